@@ -29,6 +29,9 @@ stack_props = {
         "store-bucket": "agha-gdr-store-bucket",
         "store-bucket-archive": "agha-gdr-store-bucket-archive",
         "e-tag": "agha-gdr-e-tag",
+        "folder-lock": "agha-gdr-folder-lock",
+        "submission-status": "agha-gdr-submission-status",
+        "notification-outbox": "agha-gdr-notification-outbox",
     },
     "autorun_validation_jobs": "yes",
     "notification": {
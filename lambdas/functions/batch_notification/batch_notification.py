@@ -1,16 +1,16 @@
 #!/usr/bin/env python3
+import datetime
 import json
 import logging
 import os
 import sys
 import boto3
-import http.client
 import enum
 
 import util
-from util import batch, dynamodb
+from util import batch, dynamodb, slack
+from util.instrumentation import instrument_handler
 
-SLACK_HOST = "hooks.slack.com"
 SLACK_CHANNEL = "#agha-gdr"
 
 # Environment Variable
@@ -22,6 +22,19 @@ REPORT_LAMBDA_ARN = os.environ.get("REPORT_LAMBDA_ARN")
 DATA_TRANSFER_MANAGER_LAMBDA_ARN = os.environ.get("DATA_TRANSFER_MANAGER_LAMBDA_ARN")
 CLEANUP_MANAGER_LAMBDA_ARN = os.environ.get("CLEANUP_MANAGER_LAMBDA_ARN")
 DYNAMODB_STAGING_TABLE_NAME = os.environ.get("DYNAMODB_STAGING_TABLE_NAME")
+DYNAMODB_SUBMISSION_STATUS_TABLE_NAME = os.environ.get(
+    "DYNAMODB_SUBMISSION_STATUS_TABLE_NAME"
+)
+# Idle time before the scheduled STORE_TRANSFER_CHECK looks at a transfer whose upload count stopped short, and the
+# age after which it gives up on it
+STORE_TRANSFER_CHECK_IDLE_MINUTES = int(
+    os.environ.get("STORE_TRANSFER_CHECK_IDLE_MINUTES", 30)
+)
+STORE_TRANSFER_CHECK_MAX_AGE_HOURS = int(
+    os.environ.get("STORE_TRANSFER_CHECK_MAX_AGE_HOURS", 24)
+)
+# Number of outstanding validation results (according to the submission status) from which the full check runs
+VALIDATION_FULL_CHECK_OUTSTANDING = 1
 # Logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -34,8 +47,10 @@ LAMBDA_CLIENT = boto3.client("lambda")
 class EventType(enum.Enum):
     VALIDATION_RESULT_UPLOAD = "VALIDATION_RESULT_UPLOAD"
     STORE_FILE_UPLOAD = "STORE_FILE_UPLOAD"
+    STORE_TRANSFER_CHECK = "STORE_TRANSFER_CHECK"
 
 
+@instrument_handler
 def handler(event, context):
     """
     This function will check and notify if check has been done and the result of it.
@@ -45,12 +60,20 @@ def handler(event, context):
         event_type: 'VALIDATION_RESULT',  # OR FILE_UPLOAD
         s3_key : 'ABCDE/121212/filename.fastq.gz'
     }
+    OR, from the schedule (no s3_key):
+    {
+        event_type: 'STORE_TRANSFER_CHECK'
+    }
     """
+    dynamodb.clear_query_cache()
 
     logger.info("Processing event:")
     logger.info(json.dumps(event, indent=4))
 
     event_type = event["event_type"]
+    if event_type == EventType.STORE_TRANSFER_CHECK.value:
+        return run_pending_store_transfer_check()
+
     s3_key = event["s3_key"]
 
     submission_prefix = (
@@ -58,6 +81,29 @@ def handler(event, context):
     )  # Making sure trailing slash
 
     if event_type == EventType.VALIDATION_RESULT_UPLOAD.value:
+        # Cheap check from the submission status counter before querying every result record. The counter is best
+        # effort (an increment may be lost or an event delivered twice), so it only returns early while several
+        # results are still outstanding. An event that could be the last one, or a submission without a status record
+        # (e.g. validated before the counter existed), goes through the full check.
+        submission_status = dynamodb.get_submission_status(
+            DYNAMODB_SUBMISSION_STATUS_TABLE_NAME, submission_prefix
+        )
+        if (
+            submission_status is not None
+            and dynamodb.SubmissionStatusRecord.is_validation_in_progress(
+                submission_status,
+                min_outstanding=VALIDATION_FULL_CHECK_OUTSTANDING + 1,
+            )
+        ):
+            logger.info(
+                f"Submission incomplete according to submission status "
+                f"({dynamodb.SubmissionStatus.VALIDATING.value}: {submission_status.get('validating')}, "
+                f"{dynamodb.SubmissionStatus.PASSED.value}: {submission_status.get('passed')}, "
+                f"{dynamodb.SubmissionStatus.FAILED.value}: {submission_status.get('failed')}), "
+                f"waiting for more event from the same submission."
+            )
+            return
+
         # Check if all items are all here
         fail_batch_job = batch.run_batch_check(
             staging_directory_prefix=submission_prefix
@@ -124,132 +170,209 @@ def handler(event, context):
                 return
 
     elif event_type == EventType.STORE_FILE_UPLOAD.value:
-        # Check number of file same as number of manifest
-
-        manifest_file_records = dynamodb.get_batch_item_from_pk_and_sk(
-            table_name=DYNAMODB_STORE_TABLE_NAME,
-            partition_key=dynamodb.FileRecordPartitionKey.MANIFEST_FILE_RECORD.value,
-            sort_key_prefix=submission_prefix,
-        )
-        logger.info(
-            f"Total number of {dynamodb.FileRecordPartitionKey.MANIFEST_FILE_RECORD.value}: {len(manifest_file_records)}"
+        # Cheap gate before reading the whole submission: the upload count against the number of files
+        # data_transfer_manager expects, then manifest.orig (moved separately) with a single key lookup. A transfer
+        # whose count stops short (e.g. a lost upload event or counter increment) is picked up by the scheduled
+        # STORE_TRANSFER_CHECK. Submission without an expected count (e.g. transferred before the counter existed)
+        # goes through the full check.
+        submission_status = dynamodb.get_submission_status(
+            DYNAMODB_SUBMISSION_STATUS_TABLE_NAME, submission_prefix
         )
+        if (
+            submission_status is not None
+            and dynamodb.SubmissionStatus.TRANSFER_EXPECTED.value in submission_status
+        ):
+            if not dynamodb.SubmissionStatusRecord.is_transfer_complete(
+                submission_status
+            ):
+                logger.info(
+                    f"Move is not finished, waiting for more files "
+                    f"({submission_status.get('transfer_received')} of "
+                    f"{submission_status.get('transfer_expected')} received)"
+                )
+                return
 
-        current_file_records = dynamodb.get_batch_item_from_pk_and_sk(
-            table_name=DYNAMODB_STORE_TABLE_NAME,
-            partition_key=dynamodb.FileRecordPartitionKey.FILE_RECORD.value,
-            sort_key_prefix=submission_prefix,
-        )
-        logger.info(
-            f"Total number of {dynamodb.FileRecordPartitionKey.FILE_RECORD.value}: {len(current_file_records)}"
-        )
+            manifest_orig_res = dynamodb.get_item_from_exact_pk_and_sk(
+                table_name=DYNAMODB_STORE_TABLE_NAME,
+                partition_key=dynamodb.FileRecordPartitionKey.FILE_RECORD.value,
+                sort_key=f"{submission_prefix}manifest.orig",
+            )
+            if manifest_orig_res["Count"] == 0:
+                logger.info(
+                    f"Move is not finished, waiting for more files (manifest.orig does not exist)"
+                )
+                return
 
-        # Remove manifest.txt
-        is_manifest_txt_exist = False
-        is_manifest_orig_exist = False
-        for s3_metadata in current_file_records:
-            key = s3_metadata["sort_key"]
+        run_store_check(submission_prefix)
+        return
 
-            if key.endswith("manifest.txt"):
-                is_manifest_txt_exist = True
-            elif key.endswith("manifest.orig"):
-                is_manifest_orig_exist = True
 
-        # If manifest.orig does not exist, move is incomplete waiting for moore files. Terminating ...
-        if not is_manifest_orig_exist:
-            logger.info(
-                f"Move is not finished, waiting for more files (manifest.orig does not exist)"
-            )
-            return
+def run_store_check(submission_prefix: str) -> bool:
+    """
+    Compare the store FILE records of the submission against its MANIFEST records, then notify and invoke the
+    cleanup when the move is complete.
+    :return: False when the move is not finished yet, True when the check came to a conclusion
+    """
+    # Check number of file same as number of manifest
 
-        # Check number of files exist match with dydb
-        if is_manifest_txt_exist and is_manifest_orig_exist:
-            number_file_skipped = 2
-        elif is_manifest_txt_exist or is_manifest_orig_exist:
-            number_file_skipped = 1
-        else:
-            number_file_skipped = 0
-        logger.info(f"Number of manifest files: {number_file_skipped}")
+    manifest_file_records = dynamodb.get_batch_item_from_pk_and_sk(
+        table_name=DYNAMODB_STORE_TABLE_NAME,
+        partition_key=dynamodb.FileRecordPartitionKey.MANIFEST_FILE_RECORD.value,
+        sort_key_prefix=submission_prefix,
+    )
+    logger.info(
+        f"Total number of {dynamodb.FileRecordPartitionKey.MANIFEST_FILE_RECORD.value}: {len(manifest_file_records)}"
+    )
 
-        # Check if number of files match
-        # Manifest record is the expected number,
-        if len(manifest_file_records) != (
-            len(current_file_records) - number_file_skipped
-        ):
-            logger.info(
-                "Total number of expected and current files does not match. Terminating ..."
+    current_file_records = dynamodb.get_batch_item_from_pk_and_sk(
+        table_name=DYNAMODB_STORE_TABLE_NAME,
+        partition_key=dynamodb.FileRecordPartitionKey.FILE_RECORD.value,
+        sort_key_prefix=submission_prefix,
+    )
+    logger.info(
+        f"Total number of {dynamodb.FileRecordPartitionKey.FILE_RECORD.value}: {len(current_file_records)}"
+    )
+
+    # Remove manifest.txt
+    is_manifest_txt_exist = False
+    is_manifest_orig_exist = False
+    for s3_metadata in current_file_records:
+        key = s3_metadata["sort_key"]
+
+        if key.endswith("manifest.txt"):
+            is_manifest_txt_exist = True
+        elif key.endswith("manifest.orig"):
+            is_manifest_orig_exist = True
+
+    # If manifest.orig does not exist, move is incomplete waiting for moore files. Terminating ...
+    if not is_manifest_orig_exist:
+        logger.info(
+            f"Move is not finished, waiting for more files (manifest.orig does not exist)"
+        )
+        return False
+
+    # Check number of files exist match with dydb
+    if is_manifest_txt_exist and is_manifest_orig_exist:
+        number_file_skipped = 2
+    elif is_manifest_txt_exist or is_manifest_orig_exist:
+        number_file_skipped = 1
+    else:
+        number_file_skipped = 0
+    logger.info(f"Number of manifest files: {number_file_skipped}")
+
+    # Check if number of files match
+    # Manifest record is the expected number,
+    if len(manifest_file_records) != (len(current_file_records) - number_file_skipped):
+        logger.info(
+            "Total number of expected and current files does not match. Terminating ..."
+        )
+        return False
+    else:
+        logger.info(
+            "Total number of expected and current files match exclude manifest."
+        )
+        # The store FILE records are written by s3_event_recorder before this lambda is invoked
+        missing_store_file = batch.run_manifest_orig_store_check(
+            submission_prefix, store_table_name=DYNAMODB_STORE_TABLE_NAME
+        )
+        logger.info(f"Missing store file: {json.dumps(missing_store_file, indent=4)}")
+        if len(missing_store_file) > 0:
+            message = (
+                "File in store does *not* contain all files defined in the original manifest. "
+                "Please check the submission manually. \n"
+                f"```{submission_prefix}```\n"
             )
-            return
-        else:
-            logger.info(
-                "Total number of expected and current files match exclude manifest."
+            logger.info(message)
+            send_slack_notification(
+                heading=f"Data S3 Store (`{submission_prefix}`)",
+                title="Status: FAILED",
+                message=message,
             )
-            missing_store_file = batch.run_manifest_orig_store_check(submission_prefix)
-            logger.info(
-                f"Missing store file: {json.dumps(missing_store_file, indent=4)}"
+            return True
+        else:
+
+            # Checking if staging bucket have a readme docs
+            # If exist means that it had been cleaned up before
+            file_to_check = "README.txt"
+            readme_dydb = dynamodb.get_item_from_exact_pk_and_sk(
+                DYNAMODB_STAGING_TABLE_NAME,
+                partition_key=dynamodb.FileRecordPartitionKey.FILE_RECORD.value,
+                sort_key=f"{submission_prefix}{file_to_check}",
             )
-            if len(missing_store_file) > 0:
-                message = (
-                    "File in store does *not* contain all files defined in the original manifest. "
-                    "Please check the submission manually. \n"
-                    f"```{submission_prefix}```\n"
-                )
+
+            if readme_dydb["Count"] > 0:
+                message = "CleanUp has been done for this submission."
                 logger.info(message)
-                send_slack_notification(
-                    heading=f"Data S3 Store (`{submission_prefix}`)",
-                    title="Status: FAILED",
-                    message=message,
-                )
-                return
-            else:
+                return True
 
-                # Checking if staging bucket have a readme docs
-                # If exist means that it had been cleaned up before
-                file_to_check = "README.txt"
-                readme_dydb = dynamodb.get_item_from_exact_pk_and_sk(
-                    DYNAMODB_STAGING_TABLE_NAME,
-                    partition_key=dynamodb.FileRecordPartitionKey.FILE_RECORD.value,
-                    sort_key=f"{submission_prefix}{file_to_check}",
-                )
+            message = "Files in this submission are successfully stored."
+            send_slack_notification(
+                heading=f"Data S3 Store (`{submission_prefix}`)",
+                title="Status: SUCCEEDED",
+                message=message,
+            )
 
-                if readme_dydb["Count"] > 0:
-                    message = "CleanUp has been done for this submission."
-                    logger.info(message)
-                    return
+            # Invoking lambda automatically
+            util.call_lambda(
+                lambda_arn=CLEANUP_MANAGER_LAMBDA_ARN,
+                payload={
+                    "submission_directory": submission_prefix,
+                },
+            )
+            return True
 
-                message = "Files in this submission are successfully stored."
-                send_slack_notification(
-                    heading=f"Data S3 Store (`{submission_prefix}`)",
-                    title="Status: SUCCEEDED",
-                    message=message,
-                )
 
-                # Invoking lambda automatically
-                util.call_lambda(
-                    lambda_arn=CLEANUP_MANAGER_LAMBDA_ARN,
-                    payload={
-                        "submission_directory": submission_prefix,
-                    },
-                )
-                return
+def run_pending_store_transfer_check() -> list:
+    """
+    Recovery of the STORE_FILE_UPLOAD gate, run on a schedule. A transfer whose upload count stopped short of the
+    expected count (e.g. a lost upload event or counter increment) and has been idle for
+    STORE_TRANSFER_CHECK_IDLE_MINUTES gets the full store check. Once the check comes to a conclusion the count is
+    settled, so the submission is not checked again.
+    :return: submission prefix settled by this run
+    """
+    now = datetime.datetime.now(util.TIME_ZONE)
+    settled_list = []
+
+    for submission_status in dynamodb.get_submission_status_with_pending_transfer(
+        DYNAMODB_SUBMISSION_STATUS_TABLE_NAME
+    ):
+        submission_prefix = submission_status["sort_key"]
+        date_modified = util.TIME_ZONE.localize(
+            datetime.datetime.strptime(
+                submission_status["date_modified"], "%Y%m%d_%H%M%S"
+            )
+        )
+        idle_time = now - date_modified
+        if idle_time < datetime.timedelta(
+            minutes=STORE_TRANSFER_CHECK_IDLE_MINUTES
+        ) or idle_time > datetime.timedelta(hours=STORE_TRANSFER_CHECK_MAX_AGE_HOURS):
+            continue
+
+        logger.warning(
+            f"Store upload count of '{submission_prefix}' stopped at "
+            f"{submission_status.get('transfer_received')} of {submission_status.get('transfer_expected')}, "
+            f"running the full store check"
+        )
+        if run_store_check(submission_prefix):
+            dynamodb.set_submission_status(
+                table_name=DYNAMODB_SUBMISSION_STATUS_TABLE_NAME,
+                submission_prefix=submission_prefix,
+                count_by_status={
+                    dynamodb.SubmissionStatus.TRANSFER_RECEIVED.value: int(
+                        submission_status["transfer_expected"]
+                    )
+                },
+            )
+            settled_list.append(submission_prefix)
+
+    logger.info(f"Settled store transfer: {json.dumps(settled_list, indent=4)}")
+    return settled_list
 
 
 def send_slack_notification(heading: str, title: str, message: str):
-    # Get SSM value
-    slack_webhook_endpoint = util.get_ssm_parameter(
-        "/slack/webhook/endpoint", CLIENT_SSM, with_decryption=True
+    post_data = slack.create_slack_post_data(
+        SLACK_CHANNEL, "AWS-AGHA", heading, title, message
+    )
+    return slack.send_slack_message(
+        slack.get_slack_webhook_endpoint(CLIENT_SSM), post_data
     )
-
-    connection = http.client.HTTPSConnection(SLACK_HOST)
-    post_data = {
-        "channel": SLACK_CHANNEL,
-        "username": "AWS-AGHA",
-        "text": "*" + heading + "*",  # After username line
-        "icon_emoji": ":aws_logo:",
-        "attachments": [{"title": title, "text": message}],  # First message line
-    }
-    header = {"Content-Type": "application/json"}
-    connection.request("POST", slack_webhook_endpoint, json.dumps(post_data), header)
-    response = connection.getresponse()
-    connection.close()
-    return response.status
@@ -8,11 +8,14 @@ Run python test command:
 cmd: python -m unittest tests.test_batch_notification.BatchNotificationUnitTestCase
 
 """
+import datetime
 import os
 import unittest
 import json
 from unittest import mock
+import util
 from util import dynamodb
+import batch_notification
 from batch_notification import handler, EventType
 
 MOCK_S3_METADATA_LIST = [
@@ -246,6 +249,92 @@ class BatchNotificationUnitTestCase(unittest.TestCase):
         self.assertTrue(res is None)
         return
 
+    @mock.patch("batch_notification.util.call_lambda", new=raise_error_lambda_payload)
+    @mock.patch(
+        "batch_notification.dynamodb.get_batch_item_from_pk_and_sk",
+        side_effect=AssertionError("Submission should not be read"),
+    )
+    @mock.patch(
+        "batch_notification.dynamodb.get_item_from_exact_pk_and_sk",
+        mock.MagicMock(return_value={"Count": 0, "Items": []}),
+    )
+    @mock.patch(
+        "batch_notification.dynamodb.get_submission_status",
+        mock.MagicMock(return_value={"transfer_expected": 3, "transfer_received": 3}),
+    )
+    def test_store_upload_gated_by_manifest_orig(self, mock_query):
+        key = "FlagShip/20220222/filename.fastq.gz"
+        payload = make_mock_data(EventType.STORE_FILE_UPLOAD, key)
+
+        self.assertIsNone(handler(payload, {}))
+        mock_query.assert_not_called()
+
+    @mock.patch(
+        "batch_notification.dynamodb.get_batch_item_from_pk_and_sk",
+        side_effect=AssertionError("Submission should not be read"),
+    )
+    @mock.patch(
+        "batch_notification.dynamodb.get_item_from_exact_pk_and_sk",
+        side_effect=AssertionError("manifest.orig should not be read"),
+    )
+    @mock.patch(
+        "batch_notification.dynamodb.get_submission_status",
+        mock.MagicMock(return_value={"transfer_expected": 3, "transfer_received": 2}),
+    )
+    def test_store_upload_gated_by_count(self, mock_get_item, mock_query):
+        key = "FlagShip/20220222/filename.fastq.gz"
+        payload = make_mock_data(EventType.STORE_FILE_UPLOAD, key)
+
+        self.assertIsNone(handler(payload, {}))
+        mock_get_item.assert_not_called()
+        mock_query.assert_not_called()
+
+    @mock.patch(
+        "batch_notification.batch.run_batch_check",
+        mock.MagicMock(return_value=["Uncomplete Check"]),
+    )
+    @mock.patch(
+        "batch_notification.dynamodb.get_submission_status",
+        mock.MagicMock(return_value={"validating": 3, "passed": 1, "failed": 0}),
+    )
+    def test_validation_gated_by_count(self):
+        key = "AGHA/20222222/test.fastq.gz"
+        payload = make_mock_data(EventType.VALIDATION_RESULT_UPLOAD, key)
+
+        self.assertIsNone(handler(payload, {}))
+        batch_notification.batch.run_batch_check.assert_not_called()
+
+    @mock.patch(
+        "batch_notification.batch.run_batch_check",
+        mock.MagicMock(return_value=["Uncomplete Check"]),
+    )
+    @mock.patch(
+        "batch_notification.dynamodb.get_submission_status",
+        mock.MagicMock(return_value={"validating": 2, "passed": 1, "failed": 0}),
+    )
+    def test_validation_last_outstanding_fully_checked(self):
+        """A single outstanding result may be a lost increment, the full check runs"""
+        key = "AGHA/20222222/test.fastq.gz"
+        payload = make_mock_data(EventType.VALIDATION_RESULT_UPLOAD, key)
+
+        self.assertIsNone(handler(payload, {}))
+        batch_notification.batch.run_batch_check.assert_called_once()
+
+    @mock.patch(
+        "batch_notification.batch.run_batch_check",
+        mock.MagicMock(return_value=["Uncomplete Check"]),
+    )
+    @mock.patch(
+        "batch_notification.dynamodb.get_submission_status",
+        mock.MagicMock(return_value={"passed": 1, "failed": 0}),
+    )
+    def test_validation_without_counter_fully_checked(self):
+        key = "AGHA/20222222/test.fastq.gz"
+        payload = make_mock_data(EventType.VALIDATION_RESULT_UPLOAD, key)
+
+        self.assertIsNone(handler(payload, {}))
+        batch_notification.batch.run_batch_check.assert_called_once()
+
     def tearDown(self):
         deletion_list = [
             {"partition_key": i["partition_key"], "sort_key": i["sort_key"]}
@@ -260,5 +349,66 @@ class BatchNotificationUnitTestCase(unittest.TestCase):
         dynamodb.batch_delete_from_dictionary("agha-gdr-staging-bucket", deletion_list)
 
 
+class StoreTransferCheckTestCase(unittest.TestCase):
+    @staticmethod
+    def create_date_modified(minutes_ago: int) -> str:
+        return "{:%Y%m%d_%H%M%S}".format(
+            datetime.datetime.now(util.TIME_ZONE)
+            - datetime.timedelta(minutes=minutes_ago)
+        )
+
+    @mock.patch("batch_notification.dynamodb.set_submission_status")
+    @mock.patch("batch_notification.run_store_check")
+    @mock.patch(
+        "batch_notification.dynamodb.get_submission_status_with_pending_transfer"
+    )
+    def test_idle_transfer_checked(
+        self, mock_pending, mock_run_store_check, mock_set_status
+    ):
+        mock_pending.return_value = [
+            {
+                "sort_key": "AC/2022-02-02/",
+                "transfer_expected": 3,
+                "transfer_received": 2,
+                "date_modified": self.create_date_modified(60),
+            },
+            {
+                "sort_key": "AC/2022-03-03/",
+                "transfer_expected": 3,
+                "transfer_received": 1,
+                "date_modified": self.create_date_modified(60),
+            },
+            # Still moving
+            {
+                "sort_key": "AC/2022-04-04/",
+                "transfer_expected": 3,
+                "transfer_received": 2,
+                "date_modified": self.create_date_modified(1),
+            },
+            # Given up
+            {
+                "sort_key": "AC/2022-05-05/",
+                "transfer_expected": 3,
+                "transfer_received": 2,
+                "date_modified": self.create_date_modified(3 * 24 * 60),
+            },
+        ]
+        # Only the first submission has all its files in store
+        mock_run_store_check.side_effect = lambda prefix: prefix == "AC/2022-02-02/"
+
+        settled_list = handler({"event_type": EventType.STORE_TRANSFER_CHECK.value}, {})
+
+        self.assertEqual(settled_list, ["AC/2022-02-02/"])
+        self.assertEqual(
+            [c.args[0] for c in mock_run_store_check.call_args_list],
+            ["AC/2022-02-02/", "AC/2022-03-03/"],
+        )
+        mock_set_status.assert_called_once()
+        self.assertEqual(
+            mock_set_status.call_args.kwargs["count_by_status"],
+            {"transfer_received": 3},
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -5,10 +5,14 @@ import os
 import boto3
 
 import util
-from util import s3, agha, batch
+from util import s3, agha, batch, dynamodb
+from util.instrumentation import instrument_handler
 
 STAGING_BUCKET = os.environ.get("STAGING_BUCKET")
 STORE_BUCKET = os.environ.get("STORE_BUCKET")
+DYNAMODB_SUBMISSION_STATUS_TABLE_NAME = os.environ.get(
+    "DYNAMODB_SUBMISSION_STATUS_TABLE_NAME"
+)
 
 # Logging
 logger = logging.getLogger()
@@ -17,6 +21,7 @@ logger.setLevel(logging.INFO)
 S3_CLIENT = boto3.client("s3")
 
 
+@instrument_handler
 def handler(event, context):
     """
     This function will delete object from staging bucket.
@@ -101,6 +106,14 @@ def handler(event, context):
             logger.debug(f"Deletion response: {json.dumps(res, indent=4)}")
             logger.info(f"Deletion job success!")
 
+            dynamodb.increment_submission_status(
+                table_name=DYNAMODB_SUBMISSION_STATUS_TABLE_NAME,
+                submission_prefix=submission_directory.strip("/") + "/",
+                count_by_status={
+                    dynamodb.SubmissionStatus.CLEANED.value: len(deletion_key_list)
+                },
+            )
+
         except Exception as e:
             logger.error("Something went wrong on deleting s3 keys")
             logger.error(e)
@@ -11,6 +11,7 @@ from boto3.dynamodb.conditions import Attr
 
 import util
 from util import dynamodb, s3, batch, agha, submission_data
+from util.instrumentation import instrument_handler
 
 JOB_NAME_RE = re.compile(r"[.\\/]")
 
@@ -26,6 +27,9 @@ DYNAMODB_ARCHIVE_STORE_TABLE_NAME = os.environ.get("DYNAMODB_ARCHIVE_STORE_TABLE
 DYNAMODB_ARCHIVE_RESULT_TABLE_NAME = os.environ.get(
     "DYNAMODB_ARCHIVE_RESULT_TABLE_NAME"
 )
+DYNAMODB_SUBMISSION_STATUS_TABLE_NAME = os.environ.get(
+    "DYNAMODB_SUBMISSION_STATUS_TABLE_NAME"
+)
 # Logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -33,6 +37,7 @@ logger.setLevel(logging.INFO)
 S3_CLIENT = boto3.client("s3")
 
 
+@instrument_handler
 def handler(event, context):
     """
     The lambda is to invoke s3 file migration batch job
@@ -56,6 +61,9 @@ def handler(event, context):
 
     logger.info(f"Processing event: {json.dumps(event, indent=4)}")
 
+    # Query results are only cached within a single invocation
+    dynamodb.clear_query_cache()
+
     # Parse event data and get record
     try:
         validate_event_data(event)
@@ -113,7 +121,7 @@ def handler(event, context):
     try:
 
         # Grab object list
-        manifest_list = dynamodb.get_batch_item_from_pk_and_sk(
+        manifest_list = dynamodb.get_cached_batch_item_from_pk_and_sk(
             table_name=DYNAMODB_STAGING_TABLE_NAME,
             partition_key=dynamodb.FileRecordPartitionKey.MANIFEST_FILE_RECORD.value,
             sort_key_prefix=submission_directory,
@@ -259,14 +267,30 @@ def handler(event, context):
     logger.info(json.dumps(batch_job_data))
 
     logger.info(f"Update Dynamodb list ({len(dynamodb_job)}):")
-    logger.info(
-        json.dumps([item.__dict__ for item in dynamodb_job], cls=util.JsonSerialEncoder)
-    )
+    logger.info(util.serialization.dumps([item.__dict__ for item in dynamodb_job]))
 
     # Submit Batch jobs
     if event.get("skip_submit_batch_job"):
         logger.info("Skip submit batch job flag is raised. Skipping ...")
     else:
+        # Number of store upload batch_notification waits for before checking the store against manifest.orig.
+        # Written before submitting, so no upload event is counted against the previous transfer.
+        transfer_expected = len(
+            [
+                record
+                for record in dynamodb_job
+                if dynamodb.SubmissionStatusRecord.is_counted_s3_key(record.sort_key)
+            ]
+        )
+        dynamodb.set_submission_status(
+            table_name=DYNAMODB_SUBMISSION_STATUS_TABLE_NAME,
+            submission_prefix=submission_directory,
+            count_by_status={
+                dynamodb.SubmissionStatus.TRANSFER_EXPECTED.value: transfer_expected,
+                dynamodb.SubmissionStatus.TRANSFER_RECEIVED.value: 0,
+            },
+        )
+
         logger.info("Submitting batch job")
         for i, job_data in enumerate(batch_job_data):
             submit_data_transfer_job(job_data)
@@ -292,6 +316,17 @@ def handler(event, context):
         dynamodb.batch_write_records(
             table_name=DYNAMODB_STORE_TABLE_NAME, records=dynamodb_job
         )
+        # Before the archive write below, which appends a timestamp to the records sort_key
+        try:
+            written, deleted = dynamodb.update_study_id_index_from_manifest_record_list(
+                DYNAMODB_STORE_TABLE_NAME,
+                dynamodb_job,
+                sort_key_prefix=submission_directory,
+            )
+            logger.info(f"Study ID index updated: {written} written, {deleted} deleted")
+        except Exception as e:
+            # The index can be rebuilt with scripts/util/backfill_study_id_index.py
+            logger.error(f"Unable to update the study ID index: {e}")
         dynamodb.batch_write_record_archive(
             table_name=DYNAMODB_ARCHIVE_STORE_TABLE_NAME,
             records=dynamodb_job,
@@ -315,7 +350,7 @@ def handler(event, context):
     else:
         # Create new manifest file from dynamodb given
         logger.info(f"Generating manifest file from dynamodb")
-        manifest_item = dynamodb.get_batch_item_from_pk_and_sk(
+        manifest_item = dynamodb.get_cached_batch_item_from_pk_and_sk(
             DYNAMODB_STORE_TABLE_NAME,
             dynamodb.FileRecordPartitionKey.MANIFEST_FILE_RECORD.value,
             submission_directory,
@@ -341,6 +376,7 @@ def handler(event, context):
 
         logger.info(f"New manifest file has been uploaded")
 
+    logger.info(f"DynamoDB query cache stats: {dynamodb.get_query_cache_stats()}")
     return "Data Transfer Job has started"
 
 
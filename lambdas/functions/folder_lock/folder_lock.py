@@ -3,6 +3,13 @@ import boto3
 import os
 import logging
 import enum
+import time
+
+from botocore.exceptions import ClientError
+
+import util
+from util import dynamodb
+from util.instrumentation import instrument_handler
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -12,6 +19,18 @@ s3 = boto3.client("s3")
 STAGING_BUCKET = os.environ.get("STAGING_BUCKET")
 FOLDER_LOCK_EXCEPTION_ROLE_ID = os.environ.get("FOLDER_LOCK_EXCEPTION_ROLE_ID")
 AWS_ACCOUNT_NUMBER = os.environ.get("AWS_ACCOUNT_NUMBER")
+DYNAMODB_FOLDER_LOCK_TABLE_NAME = os.environ.get("DYNAMODB_FOLDER_LOCK_TABLE_NAME")
+
+# Seconds the policy writer waits before rebuilding, so a burst of lock/unlock is written as one policy update
+FOLDER_LOCK_DEBOUNCE_SECONDS = float(os.environ.get("FOLDER_LOCK_DEBOUNCE_SECONDS", 2))
+# A writer lease is considered abandoned after this many seconds (e.g. the writer lambda has timed out)
+WRITER_LEASE_SECONDS = 120
+# Seconds between two checks of an invocation waiting for the current writer to write its change
+WRITER_WAIT_INTERVAL_SECONDS = float(
+    os.environ.get("FOLDER_LOCK_WRITER_WAIT_INTERVAL_SECONDS", 1)
+)
+# S3 bucket policy size limit is 20KB
+POLICY_SIZE_LIMIT_BYTES = 20 * 1024
 
 BUCKET_POLICY_TEMPLATE = {"Version": "2012-10-17", "Statement": []}
 
@@ -29,6 +48,13 @@ class TaskType(enum.Enum):
     FOLDER_UNLOCK = "FOLDER_UNLOCK"
 
 
+class FolderLockPartitionKey(enum.Enum):
+    # sort_key: Locked submission directory (e.g. "FlagShip/SubmissionDate")
+    LOCK = "LOCK"
+    # sort_key: Bucket name. Hold the lock_version, policy_version and the writer lease
+    POLICY = "POLICY"
+
+
 def find_folder_lock_statement(policy: dict):
     for policy_statement in policy.get("Statement"):
         if policy_statement.get("Sid") == "FolderLock":
@@ -38,106 +64,205 @@ def find_folder_lock_statement(policy: dict):
 
 def create_resource_arn_from_submission_prefix(submission_prefix: str) -> str:
     obj_prefix = os.path.dirname(submission_prefix)
-    return f"arn:aws:s3:::{STAGING_BUCKET}/{obj_prefix}/*"
+    return create_resource_arn_from_directory(obj_prefix)
 
 
-def handler(event, context):
+def create_resource_arn_from_directory(directory: str) -> str:
+    return f"arn:aws:s3:::{STAGING_BUCKET}/{directory}/*"
+
+
+def get_directory_from_resource_arn(resource_arn: str) -> str:
+    prefix = f"arn:aws:s3:::{STAGING_BUCKET}/"
+    if not resource_arn.startswith(prefix) or not resource_arn.endswith("/*"):
+        raise ValueError(f"Unexpected resource ARN: {resource_arn}")
+    return resource_arn[len(prefix) : -len("/*")]
+
+
+################################################################################
+# Lock table
+
+
+def get_lock_table():
+    return dynamodb.get_resource().Table(DYNAMODB_FOLDER_LOCK_TABLE_NAME)
+
+
+def is_conditional_check_failed(e: ClientError) -> bool:
+    return e.response["Error"]["Code"] == "ConditionalCheckFailedException"
+
+
+def write_lock_record(directory: str) -> bool:
     """
-    Locking event when manifest file has been uploaded.
-    *This will only work in STAGING bucket
+    Return False if the directory is already locked
+    """
+    try:
+        get_lock_table().put_item(
+            Item={
+                "partition_key": FolderLockPartitionKey.LOCK.value,
+                "sort_key": directory,
+                "flagship": directory.split("/")[0],
+                "date_modified": util.get_datetimestamp(),
+            },
+            ConditionExpression="attribute_not_exists(sort_key)",
+        )
+        return True
+    except ClientError as e:
+        if is_conditional_check_failed(e):
+            return False
+        raise
 
-    Payload
-    {
-        "submission_prefix": "FlagShip/SubmissionDate/Filename.txt",
-        "task": "FOLDER_LOCK" or "FOLDER_UNLOCK"
-    }
+
+def delete_lock_record(directory: str) -> bool:
+    """
+    Return False if the directory is not locked
     """
+    try:
+        get_lock_table().delete_item(
+            Key={
+                "partition_key": FolderLockPartitionKey.LOCK.value,
+                "sort_key": directory,
+            },
+            ConditionExpression="attribute_exists(sort_key)",
+        )
+        return True
+    except ClientError as e:
+        if is_conditional_check_failed(e):
+            return False
+        raise
+
+
+def get_locked_directory_list() -> list:
+    table = get_lock_table()
+    func_parameter = {
+        "KeyConditionExpression": "partition_key = :partition_key",
+        "ExpressionAttributeValues": {
+            ":partition_key": FolderLockPartitionKey.LOCK.value
+        },
+        "ConsistentRead": True,
+    }
 
-    logger.info(f"Start processing event:")
-    logger.info(json.dumps(event, indent=4))
+    response = table.query(**func_parameter)
+    directory_list = [item["sort_key"] for item in response["Items"]]
+    while response.get("LastEvaluatedKey") is not None:
+        func_parameter["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        response = table.query(**func_parameter)
+        directory_list.extend(item["sort_key"] for item in response["Items"])
 
-    ################################################################################
-    # Validate the event payload
+    return directory_list
 
-    # Checking submission_prefix of payloads
-    if "submission_prefix" not in event and "task" not in event:
-        logger.error(
-            'Expected JSON keys does not exist in the payload. Expected: ["submission_prefix", "task"]'
-        )
-        return
 
-    # Checking the correct values of tasks
-    task = event.get("task")
-    task_list = [e.value for e in TaskType]
-    if task not in task_list:
-        logger.error(f"Unexpected '{task}' in payload. Expected : {task_list}")
-        return
+def get_policy_key() -> dict:
+    return {
+        "partition_key": FolderLockPartitionKey.POLICY.value,
+        "sort_key": STAGING_BUCKET,
+    }
 
-    # Construct resource arns
-    submission_prefix = event.get("submission_prefix")
-    resource_arn = create_resource_arn_from_submission_prefix(submission_prefix)
 
-    ################################################################################
-    # Generating new policy statement
+def get_policy_record():
+    response = get_lock_table().get_item(Key=get_policy_key(), ConsistentRead=True)
+    return response.get("Item")
+
 
-    # Get Bucket Policy
+def increment_lock_version() -> int:
+    response = get_lock_table().update_item(
+        Key=get_policy_key(),
+        UpdateExpression="ADD lock_version :one",
+        ExpressionAttributeValues={":one": 1},
+        ReturnValues="UPDATED_NEW",
+    )
+    return int(response["Attributes"]["lock_version"])
+
+
+def acquire_writer_lease() -> bool:
+    now = int(time.time())
     try:
-        get_bucket_policy_response = s3.get_bucket_policy(Bucket=STAGING_BUCKET)
-        logger.debug("Received policy response:\n", get_bucket_policy_response)
-        bucket_policy = json.loads(get_bucket_policy_response["Policy"])
-    except:
-        logger.warning("No Bucket policy found. Creating a brand new policy")
-        bucket_policy = BUCKET_POLICY_TEMPLATE
+        get_lock_table().update_item(
+            Key=get_policy_key(),
+            UpdateExpression="SET writer_lease_expiry = :expiry",
+            ConditionExpression="attribute_not_exists(writer_lease_expiry) OR writer_lease_expiry < :now",
+            ExpressionAttributeValues={
+                ":expiry": now + WRITER_LEASE_SECONDS,
+                ":now": now,
+            },
+        )
+        return True
+    except ClientError as e:
+        if is_conditional_check_failed(e):
+            return False
+        raise
 
-    logger.info(f"Existing bucket policy: {json.dumps(bucket_policy, indent=4)}")
 
-    # Find Lock Policy
+def release_writer_lease(lock_version: int = None) -> bool:
+    """
+    Release the lease and record the lock_version written to the policy. The release fails (returns False) when the
+    lock table has changed since lock_version was read, so the writer has to rebuild the policy again.
+    """
+    update_parameter = {
+        "Key": get_policy_key(),
+        "UpdateExpression": "SET writer_lease_expiry = :zero",
+        "ExpressionAttributeValues": {":zero": 0},
+    }
+    if lock_version is not None:
+        update_parameter["UpdateExpression"] += ", policy_version = :version"
+        update_parameter["ConditionExpression"] = "lock_version = :version"
+        update_parameter["ExpressionAttributeValues"][":version"] = lock_version
+
     try:
-        logger.info("Grab folder lock statement")
-        folder_lock_statement = find_folder_lock_statement(bucket_policy)
+        get_lock_table().update_item(**update_parameter)
+        return True
+    except ClientError as e:
+        if is_conditional_check_failed(e):
+            return False
+        raise
+
+
+def seed_lock_table_from_bucket_policy():
+    """
+    Lock state used to live in the bucket policy only. On the first run, copy the locked directories from the policy
+    into the lock table so that rebuilding the policy does not unlock them.
+    """
+    if get_policy_record() is not None:
+        return
 
+    bucket_policy = get_bucket_policy()
+    try:
+        resource = find_folder_lock_statement(bucket_policy).get("Resource", [])
     except ValueError:
-        logger.info("No 'FolderLock' policy is found. Creating a new statement")
-        folder_lock_statement = POLICY_STATEMENT_TEMPLATE
-        bucket_policy["Statement"].append(folder_lock_statement)
-
-    folder_lock_resource = folder_lock_statement.get("Resource")
-
-    # Will add/remove resource depending on task given to the event
-    new_lock_resource = []
-    if task == TaskType.FOLDER_LOCK.value:
-        new_lock_resource.append(resource_arn)
-        # Appending existing bucket policy to the new policy
-        if isinstance(folder_lock_resource, list):
-            new_lock_resource.extend(folder_lock_resource)
-        else:
-            new_lock_resource.append(folder_lock_resource)
+        resource = []
+    if isinstance(resource, str):
+        resource = [resource]
 
-    elif task == TaskType.FOLDER_UNLOCK.value:
+    for resource_arn in resource:
+        try:
+            write_lock_record(get_directory_from_resource_arn(resource_arn))
+        except ValueError as e:
+            logger.warning(f"Skipping resource from existing policy. {e}")
 
-        # Find and delete given resource from policy statement
-        if isinstance(folder_lock_resource, list):
-            new_lock_resource = list(set(folder_lock_resource) - {resource_arn})
-        else:
-            if folder_lock_resource == resource_arn:
-                new_lock_resource = ""
-            else:
-                new_lock_resource = resource_arn
+    logger.info(f"Lock table seeded with {len(resource)} resource from bucket policy")
+    try:
+        get_lock_table().put_item(
+            Item={**get_policy_key(), "lock_version": 0, "policy_version": 0},
+            ConditionExpression="attribute_not_exists(sort_key)",
+        )
+    except ClientError as e:
+        if not is_conditional_check_failed(e):
+            raise
 
-    # Update resource statement
-    # Sanitize for any duplication
-    new_lock_resource = list(set(new_lock_resource))
 
-    # Sort ARNs for readability
-    new_lock_resource.sort()
+################################################################################
+# Bucket policy
 
-    # Updating resource back
-    folder_lock_statement["Resource"] = new_lock_resource
 
-    ################################################################################
-    # Whitelist roles to allow modification even when it is locked at the statement
+def get_bucket_policy() -> dict:
+    try:
+        get_bucket_policy_response = s3.get_bucket_policy(Bucket=STAGING_BUCKET)
+        return json.loads(get_bucket_policy_response["Policy"])
+    except:
+        logger.warning("No Bucket policy found. Creating a brand new policy")
+        return json.loads(json.dumps(BUCKET_POLICY_TEMPLATE))
 
-    logger.info("Update bucket policy to include condition")
+
+def create_folder_lock_condition() -> dict:
+    # Whitelist roles to allow modification even when it is locked at the statement
     user_id = []
     for role_id in json.loads(
         FOLDER_LOCK_EXCEPTION_ROLE_ID
@@ -149,16 +274,240 @@ def handler(event, context):
 
     # Including condition object ['Condition']["StringNotLike"]["aws:userId"] from the statement
     # Ref: https://aws.amazon.com/blogs/security/how-to-restrict-amazon-s3-bucket-access-to-a-specific-iam-role/
+    return {"StringNotLike": {"aws:userId": user_id}}
 
-    folder_lock_statement["Condition"] = {"StringNotLike": {"aws:userId": user_id}}
 
-    ################################################################################
-    # Update bucket policy
+def create_compressed_resource_arn_list(
+    directory_list: list, size_budget_bytes: int
+) -> list:
+    """
+    Return one ARN per directory. While the ARN list is larger than the budget, all directories of the flagship with
+    the most locked directories are replaced with a single flagship wildcard.
+    NOTE: A flagship wildcard also locks the other submissions of that flagship until its directories are unlocked.
+    """
+    directory_by_flagship = {}
+    for directory in sorted(set(directory_list)):
+        directory_by_flagship.setdefault(directory.split("/")[0], []).append(directory)
+
+    compressed_flagship = set()
+    while True:
+        resource_arn_list = []
+        for flagship, flagship_directory_list in directory_by_flagship.items():
+            if flagship in compressed_flagship:
+                resource_arn_list.append(create_resource_arn_from_directory(flagship))
+            else:
+                resource_arn_list.extend(
+                    create_resource_arn_from_directory(directory)
+                    for directory in flagship_directory_list
+                )
+
+        if len(json.dumps(resource_arn_list)) <= size_budget_bytes:
+            return resource_arn_list
+
+        uncompressed = [
+            flagship
+            for flagship, flagship_directory_list in directory_by_flagship.items()
+            if flagship not in compressed_flagship and len(flagship_directory_list) > 1
+        ]
+        if not uncompressed:
+            logger.error(
+                "Folder lock resources cannot fit the bucket policy size limit"
+            )
+            return resource_arn_list
+
+        flagship = max(uncompressed, key=lambda f: len(directory_by_flagship[f]))
+        logger.warning(
+            f"Bucket policy size limit reached. Locking the whole '{flagship}' flagship "
+            f"({len(directory_by_flagship[flagship])} submission locked)"
+        )
+        compressed_flagship.add(flagship)
+
+
+def create_bucket_policy(bucket_policy: dict, directory_list: list) -> dict:
+    """
+    Replace the FolderLock statement of the bucket policy with one locking the given directories.
+    Other statements are kept as they are.
+    """
+    bucket_policy["Statement"] = [
+        statement
+        for statement in bucket_policy.get("Statement", [])
+        if statement.get("Sid") != "FolderLock"
+    ]
+    if not directory_list:
+        return bucket_policy
+
+    folder_lock_statement = json.loads(json.dumps(POLICY_STATEMENT_TEMPLATE))
+    folder_lock_statement["Condition"] = create_folder_lock_condition()
+
+    # Size available for the ARN list
+    size_budget_bytes = POLICY_SIZE_LIMIT_BYTES - len(
+        json.dumps(
+            {
+                **bucket_policy,
+                "Statement": [*bucket_policy["Statement"], folder_lock_statement],
+            }
+        )
+    )
+    folder_lock_statement["Resource"] = create_compressed_resource_arn_list(
+        directory_list, size_budget_bytes
+    )
+    bucket_policy["Statement"].append(folder_lock_statement)
 
-    bucket_policy_json = json.dumps(bucket_policy, indent=4)
+    return bucket_policy
+
+
+def put_bucket_policy_from_directory_list(directory_list: list):
+    bucket_policy = create_bucket_policy(get_bucket_policy(), directory_list)
+
+    if not bucket_policy["Statement"]:
+        logger.info("No statement left in the bucket policy. Deleting bucket policy.")
+        return s3.delete_bucket_policy(Bucket=STAGING_BUCKET)
+
+    bucket_policy_json = json.dumps(bucket_policy)
     logger.info(f"New bucket policy: {bucket_policy_json}")
     response = s3.put_bucket_policy(Bucket=STAGING_BUCKET, Policy=bucket_policy_json)
     logger.info(f"BucketPolicy updated.")
     logger.debug(f"Response: {response}")
-
     return response
+
+
+def write_bucket_policy_from_lock_table(lock_version: int):
+    """
+    Coalescing writer. Only the invocation holding the writer lease rebuilds the bucket policy from the lock table,
+    and it keeps rebuilding until no lock has changed during its write.
+    Other invocations wait until the policy_version covers their lock_version (their change has been written by the
+    current writer), or take over the lease when it is released without it or has expired.
+    :param lock_version: lock_version of the caller's change
+    """
+    while not acquire_writer_lease():
+        logger.info("Bucket policy is being written by another invocation. Waiting.")
+        time.sleep(WRITER_WAIT_INTERVAL_SECONDS)
+
+        if int(get_policy_record().get("policy_version", 0)) >= lock_version:
+            logger.info("Bucket policy has been written by another invocation.")
+            return None
+
+    try:
+        # Debounce, let concurrent lock/unlock settle into the same policy update
+        time.sleep(FOLDER_LOCK_DEBOUNCE_SECONDS)
+
+        while True:
+            current_lock_version = int(get_policy_record()["lock_version"])
+            response = put_bucket_policy_from_directory_list(
+                get_locked_directory_list()
+            )
+
+            if release_writer_lease(current_lock_version):
+                return response
+            logger.info("Lock table has changed while writing. Rebuilding policy.")
+    except Exception:
+        release_writer_lease()
+        raise
+
+
+def parse_folder_lock_list(event: dict) -> list:
+    """
+    Return the list of (directory, task) from the payload, either a single request or a "folder_lock_list".
+    Invalid items are logged and skipped.
+    """
+    if "folder_lock_list" in event:
+        item_list = event["folder_lock_list"]
+    else:
+        item_list = [event]
+
+    task_list = [e.value for e in TaskType]
+    folder_lock_list = []
+    for item in item_list:
+
+        # Checking submission_prefix of payloads
+        if "submission_prefix" not in item or "task" not in item:
+            logger.error(
+                f'Expected JSON keys does not exist in the payload. Expected: ["submission_prefix", "task"]. '
+                f"Got: {item}"
+            )
+            continue
+
+        # Checking the correct values of tasks
+        task = item.get("task")
+        if task not in task_list:
+            logger.error(f"Unexpected '{task}' in payload. Expected : {task_list}")
+            continue
+
+        directory = os.path.dirname(item.get("submission_prefix"))
+        folder_lock_list.append((directory, task))
+
+    return folder_lock_list
+
+
+@instrument_handler
+def handler(event, context):
+    """
+    Locking event when manifest file has been uploaded.
+    *This will only work in STAGING bucket
+
+    The lock state is kept in the folder lock table (conditional writes), and the bucket policy is rebuilt from the
+    table by a single writer.
+
+    Payload
+    {
+        "submission_prefix": "FlagShip/SubmissionDate/Filename.txt",
+        "task": "FOLDER_LOCK" or "FOLDER_UNLOCK"
+    }
+
+    Or for multiple submissions (applied in order, with a single bucket policy update)
+    {
+        "folder_lock_list": [
+            {
+                "submission_prefix": "FlagShip/SubmissionDate/Filename.txt",
+                "task": "FOLDER_LOCK" or "FOLDER_UNLOCK"
+            },
+            ...
+        ]
+    }
+    """
+
+    logger.info(f"Start processing event:")
+    logger.info(json.dumps(event, indent=4))
+
+    ################################################################################
+    # Validate the event payload
+
+    folder_lock_list = parse_folder_lock_list(event)
+    if not folder_lock_list:
+        logger.error("No valid folder lock request in the payload.")
+        return
+
+    ################################################################################
+    # Update lock table
+
+    seed_lock_table_from_bucket_policy()
+
+    number_of_changes = 0
+    for directory, task in folder_lock_list:
+        if task == TaskType.FOLDER_LOCK.value:
+            is_changed = write_lock_record(directory)
+        else:
+            is_changed = delete_lock_record(directory)
+
+        if is_changed:
+            number_of_changes += 1
+        else:
+            logger.info(f"'{directory}' is already in the expected state ({task}).")
+
+    logger.info(
+        f"{number_of_changes}/{len(folder_lock_list)} folder lock request(s) changed the lock table."
+    )
+
+    if number_of_changes > 0:
+        lock_version = increment_lock_version()
+    else:
+        # Nothing to write unless a previous write has not completed
+        policy_record = get_policy_record()
+        if policy_record.get("policy_version") == policy_record.get("lock_version"):
+            return None
+        lock_version = int(policy_record["lock_version"])
+
+    ################################################################################
+    # Update bucket policy
+
+    return write_bucket_policy_from_lock_table(lock_version)
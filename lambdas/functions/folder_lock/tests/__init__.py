@@ -13,3 +13,5 @@ os.environ["AWS_ACCOUNT_NUMBER"] = "123456789"
 os.environ[
     "FOLDER_LOCK_EXCEPTION_ROLE_ID"
 ] = '["AIDACKCEVSQ6C2EXAMPLE", "AROADBQP57FF2AEXAMPLE"]'
+os.environ["DYNAMODB_FOLDER_LOCK_TABLE_NAME"] = "agha-gdr-folder-lock"
+os.environ["FOLDER_LOCK_DEBOUNCE_SECONDS"] = "0"
@@ -13,6 +13,10 @@ import os
 import unittest
 from unittest import mock
 
+import boto3
+from moto import mock_aws
+
+import folder_lock
 from folder_lock import (
     handler,
     TaskType,
@@ -20,22 +24,49 @@ from folder_lock import (
     create_resource_arn_from_submission_prefix,
 )
 from tests.test_data import EXISTING_KEY, EXISTING_BUCKET_POLICY
-
-
-def raise_new_bucket_policy(Bucket, Policy: str):
-    raise Exception(Policy)
-
-
-def simulate_get_bucket_policy():
-    return {"Policy": json.dumps(EXISTING_BUCKET_POLICY)}
+from util import dynamodb
 
 
 class FolderLockUnitTestCase(unittest.TestCase):
-    @mock.patch("folder_lock.s3.put_bucket_policy", new=raise_new_bucket_policy)
-    @mock.patch(
-        "folder_lock.s3.get_bucket_policy",
-        mock.MagicMock(return_value=simulate_get_bucket_policy()),
-    )
+    def setUp(self) -> None:
+        mock_aws_context = mock_aws()
+        mock_aws_context.start()
+        self.addCleanup(mock_aws_context.stop)
+
+        # Clients must be created after moto has started
+        dynamodb.DYNAMODB_RESOURCE = ""
+        self.addCleanup(setattr, dynamodb, "DYNAMODB_RESOURCE", "")
+        self.s3 = boto3.client("s3")
+        s3_patcher = mock.patch.object(folder_lock, "s3", self.s3)
+        s3_patcher.start()
+        self.addCleanup(s3_patcher.stop)
+
+        boto3.client("dynamodb").create_table(
+            TableName=os.environ["DYNAMODB_FOLDER_LOCK_TABLE_NAME"],
+            KeySchema=[
+                {"AttributeName": "partition_key", "KeyType": "HASH"},
+                {"AttributeName": "sort_key", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "partition_key", "AttributeType": "S"},
+                {"AttributeName": "sort_key", "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        self.s3.create_bucket(
+            Bucket=folder_lock.STAGING_BUCKET,
+            CreateBucketConfiguration={"LocationConstraint": "ap-southeast-2"},
+        )
+        self.s3.put_bucket_policy(
+            Bucket=folder_lock.STAGING_BUCKET, Policy=json.dumps(EXISTING_BUCKET_POLICY)
+        )
+
+    def get_lock_resource(self) -> list:
+        policy = json.loads(
+            self.s3.get_bucket_policy(Bucket=folder_lock.STAGING_BUCKET)["Policy"]
+        )
+        return find_folder_lock_statement(policy).get("Resource")
+
     def test_locking_folder(self):
         """
         Testing to lock with existing policy statement
@@ -44,40 +75,149 @@ class FolderLockUnitTestCase(unittest.TestCase):
         new_resource_arn = create_resource_arn_from_submission_prefix(new_key)
         payload = create_event(TaskType.FOLDER_LOCK, new_key)
 
-        with self.assertRaises(Exception) as context:
-            handler(payload, {})
-        exception_raise = json.loads(str(context.exception))
-        policy_statement = find_folder_lock_statement(exception_raise)
-
-        # Check if new key in resource
-        new_resource_statement = policy_statement.get("Resource")
+        handler(payload, {})
 
+        # Check if new key in resource, and existing lock is kept
+        new_resource_statement = self.get_lock_resource()
         self.assertTrue(new_resource_arn in new_resource_statement)
+        self.assertTrue(
+            create_resource_arn_from_submission_prefix(EXISTING_KEY)
+            in new_resource_statement
+        )
 
-    @mock.patch("folder_lock.s3.put_bucket_policy", new=raise_new_bucket_policy)
-    @mock.patch(
-        "folder_lock.s3.get_bucket_policy",
-        mock.MagicMock(return_value=simulate_get_bucket_policy()),
-    )
     def test_deleting_folder(self):
         """Testing if deleting prefix from statement is OK"""
 
         new_resource_arn = create_resource_arn_from_submission_prefix(EXISTING_KEY)
         payload = create_event(TaskType.FOLDER_UNLOCK, EXISTING_KEY)
 
-        with self.assertRaises(Exception) as context:
-            handler(payload, {})
-        exception_raise = json.loads(str(context.exception))
-        policy_statement = find_folder_lock_statement(exception_raise)
+        handler(payload, {})
 
         # Check if new key in resource
-        new_resource_statement = policy_statement.get("Resource")
+        new_resource_statement = self.get_lock_resource()
         self.assertTrue(new_resource_arn not in new_resource_statement)
 
+    def test_locking_locked_folder(self):
+        """Locking a locked folder should not rewrite the policy"""
+        handler(create_event(TaskType.FOLDER_LOCK, EXISTING_KEY), {})
+
+        with mock.patch.object(self.s3, "put_bucket_policy") as mock_put:
+            response = handler(create_event(TaskType.FOLDER_LOCK, EXISTING_KEY), {})
+
+        self.assertIsNone(response)
+        mock_put.assert_not_called()
+
+    def test_bulk_lock_and_unlock(self):
+        """A list of lock/unlock requests is applied with a single policy write"""
+        new_key_list = [
+            "NEW/2022-02-02/manifest.txt",
+            "NEW/2022-02-03/manifest.txt",
+        ]
+        payload = {
+            "folder_lock_list": [
+                create_event(TaskType.FOLDER_LOCK, key) for key in new_key_list
+            ]
+            + [create_event(TaskType.FOLDER_UNLOCK, EXISTING_KEY)]
+        }
+
+        with mock.patch.object(
+            self.s3, "put_bucket_policy", wraps=self.s3.put_bucket_policy
+        ) as mock_put:
+            handler(payload, {})
 
-if __name__ == "__main__":
-    unittest.main()
+        mock_put.assert_called_once()
+        resource_list = self.get_lock_resource()
+        for key in new_key_list:
+            self.assertTrue(
+                create_resource_arn_from_submission_prefix(key) in resource_list
+            )
+        self.assertTrue(
+            create_resource_arn_from_submission_prefix(EXISTING_KEY)
+            not in resource_list
+        )
+
+    def test_lock_while_other_writer(self):
+        """A lock recorded while another invocation holds the writer lease waits for that writer to write it"""
+        new_key = "NEW/2022-02-02/FileName.fastq.gz"
+        folder_lock.seed_lock_table_from_bucket_policy()
+        self.assertTrue(folder_lock.acquire_writer_lease())
+
+        def finish_other_writer(seconds):
+            # The writer sees the lock table has changed since it read the version, and rebuilds
+            lock_version = int(folder_lock.get_policy_record()["lock_version"])
+            folder_lock.put_bucket_policy_from_directory_list(
+                folder_lock.get_locked_directory_list()
+            )
+            self.assertTrue(folder_lock.release_writer_lease(lock_version))
+
+        with mock.patch(
+            "folder_lock.time.sleep", side_effect=finish_other_writer
+        ) as mock_sleep:
+            self.assertIsNone(handler(create_event(TaskType.FOLDER_LOCK, new_key), {}))
+
+        mock_sleep.assert_called_once_with(folder_lock.WRITER_WAIT_INTERVAL_SECONDS)
+        self.assertTrue(
+            create_resource_arn_from_submission_prefix(new_key)
+            in self.get_lock_resource()
+        )
+
+    def test_lock_while_other_writer_failed(self):
+        """The waiting invocation takes over the lease released without writing its change"""
+        new_key = "NEW/2022-02-02/FileName.fastq.gz"
+        folder_lock.seed_lock_table_from_bucket_policy()
+        self.assertTrue(folder_lock.acquire_writer_lease())
+
+        with mock.patch(
+            "folder_lock.time.sleep",
+            side_effect=lambda seconds: folder_lock.release_writer_lease(),
+        ):
+            self.assertIsNotNone(
+                handler(create_event(TaskType.FOLDER_LOCK, new_key), {})
+            )
+
+        policy_record = folder_lock.get_policy_record()
+        self.assertEqual(policy_record["policy_version"], policy_record["lock_version"])
+        self.assertTrue(
+            create_resource_arn_from_submission_prefix(new_key)
+            in self.get_lock_resource()
+        )
+
+    def test_lock_while_writer_lease_expired(self):
+        new_key = "NEW/2022-02-02/FileName.fastq.gz"
+        folder_lock.seed_lock_table_from_bucket_policy()
+        folder_lock.get_lock_table().update_item(
+            Key=folder_lock.get_policy_key(),
+            UpdateExpression="SET writer_lease_expiry = :expiry",
+            ExpressionAttributeValues={":expiry": 1},
+        )
+
+        self.assertIsNotNone(handler(create_event(TaskType.FOLDER_LOCK, new_key), {}))
+        self.assertTrue(
+            create_resource_arn_from_submission_prefix(new_key)
+            in self.get_lock_resource()
+        )
+
+    def test_compress_resource_to_flagship_wildcard(self):
+        directory_list = [f"BIG/2022-02-{i:02}" for i in range(20)] + [
+            "SMALL/2022-02-02"
+        ]
+
+        resource_arn_list = folder_lock.create_compressed_resource_arn_list(
+            directory_list, size_budget_bytes=500
+        )
+
+        self.assertEqual(
+            resource_arn_list,
+            [
+                f"arn:aws:s3:::{folder_lock.STAGING_BUCKET}/BIG/*",
+                f"arn:aws:s3:::{folder_lock.STAGING_BUCKET}/SMALL/2022-02-02/*",
+            ],
+        )
 
 
 def create_event(task_type: TaskType, submission_prefix: str):
     return {"submission_prefix": submission_prefix, "task": task_type.value}
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,15 +1,28 @@
 #!/usr/bin/env python3
 import json
 import logging
+import math
 import os
+import threading
+import time
 import uuid
 import re
 import sys
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
 
+import boto3
 import botocore.exceptions
+from botocore.config import Config
 
 import util
-from util import s3
+from util import s3, dynamodb
+from util.instrumentation import instrument_handler
 
 S3_CLIENT = util.get_client("s3")
 IAM_CLIENT = util.get_client("iam")
@@ -22,13 +35,40 @@ S3_DATA_SHARING_JOB_DEFINITION_ARN = os.environ.get(
     "S3_DATA_SHARING_JOB_DEFINITION_ARN"
 )
 STORE_BUCKET = os.environ.get("STORE_BUCKET")
+RESULTS_BUCKET = os.environ.get("RESULTS_BUCKET")
 DYNAMODB_STORE_TABLE_NAME = os.environ.get("DYNAMODB_STORE_TABLE_NAME")
 
+# Copy planner. Files up to BATCH_COPY_THRESHOLD_BYTES are copied server-side within this lambda, larger files are
+# left to the Batch job. Files over MULTIPART_COPY_THRESHOLD_BYTES are copied in parts in parallel.
+BATCH_COPY_THRESHOLD_BYTES = int(
+    os.environ.get("BATCH_COPY_THRESHOLD_BYTES", 100 * 1024**3)
+)
+MULTIPART_COPY_THRESHOLD_BYTES = int(
+    os.environ.get("MULTIPART_COPY_THRESHOLD_BYTES", 512 * 1024**2)
+)
+COPY_PART_SIZE_BYTES = int(os.environ.get("COPY_PART_SIZE_BYTES", 256 * 1024**2))
+COPY_MAX_WORKERS = int(os.environ.get("COPY_MAX_WORKERS", 32))
+# Stop starting new copies when the lambda has less than this time left, the remaining files are sent to Batch
+COPY_TIME_MARGIN_MS = int(os.environ.get("COPY_TIME_MARGIN_MS", 60 * 1000))
+COPY_PROGRESS_INTERVAL_SECONDS = 10
+
+# S3 multipart limits
+MAX_PART_NUMBER = 10000
+MIN_PART_SIZE_BYTES = 5 * 1024**2
+MAX_PART_SIZE_BYTES = 5 * 1024**3
+
+# Created on first use with a connection pool large enough for COPY_MAX_WORKERS
+S3_COPY_CLIENT = None
+
+# The sync manifest is saved at least this often while copying, so a timed out share can be resumed
+SYNC_MANIFEST_SAVE_INTERVAL_SECONDS = 30
+
 # Logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
+@instrument_handler
 def handler(event, context):
     """
     This function will check and notify if check has been done and the result of it.
@@ -66,31 +106,95 @@ def handler(event, context):
         return message
 
     ################################################
-    # Prepare batch jobs
-    logger.info("List of jobs need to be copied")
+    # Sync plan: only copy what is missing or changed at the destination
+
+    destination_s3_key_prefix = (
+        f"{destination_s3_key_prefix}/" if destination_s3_key_prefix else ""
+    )
 
-    # Check which key exist from given prefix
-    destination_key_exist = []
+    source_metadata_by_key = get_source_metadata_by_key(source_s3_key_list)
+    sync_manifest = SyncManifest.load(
+        destination_bucket_name=destination_bucket_name,
+        destination_s3_key_prefix=destination_s3_key_prefix,
+    )
     try:
-        existing_key = s3.get_s3_object_metadata(
-            bucket_name=destination_bucket_name,
-            directory_prefix=f"{destination_s3_key_prefix}/",
+        destination_metadata_by_key = get_destination_metadata_by_key(
+            destination_bucket_name=destination_bucket_name,
+            destination_s3_key_prefix=destination_s3_key_prefix,
+            source_s3_key_list=source_s3_key_list,
         )
-        for metadata in existing_key:
-            key = metadata["Key"].lstrip(destination_s3_key_prefix).strip("/")
-            destination_key_exist.append(key)
-
     except botocore.exceptions.ClientError:
         logger.critical("Unable to fetch existing destination key")
-    # Find missing key
-    key_to_transfer = list(set(source_s3_key_list) - set(destination_key_exist))
+        destination_metadata_by_key = {}
+
+    key_to_transfer = plan_sync(
+        source_s3_key_list=source_s3_key_list,
+        source_metadata_by_key=source_metadata_by_key,
+        destination_metadata_by_key=destination_metadata_by_key,
+        sync_manifest=sync_manifest,
+    )
+    logger.info(
+        f"Sync plan: {len(key_to_transfer)}/{len(source_s3_key_list)} file(s) are missing or changed at destination."
+    )
+
+    ################################################
+    # Plan which file is copied within this lambda and which goes to Batch
+
+    size_by_key = {
+        key: metadata["size_in_bytes"]
+        for key, metadata in source_metadata_by_key.items()
+    }
+    copy_plan, batch_key_list = plan_copy(key_to_transfer, size_by_key)
+    logger.info(
+        f"Copy plan: {len(copy_plan)} file(s) to copy within lambda, {len(batch_key_list)} file(s) to Batch."
+    )
+
+    # Batch job first as it takes the longest to start
+    submit_batch_job_from_key_list(
+        batch_key_list, destination_bucket_name, destination_s3_key_prefix
+    )
+    for key in batch_key_list:
+        sync_manifest.record(key, source_metadata_by_key.get(key))
+
+    ################################################
+    # Server-side copy
+
+    progress = CopyProgress(
+        total_file=len(copy_plan), total_bytes=sum(size for _, size in copy_plan)
+    )
+    deferred_key_list = run_copy_plan(
+        copy_plan=copy_plan,
+        destination_bucket_name=destination_bucket_name,
+        destination_s3_key_prefix=destination_s3_key_prefix,
+        progress=progress,
+        context=context,
+        source_metadata_by_key=source_metadata_by_key,
+        sync_manifest=sync_manifest,
+    )
+
+    # Anything not copied (failed or out of time) is handed over to Batch
+    submit_batch_job_from_key_list(
+        deferred_key_list, destination_bucket_name, destination_s3_key_prefix
+    )
+    for key in deferred_key_list:
+        sync_manifest.record(key, source_metadata_by_key.get(key))
+    sync_manifest.save()
 
+    summary = progress.to_dict()
+    summary["batch_file"] = len(batch_key_list) + len(deferred_key_list)
+    summary["in_sync_file"] = len(set(source_s3_key_list)) - len(key_to_transfer)
+    logger.info(json.dumps({"metric": "share_copy_summary", **summary}))
+    return summary
+
+
+def submit_batch_job_from_key_list(
+    source_s3_key_list: list,
+    destination_bucket_name: str,
+    destination_s3_key_prefix: str,
+):
     batch_job_list = []
-    for source_s3_key in key_to_transfer:
+    for source_s3_key in source_s3_key_list:
         # Construct destination S3 key
-        destination_s3_key_prefix = (
-            f"{destination_s3_key_prefix}/" if destination_s3_key_prefix else ""
-        )
         destination_s3_key = f"{destination_s3_key_prefix}{source_s3_key}"
 
         source_s3_uri = s3.create_s3_uri_from_bucket_name_and_key(
@@ -112,12 +216,572 @@ def handler(event, context):
 
     ################################################
     # Submitting job
+    if not batch_job_list:
+        return
     logger.info(f"Batch Job list: {json.dumps(batch_job_list, indent=4)}")
     for job_data in batch_job_list:
         submit_s3_data_sharing_batch_job(job_data)
     logger.info(f"Batch job has executed. Submit {len(batch_job_list)} number of job")
 
 
+def normalise_etag(etag: str) -> str:
+    # ETag from S3 API is quoted, the one recorded from S3 event is not
+    return etag.strip('"') if etag else etag
+
+
+def get_source_metadata_by_key(source_s3_key_list: list) -> dict:
+    """
+    Size and ETag of each source object, from the store table FILE records (one query per submission directory).
+    Objects without a record fall back to a HEAD request.
+    {
+        "FLAGSHIP/SUBMISSION/filename.bam": {"size_in_bytes": 123, "etag": "abcd"},
+        ...
+    }
+    """
+    metadata_by_key = {}
+    wanted_key_set = set(source_s3_key_list)
+    directory_set = {os.path.dirname(key) for key in source_s3_key_list}
+
+    for directory in sorted(directory_set):
+        record_list = dynamodb.get_batch_item_from_pk_and_sk(
+            table_name=DYNAMODB_STORE_TABLE_NAME,
+            partition_key=dynamodb.FileRecordPartitionKey.FILE_RECORD.value,
+            sort_key_prefix=f"{directory}/" if directory else "",
+            projection_expr="sort_key, size_in_bytes, etag",
+        )
+        for record in record_list:
+            if record["sort_key"] in wanted_key_set and "size_in_bytes" in record:
+                metadata_by_key[record["sort_key"]] = {
+                    "size_in_bytes": int(record["size_in_bytes"]),
+                    "etag": normalise_etag(record.get("etag")),
+                }
+
+    for key in wanted_key_set - set(metadata_by_key):
+        logger.warning(f"No store record for '{key}', using HEAD to get its size")
+        try:
+            response = get_copy_client().head_object(Bucket=STORE_BUCKET, Key=key)
+            metadata_by_key[key] = {
+                "size_in_bytes": response["ContentLength"],
+                "etag": normalise_etag(response.get("ETag")),
+            }
+        except botocore.exceptions.ClientError as e:
+            logger.error(f"Unable to get size of '{key}': {e}")
+
+    return metadata_by_key
+
+
+def get_destination_metadata_by_key(
+    destination_bucket_name: str,
+    destination_s3_key_prefix: str,
+    source_s3_key_list: list,
+) -> dict:
+    """
+    Size and ETag of destination objects, keyed by their source key. Only the directories of the source keys are
+    listed and the listing is consumed page by page, keeping only the keys that are part of this share.
+    """
+    metadata_by_key = {}
+    wanted_key_set = set(source_s3_key_list)
+    directory_set = {os.path.dirname(key) for key in source_s3_key_list}
+
+    paginator = get_copy_client().get_paginator("list_objects_v2")
+    for directory in sorted(directory_set):
+        list_prefix = (
+            f"{destination_s3_key_prefix}{directory}/"
+            if directory
+            else destination_s3_key_prefix
+        )
+        for page in paginator.paginate(
+            Bucket=destination_bucket_name, Prefix=list_prefix
+        ):
+            for metadata in page.get("Contents", []):
+                # Remove the sharing prefix (not a character set as str.lstrip would)
+                key = metadata["Key"][len(destination_s3_key_prefix) :]
+                if key in wanted_key_set:
+                    metadata_by_key[key] = {
+                        "size_in_bytes": metadata["Size"],
+                        "etag": normalise_etag(metadata["ETag"]),
+                    }
+
+    return metadata_by_key
+
+
+class SyncManifest:
+    """
+    Record of what has been copied to a destination, saved in the results bucket. For each source key it keeps the
+    source size/ETag that was copied and the ETag the copy got at the destination. Multipart copies produce a
+    different ETag from the source, so this is what allows a re-share to tell an unchanged object from a changed one.
+    {
+        "FLAGSHIP/SUBMISSION/filename.bam": {
+            "size_in_bytes": 123,
+            "source_etag": "abcd",
+            "destination_etag": "efgh-2" (null when copied by Batch)
+        }
+    }
+    """
+
+    def __init__(self, s3_key: str, record_by_key: dict = None):
+        self.s3_key = s3_key
+        self.record_by_key = record_by_key or {}
+        self.is_changed = False
+        self.last_save_time = time.perf_counter()
+
+    @staticmethod
+    def create_s3_key(destination_bucket_name: str, destination_s3_key_prefix: str):
+        return f"{s3.SHARING_KEY_PREFIX}{destination_bucket_name}/{destination_s3_key_prefix}sync_manifest.json"
+
+    @classmethod
+    def load(cls, destination_bucket_name: str, destination_s3_key_prefix: str):
+        s3_key = cls.create_s3_key(destination_bucket_name, destination_s3_key_prefix)
+        if not RESULTS_BUCKET:
+            return cls(s3_key)
+        try:
+            response = get_copy_client().get_object(Bucket=RESULTS_BUCKET, Key=s3_key)
+            return cls(s3_key, json.loads(response["Body"].read()))
+        except botocore.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] != "NoSuchKey":
+                logger.warning(f"Unable to read sync manifest, starting fresh: {e}")
+            return cls(s3_key)
+
+    def get(self, source_s3_key: str) -> dict:
+        return self.record_by_key.get(source_s3_key)
+
+    def record(
+        self,
+        source_s3_key: str,
+        source_metadata: dict,
+        destination_etag: str = None,
+    ):
+        if not source_metadata:
+            return
+        self.record_by_key[source_s3_key] = {
+            "size_in_bytes": source_metadata["size_in_bytes"],
+            "source_etag": source_metadata["etag"],
+            "destination_etag": normalise_etag(destination_etag),
+        }
+        self.is_changed = True
+
+    def save(self, force: bool = True):
+        if not self.is_changed or not RESULTS_BUCKET:
+            return
+        now = time.perf_counter()
+        if (
+            not force
+            and now - self.last_save_time < SYNC_MANIFEST_SAVE_INTERVAL_SECONDS
+        ):
+            return
+        get_copy_client().put_object(
+            Bucket=RESULTS_BUCKET,
+            Key=self.s3_key,
+            Body=json.dumps(self.record_by_key).encode(),
+        )
+        self.is_changed = False
+        self.last_save_time = now
+
+
+def is_in_sync(
+    source_metadata: dict, destination_metadata: dict, manifest_record: dict
+) -> bool:
+    """
+    The destination copy is up to date when its size matches and either its ETag is the same as the source
+    (single copy_object), or the sync manifest says it was copied from this very source version.
+    """
+    if destination_metadata is None:
+        return False
+    if destination_metadata["size_in_bytes"] != source_metadata["size_in_bytes"]:
+        return False
+    if destination_metadata["etag"] == source_metadata["etag"]:
+        return True
+    if manifest_record is None:
+        return False
+    if manifest_record.get("source_etag") != source_metadata["etag"]:
+        return False
+    # Batch copies do not report their ETag, trust one of the right size as a finished copy
+    return manifest_record.get("destination_etag") in (
+        None,
+        destination_metadata["etag"],
+    )
+
+
+def plan_sync(
+    source_s3_key_list: list,
+    source_metadata_by_key: dict,
+    destination_metadata_by_key: dict,
+    sync_manifest: SyncManifest,
+) -> list:
+    """
+    Return the source keys that are missing or changed at the destination. Source keys of unknown metadata are
+    always transferred.
+    """
+    key_to_transfer = []
+    for key in sorted(set(source_s3_key_list)):
+        source_metadata = source_metadata_by_key.get(key)
+        if source_metadata is None:
+            key_to_transfer.append(key)
+            continue
+
+        destination_metadata = destination_metadata_by_key.get(key)
+        manifest_record = sync_manifest.get(key)
+        if is_in_sync(source_metadata, destination_metadata, manifest_record):
+            # Adopt the ETag of a completed Batch copy
+            if (
+                manifest_record is None
+                or manifest_record.get("destination_etag") is None
+            ):
+                sync_manifest.record(key, source_metadata, destination_metadata["etag"])
+            continue
+
+        key_to_transfer.append(key)
+    return key_to_transfer
+
+
+def plan_copy(source_s3_key_list: list, size_by_key: dict) -> tuple:
+    """
+    Split keys into (copy_plan, batch_key_list). copy_plan is a list of (key, size) sorted largest first so the long
+    multipart copies start early. Files of unknown size or over BATCH_COPY_THRESHOLD_BYTES go to Batch.
+    """
+    copy_plan = []
+    batch_key_list = []
+    for key in source_s3_key_list:
+        size = size_by_key.get(key)
+        if size is None or size > BATCH_COPY_THRESHOLD_BYTES:
+            batch_key_list.append(key)
+        else:
+            copy_plan.append((key, size))
+
+    copy_plan.sort(key=lambda item: item[1], reverse=True)
+    return copy_plan, sorted(batch_key_list)
+
+
+def get_copy_client():
+    global S3_COPY_CLIENT
+    if S3_COPY_CLIENT is None:
+        S3_COPY_CLIENT = boto3.client(
+            "s3",
+            config=Config(
+                max_pool_connections=COPY_MAX_WORKERS,
+                retries={"max_attempts": 10, "mode": "adaptive"},
+            ),
+        )
+    return S3_COPY_CLIENT
+
+
+def get_part_size(size_in_bytes: int) -> int:
+    part_size = max(COPY_PART_SIZE_BYTES, math.ceil(size_in_bytes / MAX_PART_NUMBER))
+    return min(max(part_size, MIN_PART_SIZE_BYTES), MAX_PART_SIZE_BYTES)
+
+
+def create_part_range_list(size_in_bytes: int) -> list:
+    """
+    Inclusive byte ranges for upload_part_copy, e.g. [(0, 1023), (1024, 1500)]
+    """
+    part_size = get_part_size(size_in_bytes)
+    return [
+        (start, min(start + part_size, size_in_bytes) - 1)
+        for start in range(0, size_in_bytes, part_size)
+    ]
+
+
+class CopyProgress:
+    """
+    Thread-safe progress counter of a share request. Log the progress at most every COPY_PROGRESS_INTERVAL_SECONDS.
+    """
+
+    def __init__(self, total_file: int, total_bytes: int):
+        self.total_file = total_file
+        self.total_bytes = total_bytes
+        self.copied_file = 0
+        self.copied_bytes = 0
+        self.failed_file = 0
+        self.deferred_file = 0
+        self.start_time = time.perf_counter()
+        self.last_log_time = self.start_time
+        self.lock = threading.Lock()
+
+    def add_bytes(self, number_of_bytes: int):
+        with self.lock:
+            self.copied_bytes += number_of_bytes
+            now = time.perf_counter()
+            if now - self.last_log_time < COPY_PROGRESS_INTERVAL_SECONDS:
+                return
+            self.last_log_time = now
+        logger.info(json.dumps({"metric": "share_copy_progress", **self.to_dict()}))
+
+    def add_file(self, is_success: bool = True):
+        with self.lock:
+            if is_success:
+                self.copied_file += 1
+            else:
+                self.failed_file += 1
+
+    def add_deferred(self, number_of_file: int):
+        with self.lock:
+            self.deferred_file += number_of_file
+
+    def to_dict(self) -> dict:
+        elapsed_seconds = time.perf_counter() - self.start_time
+        return {
+            "total_file": self.total_file,
+            "copied_file": self.copied_file,
+            "failed_file": self.failed_file,
+            "deferred_file": self.deferred_file,
+            "total_bytes": self.total_bytes,
+            "copied_bytes": self.copied_bytes,
+            "elapsed_seconds": round(elapsed_seconds, 3),
+            "throughput_mib_per_second": round(
+                self.copied_bytes / 1024**2 / elapsed_seconds, 3
+            )
+            if elapsed_seconds > 0
+            else 0,
+        }
+
+
+def copy_single_object(
+    source_s3_key: str, destination_bucket_name: str, destination_s3_key: str
+) -> str:
+    response = get_copy_client().copy_object(
+        CopySource={"Bucket": STORE_BUCKET, "Key": source_s3_key},
+        Bucket=destination_bucket_name,
+        Key=destination_s3_key,
+    )
+    return response["CopyObjectResult"]["ETag"]
+
+
+def copy_part(
+    source_s3_key: str,
+    destination_bucket_name: str,
+    destination_s3_key: str,
+    upload_id: str,
+    part_number: int,
+    byte_range: tuple,
+) -> dict:
+    response = get_copy_client().upload_part_copy(
+        CopySource={"Bucket": STORE_BUCKET, "Key": source_s3_key},
+        CopySourceRange=f"bytes={byte_range[0]}-{byte_range[1]}",
+        Bucket=destination_bucket_name,
+        Key=destination_s3_key,
+        UploadId=upload_id,
+        PartNumber=part_number,
+    )
+    return {
+        "ETag": response["CopyPartResult"]["ETag"],
+        "PartNumber": part_number,
+        "size_in_bytes": byte_range[1] - byte_range[0] + 1,
+    }
+
+
+def has_time_to_start_copy(context) -> bool:
+    if not hasattr(context, "get_remaining_time_in_millis"):
+        return True
+    return context.get_remaining_time_in_millis() > COPY_TIME_MARGIN_MS
+
+
+def run_copy_plan(
+    copy_plan: list,
+    destination_bucket_name: str,
+    destination_s3_key_prefix: str,
+    progress: CopyProgress,
+    context=None,
+    source_metadata_by_key: dict = None,
+    sync_manifest: SyncManifest = None,
+) -> list:
+    """
+    Copy every (key, size) of the plan with a single pool of COPY_MAX_WORKERS. Small files are one copy_object, large
+    files are split into parts that are scheduled on the same pool so parts of one file are copied in parallel.
+    At most COPY_MAX_WORKERS copies (file or part) are submitted at a time, and no new copy is started when the lambda
+    is close to its timeout. The multipart copies left unfinished are then aborted.
+    Each completed copy is recorded in the sync_manifest (if given).
+    Return the list of key not copied (failed, or not finished as the lambda is running out of time).
+    """
+    source_metadata_by_key = source_metadata_by_key or {}
+
+    def record_copy(source_s3_key: str, destination_etag: str):
+        progress.add_file()
+        if sync_manifest is not None:
+            sync_manifest.record(
+                source_s3_key,
+                source_metadata_by_key.get(source_s3_key),
+                destination_etag,
+            )
+            sync_manifest.save(force=False)
+
+    deferred_key_list = []
+    if not copy_plan:
+        return deferred_key_list
+
+    client = get_copy_client()
+    size_by_key = dict(copy_plan)
+
+    # future -> source key
+    in_flight = {}
+    # source key -> multipart state
+    multipart_state = {}
+    # (source key, part number, byte range) of the multipart copies not submitted yet
+    pending_part_list = deque()
+
+    def abort_multipart_copy(source_s3_key: str, state: dict):
+        try:
+            client.abort_multipart_upload(
+                Bucket=destination_bucket_name,
+                Key=state["destination_s3_key"],
+                UploadId=state["upload_id"],
+            )
+        except botocore.exceptions.ClientError as e:
+            logger.error(f"Unable to abort copy of '{source_s3_key}': {e}")
+
+    def finish_multipart_copy(source_s3_key: str, state: dict):
+        if not state["is_failed"]:
+            try:
+                response = client.complete_multipart_upload(
+                    Bucket=destination_bucket_name,
+                    Key=state["destination_s3_key"],
+                    UploadId=state["upload_id"],
+                    MultipartUpload={
+                        "Parts": sorted(
+                            state["part_list"], key=lambda p: p["PartNumber"]
+                        )
+                    },
+                )
+                record_copy(source_s3_key, response["ETag"])
+                return
+            except botocore.exceptions.ClientError as e:
+                logger.error(f"Unable to complete copy of '{source_s3_key}': {e}")
+
+        abort_multipart_copy(source_s3_key, state)
+        progress.add_file(is_success=False)
+        deferred_key_list.append(source_s3_key)
+
+    def handle_completed(future):
+        source_s3_key = in_flight.pop(future)
+        state = multipart_state.get(source_s3_key)
+
+        # Single copy_object
+        if state is None:
+            try:
+                destination_etag = future.result()
+                progress.add_bytes(size_by_key[source_s3_key])
+                record_copy(source_s3_key, destination_etag)
+            except botocore.exceptions.ClientError as e:
+                logger.error(f"Unable to copy '{source_s3_key}': {e}")
+                progress.add_file(is_success=False)
+                deferred_key_list.append(source_s3_key)
+            return
+
+        # Part of a multipart copy
+        state["remaining_part"] -= 1
+        try:
+            part = future.result()
+            state["part_list"].append(
+                {"ETag": part["ETag"], "PartNumber": part["PartNumber"]}
+            )
+            progress.add_bytes(part["size_in_bytes"])
+        except botocore.exceptions.ClientError as e:
+            logger.error(f"Unable to copy part of '{source_s3_key}': {e}")
+            state["is_failed"] = True
+
+        if state["remaining_part"] == 0:
+            finish_multipart_copy(source_s3_key, state)
+
+    plan_index = 0
+    is_out_of_time = False
+    with ThreadPoolExecutor(max_workers=COPY_MAX_WORKERS) as executor:
+        while pending_part_list or plan_index < len(copy_plan):
+            # Keep at most COPY_MAX_WORKERS copies submitted, so the time budget is checked as they finish
+            if len(in_flight) >= COPY_MAX_WORKERS:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    handle_completed(future)
+
+            if not has_time_to_start_copy(context):
+                is_out_of_time = True
+                break
+
+            if pending_part_list:
+                source_s3_key, part_number, byte_range = pending_part_list.popleft()
+                state = multipart_state[source_s3_key]
+
+                # No need to copy the remaining parts of a failed file
+                if state["is_failed"]:
+                    state["remaining_part"] -= 1
+                    if state["remaining_part"] == 0:
+                        finish_multipart_copy(source_s3_key, state)
+                    continue
+
+                future = executor.submit(
+                    copy_part,
+                    source_s3_key,
+                    destination_bucket_name,
+                    state["destination_s3_key"],
+                    state["upload_id"],
+                    part_number,
+                    byte_range,
+                )
+                in_flight[future] = source_s3_key
+                continue
+
+            source_s3_key, size = copy_plan[plan_index]
+            plan_index += 1
+            destination_s3_key = f"{destination_s3_key_prefix}{source_s3_key}"
+
+            if size <= MULTIPART_COPY_THRESHOLD_BYTES:
+                future = executor.submit(
+                    copy_single_object,
+                    source_s3_key,
+                    destination_bucket_name,
+                    destination_s3_key,
+                )
+                in_flight[future] = source_s3_key
+                continue
+
+            try:
+                upload_id = client.create_multipart_upload(
+                    Bucket=destination_bucket_name, Key=destination_s3_key
+                )["UploadId"]
+            except botocore.exceptions.ClientError as e:
+                logger.error(
+                    f"Unable to start multipart copy of '{source_s3_key}': {e}"
+                )
+                progress.add_file(is_success=False)
+                deferred_key_list.append(source_s3_key)
+                continue
+
+            part_range_list = create_part_range_list(size)
+            multipart_state[source_s3_key] = {
+                "destination_s3_key": destination_s3_key,
+                "upload_id": upload_id,
+                "remaining_part": len(part_range_list),
+                "part_list": [],
+                "is_failed": False,
+            }
+            pending_part_list.extend(
+                (source_s3_key, part_number, byte_range)
+                for part_number, byte_range in enumerate(part_range_list, start=1)
+            )
+
+        # The copies in flight are awaited
+        for future in as_completed(list(in_flight)):
+            handle_completed(future)
+
+    if is_out_of_time:
+        logger.warning(
+            "Lambda is running out of time, the remaining file(s) will be copied by Batch"
+        )
+
+        # Multipart copies with parts not started are aborted, the whole file is copied by Batch
+        unfinished_key_list = list(
+            dict.fromkeys(key for key, _, _ in pending_part_list)
+        )
+        for source_s3_key in unfinished_key_list:
+            abort_multipart_copy(source_s3_key, multipart_state[source_s3_key])
+
+        remaining_key_list = unfinished_key_list + [
+            key for key, _ in copy_plan[plan_index:]
+        ]
+        progress.add_deferred(len(remaining_key_list))
+        deferred_key_list.extend(remaining_key_list)
+
+    return deferred_key_list
+
+
 def create_s3_data_sharing_batch_job_from_s3_cli_command(
     source_s3_key: str, s3_cli_command: str
 ):
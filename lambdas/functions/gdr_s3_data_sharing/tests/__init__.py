@@ -8,6 +8,7 @@ sys.path.append(SOURCE_PATH)
 
 os.environ["DYNAMODB_STORE_TABLE_NAME"] = "agha-gdr-store-bucket"
 os.environ["STORE_BUCKET"] = "agha-gdr-store-2.0"
+os.environ["RESULTS_BUCKET"] = "agha-gdr-results-2.0"
 os.environ["S3_DATA_SHARING_BATCH_INSTANCE_ROLE_NAME"] = "agha-gdr-s3-data-sharing"
 os.environ[
     "S3_DATA_SHARING_BATCH_QUEUE_NAME"
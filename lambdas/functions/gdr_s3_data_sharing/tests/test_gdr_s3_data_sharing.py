@@ -13,7 +13,12 @@ import os
 import unittest
 from unittest import mock
 
+import boto3
+from moto import mock_aws
+
+import gdr_s3_data_sharing
 from gdr_s3_data_sharing import handler
+from util import dynamodb
 
 
 class GDRS3DataSharingUnitTestCase(unittest.TestCase):
@@ -31,6 +36,255 @@ class GDRS3DataSharingUnitTestCase(unittest.TestCase):
         print(res)
 
 
+class GDRS3DataSharingCopyPlannerUnitTestCase(unittest.TestCase):
+    """
+    Server-side copy against moto
+    cmd: python -m unittest tests.test_gdr_s3_data_sharing.GDRS3DataSharingCopyPlannerUnitTestCase
+    """
+
+    destination_bucket = "umccr-temp-dev"
+    small_key = "Cardiac/2023-11-23/abcde.bam.bai"
+    large_key = "Cardiac/2023-11-23/abcde.bam"
+    existing_key = "Cardiac/2023-11-23/existing.bam"
+
+    def setUp(self) -> None:
+        # Run against moto whatever the environment (or an earlier test case) has set
+        env_patcher = mock.patch.dict(
+            os.environ,
+            {
+                "AWS_ACCESS_KEY_ID": "testing",
+                "AWS_SECRET_ACCESS_KEY": "testing",
+                "AWS_DEFAULT_REGION": "ap-southeast-2",
+            },
+        )
+        env_patcher.start()
+        self.addCleanup(env_patcher.stop)
+        os.environ.pop("AWS_ENDPOINT", None)
+
+        mock_aws_context = mock_aws()
+        mock_aws_context.start()
+        self.addCleanup(mock_aws_context.stop)
+
+        # Clients must be created after moto has started
+        dynamodb.DYNAMODB_RESOURCE = ""
+        self.addCleanup(setattr, dynamodb, "DYNAMODB_RESOURCE", "")
+        gdr_s3_data_sharing.S3_COPY_CLIENT = None
+        self.addCleanup(setattr, gdr_s3_data_sharing, "S3_COPY_CLIENT", None)
+
+        for patcher in [
+            mock.patch(
+                "gdr_s3_data_sharing.s3.get_s3_location", return_value="ap-southeast-2"
+            ),
+            mock.patch("gdr_s3_data_sharing.submit_s3_data_sharing_batch_job"),
+            mock.patch(
+                "gdr_s3_data_sharing.MULTIPART_COPY_THRESHOLD_BYTES", 6 * 1024**2
+            ),
+            mock.patch("gdr_s3_data_sharing.COPY_PART_SIZE_BYTES", 5 * 1024**2),
+            mock.patch("gdr_s3_data_sharing.COPY_MAX_WORKERS", 4),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.s3 = boto3.client("s3")
+        for bucket in [
+            os.environ["STORE_BUCKET"],
+            os.environ["RESULTS_BUCKET"],
+            self.destination_bucket,
+        ]:
+            self.s3.create_bucket(
+                Bucket=bucket,
+                CreateBucketConfiguration={"LocationConstraint": "ap-southeast-2"},
+            )
+
+        self.large_body = os.urandom(11 * 1024**2)
+        self.s3.put_object(
+            Bucket=os.environ["STORE_BUCKET"], Key=self.large_key, Body=self.large_body
+        )
+        self.s3.put_object(
+            Bucket=os.environ["STORE_BUCKET"], Key=self.small_key, Body=b"index"
+        )
+        self.s3.put_object(
+            Bucket=os.environ["STORE_BUCKET"], Key=self.existing_key, Body=b"existing"
+        )
+        self.s3.put_object(
+            Bucket=self.destination_bucket,
+            Key=f"20220322/{self.existing_key}",
+            Body=b"existing",
+        )
+
+        # Only the small file has a store record, the large one is sized by HEAD
+        boto3.client("dynamodb").create_table(
+            TableName=os.environ["DYNAMODB_STORE_TABLE_NAME"],
+            KeySchema=[
+                {"AttributeName": "partition_key", "KeyType": "HASH"},
+                {"AttributeName": "sort_key", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "partition_key", "AttributeType": "S"},
+                {"AttributeName": "sort_key", "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        dynamodb.write_record_from_dict(
+            os.environ["DYNAMODB_STORE_TABLE_NAME"],
+            {
+                "partition_key": dynamodb.FileRecordPartitionKey.FILE_RECORD.value,
+                "sort_key": self.small_key,
+                "size_in_bytes": 5,
+            },
+        )
+
+    def test_server_side_copy(self):
+        event_payload = make_mock_data()
+        event_payload["source_s3_key_list"] = [
+            self.small_key,
+            self.large_key,
+            self.existing_key,
+        ]
+
+        summary = handler(event_payload, {})
+
+        self.assertEqual(summary["copied_file"], 2)
+        self.assertEqual(summary["copied_bytes"], len(self.large_body) + 5)
+        self.assertEqual(summary["batch_file"], 0)
+        gdr_s3_data_sharing.submit_s3_data_sharing_batch_job.assert_not_called()
+
+        large_copy = self.s3.get_object(
+            Bucket=self.destination_bucket, Key=f"20220322/{self.large_key}"
+        )
+        self.assertEqual(large_copy["Body"].read(), self.large_body)
+        self.assertTrue(large_copy["ETag"].strip('"').endswith("-3"))
+        small_copy = self.s3.get_object(
+            Bucket=self.destination_bucket, Key=f"20220322/{self.small_key}"
+        )
+        self.assertEqual(small_copy["Body"].read(), b"index")
+
+    def test_reshare_copies_only_changed(self):
+        event_payload = make_mock_data()
+        event_payload["source_s3_key_list"] = [
+            self.small_key,
+            self.large_key,
+            self.existing_key,
+        ]
+        handler(event_payload, {})
+
+        # The multipart copy has a different ETag from the source, the sync manifest tells it is up to date
+        summary = handler(event_payload, {})
+        self.assertEqual(summary["copied_file"], 0)
+        self.assertEqual(summary["in_sync_file"], 3)
+
+        # Changed source object is copied again
+        self.s3.put_object(
+            Bucket=os.environ["STORE_BUCKET"], Key=self.existing_key, Body=b"changed"
+        )
+        summary = handler(event_payload, {})
+        self.assertEqual(summary["copied_file"], 1)
+        self.assertEqual(
+            self.s3.get_object(
+                Bucket=self.destination_bucket, Key=f"20220322/{self.existing_key}"
+            )["Body"].read(),
+            b"changed",
+        )
+
+    def test_destination_key_from_prefix(self):
+        """The sharing prefix is removed as a prefix, not as a set of characters"""
+        source_key = "dc/2022/a.bam"
+        self.s3.put_object(
+            Bucket=self.destination_bucket, Key=f"ab/cd/{source_key}", Body=b"a"
+        )
+
+        metadata_by_key = gdr_s3_data_sharing.get_destination_metadata_by_key(
+            destination_bucket_name=self.destination_bucket,
+            destination_s3_key_prefix="ab/cd/",
+            source_s3_key_list=[source_key],
+        )
+
+        self.assertEqual(list(metadata_by_key), [source_key])
+        self.assertEqual(metadata_by_key[source_key]["size_in_bytes"], 1)
+
+    def test_very_large_file_to_batch(self):
+        with mock.patch("gdr_s3_data_sharing.BATCH_COPY_THRESHOLD_BYTES", 1024):
+            copy_plan, batch_key_list = gdr_s3_data_sharing.plan_copy(
+                [self.small_key, self.large_key],
+                {self.small_key: 5, self.large_key: len(self.large_body)},
+            )
+
+        self.assertEqual(copy_plan, [(self.small_key, 5)])
+        self.assertEqual(batch_key_list, [self.large_key])
+
+    def test_out_of_time_deferred_to_batch(self):
+        context = mock.MagicMock(function_name="s3-data-sharing", aws_request_id="1234")
+        context.get_remaining_time_in_millis.return_value = 1000
+
+        event_payload = make_mock_data()
+        event_payload["source_s3_key_list"] = [self.small_key, self.existing_key]
+        summary = handler(event_payload, context)
+
+        self.assertEqual(summary["copied_file"], 0)
+        self.assertEqual(summary["deferred_file"], 1)
+        gdr_s3_data_sharing.submit_s3_data_sharing_batch_job.assert_called_once()
+
+    def run_copy_plan_with_time_left(self, remaining_time_list: list) -> tuple:
+        """
+        Copy the large file (3 parts) then the small one, with the lambda time left for each time budget check
+        """
+        context = mock.MagicMock()
+        context.get_remaining_time_in_millis.side_effect = (
+            remaining_time_list + [0] * 10
+        )
+        copy_plan = [(self.large_key, len(self.large_body)), (self.small_key, 5)]
+        progress = gdr_s3_data_sharing.CopyProgress(
+            total_file=2, total_bytes=len(self.large_body) + 5
+        )
+
+        deferred_key_list = gdr_s3_data_sharing.run_copy_plan(
+            copy_plan=copy_plan,
+            destination_bucket_name=self.destination_bucket,
+            destination_s3_key_prefix="20220322/",
+            progress=progress,
+            context=context,
+        )
+        return deferred_key_list, progress
+
+    def test_out_of_time_during_multipart_copy(self):
+        # Time for the multipart upload and its first part only
+        deferred_key_list, progress = self.run_copy_plan_with_time_left(
+            [10 * 60 * 1000] * 2
+        )
+
+        self.assertEqual(deferred_key_list, [self.large_key, self.small_key])
+        self.assertEqual(progress.copied_file, 0)
+        self.assertEqual(progress.deferred_file, 2)
+        self.assertEqual(
+            self.s3.list_multipart_uploads(Bucket=self.destination_bucket).get(
+                "Uploads", []
+            ),
+            [],
+        )
+        self.assertNotIn(
+            "Contents",
+            self.s3.list_objects_v2(
+                Bucket=self.destination_bucket, Prefix=f"20220322/{self.large_key}"
+            ),
+        )
+
+    def test_out_of_time_after_multipart_copy(self):
+        # Time for the multipart upload and its 3 parts, the small file is left to Batch
+        deferred_key_list, progress = self.run_copy_plan_with_time_left(
+            [10 * 60 * 1000] * 4
+        )
+
+        self.assertEqual(deferred_key_list, [self.small_key])
+        self.assertEqual(progress.copied_file, 1)
+        self.assertEqual(progress.deferred_file, 1)
+        self.assertEqual(
+            self.s3.get_object(
+                Bucket=self.destination_bucket, Key=f"20220322/{self.large_key}"
+            )["Body"].read(),
+            self.large_body,
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -8,7 +8,9 @@ import pandas as pd
 import sys
 
 import util
-from util import dynamodb, submission_data, notification, s3, agha, batch
+from util import dynamodb, submission_data, notification, s3, agha, batch, timing
+from util.instrumentation import instrument_handler
+from util.log import LazyJson
 
 DYNAMODB_STAGING_TABLE_NAME = os.environ.get("DYNAMODB_STAGING_TABLE_NAME")
 DYNAMODB_ARCHIVE_STAGING_TABLE_NAME = os.environ.get(
@@ -34,6 +36,8 @@ logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
+@instrument_handler
+@timing.trace_handler
 def handler(event, context):
     """
     The lambda is to do a quick validation upon manifest file upload event and record to the database.
@@ -90,7 +94,7 @@ def handler(event, context):
     notification.SUBMITTER_INFO = notification.SubmitterInfo()
 
     logger.info(f"Start processing S3 event:")
-    logger.info(json.dumps(event, indent=4, cls=util.JsonSerialEncoder))
+    logger.info("%s", LazyJson(event, max_items=None))
 
     ####################################################
     # Validate event
@@ -161,34 +165,50 @@ def handler(event, context):
         notification.set_submitter_information_from_s3_event(event_record)
 
         # Pull file metadata from S3
-        data.file_metadata = s3.get_s3_object_metadata(
-            data.bucket_name, data.submission_prefix
-        )
-        logger.info(
-            f"File metadata in the current s3 content: {json.dumps(data.file_metadata, indent=4, cls=util.JsonSerialEncoder)}"
-        )
-
-        # Collect manifest data and then validate
-        data.manifest_data = submission_data.retrieve_manifest_data(
-            data.bucket_name, data.manifest_s3_key
-        )
+        with timing.span("list_s3_object") as list_span:
+            data.file_metadata = s3.get_s3_object_metadata(
+                data.bucket_name, data.submission_prefix
+            )
+            list_span.set_count("object", len(data.file_metadata))
         logger.info(
-            f"Current manifest filename data: {json.dumps(data.manifest_data['filename'].tolist(), indent=4)}"
+            "File metadata in the current s3 content: %s",
+            LazyJson(data.file_metadata),
         )
 
         ####################################################
-        # Validate Manifest
+        # Read and validate Manifest
         ####################################################
         try:
-            file_list, data.files_extra = submission_data.validate_manifest(
-                data, exception_filename, skip_checksum_check=skip_checksum_validation
+            # Collect manifest data (the header is checked while reading) and then validate
+            with timing.span("read_manifest") as manifest_span:
+                data.manifest_data = submission_data.retrieve_manifest_data(
+                    data.bucket_name, data.manifest_s3_key
+                )
+                manifest_span.set_count("row", len(data.manifest_data))
+            logger.info(
+                "Current manifest filename data: %s",
+                LazyJson(data.manifest_data["filename"]),
             )
+
+            with timing.span("validate_manifest"):
+                file_list, data.files_extra = submission_data.validate_manifest(
+                    data,
+                    exception_filename,
+                    skip_checksum_check=skip_checksum_validation,
+                )
         except ValueError as e:
+            try:
+                additional_information = json.loads(str(e))
+            except json.JSONDecodeError:
+                # Manifest could not be read (e.g. missing required column), not reported yet
+                additional_information = str(e)
+                notification.log_and_store_message(additional_information, "critical")
+
             # Update DynamoDb regarding manifest checks status
             manifest_status_record = dynamodb.ManifestStatusCheckRecord(
                 sort_key=data.manifest_s3_key,
                 status=dynamodb.ManifestStatusCheckValue.FAIL.value,
-                additional_information=json.loads(str(e)),
+                additional_information=additional_information,
             )
 
             dynamodb.write_record_from_class(
@@ -230,105 +250,116 @@ def handler(event, context):
         )
 
         # Grab dynamodb FILE record
-        staging_file_record = dynamodb.get_batch_item_from_pk_and_sk(
-            table_name=DYNAMODB_STAGING_TABLE_NAME,
-            partition_key=dynamodb.FileRecordPartitionKey.FILE_RECORD.value,
-            sort_key_prefix=data.submission_prefix,
-        )
+        with timing.span("query_file_record") as query_span:
+            staging_file_record = dynamodb.get_batch_item_from_pk_and_sk(
+                table_name=DYNAMODB_STAGING_TABLE_NAME,
+                partition_key=dynamodb.FileRecordPartitionKey.FILE_RECORD.value,
+                sort_key_prefix=data.submission_prefix,
+            )
+            query_span.set_count("record", len(staging_file_record))
         staging_file_record_df = pd.json_normalize(staging_file_record)
 
-        for filename in file_list:
+        # All files in the submission share the same flagship prefix
+        flagship_code = agha.FlagShip.from_name(
+            data.submission_prefix.split("/")[0]
+        ).preferred_code()
 
-            sort_key = f"{data.submission_prefix}/{filename}"
+        with timing.span("check_file", file=len(file_list)) as check_file_span:
+            for filename in file_list:
 
-            # Variables from manifest data
-            agha_study_id = submission_data.find_study_id_from_manifest_df_and_filename(
-                data.manifest_data, filename
-            )
-            provided_checksum = (
-                submission_data.find_checksum_from_manifest_df_and_filename(
-                    data.manifest_data, filename
-                )
-            )
-            logger.debug(f"Variables extracted from manifest file for '{filename}'.")
-            logger.debug(
-                f"AGHA_STUDY_ID:{agha_study_id}, PROVIDED_CHECKSUM:{provided_checksum}"
-            )
-
-            # Search if file exist at s3
-            query_submission_df = staging_file_record_df.loc[
-                (staging_file_record_df["sort_key"] == sort_key)
-            ]
+                sort_key = f"{data.submission_prefix}/{filename}"
 
-            if len(query_submission_df) == 0:
-                notification.log_and_store_message(
-                    f"No such file found at bucket:{DYNAMODB_STAGING_TABLE_NAME}\
-                 s3_key:{sort_key}",
-                    "warning",
+                # Variables from manifest data
+                agha_study_id = (
+                    submission_data.find_study_id_from_manifest_df_and_filename(
+                        data.manifest_data, filename
+                    )
+                )
+                provided_checksum = (
+                    submission_data.find_checksum_from_manifest_df_and_filename(
+                        data.manifest_data, filename
+                    )
+                )
+                logger.debug(
+                    f"Variables extracted from manifest file for '{filename}'."
+                )
+                logger.debug(
+                    f"AGHA_STUDY_ID:{agha_study_id}, PROVIDED_CHECKSUM:{provided_checksum}"
                 )
 
-                # UNLOCK submission in staging bucket to be fixed
-                payload = {
-                    "task": "FOLDER_UNLOCK",
-                    "submission_prefix": data.manifest_s3_key,
-                }
-                util.call_lambda(FOLDER_LOCK_LAMBDA_ARN, payload)
-                notification.log_and_store_message(f"Unlocking submission directory.")
+                # Search if file exist at s3
+                query_submission_df = staging_file_record_df.loc[
+                    (staging_file_record_df["sort_key"] == sort_key)
+                ]
 
-                notification.notify_and_exit()
-            logger.debug(f"File check '{sort_key}' in s3 bucket: OK.")
+                if len(query_submission_df) == 0:
+                    notification.log_and_store_message(
+                        f"No such file found at bucket:{DYNAMODB_STAGING_TABLE_NAME}\
+                 s3_key:{sort_key}",
+                        "warning",
+                    )
 
-            file_etag = query_submission_df["etag"].values[0]
+                    # UNLOCK submission in staging bucket to be fixed
+                    payload = {
+                        "task": "FOLDER_UNLOCK",
+                        "submission_prefix": data.manifest_s3_key,
+                    }
+                    util.call_lambda(FOLDER_LOCK_LAMBDA_ARN, payload)
+                    notification.log_and_store_message(
+                        f"Unlocking submission directory."
+                    )
 
-            # Check if the file eTag has appeared else than this staging bucket and warn if so.
-            logger.info("Check if the same Etag has exist in the database")
-            etag_response = dynamodb.get_item_from_pk(
-                DYNAMODB_ETAG_TABLE_NAME, file_etag
-            )
-            logger.debug("eTag query response:")
-            logger.debug(
-                json.dumps(etag_response, indent=4, cls=util.JsonSerialEncoder)
-            )
+                    notification.notify_and_exit()
+                logger.debug(f"File check '{sort_key}' in s3 bucket: OK.")
 
-            if etag_response["Count"] > 1:
-                s3_duplicate_list = []
-                for each_etag_appearance in etag_response["Items"]:
-                    # Parsing...
-                    s3_key = each_etag_appearance["s3_key"]
-                    bucket_name = each_etag_appearance["bucket_name"]
+                file_etag = query_submission_df["etag"].values[0]
 
-                    s3_uri = s3.create_s3_uri_from_bucket_name_and_key(
-                        bucket_name, s3_key
-                    )
-                    s3_duplicate_list.append(s3_uri)
-
-                duplicate_etag_list.append(s3_duplicate_list)
-
-            # Create Manifest type record
-            manifest_record = dynamodb.ManifestFileRecord(
-                partition_key=dynamodb.FileRecordPartitionKey.MANIFEST_FILE_RECORD.value,
-                sort_key=sort_key,
-                flagship=agha.FlagShip.from_name(
-                    sort_key.split("/")[0]
-                ).preferred_code(),
-                filename=filename,
-                filetype=agha.FileType.from_name(filename).get_name(),
-                submission=data.submission_prefix,
-                date_modified=util.get_datetimestamp(),
-                provided_checksum=provided_checksum,
-                agha_study_id=agha_study_id,
-                is_in_manifest="True",
-                validation_status="PASS",
-            )
+                # Check if the file eTag has appeared else than this staging bucket and warn if so.
+                logger.info("Check if the same Etag has exist in the database")
+                etag_response = dynamodb.get_item_from_pk(
+                    DYNAMODB_ETAG_TABLE_NAME, file_etag
+                )
+                logger.debug("eTag query response:")
+                logger.debug("%s", LazyJson(etag_response))
+
+                if etag_response["Count"] > 1:
+                    s3_duplicate_list = []
+                    for each_etag_appearance in etag_response["Items"]:
+                        # Parsing...
+                        s3_key = each_etag_appearance["s3_key"]
+                        bucket_name = each_etag_appearance["bucket_name"]
+
+                        s3_uri = s3.create_s3_uri_from_bucket_name_and_key(
+                            bucket_name, s3_key
+                        )
+                        s3_duplicate_list.append(s3_uri)
+
+                    duplicate_etag_list.append(s3_duplicate_list)
+                    check_file_span.add_count("duplicate")
+
+                # Create Manifest type record
+                manifest_record = dynamodb.ManifestFileRecord(
+                    partition_key=dynamodb.FileRecordPartitionKey.MANIFEST_FILE_RECORD.value,
+                    sort_key=sort_key,
+                    flagship=flagship_code,
+                    filename=filename,
+                    filetype=agha.FileType.from_name(filename).get_name(),
+                    submission=data.submission_prefix,
+                    date_modified=util.get_datetimestamp(),
+                    provided_checksum=provided_checksum,
+                    agha_study_id=agha_study_id,
+                    is_in_manifest="True",
+                    validation_status="PASS",
+                )
 
-            # Update item at the record
-            staging_dynamodb_batch_write_list.append(manifest_record.__dict__)
-            archive_manifest_record = dynamodb.ArchiveManifestFileRecord.create_archive_manifest_record_from_manifest_record(
-                manifest_record, "CREATE"
-            )
-            archive_staging_dynamodb_batch_write_list.append(
-                archive_manifest_record.__dict__
-            )
+                # Update item at the record
+                staging_dynamodb_batch_write_list.append(manifest_record.__dict__)
+                archive_manifest_record = dynamodb.ArchiveManifestFileRecord.create_archive_manifest_record_from_manifest_record(
+                    manifest_record, "CREATE"
+                )
+                archive_staging_dynamodb_batch_write_list.append(
+                    archive_manifest_record.__dict__
+                )
 
         # Construct to an expected payload:
         # {
@@ -463,32 +494,36 @@ def handler(event, context):
 
         # Update dynamodb batch if not skipped
         if not event.get("skip_update_dynamodb"):
-            # Clear previous result if any (will happen if manifest get re-upload)
-            exiting_manifest_record = dynamodb.get_batch_item_from_pk_and_sk(
-                table_name=DYNAMODB_STAGING_TABLE_NAME,
-                partition_key=dynamodb.FileRecordPartitionKey.MANIFEST_FILE_RECORD.value,
-                sort_key_prefix=data.submission_prefix,
-            )
-            dynamodb.batch_delete_from_dictionary(
-                table_name=DYNAMODB_STAGING_TABLE_NAME,
-                dictionary_list=exiting_manifest_record,
-            )
-            dynamodb.batch_write_objects_archive(
-                table_name=DYNAMODB_ARCHIVE_STAGING_TABLE_NAME,
-                object_list=archive_staging_dynamodb_batch_write_list,
-                archive_log="ObjectRemoved",
-            )
+            with timing.span(
+                "update_dynamodb", write=len(staging_dynamodb_batch_write_list)
+            ) as update_span:
+                # Clear previous result if any (will happen if manifest get re-upload)
+                exiting_manifest_record = dynamodb.get_batch_item_from_pk_and_sk(
+                    table_name=DYNAMODB_STAGING_TABLE_NAME,
+                    partition_key=dynamodb.FileRecordPartitionKey.MANIFEST_FILE_RECORD.value,
+                    sort_key_prefix=data.submission_prefix,
+                )
+                dynamodb.batch_delete_from_dictionary(
+                    table_name=DYNAMODB_STAGING_TABLE_NAME,
+                    dictionary_list=exiting_manifest_record,
+                )
+                update_span.set_count("delete", len(exiting_manifest_record))
+                dynamodb.batch_write_objects_archive(
+                    table_name=DYNAMODB_ARCHIVE_STAGING_TABLE_NAME,
+                    object_list=archive_staging_dynamodb_batch_write_list,
+                    archive_log="ObjectRemoved",
+                )
 
-            # Append new result
-            dynamodb.batch_write_objects(
-                table_name=DYNAMODB_STAGING_TABLE_NAME,
-                object_list=staging_dynamodb_batch_write_list,
-            )
-            dynamodb.batch_write_objects_archive(
-                table_name=DYNAMODB_ARCHIVE_STAGING_TABLE_NAME,
-                object_list=archive_staging_dynamodb_batch_write_list,
-                archive_log="ObjectCreated",
-            )
+                # Append new result
+                dynamodb.batch_write_objects(
+                    table_name=DYNAMODB_STAGING_TABLE_NAME,
+                    object_list=staging_dynamodb_batch_write_list,
+                )
+                dynamodb.batch_write_objects_archive(
+                    table_name=DYNAMODB_ARCHIVE_STAGING_TABLE_NAME,
+                    object_list=archive_staging_dynamodb_batch_write_list,
+                    archive_log="ObjectCreated",
+                )
         else:
             logger.info(f"'skip_update_dynamodb' payload is True. Skipping ...")
 
@@ -500,15 +535,16 @@ def handler(event, context):
             notification.MESSAGE_STORE.append("")
             notification.log_and_store_message("Continuing with file validation.")
 
-            # Invoke validation manager for automation
-            client_lambda = util.get_client("lambda")
+            with timing.span("invoke_validation_manager"):
+                # Invoke validation manager for automation
+                client_lambda = util.get_client("lambda")
 
-            lambda_res = client_lambda.invoke(
-                FunctionName=VALIDATION_MANAGER_LAMBDA_ARN,
-                InvocationType="Event",
-                Payload=json.dumps(validation_payload),
-            )
-            print(lambda_res)
+                lambda_res = client_lambda.invoke(
+                    FunctionName=VALIDATION_MANAGER_LAMBDA_ARN,
+                    InvocationType="Event",
+                    Payload=json.dumps(validation_payload),
+                )
+                print(lambda_res)
         else:
             notification.log_and_store_message(
                 "Validation pipeline for this submission is disabled."
@@ -516,7 +552,8 @@ def handler(event, context):
 
         # Send notification to submitter for the submission if not skipped
         if not event.get("skip_send_notification"):
-            notification.send_notifications()
+            with timing.span("send_notification"):
+                notification.send_notifications()
         else:
             logger.info(f"'skip_send_notification' payload is True. Skipping ...")
 
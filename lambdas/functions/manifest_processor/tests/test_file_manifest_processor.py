@@ -234,6 +234,42 @@ class ManifestProcessorUnitTestCase(unittest.TestCase):
         self.assertTrue(ordered(expected_payload) == ordered(exception_raise))
         return
 
+    @mock.patch(
+        "manifest_processor.s3.get_s3_object_metadata",
+        mock.MagicMock(return_value=MOCK_S3_METADATA_LIST),
+    )
+    @mock.patch(
+        "manifest_processor.submission_data.retrieve_manifest_data",
+        mock.MagicMock(
+            side_effect=ValueError(
+                "manifest header is invalid:\rrequired column missing from manifest"
+            )
+        ),
+    )
+    @mock.patch(
+        "manifest_processor.util.call_lambda", new=get_folder_lock_lambda_payload
+    )
+    def test_folder_unlock_lambda_with_bad_manifest_header(self):
+        """Will test if a manifest that cannot be read unlocks the folder."""
+        key = "FlagShip/20220222/manifest.txt"
+        expected_payload = {"task": "FOLDER_UNLOCK", "submission_prefix": key}
+        event_payload = {
+            "bucket_name": "agha-gdr-staging-2.0",
+            "manifest_fp": key,
+            "email_report_to": "example@email.com",
+            "skip_send_notification": True,
+        }
+
+        with self.assertRaises(Exception) as context:
+            handler(event_payload, {})
+        exception_raise = json.loads(str(context.exception))
+        self.assertTrue(ordered(expected_payload) == ordered(exception_raise))
+
+        manifest_status_record = dynamodb.get_item_from_exact_pk_and_sk(
+            "agha-gdr-staging-bucket", "STATUS:MANIFEST", key
+        )
+        self.assertEqual(manifest_status_record["Items"][0]["status"], "FAIL")
+
     @mock.patch(
         "manifest_processor.s3.get_s3_object_metadata",
         mock.MagicMock(return_value=MOCK_S3_METADATA_LIST),
@@ -1,11 +1,14 @@
 #!/usr/bin/env python3
 import logging
-import http.client
 import json
+import os
+import time
 
 import botocore.exceptions
 
 import util
+from util import dynamodb, notification, slack
+from util.instrumentation import instrument_handler
 
 # Logging
 logger = logging.getLogger()
@@ -18,20 +21,27 @@ SLACK_HOST = util.get_environment_variable("SLACK_HOST")
 SLACK_CHANNEL = util.get_environment_variable("SLACK_CHANNEL")
 MANAGER_EMAIL = util.get_environment_variable("MANAGER_EMAIL")
 SENDER_EMAIL = util.get_environment_variable("SENDER_EMAIL")
+DYNAMODB_NOTIFICATION_OUTBOX_TABLE_NAME = os.environ.get(
+    "DYNAMODB_NOTIFICATION_OUTBOX_TABLE_NAME"
+)
+# A submission is notified once no message has been added for this long
+NOTIFICATION_COALESCE_WINDOW_SECONDS = int(
+    os.environ.get("NOTIFICATION_COALESCE_WINDOW_SECONDS", 60)
+)
+# ... or once its oldest message has waited this long
+NOTIFICATION_MAX_DELAY_SECONDS = int(
+    os.environ.get("NOTIFICATION_MAX_DELAY_SECONDS", 600)
+)
 
 # Get AWS clients, resources
 CLIENT_SES = util.get_client("ses")
 CLIENT_SSM = util.get_client("ssm")
 
-# Get SSM value
-SLACK_WEBHOOK_ENDPOINT = util.get_ssm_parameter(
-    "/slack/webhook/endpoint", CLIENT_SSM, with_decryption=True
-)
-
 # Other
 EMAIL_SUBJECT = "[AGHA service] Submission received"
 
 
+@instrument_handler
 def handler(event, context):
     """
     Notification lambda will send notification to email/slack channel.
@@ -52,6 +62,67 @@ def handler(event, context):
     logger.info(f"Event processed:")
     print(event)
 
+    send_notification(event)
+
+
+@instrument_handler
+def aggregate_handler(event, context):
+    """
+    Scheduled entry point. Send the notification written to the outbox table (see util.notification), one email and
+    Slack post per submission once the submission has gone quiet.
+
+    :param event: not used
+    :param context: not used
+    """
+    outbox_list = notification.get_outbox_notification_list(
+        DYNAMODB_NOTIFICATION_OUTBOX_TABLE_NAME
+    )
+    now = int(time.time())
+    group_list = notification.group_outbox_notification(
+        outbox_list,
+        flush_before=now - NOTIFICATION_COALESCE_WINDOW_SECONDS,
+        force_flush_before=now - NOTIFICATION_MAX_DELAY_SECONDS,
+    )
+    logger.info(
+        f"{len(outbox_list)} notification in outbox, {len(group_list)} submission ready to be notified"
+    )
+
+    number_of_sent = 0
+    number_of_failed = 0
+    for group in group_list:
+        try:
+            send_notification(notification.merge_outbox_notification(group))
+        except (botocore.exceptions.ClientError, OSError, ValueError) as e:
+            # Left in the outbox for the next run, the other submissions are still notified
+            logger.error(
+                f"Unable to notify submission '{group[0].get('submission_prefix')}': {e}"
+            )
+            number_of_failed += len(group)
+            continue
+        number_of_sent += len(group)
+
+        # Removed only once sent
+        dynamodb.batch_delete_from_dictionary(
+            DYNAMODB_NOTIFICATION_OUTBOX_TABLE_NAME,
+            [
+                {"partition_key": r["partition_key"], "sort_key": r["sort_key"]}
+                for r in group
+            ],
+        )
+
+    return {
+        "submission_notified": len(group_list),
+        "notification_sent": number_of_sent,
+        "notification_failed": number_of_failed,
+        "notification_pending": len(outbox_list) - number_of_sent,
+    }
+
+
+def send_notification(event: dict):
+    """
+    Send the notification by email and/or Slack. Raise ClientError (SES), OSError or ValueError (Slack) when either
+    could not be sent.
+    """
     messages = event["messages"]
     subject = event["subject"]
     submitter_info = event["submitter_info"]
@@ -92,9 +163,11 @@ def handler(event, context):
             slack_message,
             SLACK_HOST,
             SLACK_CHANNEL,
-            SLACK_WEBHOOK_ENDPOINT,
+            slack.get_slack_webhook_endpoint(CLIENT_SSM),
         )
         logger.info(f"Slack call response: {slack_response}")
+        if slack_response != 200:
+            raise ValueError(f"Slack webhook responded with status {slack_response}")
 
 
 def send_email(recipients, sender, subject_text, body_html, ses_client):
@@ -119,7 +192,7 @@ def send_email(recipients, sender, subject_text, body_html, ses_client):
         )
     except botocore.exceptions.ClientError as e:
         logger.error(f"email failed to send: {e}")
-        return e
+        raise
     else:
         logger.info(f'email sent, message ID: {response["MessageId"]}')
         return response
@@ -128,19 +201,14 @@ def send_email(recipients, sender, subject_text, body_html, ses_client):
 def call_slack_webhook(
     topic, title, message, slack_host, slack_channel, slack_webhook_endpoint
 ):
-    connection = http.client.HTTPSConnection(slack_host)
-    post_data = {
-        "channel": slack_channel,
-        "username": "Notice from AWS",
-        "text": "*" + topic + "*",
-        "icon_emoji": ":aws_logo:",
-        "attachments": [{"title": title, "text": message}],
-    }
-    header = {"Content-Type": "application/json"}
-    connection.request("POST", slack_webhook_endpoint, json.dumps(post_data), header)
-    response = connection.getresponse()
-    connection.close()
-    return response.status
+    post_data = slack.create_slack_post_data(
+        slack_channel, "Notice from AWS", topic, title, message
+    )
+    return slack.send_slack_message(
+        slack_webhook_endpoint,
+        post_data,
+        session=slack.get_slack_webhook_session(slack_host),
+    )
 
 
 def make_email_body_html(submission, submitter, messages):
@@ -157,6 +225,11 @@ def make_email_body_html(submission, submitter, messages):
     </html>"""
     insert = ""
     for msg in messages:
-        insert += f"{msg}<br>\n"
+        insert += f"{render_email_message(msg)}<br>\n"
     body_html = body_html.replace("PLACEHOLDER", insert)
     return body_html
+
+
+def render_email_message(message: str) -> str:
+    # Keep the indentation and line break of plain text messages (e.g. JSON dump) in the email
+    return message.replace(" ", "&nbsp;").replace("\n", "<br>")
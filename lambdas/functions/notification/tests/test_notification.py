@@ -13,7 +13,11 @@ import os
 import unittest
 from unittest import mock
 
+import botocore.exceptions
+
+import notification
 from notification import handler
+from util import notification as util_notification
 
 
 def create_manifest_record_payload():
@@ -38,5 +42,69 @@ class NotificationTestCase(unittest.TestCase):
         handler(event_payload, {})
 
 
+class NotificationAggregateTestCase(unittest.TestCase):
+    """
+    cmd: python -m unittest tests.test_notification.NotificationAggregateTestCase
+    """
+
+    def create_outbox_record(self, submission_prefix: str) -> dict:
+        return {
+            "partition_key": util_notification.OUTBOX_PARTITION_KEY,
+            "sort_key": f"000000000001:{submission_prefix}",
+            "created_at": 1,
+            "submission_prefix": submission_prefix,
+            "messages": ["Submission received"],
+            "subject": "[AGHA service] Submission received",
+            "submitter_info": {
+                "name": "",
+                "email": "",
+                "submission_prefix": submission_prefix,
+            },
+        }
+
+    def test_outbox_deleted_only_when_sent(self):
+        sent_record = self.create_outbox_record("AC/2022-02-02/")
+        failed_record = self.create_outbox_record("AC/2022-02-03/")
+
+        def send_notification(event):
+            if event["submitter_info"]["submission_prefix"] == "AC/2022-02-03/":
+                raise ValueError("Slack webhook responded with status 500")
+
+        with mock.patch(
+            "notification.notification.get_outbox_notification_list",
+            return_value=[sent_record, failed_record],
+        ), mock.patch(
+            "notification.send_notification", side_effect=send_notification
+        ), mock.patch(
+            "notification.dynamodb.batch_delete_from_dictionary"
+        ) as mock_delete:
+            result = notification.aggregate_handler({}, {})
+
+        self.assertEqual(result["notification_sent"], 1)
+        self.assertEqual(result["notification_failed"], 1)
+        self.assertEqual(result["notification_pending"], 1)
+        mock_delete.assert_called_once()
+        self.assertEqual(
+            mock_delete.call_args[0][1],
+            [
+                {
+                    "partition_key": util_notification.OUTBOX_PARTITION_KEY,
+                    "sort_key": sent_record["sort_key"],
+                }
+            ],
+        )
+
+    def test_send_email_failure_raised(self):
+        ses_client = mock.MagicMock()
+        ses_client.send_email.side_effect = botocore.exceptions.ClientError(
+            {"Error": {"Code": "MessageRejected", "Message": "Rejected"}}, "SendEmail"
+        )
+
+        with self.assertRaises(botocore.exceptions.ClientError):
+            notification.send_email(
+                ["a@example.com"], "b@example.com", "subject", "body", ses_client
+            )
+
+
 if __name__ == "__main__":
     unittest.main()
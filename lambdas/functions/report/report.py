@@ -7,12 +7,26 @@
 import os
 import logging
 import json
+import base64
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
 import boto3
 
-from util import agha, s3, batch, submission_data
+import util
+from util import agha, s3, batch, dynamodb, submission_data, manifest_diff
+from util.instrumentation import instrument_handler
 
 STAGING_BUCKET = os.environ.get("STAGING_BUCKET")
 STORE_BUCKET = os.environ.get("STORE_BUCKET")
+DYNAMODB_STORE_TABLE_NAME = os.environ.get("DYNAMODB_STORE_TABLE_NAME")
+DYNAMODB_SUBMISSION_STATUS_TABLE_NAME = os.environ.get(
+    "DYNAMODB_SUBMISSION_STATUS_TABLE_NAME"
+)
+
+# Number of submission evaluated concurrently in passed_validation
+REPORT_MAX_WORKERS = int(os.environ.get("REPORT_MAX_WORKERS", 8))
+# Stop starting new submission check when the lambda has less than this time left
+REPORT_TIME_MARGIN_MS = int(os.environ.get("REPORT_TIME_MARGIN_MS", 30 * 1000))
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -20,6 +34,7 @@ logger.setLevel(logging.INFO)
 lambda_client = boto3.client("lambda")
 
 
+@instrument_handler
 def handler(event, context):
     """
     Purpose of the lambda will report data/metadata inside the pipeline
@@ -30,6 +45,7 @@ def handler(event, context):
     * Each payload might be different depending on check_type selected.
 
     """
+    dynamodb.clear_query_cache()
 
     ################################################################################
     # For file transfer check type
@@ -112,7 +128,8 @@ def handler(event, context):
         """
         OPTIONAL:
         {
-            exception_postfix_filename_list:[]
+            exception_postfix_filename_list:[],
+            continuation_token: "" (from the previous partial response)
         }
         """
         logger.info("Checking for passed validation")
@@ -123,47 +140,48 @@ def handler(event, context):
         if payload is not None:
             check_payload.set_payload(**payload)
 
-        # Get submission directory in staging/store bucket
-        staging_submission_directory = []
-        store_submission_directory = []
-        for flagship_code in agha.FlagShip.list_flagship_enum():
-            query_directory = flagship_code + "/"
+        # One listing of the staging bucket gives both the submission directories and their files
+        staging_object_by_submission = list_staging_object_by_submission()
 
-            staging_submission_directory.extend(
-                s3.aws_s3_ls(STAGING_BUCKET, query_directory)
-            )
-            store_submission_directory.extend(
-                s3.aws_s3_ls(STORE_BUCKET, query_directory)
-            )
+        # Store bucket listing only for the flagship with submission in staging
+        flagship_list = sorted(
+            {prefix.split("/")[0] for prefix in staging_object_by_submission}
+        )
+        store_submission_directory = list_submission_directory(
+            STORE_BUCKET, flagship_list
+        )
 
         # Remove keys that had already been submitted to the store bucket
-        s3_to_check = list(
-            set(staging_submission_directory) - set(store_submission_directory)
+        s3_to_check = sorted(
+            prefix
+            for prefix in staging_object_by_submission
+            if prefix not in store_submission_directory
+            and not prefix.startswith("TEST")
         )
 
-        # Define result array
-        passed_submission_list = []
+        # Resume from a previous partial report
+        if check_payload.start_from is not None:
+            s3_to_check = [
+                prefix for prefix in s3_to_check if prefix >= check_payload.start_from
+            ]
 
         logger.info(f"S3 key to check: {json.dumps(s3_to_check, indent=4)}")
 
-        for submission_prefix in s3_to_check:
-            # directory prefix for the submission (Stripping resource arn)
-
-            if submission_prefix.startswith("TEST"):
-                continue
-
-            fail_status_check_result = batch.run_status_result_check(submission_prefix)
-
-            fail_batch_job = batch.run_batch_check(
-                staging_directory_prefix=submission_prefix,
-                exception_list=check_payload.exception_postfix_file,
-            )
-
-            if len(fail_batch_job) < 0 and len(fail_status_check_result) < 0:
-                passed_submission_list.append(submission_prefix)
+        passed_submission_list, next_start_from = run_passed_validation_check(
+            s3_to_check=s3_to_check,
+            staging_object_by_submission=staging_object_by_submission,
+            exception_list=check_payload.exception_postfix_file,
+            context=context,
+        )
 
         logger.info(f"Ready to transfer list: {passed_submission_list}")
-        return {"ready_to_transfer_s3_key": passed_submission_list}
+        response = {"ready_to_transfer_s3_key": passed_submission_list}
+        if next_start_from is not None:
+            logger.warning(
+                f"Running out of time, returning partial result. Next submission to check: {next_start_from}"
+            )
+            response["continuation_token"] = create_continuation_token(next_start_from)
+        return response
 
     ################################################################################
     # Check file in store bucket same as manifest
@@ -171,7 +189,9 @@ def handler(event, context):
     elif event.get("report_type") == "store_bucket_check":
         """
         {
-            "submission_prefix": "AC/2022-02-22"
+            "submission_prefix": "AC/2022-02-22",
+            "exception_postfix_file": [".md5"],  # Optional
+            "use_dynamodb": true  # Optional, compare against store FILE records instead of listing the bucket
         }
         """
         logger.info(f"'store_bucket_check' option selected.")
@@ -189,63 +209,26 @@ def handler(event, context):
             bucket_name=STORE_BUCKET, manifest_key=manifest_orig_key
         )
 
-        manifest_orig_filename_list = manifest_orig_pd["filename"].tolist()
-        logger.info(
-            f"List of filename in 'manifest.orig': {json.dumps(manifest_orig_filename_list, indent=4)}"
-        )
-
-        # Grab for filename from 'manifest.orig' that should exist in the bucket
-        manifest_orig_filename_to_check = []
-        for manifest_orig_filename in manifest_orig_filename_list:
-
-            if submission_data.is_file_skipped(
-                manifest_orig_filename, payload.exception_postfix_file
-            ):
-                continue
-            else:
-                manifest_orig_filename_to_check.append(manifest_orig_filename)
-
-        # Grab s3_key exist in store bucket
-        store_metadata_list = s3.get_s3_object_metadata(
-            bucket_name=STORE_BUCKET, directory_prefix=payload.submission_prefix
-        )
-        store_filename_list = [
-            metadata["Key"].split("/")[-1] for metadata in store_metadata_list
-        ]
-        logger.info(
-            f"Filename in store bucket: {json.dumps(store_filename_list, indent=4)}"
-        )
-
-        # Comparing files in the manifest.orig but not in the manifest store
-        manifest_orig_diff_store = list(
-            set(manifest_orig_filename_list) - set(store_filename_list)
-        )
-        logger.info(
-            f"Comparing filename exist in original manifest but not in store bucket. "
-            f"Result {json.dumps(manifest_orig_diff_store, indent=4)}"
-        )
-
-        # Checking file that could be altered and only the altered file is being stored (e.g. uncompressed file)
-        uncompress_file = []
-        for filename in manifest_orig_diff_store:
-            if (
-                agha.FileType.is_compressable_file(filename)
-                and not agha.FileType.is_compress_file(filename)
-                and f"{filename}.gz" in store_filename_list
-            ):
-                uncompress_file.append(filename)
+        if payload.use_dynamodb:
+            store_key_list = manifest_diff.list_store_key_from_dynamodb(
+                table_name=DYNAMODB_STORE_TABLE_NAME,
+                submission_prefix=payload.submission_prefix,
+            )
+        else:
+            store_key_list = manifest_diff.list_store_key_from_s3(
+                bucket_name=STORE_BUCKET, submission_prefix=payload.submission_prefix
+            )
+        logger.info(f"Number of object in store: {len(store_key_list)}")
 
-        remove_uncompress_file = list(
-            set(manifest_orig_diff_store) - set(uncompress_file)
-        )
-        len_remove_uncompress_file = len(remove_uncompress_file)
-        logger.info(
-            f"Difference after removing uncompress file: {remove_uncompress_file}"
+        missing_file_list = manifest_diff.find_missing_manifest_file(
+            manifest_filename_list=manifest_orig_pd["filename"].tolist(),
+            store_key_list=store_key_list,
+            postfix_exception_list=payload.exception_postfix_file,
         )
-        logger.info(f"Total number of difference: {len_remove_uncompress_file}")
+        logger.info(f"Total number of difference: {len(missing_file_list)}")
 
-        if len_remove_uncompress_file > 0:
-            message = f"Contain missing file. Expected file: {json.dumps(remove_uncompress_file, indent=4)}"
+        if len(missing_file_list) > 0:
+            message = f"Contain missing file. Expected file: {json.dumps(missing_file_list, indent=4)}"
             logger.critical(message)
             return message
         else:
@@ -253,13 +236,51 @@ def handler(event, context):
             logger.info(message)
             return message
 
+    ################################################################################
+    # Per submission file count from the submission status table
+    ################################################################################
+    elif event.get("report_type") == "submission_status":
+        """
+        {
+            "flagship": "AC",
+            "submission": "2022-02-22"  # Optional, prefix of the submission to narrow down
+        }
+        """
+        logger.info(f"'submission_status' option selected.")
+
+        dict_payload = event.get("payload", {})
+        flagship = dict_payload.get("flagship")
+        if not flagship:
+            return "Invalid payload. 'flagship' is required."
+
+        status_list = dynamodb.get_submission_status_list(
+            table_name=DYNAMODB_SUBMISSION_STATUS_TABLE_NAME,
+            flagship=flagship,
+            submission_prefix=dict_payload.get("submission", ""),
+        )
+
+        return [
+            {
+                "submission": record["sort_key"],
+                "date_modified": record.get("date_modified"),
+                **{
+                    status: int(record.get(status, 0))
+                    for status in dynamodb.SubmissionStatus.to_list()
+                },
+            }
+            for record in status_list
+        ]
+
 
 class StoreBucketPayload:
     def __init__(self):
         self.submission_prefix = None
         self.exception_postfix_file = None
+        self.use_dynamodb = False
 
-    def set_payload(self, submission_prefix=None, exception_postfix_file=None):
+    def set_payload(
+        self, submission_prefix=None, exception_postfix_file=None, use_dynamodb=False
+    ):
 
         # Mandatory payload
         if submission_prefix is None:
@@ -271,6 +292,7 @@ class StoreBucketPayload:
 
         self.submission_prefix = submission_prefix
         self.exception_postfix_file = exception_postfix_file
+        self.use_dynamodb = use_dynamodb
 
 
 class FileTransferPayload:
@@ -284,6 +306,132 @@ class FileTransferPayload:
 class PassedValidationPayload:
     def __init__(self):
         self.exception_postfix_file = None
+        self.start_from = None
 
-    def set_payload(self, exception_postfix_filename_list=None):
+    def set_payload(
+        self, exception_postfix_filename_list=None, continuation_token=None
+    ):
         self.exception_postfix_file = exception_postfix_filename_list
+        if continuation_token is not None:
+            self.start_from = parse_continuation_token(continuation_token)
+
+
+def create_continuation_token(start_from: str) -> str:
+    return base64.urlsafe_b64encode(
+        json.dumps({"start_from": start_from}).encode()
+    ).decode()
+
+
+def parse_continuation_token(continuation_token: str) -> str:
+    try:
+        return json.loads(base64.urlsafe_b64decode(continuation_token))["start_from"]
+    except (ValueError, KeyError, TypeError):
+        raise ValueError(f"Invalid continuation_token: {continuation_token}")
+
+
+def list_staging_object_by_submission() -> dict:
+    """
+    List the staging bucket once and group object metadata by submission directory (e.g. "AC/2022-02-22/").
+    Only flagship known to agha.FlagShip are kept, as with the per-flagship listing.
+    """
+    flagship_set = set(agha.FlagShip.list_flagship_enum())
+    object_by_submission = {}
+
+    paginator = util.get_client("s3").get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=STAGING_BUCKET):
+        for metadata in page.get("Contents", []):
+            split_key = metadata["Key"].split("/")
+            if len(split_key) < 3 or split_key[0] not in flagship_set:
+                continue
+
+            submission_prefix = f"{split_key[0]}/{split_key[1]}/"
+            object_by_submission.setdefault(submission_prefix, []).append(metadata)
+
+    return object_by_submission
+
+
+def list_submission_directory(bucket_name: str, flagship_list: list) -> set:
+    """
+    Same as s3.aws_s3_ls for each flagship, listed concurrently with a single (thread safe) client.
+    """
+    client_s3 = util.get_client("s3")
+
+    def ls_flagship(flagship: str) -> list:
+        ls_list = []
+        paginator = client_s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(
+            Bucket=bucket_name, Prefix=f"{flagship}/", Delimiter="/"
+        ):
+            ls_list.extend(cur["Prefix"] for cur in page.get("CommonPrefixes", []))
+        return ls_list
+
+    submission_directory = set()
+    with ThreadPoolExecutor(max_workers=REPORT_MAX_WORKERS) as executor:
+        for directory_list in executor.map(ls_flagship, flagship_list):
+            submission_directory.update(directory_list)
+    return submission_directory
+
+
+def is_submission_passed(
+    submission_prefix: str, s3_list: list, exception_list: list = None
+) -> bool:
+    fail_status_check_result = batch.run_status_result_check(submission_prefix)
+
+    fail_batch_job = batch.run_batch_check(
+        staging_directory_prefix=submission_prefix,
+        exception_list=exception_list,
+        s3_list=s3_list,
+    )
+
+    return len(fail_batch_job) == 0 and len(fail_status_check_result) == 0
+
+
+def has_time_for_next_check(context) -> bool:
+    if not hasattr(context, "get_remaining_time_in_millis"):
+        return True
+    return context.get_remaining_time_in_millis() > REPORT_TIME_MARGIN_MS
+
+
+def run_passed_validation_check(
+    s3_to_check: list, staging_object_by_submission: dict, exception_list, context
+) -> tuple:
+    """
+    Evaluate submissions (in order) with a pool of REPORT_MAX_WORKERS. No new check is started when the lambda is
+    close to its timeout, the checks in flight are awaited.
+    Return (passed_submission_list, next_start_from), next_start_from is None when every submission is checked.
+    """
+    passed_submission_list = []
+    next_start_from = None
+
+    with ThreadPoolExecutor(max_workers=REPORT_MAX_WORKERS) as executor:
+        in_flight = {}
+        for submission_prefix in s3_to_check:
+            if not has_time_for_next_check(context):
+                next_start_from = submission_prefix
+                break
+
+            # Keep at most REPORT_MAX_WORKERS checks submitted, so the time budget is checked as they finish
+            if len(in_flight) >= REPORT_MAX_WORKERS:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.result():
+                        passed_submission_list.append(in_flight[future])
+                    del in_flight[future]
+
+                if not has_time_for_next_check(context):
+                    next_start_from = submission_prefix
+                    break
+
+            future = executor.submit(
+                is_submission_passed,
+                submission_prefix,
+                staging_object_by_submission[submission_prefix],
+                exception_list,
+            )
+            in_flight[future] = submission_prefix
+
+        for future, submission_prefix in in_flight.items():
+            if future.result():
+                passed_submission_list.append(submission_prefix)
+
+    return sorted(passed_submission_list), next_start_from
@@ -13,7 +13,12 @@ import os
 import unittest
 from unittest import mock
 
+import boto3
+from moto import mock_aws
+
+import report
 from report import handler
+from util import dynamodb
 
 
 def create_report_payload():
@@ -39,5 +44,90 @@ class ReportUnitTestCase(unittest.TestCase):
         print(res)
 
 
+class ReportPassedValidationUnitTestCase(unittest.TestCase):
+    """
+    passed_validation against moto
+    cmd: python -m unittest tests.test_report.ReportPassedValidationUnitTestCase
+    """
+
+    def setUp(self) -> None:
+        env_patcher = mock.patch.dict(os.environ)
+        env_patcher.start()
+        self.addCleanup(env_patcher.stop)
+        os.environ.pop("AWS_ENDPOINT", None)
+
+        mock_aws_context = mock_aws()
+        mock_aws_context.start()
+        self.addCleanup(mock_aws_context.stop)
+
+        # Clients must be created after moto has started
+        dynamodb.DYNAMODB_RESOURCE = ""
+        self.addCleanup(setattr, dynamodb, "DYNAMODB_RESOURCE", "")
+
+        s3_client = boto3.client("s3")
+        for bucket in [os.environ["STAGING_BUCKET"], os.environ["STORE_BUCKET"]]:
+            s3_client.create_bucket(
+                Bucket=bucket,
+                CreateBucketConfiguration={"LocationConstraint": "ap-southeast-2"},
+            )
+        boto3.client("dynamodb").create_table(
+            TableName=os.environ["DYNAMODB_RESULT_TABLE_NAME"],
+            KeySchema=[
+                {"AttributeName": "partition_key", "KeyType": "HASH"},
+                {"AttributeName": "sort_key", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "partition_key", "AttributeType": "S"},
+                {"AttributeName": "sort_key", "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+        # AC/passed/ has its result, AC/no_result/ has not, AC/stored/ is already in the store bucket
+        for key in [
+            "AC/passed/a.bam",
+            "AC/passed/manifest.txt",
+            "AC/no_result/b.bam",
+            "AC/stored/c.bam",
+            "TEST/test/d.bam",
+        ]:
+            s3_client.put_object(Bucket=os.environ["STAGING_BUCKET"], Key=key, Body=b"")
+        s3_client.put_object(
+            Bucket=os.environ["STORE_BUCKET"], Key="AC/stored/c.bam", Body=b""
+        )
+        dynamodb.write_record_from_dict(
+            os.environ["DYNAMODB_RESULT_TABLE_NAME"],
+            {
+                "partition_key": dynamodb.FileRecordPartitionKey.FILE_RECORD.value,
+                "sort_key": "AC/passed/a.bam__results.json",
+            },
+        )
+
+    def test_passed_validation(self):
+        response = handler({"report_type": "passed_validation"}, {})
+
+        self.assertEqual(response, {"ready_to_transfer_s3_key": ["AC/passed/"]})
+
+    def test_passed_validation_continuation(self):
+        context = mock.MagicMock(function_name="report", aws_request_id="1234")
+
+        # Only time for the first submission
+        context.get_remaining_time_in_millis.side_effect = [60000, 1000]
+        response = handler({"report_type": "passed_validation"}, context)
+        self.assertEqual(response["ready_to_transfer_s3_key"], [])
+        self.assertIn("continuation_token", response)
+
+        context.get_remaining_time_in_millis.side_effect = None
+        context.get_remaining_time_in_millis.return_value = 60000
+        response = handler(
+            {
+                "report_type": "passed_validation",
+                "payload": {"continuation_token": response["continuation_token"]},
+            },
+            context,
+        )
+        self.assertEqual(response, {"ready_to_transfer_s3_key": ["AC/passed/"]})
+
+
 if __name__ == "__main__":
     unittest.main()
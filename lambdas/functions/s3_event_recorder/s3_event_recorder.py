@@ -10,6 +10,9 @@ import util
 import util.s3 as s3
 import util.dynamodb as dynamodb
 import util.batch as batch
+import util.timing as timing
+from util.instrumentation import instrument_handler
+from util.log import LazyJson
 
 # Buckets
 STAGING_BUCKET = os.environ.get("STAGING_BUCKET")
@@ -28,6 +31,9 @@ DYNAMODB_ARCHIVE_RESULT_TABLE_NAME = os.environ.get(
     "DYNAMODB_ARCHIVE_RESULT_TABLE_NAME"
 )
 DYNAMODB_ETAG_TABLE_NAME = os.environ.get("DYNAMODB_ETAG_TABLE_NAME")
+DYNAMODB_SUBMISSION_STATUS_TABLE_NAME = os.environ.get(
+    "DYNAMODB_SUBMISSION_STATUS_TABLE_NAME"
+)
 
 # Lambda ARN
 BATCH_NOTIFICATION_LAMBDA = os.environ.get("BATCH_NOTIFICATION_LAMBDA")
@@ -36,6 +42,7 @@ logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
+@instrument_handler
 def handler(event, context):
     """
     The lambda is to record events produced by S3 and insert/delete on DynamoDb Tables.
@@ -68,11 +75,14 @@ def handler(event, context):
     """
 
     logger.info("Start processing S3 event:")
-    logger.info(json.dumps(event))
+    logger.info("%s", LazyJson(event, max_items=None))
 
     # convert S3 event payloads into more convenient S3EventRecords
     s3_event_records: List[s3.S3EventRecord] = s3.parse_s3_event(event)
 
+    # Submission status count changes, written once per submission when flushed
+    status_delta = {}
+
     # Ideally one s3 event will only contain one record event
     # REF: https://stackoverflow.com/questions/40765699/how-many-records-can-be-in-s3-put-event-lambda-trigger/40767563#40767563
 
@@ -82,7 +92,7 @@ def handler(event, context):
         # Create DynamoDb record
         db_record = dynamodb.FileRecord.create_file_record_from_s3_record(s3_record)
         logger.info(f"DynamoDb record has been created from s3 event:")
-        logger.info(json.dumps(db_record.__dict__, cls=util.DecimalEncoder))
+        logger.info("%s", LazyJson(db_record.__dict__))
 
         # Distinguish between different buckets
         if s3_record.bucket_name == STAGING_BUCKET:
@@ -90,13 +100,21 @@ def handler(event, context):
             # Append record to the list accordingly
             if s3_record.event_type == s3.S3EventType.EVENT_OBJECT_CREATED:
 
-                write_standard_file_record(
+                write_res = write_standard_file_record(
                     file_record_table_name=DYNAMODB_STAGING_TABLE_NAME,
                     archive_file_record_table_name=DYNAMODB_ARCHIVE_STAGING_TABLE_NAME,
                     etag_table_name=DYNAMODB_ETAG_TABLE_NAME,
                     file_record=db_record,
                 )
 
+                # An overwritten object is already counted
+                if "Attributes" not in write_res:
+                    dynamodb.add_submission_status_count(
+                        status_delta,
+                        db_record.s3_key,
+                        dynamodb.SubmissionStatus.UPLOADED,
+                    )
+
             elif s3_record.event_type == s3.S3EventType.EVENT_OBJECT_REMOVED:
 
                 delete_standard_file_record(
@@ -105,6 +123,12 @@ def handler(event, context):
                     etag_table_name=DYNAMODB_ETAG_TABLE_NAME,
                     file_record=db_record,
                 )
+                dynamodb.add_submission_status_count(
+                    status_delta,
+                    db_record.s3_key,
+                    dynamodb.SubmissionStatus.UPLOADED,
+                    -1,
+                )
 
                 # Delete MANIFEST file record
                 delete_manifest_file_record(
@@ -130,14 +154,27 @@ def handler(event, context):
             # Append record to list accordingly
             if s3_record.event_type == s3.S3EventType.EVENT_OBJECT_CREATED:
 
-                write_standard_file_record(
+                write_res = write_standard_file_record(
                     file_record_table_name=DYNAMODB_STORE_TABLE_NAME,
                     archive_file_record_table_name=DYNAMODB_ARCHIVE_STORE_TABLE_NAME,
                     etag_table_name=DYNAMODB_ETAG_TABLE_NAME,
                     file_record=db_record,
                 )
+                if "Attributes" not in write_res:
+                    dynamodb.add_submission_status_count(
+                        status_delta,
+                        db_record.s3_key,
+                        dynamodb.SubmissionStatus.TRANSFERRED,
+                    )
+                # Every upload counts towards the expected count set by data_transfer_manager
+                dynamodb.add_submission_status_count(
+                    status_delta,
+                    db_record.s3_key,
+                    dynamodb.SubmissionStatus.TRANSFER_RECEIVED,
+                )
 
                 # Send notification through batch_notification lambda
+                flush_submission_status_delta(status_delta)
                 util.call_lambda(
                     lambda_arn=BATCH_NOTIFICATION_LAMBDA,
                     payload={
@@ -155,12 +192,24 @@ def handler(event, context):
                     etag_table_name=DYNAMODB_ETAG_TABLE_NAME,
                     file_record=db_record,
                 )
+                dynamodb.add_submission_status_count(
+                    status_delta,
+                    db_record.s3_key,
+                    dynamodb.SubmissionStatus.TRANSFERRED,
+                    -1,
+                )
 
                 delete_manifest_file_record(
                     manifest_record_table_name=DYNAMODB_STORE_TABLE_NAME,
                     manifest_record_archive_table_name=DYNAMODB_ARCHIVE_STORE_TABLE_NAME,
                     db_record=db_record,
                 )
+                deleted_index_list = dynamodb.delete_study_id_index_from_s3_key(
+                    DYNAMODB_STORE_TABLE_NAME, db_record.sort_key
+                )
+                logger.info(
+                    f"Deleted {len(deleted_index_list)} study ID index record(s)"
+                )
 
             else:
                 logger.warning(
@@ -168,6 +217,16 @@ def handler(event, context):
                 )
 
         elif s3_record.bucket_name == RESULT_BUCKET:
+            # Profiles sampled by util.timing are not validation results
+            if s3_record.object_key.startswith(timing.PROFILE_KEY_PREFIX):
+                logger.info(f"Skipping profile object: {s3_record.object_key}")
+                continue
+
+            # Data sharing sync manifests are not validation results either
+            if s3_record.object_key.startswith(s3.SHARING_KEY_PREFIX):
+                logger.info(f"Skipping sharing object: {s3_record.object_key}")
+                continue
+
             # NOTE: Current S3 event configuration only send create object event
             if s3_record.event_type == s3.S3EventType.EVENT_OBJECT_CREATED:
 
@@ -184,7 +243,12 @@ def handler(event, context):
                     # There is a chance result is being replaced from the old one. Making sure result in dynamodb
                     # is cleared out before reading the new one
                     sort_key = s3_record.object_key.strip("__result.json")
-                    delete_status_and_data_from_result_table(sort_key)
+                    deleted_record_list = delete_status_and_data_from_result_table(
+                        sort_key
+                    )
+                    add_validation_outcome_count(
+                        status_delta, sort_key, deleted_record_list, -1
+                    )
 
                     # Reading new result
                     result_list = s3.get_object_from_bucket_name_and_s3_key(
@@ -239,12 +303,18 @@ def handler(event, context):
                     dynamodb.batch_write_records(
                         DYNAMODB_RESULT_TABLE_NAME, dynamodb_put_item_list
                     )
+                    add_validation_outcome_count(
+                        status_delta,
+                        sort_key,
+                        [record.__dict__ for record in dynamodb_put_item_list],
+                    )
                     dynamodb.batch_write_records(
                         DYNAMODB_ARCHIVE_RESULT_TABLE_NAME,
                         dynamodb_archive_put_item_list,
                     )
 
-                    # Send notification through batch_notification lambda
+                    # Send notification through batch_notification lambda, which reads the submission status
+                    flush_submission_status_delta(status_delta)
                     util.call_lambda(
                         lambda_arn=BATCH_NOTIFICATION_LAMBDA,
                         payload={
@@ -264,10 +334,14 @@ def handler(event, context):
                 if "__results.json" in s3_record.object_key:
                     sort_key = s3_record.object_key.strip("__result.json")
                     # Deleting
+                    # Result objects are removed by validation_manager ahead of a new run, which resets the
+                    # submission status itself. Not counting here keeps the removal event from racing the reset.
                     delete_status_and_data_from_result_table(sort_key)
         else:
             logger.warning(f"Unsupported AGHA bucket: {s3_record.bucket_name}")
 
+    flush_submission_status_delta(status_delta)
+
     return None
 
 
@@ -288,13 +362,15 @@ def write_standard_file_record(
     :param archive_file_record_table_name: The table name to write
     :param etag_table_name: The table name to write
     :param file_record: The File record class
-    :return:
+    :return: The put_item response of the file record table ('Attributes' is present if a record was replaced)
     """
     # Write to database
     logger.info(f"Updating records at {file_record_table_name}")
-    write_res = dynamodb.write_record_from_class(file_record_table_name, file_record)
+    file_record_write_res = dynamodb.write_record_from_class(
+        file_record_table_name, file_record
+    )
     logger.debug(f"Updating {file_record_table_name} table response:")
-    logger.debug(json.dumps(write_res, cls=util.DecimalEncoder))
+    logger.debug("%s", LazyJson(file_record_write_res))
 
     # Write Archive record
     db_record_archive = (
@@ -307,7 +383,7 @@ def write_standard_file_record(
         archive_file_record_table_name, db_record_archive
     )
     logger.debug(f"Updating {archive_file_record_table_name} table response:")
-    logger.debug(json.dumps(write_res, cls=util.DecimalEncoder))
+    logger.debug("%s", LazyJson(write_res))
 
     # Construct ETag record
     etag_record = dynamodb.ETagFileRecord(
@@ -318,9 +394,11 @@ def write_standard_file_record(
 
     # Updating ETag record
     logger.info(f"Updating ETag file to the ETag record")
-    write_res = dynamodb.write_record_from_class(etag_table_name, etag_record)
+    etag_write_res = dynamodb.write_record_from_class(etag_table_name, etag_record)
     logger.debug(f"Updating {etag_table_name} table response:")
-    logger.debug(json.dumps(write_res, cls=util.DecimalEncoder))
+    logger.debug("%s", LazyJson(etag_write_res))
+
+    return file_record_write_res
 
 
 def delete_standard_file_record(
@@ -348,7 +426,7 @@ def delete_standard_file_record(
     logger.info(
         f"Getting item to delete from {file_record_table_name}. Item to delete response:"
     )
-    logger.info(json.dumps(get_item_res, cls=util.DecimalEncoder))
+    logger.info("%s", LazyJson(get_item_res))
 
     # Delete FILE record
     delete_item = dynamodb.delete_record_from_record_class(
@@ -365,12 +443,12 @@ def delete_standard_file_record(
         )
     )
     logger.info(f"Updating records at {archive_file_record_table_name}. Archive table:")
-    logger.info(json.dumps(db_record_archive.__dict__, cls=util.DecimalEncoder))
+    logger.info("%s", LazyJson(db_record_archive.__dict__))
     write_res = dynamodb.write_record_from_class(
         archive_file_record_table_name, db_record_archive
     )
     logger.debug(f"Updating {archive_file_record_table_name} table response:")
-    logger.debug(json.dumps(write_res, cls=util.DecimalEncoder))
+    logger.debug("%s", LazyJson(write_res))
 
     if get_item_res["Count"] > 0:
         logger.debug("Existing record found")
@@ -389,7 +467,7 @@ def delete_standard_file_record(
             etag_table_name, etag_record
         )
         logger.info(f"Deleting from {etag_table_name}. Deleted records:")
-        logger.info(json.dumps(delete_item, cls=util.DecimalEncoder))
+        logger.info("%s", LazyJson(delete_item))
 
 
 def delete_manifest_file_record(
@@ -405,7 +483,7 @@ def delete_manifest_file_record(
     )
 
     logger.info(f"Get manifest record response:")
-    logger.info(json.dumps(manifest_res, cls=util.DecimalEncoder))
+    logger.info("%s", LazyJson(manifest_res))
 
     if manifest_res["Count"] == 1:
         logger.info(f'Deleting {manifest_res["Count"]} number of records')
@@ -421,21 +499,18 @@ def delete_manifest_file_record(
         logger.info(
             f"Delete the following record from {manifest_record_table_name} table."
         )
-        logger.info(json.dumps(delete_item, cls=util.DecimalEncoder))
+        logger.info("%s", LazyJson(delete_item))
 
         # Archive database
         db_record_archive = dynamodb.ArchiveManifestFileRecord.create_archive_manifest_record_from_manifest_record(
             manifest_record, s3.S3EventType.EVENT_OBJECT_REMOVED.value
         )
-        logger.info(f"Updating records at {manifest_record_archive_table_name}. Item:")
-        logger.info(
-            f"{json.dumps(manifest_record_archive_table_name, indent=4, cls=util.JsonSerialEncoder)}"
-        )
+        logger.info(f"Updating records at {manifest_record_archive_table_name}")
         write_res = dynamodb.write_record_from_class(
             manifest_record_archive_table_name, db_record_archive
         )
         logger.debug(f"Updating {manifest_record_archive_table_name} table response:")
-        logger.debug(json.dumps(write_res, indent=4, cls=util.JsonSerialEncoder))
+        logger.debug("%s", LazyJson(write_res))
 
 
 def delete_manifest_status_record(table_name, archive_table_name, db_record):
@@ -449,7 +524,7 @@ def delete_manifest_status_record(table_name, archive_table_name, db_record):
     )
 
     logger.info(f"Get manifest record response:")
-    logger.info(json.dumps(status_manifest_res, indent=4, cls=util.JsonSerialEncoder))
+    logger.info("%s", LazyJson(status_manifest_res))
 
     if status_manifest_res["Count"] == 1:
         # Delete from record
@@ -457,7 +532,7 @@ def delete_manifest_status_record(table_name, archive_table_name, db_record):
             table_name, status_manifest_res
         )
         logger.info(f"Delete the following record from {table_name} table")
-        logger.info(json.dumps(delete_item, cls=util.DecimalEncoder))
+        logger.info("%s", LazyJson(delete_item))
 
         # Archive database
         logger.info(f"Updating records at {archive_table_name}")
@@ -468,7 +543,7 @@ def delete_manifest_status_record(table_name, archive_table_name, db_record):
         )
         write_res = dynamodb.write_record_from_dict(archive_table_name, archive_dict)
         logger.debug(f"Updating {archive_table_name} table response:")
-        logger.debug(json.dumps(write_res, indent=4, cls=util.JsonSerialEncoder))
+        logger.debug("%s", LazyJson(write_res))
 
 
 def validate_batch_job_result(batch_result: dict):
@@ -553,7 +628,7 @@ def delete_status_and_data_from_result_table(sort_key: str):
     array_to_delete = find_status_and_data_record(sort_key)
     if array_to_delete:
         logger.info(f"Item to delete from dynamodb result table: ")
-        logger.info(json.dumps(array_to_delete, indent=4, cls=util.JsonSerialEncoder))
+        logger.info("%s", LazyJson(array_to_delete))
 
         dynamodb.batch_delete_from_dictionary(
             table_name=DYNAMODB_RESULT_TABLE_NAME, dictionary_list=array_to_delete
@@ -563,3 +638,40 @@ def delete_status_and_data_from_result_table(sort_key: str):
             object_list=array_to_delete,
             archive_log=s3.S3EventType.EVENT_OBJECT_REMOVED.value,
         )
+
+    return array_to_delete
+
+
+def flush_submission_status_delta(status_delta: dict):
+    dynamodb.update_submission_status_count_from_delta(
+        DYNAMODB_SUBMISSION_STATUS_TABLE_NAME, status_delta
+    )
+    status_delta.clear()
+
+
+def add_validation_outcome_count(
+    status_delta: dict, staging_s3_key: str, result_record_list: list, count: int = 1
+):
+    """
+    Count the staging file as passed if all of its STATUS records are PASS, failed otherwise. Nothing is counted
+    when there is no completed STATUS record (e.g. nothing was deleted, or the check is still RUNNING).
+    """
+    status_value_list = [
+        record.get("value")
+        for record in result_record_list
+        if record.get("partition_key", "").startswith(
+            dynamodb.ResultPartitionKey.STATUS.value
+        )
+    ]
+    if (
+        not status_value_list
+        or batch.StatusBatchResult.RUNNING.value in status_value_list
+    ):
+        return
+
+    if all(value == "PASS" for value in status_value_list):
+        status = dynamodb.SubmissionStatus.PASSED
+    else:
+        status = dynamodb.SubmissionStatus.FAILED
+
+    dynamodb.add_submission_status_count(status_delta, staging_s3_key, status, count)
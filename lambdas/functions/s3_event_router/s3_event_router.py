@@ -2,6 +2,7 @@ import os
 import logging
 import json
 import boto3
+from util.instrumentation import instrument_handler
 
 STAGING_BUCKET = os.environ.get("STAGING_BUCKET")
 MANIFEST_PROCESSOR_LAMBDA_ARN = os.environ.get("MANIFEST_PROCESSOR_LAMBDA_ARN")
@@ -21,6 +22,7 @@ def call_lambda(lambda_arn: str, payload: dict):
     return response
 
 
+@instrument_handler
 def handler(event, context):
     """
     Entry point for S3 event processing. An S3 event is essentially a dict with a list of S3 Records:
@@ -118,14 +120,15 @@ def handler(event, context):
 
         # Call folder lock lambda
 
-        # Create folder lock payload
-        for record in manifest_records:
-            s3key: str = record["s3"]["object"]["key"]
-
-            payload = {"task": "FOLDER_LOCK", "submission_prefix": s3key}
+        # Create folder lock payload, one call for all manifests in the event
+        folder_lock_list = [
+            {"task": "FOLDER_LOCK", "submission_prefix": record["s3"]["object"]["key"]}
+            for record in manifest_records
+        ]
+        payload = {"folder_lock_list": folder_lock_list}
 
-            folder_lock_response = call_lambda(FOLDER_LOCK_LAMBDA_ARN, payload)
-            logger.info(f"Folder Lock Lambda call response: {folder_lock_response}")
+        folder_lock_response = call_lambda(FOLDER_LOCK_LAMBDA_ARN, payload)
+        logger.info(f"Folder Lock Lambda call response: {folder_lock_response}")
 
         # Call validation lambda
         validation_response = call_lambda(
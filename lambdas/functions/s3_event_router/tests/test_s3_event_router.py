@@ -99,7 +99,9 @@ class S3EventRouterUnitTestCase(unittest.TestCase):
     def test_folder_lock_trigger_payload(self):
         """Testing the payload given to folder_lock lambda"""
         key = "flagship/date/manifest.txt"
-        expected_payload = {"task": "FOLDER_LOCK", "submission_prefix": key}
+        expected_payload = {
+            "folder_lock_list": [{"task": "FOLDER_LOCK", "submission_prefix": key}]
+        }
 
         event_payload = create_event_payload(
             event_name="ObjectCreated",
@@ -112,6 +114,36 @@ class S3EventRouterUnitTestCase(unittest.TestCase):
         self.assertTrue(ordered(expected_payload) == ordered(exception_raise))
         return
 
+    @mock.patch("s3_event_router.call_lambda")
+    def test_folder_lock_batched_per_event(self, mock_call_lambda):
+        """All manifests of one event are locked with a single folder_lock call"""
+        key_list = ["flagship/date1/manifest.txt", "flagship/date2/manifest.txt"]
+        event_payload = {"Records": []}
+        for key in key_list:
+            event_payload["Records"] += create_event_payload(
+                event_name="ObjectCreated",
+                bucket_name=os.environ.get("STAGING_BUCKET"),
+                s3_key=key,
+            )["Records"]
+
+        handler(event_payload, {})
+
+        folder_lock_call_list = [
+            c
+            for c in mock_call_lambda.call_args_list
+            if c.args[0] == os.environ["FOLDER_LOCK_LAMBDA_ARN"]
+        ]
+        self.assertEqual(len(folder_lock_call_list), 1)
+        self.assertEqual(
+            folder_lock_call_list[0].args[1],
+            {
+                "folder_lock_list": [
+                    {"task": "FOLDER_LOCK", "submission_prefix": key}
+                    for key in key_list
+                ]
+            },
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
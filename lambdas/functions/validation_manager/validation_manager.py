@@ -12,6 +12,9 @@ import util.notification as notification
 import util.s3 as s3
 import util.batch as batch
 import util.agha as agha
+import util.timing as timing
+from util.instrumentation import instrument_handler
+from util.log import LazyJson
 
 DYNAMODB_STAGING_TABLE_NAME = os.environ.get("DYNAMODB_STAGING_TABLE_NAME")
 DYNAMODB_ARCHIVE_STAGING_TABLE_NAME = os.environ.get(
@@ -21,6 +24,9 @@ DYNAMODB_RESULT_TABLE_NAME = os.environ.get("DYNAMODB_RESULT_TABLE_NAME")
 DYNAMODB_ARCHIVE_RESULT_TABLE_NAME = os.environ.get(
     "DYNAMODB_ARCHIVE_RESULT_TABLE_NAME"
 )
+DYNAMODB_SUBMISSION_STATUS_TABLE_NAME = os.environ.get(
+    "DYNAMODB_SUBMISSION_STATUS_TABLE_NAME"
+)
 STAGING_BUCKET = os.environ.get("STAGING_BUCKET")
 RESULTS_BUCKET = os.environ.get("RESULTS_BUCKET")
 
@@ -29,6 +35,8 @@ logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
+@instrument_handler
+@timing.trace_handler
 def handler(event, context):
     """
     The lambda is to invoke batch job with given event.
@@ -74,7 +82,10 @@ def handler(event, context):
     dynamodb_result_update = list()
 
     logger.info("Processing event at validation manager lambda:")
-    logger.info(json.dumps(event, indent=4))
+    logger.info("%s", LazyJson(event, max_items=None))
+
+    # Query results are only cached within a single invocation
+    dynamodb.clear_query_cache()
 
     # Parse event data and get record
     validate_event_data(event)
@@ -86,7 +97,7 @@ def handler(event, context):
     manifest_fp = event.get("manifest_fp")
     if manifest_fp is not None and "manifest_dynamodb_key_prefix" in event:
         submission_prefix = os.path.dirname(event["manifest_fp"])
-        manifest_record_dynamodb_staging = dynamodb.get_batch_item_from_pk_and_sk(
+        manifest_record_dynamodb_staging = dynamodb.get_cached_batch_item_from_pk_and_sk(
             table_name=DYNAMODB_STAGING_TABLE_NAME,
             partition_key=dynamodb.FileRecordPartitionKey.MANIFEST_FILE_RECORD.value,
             sort_key_prefix=submission_prefix,
@@ -115,162 +126,186 @@ def handler(event, context):
     # Process each record and prepare Batch commands
     batch_job_data = list()
 
-    file_record_dynamodb_staging = dynamodb.get_batch_item_from_pk_and_sk(
-        table_name=DYNAMODB_STAGING_TABLE_NAME,
-        partition_key=dynamodb.FileRecordPartitionKey.FILE_RECORD.value,
-        sort_key_prefix=data.submission_prefix,
-    )
-    file_record_dynamodb_df = pd.json_normalize(file_record_dynamodb_staging)
-
-    # Possibility of being fetched at above line, having if-condition to prevent re-fetch
-    if manifest_record_dynamodb_staging is None:
-        manifest_record_dynamodb_staging = dynamodb.get_batch_item_from_pk_and_sk(
+    with timing.span("query_staging_record"):
+        file_record_dynamodb_staging = dynamodb.get_cached_batch_item_from_pk_and_sk(
             table_name=DYNAMODB_STAGING_TABLE_NAME,
-            partition_key=dynamodb.FileRecordPartitionKey.MANIFEST_FILE_RECORD.value,
+            partition_key=dynamodb.FileRecordPartitionKey.FILE_RECORD.value,
             sort_key_prefix=data.submission_prefix,
         )
-        manifest_record_dynamodb_df = pd.json_normalize(
-            manifest_record_dynamodb_staging
-        )
-
-    for filename in data.filename_accepted:
-
-        # Get partition key and existing records
-        sort_key = f"{data.submission_prefix}/{filename}"
-
-        # Skipping exception validation defined in payload
-        if event.get("exception_postfix_filename") is not None:
-            postfix_exception_list = event.get("exception_postfix_filename")
-            if (
-                len(
-                    [
-                        filename
-                        for postfix in postfix_exception_list
-                        if filename.endswith(postfix)
-                    ]
-                )
-                > 0
-            ):
-                continue
-
-        # Find checksum file from file record
-        try:
-            manifest_record = util.get_record_from_given_field_and_panda_df(
-                panda_df=manifest_record_dynamodb_df,
-                fieldname_lookup="sort_key",
-                fieldvalue_lookup=sort_key,
+        file_record_dynamodb_df = pd.json_normalize(file_record_dynamodb_staging)
+
+        # Possibility of being fetched at above line, having if-condition to prevent re-fetch
+        if manifest_record_dynamodb_staging is None:
+            manifest_record_dynamodb_staging = dynamodb.get_cached_batch_item_from_pk_and_sk(
+                table_name=DYNAMODB_STAGING_TABLE_NAME,
+                partition_key=dynamodb.FileRecordPartitionKey.MANIFEST_FILE_RECORD.value,
+                sort_key_prefix=data.submission_prefix,
             )
-            provided_checksum = manifest_record["provided_checksum"]
-        except:
-            message = (
-                f"No or more than one manifest record found for '{sort_key}'. Aborting!"
+            manifest_record_dynamodb_df = pd.json_normalize(
+                manifest_record_dynamodb_staging
             )
-            logger.error(message)
-            raise Exception
 
-        # Replace tasks with those specified by user if available
-        if event.get("tasks") is None:
-            tasks_list = batch.get_tasks_list(filename)
-        else:
-            tasks_list = event.get("tasks")
+    with timing.span(
+        "prepare_batch_job", file=len(data.filename_accepted)
+    ) as prepare_span:
+        for filename in data.filename_accepted:
+
+            # Get partition key and existing records
+            sort_key = f"{data.submission_prefix}/{filename}"
+
+            # Skipping exception validation defined in payload
+            if event.get("exception_postfix_filename") is not None:
+                postfix_exception_list = event.get("exception_postfix_filename")
+                if (
+                    len(
+                        [
+                            filename
+                            for postfix in postfix_exception_list
+                            if filename.endswith(postfix)
+                        ]
+                    )
+                    > 0
+                ):
+                    continue
+
+            # Find checksum file from file record
+            try:
+                manifest_record = util.get_record_from_given_field_and_panda_df(
+                    panda_df=manifest_record_dynamodb_df,
+                    fieldname_lookup="sort_key",
+                    fieldvalue_lookup=sort_key,
+                )
+                provided_checksum = manifest_record["provided_checksum"]
+            except:
+                message = f"No or more than one manifest record found for '{sort_key}'. Aborting!"
+                logger.error(message)
+                raise Exception
+
+            # Replace tasks with those specified by user if available
+            if event.get("tasks") is None:
+                tasks_list = batch.get_tasks_list(filename)
+            else:
+                tasks_list = event.get("tasks")
 
-        if event.get("tasks_skipped") is not None:
-            tasks_list = list(set(tasks_list) - set(event.get("tasks_skipped")))
+            if event.get("tasks_skipped") is not None:
+                tasks_list = list(set(tasks_list) - set(event.get("tasks_skipped")))
 
-        # Find size file from file record
-        try:
-            file_record = util.get_record_from_given_field_and_panda_df(
-                panda_df=file_record_dynamodb_df,
-                fieldname_lookup="sort_key",
-                fieldvalue_lookup=sort_key,
-            )
-            filesize = int(file_record["size_in_bytes"])
-        except:
-            message = (
-                f"No or more than one file record found for '{sort_key}'. Aborting!"
+            # Find size file from file record
+            try:
+                file_record = util.get_record_from_given_field_and_panda_df(
+                    panda_df=file_record_dynamodb_df,
+                    fieldname_lookup="sort_key",
+                    fieldvalue_lookup=sort_key,
+                )
+                filesize = int(file_record["size_in_bytes"])
+            except:
+                message = (
+                    f"No or more than one file record found for '{sort_key}'. Aborting!"
+                )
+                logger.error(message)
+                raise Exception
+
+            # Create job data
+            logger.debug(f"Creating batch job for, s3_key:{sort_key}")
+            job_data = batch.create_job_data(
+                s3_key=sort_key,
+                partition_key=dynamodb.ResultPartitionKey.FILE.value,
+                checksum=provided_checksum,
+                tasks_list=tasks_list,
+                output_prefix=data.output_prefix,
+                filesize=filesize,
             )
-            logger.error(message)
-            raise Exception
-
-        # Create job data
-        logger.debug(f"Creating batch job for, s3_key:{sort_key}")
-        job_data = batch.create_job_data(
-            s3_key=sort_key,
-            partition_key=dynamodb.ResultPartitionKey.FILE.value,
-            checksum=provided_checksum,
-            tasks_list=tasks_list,
-            output_prefix=data.output_prefix,
-            filesize=filesize,
-        )
-
-        batch_job_data.append(job_data)
 
-        # Create dydb record
-        for task_type in tasks_list:
-            # STATUS record
-            partition_key = (
-                dynamodb.ResultPartitionKey.create_partition_key_with_result_prefix(
-                    data_type=dynamodb.ResultPartitionKey.STATUS.value,
-                    check_type=task_type,
+            batch_job_data.append(job_data)
+            prepare_span.add_count("job")
+
+            # Create dydb record
+            for task_type in tasks_list:
+                # STATUS record
+                partition_key = (
+                    dynamodb.ResultPartitionKey.create_partition_key_with_result_prefix(
+                        data_type=dynamodb.ResultPartitionKey.STATUS.value,
+                        check_type=task_type,
+                    )
                 )
-            )
-            running_status = dynamodb.ResultRecord(
-                sort_key=sort_key,
-                partition_key=partition_key,
-                value=batch.StatusBatchResult.RUNNING.value,
-            )
-            dynamodb_result_update.append(running_status)
+                running_status = dynamodb.ResultRecord(
+                    sort_key=sort_key,
+                    partition_key=partition_key,
+                    value=batch.StatusBatchResult.RUNNING.value,
+                )
+                dynamodb_result_update.append(running_status)
 
     # Clear result objects in the Result bucket if exists. (To prevent mix results between old and new validations)
     logger.info(
         "Check results bucket if any object need to be deleted to prevent validation result overlap."
     )
-    try:
-        existing_object_metadata_results = s3.get_s3_object_metadata(
-            bucket_name=RESULTS_BUCKET, directory_prefix=f"{data.submission_prefix}/"
-        )
-        list_of_keys = [
-            metadata["Key"] for metadata in existing_object_metadata_results
-        ]
-        logger.info(
-            f"List of keys to be deleted in results bucket: {json.dumps(list_of_keys, indent=4, cls=util.JsonSerialEncoder)}"
-        )
-        s3.delete_s3_object_from_key(bucket_name=RESULTS_BUCKET, key_list=list_of_keys)
-    except ValueError:
-        logger.info(f"No existing results found in '{RESULTS_BUCKET}' bucket.")
+    with timing.span("clear_result_object") as clear_span:
+        try:
+            existing_object_metadata_results = s3.get_s3_object_metadata(
+                bucket_name=RESULTS_BUCKET,
+                directory_prefix=f"{data.submission_prefix}/",
+            )
+            list_of_keys = [
+                metadata["Key"] for metadata in existing_object_metadata_results
+            ]
+            clear_span.set_count("object", len(list_of_keys))
+            logger.info(
+                "List of keys to be deleted in results bucket: %s",
+                LazyJson(list_of_keys),
+            )
+            s3.delete_s3_object_from_key(
+                bucket_name=RESULTS_BUCKET, key_list=list_of_keys
+            )
+        except ValueError:
+            logger.info(f"No existing results found in '{RESULTS_BUCKET}' bucket.")
 
     # Update status of dynamodb to RUNNING (To flush dydb if previous result is in dynamodb)
     # Executed before batch submitted, in case submitting batch from lambda takes time and the first job submitted
     # has completed, it will override with RUNNING status
     if not event.get("skip_update_dynamodb") == "true":
-        dynamodb.batch_write_records(
-            table_name=DYNAMODB_RESULT_TABLE_NAME, records=dynamodb_result_update
-        )
-        dynamodb.batch_write_record_archive(
-            table_name=DYNAMODB_ARCHIVE_RESULT_TABLE_NAME,
-            records=dynamodb_result_update,
-            archive_log="ObjectCreated",
-        )
+        with timing.span("update_dynamodb", write=len(dynamodb_result_update)):
+            dynamodb.batch_write_records(
+                table_name=DYNAMODB_RESULT_TABLE_NAME, records=dynamodb_result_update
+            )
+            dynamodb.batch_write_record_archive(
+                table_name=DYNAMODB_ARCHIVE_RESULT_TABLE_NAME,
+                records=dynamodb_result_update,
+                archive_log="ObjectCreated",
+            )
+
+    # A new validation run, results of the previous run no longer count
+    dynamodb.set_submission_status(
+        table_name=DYNAMODB_SUBMISSION_STATUS_TABLE_NAME,
+        submission_prefix=f"{data.submission_prefix}/",
+        count_by_status={
+            dynamodb.SubmissionStatus.VALIDATING.value: len(batch_job_data),
+            dynamodb.SubmissionStatus.PASSED.value: 0,
+            dynamodb.SubmissionStatus.FAILED.value: 0,
+        },
+    )
 
     # Submit Batch jobs
     logger.info(
         f"Submitting batch job to queue. batch job data list ({len(batch_job_data)}):"
     )
-    logger.info(json.dumps(batch_job_data))
-    for i, job_data in enumerate(batch_job_data):
-        # Submit job to batch
-        batch_res = batch.submit_batch_job(job_data)
-
-        # Sleep for 1 second every 8th job
-        # This is to prevent AWS Batch SubmitJob throttling limit of 50 jobs per second
-        # Putting (50/6=) 8 here as it is shared across 3 reserved concurrency limit, and
-        # 2 lambda function (transfer-manager and validation-manager)
-        # Without sleep, the average of submitting jobs is about 13 jobs per second
-        # https://docs.aws.amazon.com/batch/latest/userguide/service_limits.html
-        if (i + 1) % 8 == 0:
-            time.sleep(1)
+    logger.info("%s", LazyJson(batch_job_data))
+    with timing.span("submit_batch_job", job=len(batch_job_data)) as submit_span:
+        for i, job_data in enumerate(batch_job_data):
+            # Submit job to batch
+            batch_res = batch.submit_batch_job(job_data)
+
+            # Sleep for 1 second every 8th job
+            # This is to prevent AWS Batch SubmitJob throttling limit of 50 jobs per second
+            # Putting (50/6=) 8 here as it is shared across 3 reserved concurrency limit, and
+            # 2 lambda function (transfer-manager and validation-manager)
+            # Without sleep, the average of submitting jobs is about 13 jobs per second
+            # https://docs.aws.amazon.com/batch/latest/userguide/service_limits.html
+            if (i + 1) % 8 == 0:
+                time.sleep(1)
+                submit_span.add_count("throttle_sleep")
 
     logger.info("Batch job has been submitted.")
+    logger.info(f"DynamoDB query cache stats: {dynamodb.get_query_cache_stats()}")
 
 
 ################################################################
@@ -402,7 +437,7 @@ def handle_input_manifest(data: submission_data.SubmissionData, event, file_list
     )
 
     logger.info(f"File list to process:")
-    logger.info(json.dumps(files_included, indent=4, cls=util.JsonSerialEncoder))
+    logger.info("%s", LazyJson(files_included))
 
     # Create file records
     # data.output_prefix = s3.get_output_prefix(data.submission_prefix)
@@ -9,6 +9,12 @@ import datetime
 import boto3
 import pytz
 
+from .cache import TTLCache
+from . import serialization
+
+# Register AWS API call instrumentation before any client is created
+from . import instrumentation
+
 LOGGER = logging.getLogger(__name__)
 LOGGER.setLevel(logging.INFO)
 
@@ -18,6 +24,11 @@ FEXT_CRAM = {".cram"}
 FEXT_VCF = {".vcf.gz", ".gvcf.gz"}
 FEXT_ACCEPTED = {*FEXT_FASTQ, *FEXT_BAM, *FEXT_CRAM, *FEXT_VCF}
 
+# SSM parameters are cached across warm invocation to avoid decrypting on each call
+SSM_PARAMETER_CACHE = TTLCache(
+    maxsize=32, ttl=int(os.environ.get("SSM_PARAMETER_CACHE_TTL", 300))
+)
+
 MELBOURNE_TZ = "Australia/Melbourne"  # Options: `print(pytz.all_timezones)`
 TIME_ZONE = pytz.timezone(MELBOURNE_TZ)
 
@@ -94,6 +105,16 @@ def get_ssm_parameter(name, ssm_client, with_decryption=False):
     return response["Parameter"]["Value"]
 
 
+def get_ssm_parameter_cached(name, ssm_client, with_decryption=False):
+    """
+    Same as get_ssm_parameter, but the value is kept in SSM_PARAMETER_CACHE until the TTL expires.
+    """
+    return SSM_PARAMETER_CACHE.get_or_set(
+        (name, with_decryption),
+        lambda: get_ssm_parameter(name, ssm_client, with_decryption=with_decryption),
+    )
+
+
 def get_s3_object_metadata(bucket, prefix, client_s3):
     results = list()
     response = client_s3.list_objects_v2(Bucket=bucket, Prefix=prefix)
@@ -146,40 +167,23 @@ def execute_command(command):
     return process_result
 
 
-class JsonSerialEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, decimal.Decimal):
-            return str(o)
+# NOTE: The encoders below are kept for `json.dumps(..., cls=...)` callers. New code should use
+# serialization.dumps, which has the same output and uses orjson when available.
 
-        if isinstance(o, (datetime.datetime, datetime.date)):
-            return o.isoformat()
 
-        return super(JsonSerialEncoder, self).default(o)
-
-
-# TODO: Replace DecimalEncoder and json_serial (below) with the JsonSerialEncoder class (above)
-
-
-class DecimalEncoder(json.JSONEncoder):
+class JsonSerialEncoder(json.JSONEncoder):
     def default(self, o):
-        if isinstance(o, decimal.Decimal):
-            return str(o)
-        return super(DecimalEncoder, self).default(o)
-
-
-def json_serial(obj):
-    """JSON serializer for objects not serializable by default json code"""
+        return serialization.json_default(o)
 
-    if isinstance(obj, (datetime.datetime, datetime.date)):
-        return obj.isoformat()
 
-    raise TypeError("Type %s not serializable" % type(obj))
+# DecimalEncoder and json_serial share the JsonSerialEncoder conversion
+DecimalEncoder = JsonSerialEncoder
+json_serial = serialization.json_default
 
 
 def replace_record_decimal_object(record):
     for k in record:
-        if isinstance(record[k], decimal.Decimal):
-            record[k] = int(record[k]) if record[k] % 1 == 0 else float(record[k])
+        record[k] = serialization.normalise_decimal(record[k])
     return record
 
 
@@ -193,6 +197,8 @@ def get_record_from_given_field_and_panda_df(
 def call_lambda(lambda_arn: str, payload: dict):
     lambda_client = boto3.client("lambda")
     response = lambda_client.invoke(
-        FunctionName=lambda_arn, InvocationType="Event", Payload=json.dumps(payload)
+        FunctionName=lambda_arn,
+        InvocationType="Event",
+        Payload=serialization.dumps(payload),
     )
     return response
@@ -70,17 +70,43 @@ class FlagShip(Enum):
         return self.value[2:]
 
     @staticmethod
-    def from_name(name: str) -> "FlagShip":
-        for fs in FlagShip:
-            if name in fs.value:
-                return fs
-        return FlagShip.UNKNOWN
+    def from_name(name: str, case_insensitive: bool = False) -> "FlagShip":
+        if case_insensitive:
+            return FLAGSHIP_ALIAS_LOOKUP_CASEFOLD.get(
+                str(name).casefold(), FlagShip.UNKNOWN
+            )
+        return FLAGSHIP_ALIAS_LOOKUP.get(name, FlagShip.UNKNOWN)
+
+    @staticmethod
+    def from_names(names, case_insensitive: bool = False):
+        """
+        Map a pandas Series of flagship names/prefixes to FlagShip members in one call.
+        Each distinct name is only resolved once.
+        :param names: pandas Series of names
+        :param case_insensitive: match names regardless of case
+        :return: pandas Series of FlagShip
+        """
+        lookup = {
+            name: FlagShip.from_name(name, case_insensitive=case_insensitive)
+            for name in names.unique()
+        }
+        return names.map(lookup)
 
     @staticmethod
     def list_flagship_enum() -> List:
         return [flagship.preferred_code() for flagship in FlagShip]
 
 
+# Alias lookup tables built once at import, so FlagShip.from_name does not iterate every member.
+# The first flagship declaring a name wins, as with the previous linear search.
+FLAGSHIP_ALIAS_LOOKUP = dict()
+FLAGSHIP_ALIAS_LOOKUP_CASEFOLD = dict()
+for _flagship in FlagShip:
+    for _name in _flagship.value:
+        FLAGSHIP_ALIAS_LOOKUP.setdefault(_name, _flagship)
+        FLAGSHIP_ALIAS_LOOKUP_CASEFOLD.setdefault(_name.casefold(), _flagship)
+
+
 FEXT_FASTQ = [".fq", ".fq.gz", ".fastq", ".fastq.gz"]
 FEXT_BAM = [".bam"]
 FEXT_BAM_INDEX = [".bai"]
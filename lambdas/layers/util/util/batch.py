@@ -8,7 +8,7 @@ import json
 from boto3.dynamodb.conditions import Attr
 
 import util
-from util import agha, dynamodb, s3, submission_data
+from util import agha, dynamodb, s3, submission_data, manifest_diff
 
 JOB_NAME_RE = re.compile(r"[.\\/]")
 
@@ -209,7 +209,7 @@ def run_status_result_check(submission_directory: str, exception_list=None) -> l
         )
         filter_key = Attr("value").ne("PASS")  # Not equal to PASS
 
-        fail_dydb_list = dynamodb.get_batch_item_from_pk_and_sk(
+        fail_dydb_list = dynamodb.get_cached_batch_item_from_pk_and_sk(
             table_name=DYNAMODB_RESULT_TABLE_NAME,
             partition_key=partition_key_to_search,
             sort_key_prefix=submission_directory,
@@ -229,19 +229,34 @@ def run_status_result_check(submission_directory: str, exception_list=None) -> l
     return list(set_fail_s3_key)
 
 
-def run_batch_check(staging_directory_prefix: str, exception_list=None) -> list:
+def run_batch_check(
+    staging_directory_prefix: str, exception_list=None, s3_list: list = None
+) -> list:
     """
     This function is to check if all batch job has been run successfully. The function will check if non-index file
     in s3 staging bucket has a result generated by batch job in the result bucket.
 
     param staging_directory_prefix: s3 key to the staging bucket
     exception_list: files to exclude from the check
+    s3_list: Staging object metadata of the directory, if already listed by the caller
     :return:
     """
 
-    s3_list = s3.get_s3_object_metadata(
-        bucket_name=STAGING_BUCKET, directory_prefix=staging_directory_prefix
-    )
+    if s3_list is None:
+        s3_list = s3.get_s3_object_metadata(
+            bucket_name=STAGING_BUCKET, directory_prefix=staging_directory_prefix
+        )
+
+    # Result FILE records of the whole directory in one query, rather than one per file
+    result_sort_key_set = {
+        item["sort_key"]
+        for item in dynamodb.get_batch_item_from_pk_and_sk(
+            table_name=DYNAMODB_RESULT_TABLE_NAME,
+            partition_key=dynamodb.FileRecordPartitionKey.FILE_RECORD.value,
+            sort_key_prefix=staging_directory_prefix,
+            projection_expr="sort_key",
+        )
+    }
 
     if exception_list is None:
         exception_list = []
@@ -269,20 +284,17 @@ def run_batch_check(staging_directory_prefix: str, exception_list=None) -> list:
 
         # Check if validation had succeeded via dynamodb
         sort_key = s3_key + "__results.json"
-        dy_res = dynamodb.get_item_from_exact_pk_and_sk(
-            table_name=DYNAMODB_RESULT_TABLE_NAME,
-            partition_key=dynamodb.FileRecordPartitionKey.FILE_RECORD.value,
-            sort_key=sort_key,
-        )
 
-        if dy_res["Count"] < 1:
+        if sort_key not in result_sort_key_set:
             # Means no data generated for s3 key
             fail_batch_job_key.append(s3_key)
 
     return fail_batch_job_key
 
 
-def run_manifest_orig_store_check(submission_prefix: str):
+def run_manifest_orig_store_check(
+    submission_prefix: str, store_table_name: str = None
+) -> list:
     """
     To check if manifest.orig match up with manifest match with list of file in store bucket.
     Will return any missing file from store bucket.
@@ -290,6 +302,7 @@ def run_manifest_orig_store_check(submission_prefix: str):
     {
         "submission_prefix": "AC/2022-02-22"
     }
+    :param store_table_name: When given, the store FILE records of this table are used instead of listing the bucket
     """
 
     manifest_orig_key = submission_prefix + "manifest.orig"
@@ -298,40 +311,16 @@ def run_manifest_orig_store_check(submission_prefix: str):
         bucket_name=STORE_BUCKET, manifest_key=manifest_orig_key
     )
 
-    manifest_orig_filename_list = manifest_orig_pd["filename"].tolist()
-
-    # Grab for filename from 'manifest.orig' that should exist in the bucket
-    manifest_orig_filename_to_check = []
-    for manifest_orig_filename in manifest_orig_filename_list:
-
-        if submission_data.is_file_skipped(manifest_orig_filename):
-            continue
-        else:
-            manifest_orig_filename_to_check.append(manifest_orig_filename)
-
-    # Grab s3_key exist in store bucket
-    store_metadata_list = s3.get_s3_object_metadata(
-        bucket_name=STORE_BUCKET, directory_prefix=submission_prefix
-    )
-    store_filename_list = [
-        metadata["Key"].split("/")[-1] for metadata in store_metadata_list
-    ]
+    if store_table_name:
+        store_key_list = manifest_diff.list_store_key_from_dynamodb(
+            table_name=store_table_name, submission_prefix=submission_prefix
+        )
+    else:
+        store_key_list = manifest_diff.list_store_key_from_s3(
+            bucket_name=STORE_BUCKET, submission_prefix=submission_prefix
+        )
 
-    # Comparing files in the manifest.orig but not in the manifest store
-    manifest_orig_diff_store = list(
-        set(manifest_orig_filename_list) - set(store_filename_list)
+    return manifest_diff.find_missing_manifest_file(
+        manifest_filename_list=manifest_orig_pd["filename"].tolist(),
+        store_key_list=store_key_list,
     )
-
-    # Checking file that could be altered and only the altered file is being stored (e.g. uncompressed file)
-    uncompress_file = []
-    for filename in manifest_orig_diff_store:
-        if (
-            agha.FileType.is_compressable_file(filename)
-            and not agha.FileType.is_compress_file(filename)
-            and f"{filename}.gz" in store_filename_list
-        ):
-            uncompress_file.append(filename)
-
-    missing_file = list(set(manifest_orig_diff_store) - set(uncompress_file))
-
-    return missing_file
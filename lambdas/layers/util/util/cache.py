@@ -0,0 +1,66 @@
+import collections
+import threading
+import time
+
+
+class TTLCache:
+    """
+    Size-bounded LRU cache where each entry expires after `ttl` seconds.
+    Meant to be declared at module level so it survives across warm lambda invocations.
+    - maxsize: Number of entries kept before the least recently used entry is evicted
+    - ttl: Number of seconds an entry is valid since it was set
+    """
+
+    def __init__(self, maxsize=128, ttl=300, timer=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.hit = 0
+        self.miss = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] <= self.timer():
+                if entry is not None:
+                    del self._data[key]
+                self.miss += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hit += 1
+            return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, self.timer() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key, func):
+        """
+        Return the cached value of the key, otherwise call func() and cache its result.
+        """
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = func()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        return {"hit": self.hit, "miss": self.miss, "size": len(self._data)}
+
+    def __len__(self):
+        return len(self._data)
@@ -1,8 +1,14 @@
 import json
 import os.path
 import logging
+import threading
 import boto3
-from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.conditions import (
+    Attr,
+    Key,
+    ConditionBase,
+    ConditionExpressionBuilder,
+)
 
 from .agha import FileType
 import util
@@ -13,6 +19,13 @@ logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 DYNAMODB_RESOURCE = ""
+# boto3 resources are not thread safe, worker threads get their own resource
+THREAD_LOCAL = threading.local()
+
+# Request-scoped read-through cache for query results. Lambda containers are reused across invocation, so
+# the handler is expected to call clear_query_cache() at the start of each invocation.
+QUERY_CACHE = {}
+QUERY_CACHE_STATS = {"hit": 0, "miss": 0}
 
 
 ########################################################################################################################
@@ -81,6 +94,7 @@ class FileRecordPartitionKey(Enum):
     FILE_RECORD = "TYPE:FILE"
     MANIFEST_FILE_RECORD = "TYPE:MANIFEST"
     STATUS_MANIFEST = "STATUS:MANIFEST"
+    STUDY_ID_INDEX = "TYPE:STUDY_ID_INDEX"
 
     def __str__(self):
         return self.value
@@ -334,6 +348,92 @@ class ArchiveManifestFileRecord(ManifestFileRecord):
         )
 
 
+def get_submission_status_with_pending_transfer(table_name: str) -> list:
+    """
+    Status record of every submission with fewer store uploads than the latest data transfer expects. The table only
+    holds one small record per submission, so it is scanned.
+    """
+    if not table_name:
+        return []
+
+    table = get_resource().Table(table_name)
+    scan_kwargs = {
+        "FilterExpression": Attr(SubmissionStatus.TRANSFER_EXPECTED.value).gt(0)
+    }
+    record_list = []
+    while True:
+        response = table.scan(**scan_kwargs)
+        record_list.extend(
+            record
+            for record in response.get("Items", [])
+            if SubmissionStatusRecord.is_transfer_pending(record)
+        )
+        if "LastEvaluatedKey" not in response:
+            return record_list
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+########################################################################################################################
+# Study ID index (agha-gdr-store-bucket)
+
+# A manifest row may list more than one study ID (e.g. 'A1234567,A1234568'). A GSI can only index one value per item,
+# so every MANIFEST record has one StudyIdIndexRecord per study ID, and only these records carry the GSI partition
+# attribute (i.e. a sparse index).
+# partition_key: TYPE:STUDY_ID_INDEX
+# sort_key: <s3_key>#<study_id>
+
+AGHA_STUDY_ID_INDEX_NAME = "agha_study_id_index"
+STUDY_ID_INDEX_SEPARATOR = "#"
+# Attribute copied from the MANIFEST record into the index record (the GSI projects all attributes)
+STUDY_ID_INDEX_ATTRIBUTE_LIST = [
+    ManifestFileRecordAttribute.FLAGSHIP.value,
+    ManifestFileRecordAttribute.FILENAME.value,
+    ManifestFileRecordAttribute.FILETYPE.value,
+    ManifestFileRecordAttribute.SUBMISSION.value,
+    ManifestFileRecordAttribute.PROVIDED_CHECKSUM.value,
+    ManifestFileRecordAttribute.AGHA_STUDY_ID.value,
+]
+
+
+def split_agha_study_id(agha_study_id) -> list:
+    """
+    'A1234567, A1234568' -> ['A1234567', 'A1234568']
+    """
+    return [i.strip() for i in str(agha_study_id or "").split(",") if i.strip()]
+
+
+class StudyIdIndexRecord:
+    """
+    - index_agha_study_id: GSI partition key, a single study ID
+    - s3_key: GSI sort key, the sort_key of the MANIFEST record
+    """
+
+    @staticmethod
+    def create_sort_key(s3_key: str, agha_study_id: str) -> str:
+        return f"{s3_key}{STUDY_ID_INDEX_SEPARATOR}{agha_study_id}"
+
+    @staticmethod
+    def create_record_list_from_manifest_record(manifest_record: dict) -> list:
+        s3_key = manifest_record["sort_key"]
+
+        record_list = []
+        for agha_study_id in dict.fromkeys(
+            split_agha_study_id(manifest_record.get("agha_study_id"))
+        ):
+            record = {
+                "partition_key": FileRecordPartitionKey.STUDY_ID_INDEX.value,
+                "sort_key": StudyIdIndexRecord.create_sort_key(s3_key, agha_study_id),
+                "index_agha_study_id": agha_study_id,
+                "s3_key": s3_key,
+                "date_modified": util.get_datetimestamp(),
+            }
+            for attribute in STUDY_ID_INDEX_ATTRIBUTE_LIST:
+                if attribute in manifest_record:
+                    record[attribute] = manifest_record[attribute]
+            record_list.append(record)
+        return record_list
+
+
 ########################################################################################################################
 # Table: agha-gdr-result-bucket, agha-gdr-result-bucket-archive
 
@@ -406,6 +506,101 @@ class ArchiveResultRecord(ResultRecord):
         )
 
 
+########################################################################################################################
+# Table: agha-gdr-submission-status
+
+# One record per submission holding a count of files at each pipeline stage. The record is maintained by the
+# pipeline itself (s3_event_recorder, validation_manager, cleanup_manager) so the state of a submission can be read
+# with a single GetItem instead of scanning the staging/result/store tables.
+
+
+class SubmissionStatus(Enum):
+    UPLOADED = "uploaded"
+    VALIDATING = "validating"
+    PASSED = "passed"
+    FAILED = "failed"
+    TRANSFERRED = "transferred"
+    CLEANED = "cleaned"
+    TRANSFER_EXPECTED = "transfer_expected"
+    TRANSFER_RECEIVED = "transfer_received"
+
+    def __str__(self):
+        return self.value
+
+    @staticmethod
+    def to_list():
+        return [status.value for status in SubmissionStatus]
+
+
+# Files that are not part of the submission data and therefore not counted
+SUBMISSION_STATUS_IGNORED_FILENAME = ["manifest.txt", "manifest.orig", "README.txt"]
+
+
+class SubmissionStatusRecord:
+    """
+    partition_key: The flagship code (e.g. 'AC')
+    sort_key: The submission prefix with a trailing slash (e.g. 'AC/2022-02-02/')
+    uploaded: Number of data files currently in the staging bucket
+    validating: Number of files submitted to the latest validation run
+    passed/failed: Number of files with all checks passed, or at least one check failed, from the latest run
+    transferred: Number of data files currently in the store bucket
+    cleaned: Number of files removed from staging by the cleanup manager
+    transfer_expected: Number of data files the latest data transfer will write to the store bucket
+    transfer_received: Number of store upload events (including overwrite) since the latest data transfer started
+    """
+
+    def __init__(self, submission_prefix="", date_modified="", **status_count):
+        self.partition_key = submission_prefix.split("/")[0]
+        self.sort_key = submission_prefix
+        self.date_modified = date_modified
+        for status in SubmissionStatus.to_list():
+            setattr(self, status, status_count.get(status, 0))
+
+    @staticmethod
+    def create_submission_prefix_from_s3_key(s3_key: str) -> str:
+        return os.path.dirname(s3_key).strip("/") + "/"
+
+    @staticmethod
+    def is_counted_s3_key(s3_key: str) -> bool:
+        return os.path.basename(s3_key) not in SUBMISSION_STATUS_IGNORED_FILENAME
+
+    @staticmethod
+    def is_validation_complete(record: dict) -> bool:
+        validating = int(record.get(SubmissionStatus.VALIDATING.value, 0))
+        passed = int(record.get(SubmissionStatus.PASSED.value, 0))
+        failed = int(record.get(SubmissionStatus.FAILED.value, 0))
+        return validating > 0 and passed + failed >= validating
+
+    @staticmethod
+    def is_validation_in_progress(record: dict, min_outstanding: int = 1) -> bool:
+        """
+        True only when the counters are present and tell at least min_outstanding validation results are still to
+        come. Missing counters are left to the full check.
+        """
+        validating = int(record.get(SubmissionStatus.VALIDATING.value, 0))
+        passed = int(record.get(SubmissionStatus.PASSED.value, 0))
+        failed = int(record.get(SubmissionStatus.FAILED.value, 0))
+        return validating > 0 and validating - (passed + failed) >= min_outstanding
+
+    @staticmethod
+    def is_validation_passed(record: dict) -> bool:
+        return SubmissionStatusRecord.is_validation_complete(record) and (
+            int(record.get(SubmissionStatus.FAILED.value, 0)) == 0
+        )
+
+    @staticmethod
+    def is_transfer_complete(record: dict) -> bool:
+        expected = int(record.get(SubmissionStatus.TRANSFER_EXPECTED.value, 0))
+        received = int(record.get(SubmissionStatus.TRANSFER_RECEIVED.value, 0))
+        return expected > 0 and received >= expected
+
+    @staticmethod
+    def is_transfer_pending(record: dict) -> bool:
+        expected = int(record.get(SubmissionStatus.TRANSFER_EXPECTED.value, 0))
+        received = int(record.get(SubmissionStatus.TRANSFER_RECEIVED.value, 0))
+        return expected > 0 and received < expected
+
+
 ########################################################################################################################
 # The following will contain function related to boto3 DynamoDB API
 
@@ -435,17 +630,27 @@ def find_s3_metadata_from_s3_metadata_list_by_filename(filename, array):
     raise ValueError("No metadata data found at S3")
 
 
+def create_resource(session=boto3):
+    if os.getenv("AWS_ENDPOINT"):
+        return session.resource(
+            service_name="dynamodb", endpoint_url=os.getenv("AWS_ENDPOINT")
+        )
+    else:
+        return session.resource(service_name="dynamodb")
+
+
 def get_resource():
     global DYNAMODB_RESOURCE
+    if threading.current_thread() is not threading.main_thread():
+        # The default session is not thread safe either, hence a session per thread
+        if not getattr(THREAD_LOCAL, "resource", None):
+            THREAD_LOCAL.resource = create_resource(boto3.session.Session())
+        return THREAD_LOCAL.resource
+
     if DYNAMODB_RESOURCE:
         return DYNAMODB_RESOURCE
     else:
-        if os.getenv("AWS_ENDPOINT"):
-            DYNAMODB_RESOURCE = boto3.resource(
-                service_name="dynamodb", endpoint_url=os.getenv("AWS_ENDPOINT")
-            )
-        else:
-            DYNAMODB_RESOURCE = boto3.resource(service_name="dynamodb")
+        DYNAMODB_RESOURCE = create_resource()
         return DYNAMODB_RESOURCE
 
 
@@ -458,6 +663,7 @@ def delete_record_from_record_class(table_name: str, record):
     :return:
     """
 
+    invalidate_query_cache(table_name)
     ddb = get_resource()
     tbl = ddb.Table(table_name)
 
@@ -484,6 +690,7 @@ def delete_record_from_dictionary(table_name: str, dictionary: dict):
     :return:
     """
 
+    invalidate_query_cache(table_name)
     ddb = get_resource()
     tbl = ddb.Table(table_name)
 
@@ -505,6 +712,7 @@ def delete_record_from_dictionary(table_name: str, dictionary: dict):
 
 
 def batch_delete_from_dictionary(table_name: str, dictionary_list: list):
+    invalidate_query_cache(table_name)
     tbl = get_resource().Table(table_name)
     with tbl.batch_writer() as batch:
         for record in dictionary_list:
@@ -518,6 +726,8 @@ def batch_delete_from_dictionary(table_name: str, dictionary_list: list):
 def write_main_and_archive_record_from_class(
     main_table_name: str, archive_table_name: str, record_class, archive_log: str
 ):
+    invalidate_query_cache(main_table_name)
+    invalidate_query_cache(archive_table_name)
     dynamodb_resource = get_resource()
 
     dynamodb_table = dynamodb_resource.Table(main_table_name)
@@ -533,6 +743,7 @@ def write_main_and_archive_record_from_class(
 
 
 def write_record_from_class(table_name, record) -> dict:
+    invalidate_query_cache(table_name)
     dynamodb_resource = get_resource()
     dynamodb_table = dynamodb_resource.Table(table_name)
 
@@ -541,6 +752,7 @@ def write_record_from_class(table_name, record) -> dict:
 
 
 def write_record_from_dict(table_name, record_dict) -> dict:
+    invalidate_query_cache(table_name)
     dynamodb_resource = get_resource()
     dynamodb_table = dynamodb_resource.Table(table_name)
 
@@ -549,6 +761,7 @@ def write_record_from_dict(table_name, record_dict) -> dict:
 
 
 def batch_write_records(table_name: str, records: list):
+    invalidate_query_cache(table_name)
     tbl = get_resource().Table(table_name)
     with tbl.batch_writer() as batch:
         for record in records:
@@ -556,6 +769,7 @@ def batch_write_records(table_name: str, records: list):
 
 
 def batch_write_record_archive(table_name: str, records: list, archive_log: str):
+    invalidate_query_cache(table_name)
     tbl = get_resource().Table(table_name)
     with tbl.batch_writer() as batch:
         for record in records:
@@ -566,6 +780,7 @@ def batch_write_record_archive(table_name: str, records: list, archive_log: str)
 
 
 def batch_write_objects(table_name: str, object_list: list):
+    invalidate_query_cache(table_name)
     tbl = get_resource().Table(table_name)
     with tbl.batch_writer() as batch:
         for object in object_list:
@@ -573,6 +788,7 @@ def batch_write_objects(table_name: str, object_list: list):
 
 
 def batch_write_objects_archive(table_name: str, object_list: list, archive_log: str):
+    invalidate_query_cache(table_name)
     tbl = get_resource().Table(table_name)
     with tbl.batch_writer() as batch:
         for object in object_list:
@@ -647,7 +863,11 @@ def get_field_list_from_dynamodb_record(
 
 
 def get_batch_item_from_pk_and_sk(
-    table_name: str, partition_key: str, sort_key_prefix: str, filter_expr: str = None
+    table_name: str,
+    partition_key: str,
+    sort_key_prefix: str,
+    filter_expr: str = None,
+    projection_expr: str = None,
 ):
     ddb = get_resource()
     tbl = ddb.Table(table_name)
@@ -663,6 +883,9 @@ def get_batch_item_from_pk_and_sk(
     if filter_expr:
         func_parameter["FilterExpression"] = filter_expr
 
+    if projection_expr:
+        func_parameter["ProjectionExpression"] = projection_expr
+
     # Init query
     response = tbl.query(**func_parameter)
 
@@ -697,3 +920,434 @@ def get_batch_item_from_pk_only(table_name: str, partition_key: str):
         result_item.extend(response["Items"])
 
     return result_item
+
+
+def get_batch_item_from_pk_and_sk_list(
+    table_name: str,
+    partition_key: str,
+    sort_key_list: list,
+    projection_expr: str = None,
+):
+    """
+    Read the records of exact sort keys with BatchGetItem (100 keys per request). Missing records are not returned.
+    """
+    ddb = get_resource()
+
+    result_item = []
+    sort_key_list = list(dict.fromkeys(sort_key_list))
+    for i in range(0, len(sort_key_list), 100):
+        request = {
+            "Keys": [
+                {
+                    FileRecordAttribute.PARTITION_KEY.value: partition_key,
+                    FileRecordAttribute.SORT_KEY.value: sort_key,
+                }
+                for sort_key in sort_key_list[i : i + 100]
+            ]
+        }
+        if projection_expr:
+            request["ProjectionExpression"] = projection_expr
+
+        request_items = {table_name: request}
+        while request_items:
+            response = ddb.batch_get_item(RequestItems=request_items)
+            result_item.extend(response["Responses"].get(table_name, []))
+            request_items = response.get("UnprocessedKeys")
+
+    return result_item
+
+
+########################################################################################################################
+# Request-scoped read-through cache for get_batch_item_from_pk_and_sk
+
+
+def clear_query_cache():
+    """
+    Drop every cached query result and reset the hit/miss counter. To be called at the start of a lambda invocation.
+    """
+    QUERY_CACHE.clear()
+    QUERY_CACHE_STATS["hit"] = 0
+    QUERY_CACHE_STATS["miss"] = 0
+
+
+def invalidate_query_cache(table_name: str):
+    """
+    Drop cached query results of the given table. All write/delete function in this module call this.
+    """
+    for cache_key in [key for key in QUERY_CACHE if key[0] == table_name]:
+        del QUERY_CACHE[cache_key]
+
+
+def get_query_cache_stats() -> dict:
+    return {
+        "hit": QUERY_CACHE_STATS["hit"],
+        "miss": QUERY_CACHE_STATS["miss"],
+        "cached_query": len(QUERY_CACHE),
+    }
+
+
+def construct_query_cache_key(
+    table_name: str,
+    partition_key: str,
+    sort_key_prefix: str,
+    filter_expr=None,
+    projection_expr: str = None,
+) -> tuple:
+    """
+    Condition object from boto3 is not hashable, the filter is therefore keyed by its built expression string
+    together with its attribute names and values.
+    """
+    if isinstance(filter_expr, ConditionBase):
+        filter_built = ConditionExpressionBuilder().build_expression(filter_expr)
+        filter_key = (
+            filter_built.condition_expression,
+            tuple(sorted(filter_built.attribute_name_placeholders.items())),
+            repr(sorted(filter_built.attribute_value_placeholders.items())),
+        )
+    else:
+        filter_key = filter_expr
+
+    return table_name, partition_key, sort_key_prefix, filter_key, projection_expr
+
+
+def get_cached_batch_item_from_pk_and_sk(
+    table_name: str,
+    partition_key: str,
+    sort_key_prefix: str,
+    filter_expr: str = None,
+    projection_expr: str = None,
+):
+    """
+    Read-through version of get_batch_item_from_pk_and_sk. Identical query within the same invocation will be
+    served from memory until a write to the same table is made through this module.
+    Each item returned is a shallow copy so the caller may modify it without altering the cache.
+    """
+    cache_key = construct_query_cache_key(
+        table_name=table_name,
+        partition_key=partition_key,
+        sort_key_prefix=sort_key_prefix,
+        filter_expr=filter_expr,
+        projection_expr=projection_expr,
+    )
+
+    if cache_key in QUERY_CACHE:
+        QUERY_CACHE_STATS["hit"] += 1
+    else:
+        QUERY_CACHE_STATS["miss"] += 1
+        QUERY_CACHE[cache_key] = get_batch_item_from_pk_and_sk(
+            table_name=table_name,
+            partition_key=partition_key,
+            sort_key_prefix=sort_key_prefix,
+            filter_expr=filter_expr,
+            projection_expr=projection_expr,
+        )
+
+    return [dict(item) for item in QUERY_CACHE[cache_key]]
+
+
+########################################################################################################################
+# Submission status counter (agha-gdr-submission-status)
+#
+# Status writes are best effort: a failure is logged and never fails the caller, as the status table is only a fast
+# path in front of the authoritative checks against the staging/result/store tables.
+
+
+def add_submission_status_count(
+    status_delta: dict, s3_key: str, status: SubmissionStatus, count: int = 1
+):
+    """
+    Accumulate a count change in status_delta ({submission_prefix: {status: count}}) so that a caller processing
+    many files writes each submission once with update_submission_status_count_from_delta.
+    """
+    if not SubmissionStatusRecord.is_counted_s3_key(s3_key):
+        return status_delta
+
+    submission_prefix = SubmissionStatusRecord.create_submission_prefix_from_s3_key(
+        s3_key
+    )
+    count_by_status = status_delta.setdefault(submission_prefix, {})
+    count_by_status[status.value] = count_by_status.get(status.value, 0) + count
+    return status_delta
+
+
+def increment_submission_status(
+    table_name: str, submission_prefix: str, count_by_status: dict
+):
+    """
+    Atomically add the count of each status to the submission record, the record is created if it does not exist.
+    count_by_status: {'uploaded': 2, 'passed': -1}
+    """
+    count_by_status = {k: v for k, v in count_by_status.items() if v}
+    if not table_name or not count_by_status:
+        return None
+
+    record = SubmissionStatusRecord(submission_prefix)
+    attribute_name = {f"#{status}": status for status in count_by_status}
+    attribute_value = {f":{status}": count for status, count in count_by_status.items()}
+    attribute_name["#flagship"] = "flagship"
+    attribute_name["#date_modified"] = "date_modified"
+    attribute_value[":flagship"] = record.partition_key
+    attribute_value[":date_modified"] = util.get_datetimestamp()
+
+    add_expr = ", ".join(f"#{status} :{status}" for status in count_by_status)
+
+    try:
+        return (
+            get_resource()
+            .Table(table_name)
+            .update_item(
+                Key={
+                    "partition_key": record.partition_key,
+                    "sort_key": record.sort_key,
+                },
+                UpdateExpression=f"ADD {add_expr} SET #flagship = :flagship, #date_modified = :date_modified",
+                ExpressionAttributeNames=attribute_name,
+                ExpressionAttributeValues=attribute_value,
+                ReturnValues="ALL_NEW",
+            )
+            .get("Attributes")
+        )
+    except Exception as e:
+        logger.warning(
+            f"Unable to update submission status of '{submission_prefix}': {e}"
+        )
+        return None
+
+
+def update_submission_status_count_from_delta(table_name: str, status_delta: dict):
+    for submission_prefix, count_by_status in status_delta.items():
+        increment_submission_status(table_name, submission_prefix, count_by_status)
+
+
+def set_submission_status(
+    table_name: str, submission_prefix: str, count_by_status: dict
+):
+    """
+    Overwrite the count of the given statuses (e.g. reset passed/failed when a new validation run starts). Statuses
+    not given are left untouched.
+    """
+    if not table_name or not count_by_status:
+        return None
+
+    record = SubmissionStatusRecord(submission_prefix)
+    attribute_name = {f"#{status}": status for status in count_by_status}
+    attribute_value = {f":{status}": count for status, count in count_by_status.items()}
+    attribute_name["#flagship"] = "flagship"
+    attribute_name["#date_modified"] = "date_modified"
+    attribute_value[":flagship"] = record.partition_key
+    attribute_value[":date_modified"] = util.get_datetimestamp()
+
+    set_expr = ", ".join(f"{name} = :{name[1:]}" for name in attribute_name)
+
+    try:
+        return (
+            get_resource()
+            .Table(table_name)
+            .update_item(
+                Key={
+                    "partition_key": record.partition_key,
+                    "sort_key": record.sort_key,
+                },
+                UpdateExpression=f"SET {set_expr}",
+                ExpressionAttributeNames=attribute_name,
+                ExpressionAttributeValues=attribute_value,
+                ReturnValues="ALL_NEW",
+            )
+            .get("Attributes")
+        )
+    except Exception as e:
+        logger.warning(f"Unable to set submission status of '{submission_prefix}': {e}")
+        return None
+
+
+def get_submission_status(table_name: str, submission_prefix: str):
+    """
+    Return the status record of the submission (counts are Decimal), or None if there is none (or no table).
+    """
+    if not table_name:
+        return None
+
+    record = SubmissionStatusRecord(submission_prefix)
+    try:
+        response = (
+            get_resource()
+            .Table(table_name)
+            .get_item(
+                Key={
+                    "partition_key": record.partition_key,
+                    "sort_key": record.sort_key,
+                },
+                ConsistentRead=True,
+            )
+        )
+    except Exception as e:
+        logger.warning(
+            f"Unable to read submission status of '{submission_prefix}': {e}"
+        )
+        return None
+
+    return response.get("Item")
+
+
+def get_submission_status_list(table_name: str, flagship: str, submission_prefix=""):
+    """
+    Status record of every submission of a flagship, optionally narrowed down by the submission prefix.
+    """
+    return get_batch_item_from_pk_and_sk(
+        table_name=table_name,
+        partition_key=flagship,
+        sort_key_prefix=f"{flagship}/{submission_prefix}",
+    )
+
+
+########################################################################################################################
+# Study ID index (agha-gdr-store-bucket)
+
+
+def update_study_id_index_from_manifest_record_list(
+    table_name: str, manifest_record_list: list, sort_key_prefix: str = None
+):
+    """
+    Make the index records of the given MANIFEST records match their agha_study_id. The existing index records are
+    read with a single query (over the common prefix of the records) and only the difference is written.
+    :param manifest_record_list: MANIFEST record (dict or ManifestFileRecord)
+    :param sort_key_prefix: prefix covering all records, defaults to their common prefix
+    :return: (number of index record written, number of index record deleted)
+    """
+    manifest_record_list = [
+        r if isinstance(r, dict) else dict(r.__dict__) for r in manifest_record_list
+    ]
+    if not manifest_record_list:
+        return 0, 0
+
+    if sort_key_prefix is None:
+        sort_key_prefix = os.path.commonprefix(
+            [r["sort_key"] for r in manifest_record_list]
+        )
+
+    if sort_key_prefix:
+        existing_index_list = get_batch_item_from_pk_and_sk(
+            table_name=table_name,
+            partition_key=FileRecordPartitionKey.STUDY_ID_INDEX.value,
+            sort_key_prefix=sort_key_prefix,
+            projection_expr="sort_key, s3_key",
+        )
+    else:
+        existing_index_list = get_batch_item_from_pk_only(
+            table_name=table_name,
+            partition_key=FileRecordPartitionKey.STUDY_ID_INDEX.value,
+        )
+
+    s3_key_set = {r["sort_key"] for r in manifest_record_list}
+    existing_sort_key_set = {
+        record["sort_key"]
+        for record in existing_index_list
+        if record.get("s3_key") in s3_key_set
+    }
+
+    write_list = []
+    for manifest_record in manifest_record_list:
+        write_list.extend(
+            StudyIdIndexRecord.create_record_list_from_manifest_record(manifest_record)
+        )
+    delete_sort_key_set = existing_sort_key_set - {r["sort_key"] for r in write_list}
+
+    batch_write_objects(table_name, write_list)
+    batch_delete_from_dictionary(
+        table_name,
+        [
+            {
+                "partition_key": FileRecordPartitionKey.STUDY_ID_INDEX.value,
+                "sort_key": sort_key,
+            }
+            for sort_key in delete_sort_key_set
+        ],
+    )
+    return len(write_list), len(delete_sort_key_set)
+
+
+def delete_study_id_index_from_s3_key(table_name: str, s3_key: str) -> list:
+    """
+    Delete the index records of a MANIFEST record (e.g. when the MANIFEST record is deleted).
+    """
+    index_record_list = [
+        record
+        for record in get_batch_item_from_pk_and_sk(
+            table_name=table_name,
+            partition_key=FileRecordPartitionKey.STUDY_ID_INDEX.value,
+            sort_key_prefix=f"{s3_key}{STUDY_ID_INDEX_SEPARATOR}",
+            projection_expr="partition_key, sort_key, s3_key",
+        )
+        if record.get("s3_key") == s3_key
+    ]
+    batch_delete_from_dictionary(table_name, index_record_list)
+    return index_record_list
+
+
+def get_batch_item_from_agha_study_id(
+    table_name: str,
+    agha_study_id: str,
+    s3_key_prefix: str = "",
+    filter_expr: str = None,
+):
+    """
+    Query the study ID GSI. Only the records of the study are read, instead of a filter over a whole flagship.
+    :param s3_key_prefix: e.g. flagship or submission prefix ('AC/', 'AC/2022-02-02/')
+    :return: index records, each with 'sort_key' set to the s3_key of the MANIFEST record so it can be used in place
+        of the MANIFEST record
+    """
+    tbl = get_resource().Table(table_name)
+
+    key_expr = Key("index_agha_study_id").eq(str(agha_study_id).strip())
+    if s3_key_prefix:
+        key_expr = key_expr & Key("s3_key").begins_with(s3_key_prefix)
+
+    func_parameter = {
+        "IndexName": AGHA_STUDY_ID_INDEX_NAME,
+        "KeyConditionExpression": key_expr,
+    }
+    if filter_expr:
+        func_parameter["FilterExpression"] = filter_expr
+
+    result_item = []
+    while True:
+        response = tbl.query(**func_parameter)
+        result_item.extend(response["Items"])
+        if response.get("LastEvaluatedKey") is None:
+            break
+        func_parameter["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    for item in result_item:
+        item["index_sort_key"] = item["sort_key"]
+        item["sort_key"] = item["s3_key"]
+    return result_item
+
+
+def get_manifest_record_by_agha_study_id(
+    table_name: str,
+    agha_study_id_list: list,
+    sort_key_prefix: str,
+    filter_expr: str = None,
+) -> dict:
+    """
+    Fallback of the study ID GSI for study IDs without index record (e.g. a submission stored before the index and not
+    backfilled yet). The MANIFEST records under the prefix are read once and matched against the study IDs in memory.
+    :param sort_key_prefix: e.g. flagship prefix ('AC/')
+    :return: study ID -> MANIFEST records (ordered by sort_key), only for the study IDs found
+    """
+    agha_study_id_set = {str(i).strip() for i in agha_study_id_list}
+    manifest_record_list = get_batch_item_from_pk_and_sk(
+        table_name=table_name,
+        partition_key=FileRecordPartitionKey.MANIFEST_FILE_RECORD.value,
+        sort_key_prefix=sort_key_prefix,
+        filter_expr=filter_expr,
+    )
+
+    record_by_study_id = {}
+    for record in sorted(manifest_record_list, key=lambda r: r["sort_key"]):
+        for agha_study_id in dict.fromkeys(
+            split_agha_study_id(record.get("agha_study_id"))
+        ):
+            if agha_study_id in agha_study_id_set:
+                record_by_study_id.setdefault(agha_study_id, []).append(record)
+    return record_by_study_id
@@ -0,0 +1,236 @@
+import collections
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+import boto3
+import botocore.handlers
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# 'log' for a single summary log line, 'emf' for CloudWatch Embedded Metric Format
+AWS_CALL_METRIC_FORMAT = os.environ.get("AWS_CALL_METRIC_FORMAT", "log")
+AWS_CALL_METRIC_NAMESPACE = os.environ.get(
+    "AWS_CALL_METRIC_NAMESPACE", "AGHA/DataValidation"
+)
+
+CONTEXT_START_KEY = "instrumentation_start"
+CONTEXT_OPERATION_KEY = "instrumentation_operation"
+
+
+class AwsCallStats:
+    """
+    Counter of AWS API calls made through botocore, grouped by '<service>.<operation>'
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.operation = collections.defaultdict(
+            lambda: {
+                "call": 0,
+                "error": 0,
+                "retry": 0,
+                "bytes_sent": 0,
+                "bytes_received": 0,
+                "latency_ms": 0.0,
+            }
+        )
+
+    def reset(self):
+        with self._lock:
+            self.operation.clear()
+
+    def record(
+        self, operation_name, latency_ms, bytes_sent, bytes_received, retry, error
+    ):
+        with self._lock:
+            stats = self.operation[operation_name]
+            stats["call"] += 1
+            stats["error"] += int(error)
+            stats["retry"] += retry
+            stats["bytes_sent"] += bytes_sent
+            stats["bytes_received"] += bytes_received
+            stats["latency_ms"] += latency_ms
+
+    def summary(self) -> dict:
+        with self._lock:
+            operation = {
+                name: dict(stats, latency_ms=round(stats["latency_ms"], 2))
+                for name, stats in sorted(self.operation.items())
+            }
+
+        total = {
+            "call": 0,
+            "error": 0,
+            "retry": 0,
+            "bytes_sent": 0,
+            "bytes_received": 0,
+            "latency_ms": 0.0,
+        }
+        for stats in operation.values():
+            for key in total:
+                total[key] += stats[key]
+        total["latency_ms"] = round(total["latency_ms"], 2)
+
+        return {"total": total, "operation": operation}
+
+
+AWS_CALL_STATS = AwsCallStats()
+
+
+def get_operation_name(model) -> str:
+    return f"{model.service_model.service_name}.{model.name}"
+
+
+def before_call_handler(params, model, context, **kwargs):
+    context[CONTEXT_START_KEY] = time.perf_counter()
+    # after-call-error is emitted without the model, hence kept for the error handler
+    context[CONTEXT_OPERATION_KEY] = get_operation_name(model)
+
+    body = params.get("body") if isinstance(params, dict) else None
+    context["instrumentation_bytes_sent"] = (
+        len(body) if isinstance(body, (bytes, str)) else 0
+    )
+
+
+def after_call_handler(http_response, parsed, model, context, **kwargs):
+    start = context.pop(CONTEXT_START_KEY, None)
+    if start is None:
+        return
+    latency_ms = (time.perf_counter() - start) * 1000
+
+    # Only rely on the header, reading the content would consume streaming body (e.g. S3 GetObject)
+    headers = getattr(http_response, "headers", None) or {}
+    try:
+        bytes_received = int(headers.get("content-length", 0))
+    except (TypeError, ValueError):
+        bytes_received = 0
+
+    response_metadata = (parsed or {}).get("ResponseMetadata", {})
+    status_code = getattr(http_response, "status_code", 200) or 200
+
+    AWS_CALL_STATS.record(
+        operation_name=context.pop(CONTEXT_OPERATION_KEY, None)
+        or get_operation_name(model),
+        latency_ms=latency_ms,
+        bytes_sent=context.pop("instrumentation_bytes_sent", 0),
+        bytes_received=bytes_received,
+        retry=response_metadata.get("RetryAttempts", 0),
+        error=status_code >= 300,
+    )
+
+
+def after_call_error_handler(context, **kwargs):
+    """
+    Emitted with the exception (e.g. endpoint connection error, read timeout) and the context only.
+    """
+    start = context.pop(CONTEXT_START_KEY, None)
+    if start is None:
+        return
+
+    AWS_CALL_STATS.record(
+        operation_name=context.pop(CONTEXT_OPERATION_KEY, "unknown"),
+        latency_ms=(time.perf_counter() - start) * 1000,
+        bytes_sent=context.pop("instrumentation_bytes_sent", 0),
+        bytes_received=0,
+        retry=0,
+        error=True,
+    )
+
+
+EVENT_HANDLER_LIST = [
+    ("before-call.*.*", before_call_handler),
+    ("after-call.*.*", after_call_handler),
+    ("after-call-error.*.*", after_call_error_handler),
+]
+
+
+def register_event_handler():
+    """
+    Registered as botocore builtin handlers so every session created afterwards (including the boto3 default session
+    and any clients made from it) is instrumented. A default session that already exists is registered directly.
+    """
+    for event_name, handler in EVENT_HANDLER_LIST:
+        if (event_name, handler) not in botocore.handlers.BUILTIN_HANDLERS:
+            botocore.handlers.BUILTIN_HANDLERS.append((event_name, handler))
+
+        if boto3.DEFAULT_SESSION is not None:
+            boto3.DEFAULT_SESSION.events.register(
+                event_name, handler, unique_id=f"instrumentation-{event_name}"
+            )
+
+
+def create_metric_log(function_name: str, duration_ms: float) -> str:
+    summary = AWS_CALL_STATS.summary()
+    total = summary["total"]
+
+    if AWS_CALL_METRIC_FORMAT == "emf":
+        return json.dumps(
+            {
+                "_aws": {
+                    "Timestamp": int(time.time() * 1000),
+                    "CloudWatchMetrics": [
+                        {
+                            "Namespace": AWS_CALL_METRIC_NAMESPACE,
+                            "Dimensions": [["FunctionName"]],
+                            "Metrics": [
+                                {"Name": "AwsApiCall", "Unit": "Count"},
+                                {"Name": "AwsApiError", "Unit": "Count"},
+                                {"Name": "AwsApiRetry", "Unit": "Count"},
+                                {"Name": "AwsApiLatency", "Unit": "Milliseconds"},
+                                {"Name": "HandlerDuration", "Unit": "Milliseconds"},
+                            ],
+                        }
+                    ],
+                },
+                "FunctionName": function_name,
+                "AwsApiCall": total["call"],
+                "AwsApiError": total["error"],
+                "AwsApiRetry": total["retry"],
+                "AwsApiLatency": total["latency_ms"],
+                "HandlerDuration": round(duration_ms, 2),
+                "aws_call": summary["operation"],
+            }
+        )
+
+    return json.dumps(
+        {
+            "metric": "aws_call_summary",
+            "function_name": function_name,
+            "handler_duration_ms": round(duration_ms, 2),
+            **summary,
+        }
+    )
+
+
+def instrument_handler(handler):
+    """
+    Decorator for lambda handler. Count AWS API calls made during the invocation and output the summary at the end.
+    """
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        function_name = getattr(context, "function_name", None) or handler.__module__
+
+        AWS_CALL_STATS.reset()
+        start = time.perf_counter()
+        try:
+            return handler(event, context)
+        finally:
+            metric_log = create_metric_log(
+                function_name, (time.perf_counter() - start) * 1000
+            )
+            if AWS_CALL_METRIC_FORMAT == "emf":
+                # EMF must be a raw JSON line in the log stream
+                print(metric_log)
+            else:
+                logger.info(metric_log)
+
+    return wrapper
+
+
+register_event_handler()
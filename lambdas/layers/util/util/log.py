@@ -0,0 +1,71 @@
+from .serialization import dumps
+
+# Collections longer than this are replaced by their count and a sample of the first items
+LOG_MAX_ITEMS = 20
+LOG_SAMPLE_SIZE = 5
+
+
+def truncate(obj, max_items: int = LOG_MAX_ITEMS, sample_size: int = LOG_SAMPLE_SIZE):
+    """
+    Return a copy of the obj where any list/dict longer than max_items is replaced with
+    {"count": <length>, "sample": <first sample_size items>}.
+    """
+    # pandas/numpy objects
+    if hasattr(obj, "tolist"):
+        obj = obj.tolist()
+
+    if isinstance(obj, dict):
+        items = list(obj.items())
+        if len(items) > max_items:
+            return {
+                "count": len(items),
+                "sample": {
+                    k: truncate(v, max_items, sample_size)
+                    for k, v in items[:sample_size]
+                },
+            }
+        return {k: truncate(v, max_items, sample_size) for k, v in items}
+
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        items = list(obj)
+        if len(items) > max_items:
+            return {
+                "count": len(items),
+                "sample": [
+                    truncate(v, max_items, sample_size) for v in items[:sample_size]
+                ],
+            }
+        return [truncate(v, max_items, sample_size) for v in items]
+
+    return obj
+
+
+class LazyJson:
+    """
+    Wrap an object to be logged as JSON. Serialisation only happens when the log record is emitted, so passing it as
+    a logging argument costs nothing when the level is disabled.
+    Example:
+        logger.info("File metadata: %s", LazyJson(file_metadata))
+    """
+
+    __slots__ = ("obj", "max_items", "sample_size", "indent")
+
+    def __init__(
+        self,
+        obj,
+        max_items: int = LOG_MAX_ITEMS,
+        sample_size: int = LOG_SAMPLE_SIZE,
+        indent: int = None,
+    ):
+        self.obj = obj
+        self.max_items = max_items
+        self.sample_size = sample_size
+        self.indent = indent
+
+    def __str__(self):
+        obj = self.obj
+        if self.max_items is not None:
+            obj = truncate(obj, self.max_items, self.sample_size)
+        return dumps(obj, indent=self.indent)
+
+    __repr__ = __str__
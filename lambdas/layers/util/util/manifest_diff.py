@@ -0,0 +1,128 @@
+"""
+Compare filenames listed in a manifest against the objects of a submission (e.g. the store bucket).
+
+A manifest filename is satisfied by the store when:
+- The exact filename exists, or
+- A compressible file (FASTQ/VCF) is listed uncompressed and only its '.gz' version exists (the pipeline compresses
+  them on transfer), or
+- An index file is listed and the file it indexes is satisfied (index files are re-created by the validation
+  pipeline rather than transferred from staging).
+
+Every name is normalised once, so a diff is O(n) over the two listings regardless of their order.
+"""
+import logging
+import os
+from typing import Iterable, List
+
+from util import agha, dynamodb, s3
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+INDEX_EXTENSION_LIST = [
+    *agha.FileType.BAM_INDEX.get_extensions(),
+    *agha.FileType.CRAM_INDEX.get_extensions(),
+    *agha.FileType.VCF_INDEX.get_extensions(),
+]
+
+
+def strip_compression_extension(filename: str) -> str:
+    if agha.FileType.is_compress_file(filename):
+        return filename[: -len(".gz")]
+    return filename
+
+
+def strip_index_extension(filename: str) -> str:
+    """
+    Return the name of the file the index belongs to (e.g. 'a.bam.bai' -> 'a.bam'), or the filename itself if it is
+    not an index file.
+    """
+    for extension in INDEX_EXTENSION_LIST:
+        if filename.endswith(extension):
+            return filename[: -len(extension)]
+    return filename
+
+
+def create_store_filename_set(store_key_list: Iterable[str]) -> set:
+    """
+    Basename of every key, plus the uncompressed name of every compressed compressible file. A listed 'a.fastq' is
+    then satisfied by either 'a.fastq' or 'a.fastq.gz' with a single set lookup.
+    """
+    store_filename_set = set()
+    for key in store_key_list:
+        filename = os.path.basename(key)
+        store_filename_set.add(filename)
+
+        if agha.FileType.is_compress_file(filename):
+            uncompressed = strip_compression_extension(filename)
+            if agha.FileType.is_compressable_file(
+                uncompressed
+            ) and not agha.FileType.is_compress_file(uncompressed):
+                store_filename_set.add(uncompressed)
+
+    return store_filename_set
+
+
+def is_manifest_file_in_store(filename: str, store_filename_set: set) -> bool:
+    if filename in store_filename_set:
+        return True
+
+    indexed_filename = strip_index_extension(filename)
+    if indexed_filename != filename:
+        return is_manifest_file_in_store(indexed_filename, store_filename_set)
+
+    return False
+
+
+def find_missing_manifest_file(
+    manifest_filename_list: Iterable[str],
+    store_key_list: Iterable[str],
+    postfix_exception_list: list = None,
+) -> List[str]:
+    """
+    Manifest filenames not satisfied by the store listing.
+    :param manifest_filename_list: filename column of the manifest
+    :param store_key_list: s3_key (or filename) of the objects in the store
+    :param postfix_exception_list: manifest filename ending with any of these is not checked
+    :return: sorted list of missing filename
+    """
+    postfix_exception = tuple(postfix_exception_list or [])
+    store_filename_set = create_store_filename_set(store_key_list)
+
+    missing_file_set = set()
+    for filename in manifest_filename_list:
+        if postfix_exception and filename.endswith(postfix_exception):
+            continue
+        if not is_manifest_file_in_store(filename, store_filename_set):
+            missing_file_set.add(filename)
+
+    return sorted(missing_file_set)
+
+
+########################################################################################################################
+# Store listing
+
+
+def list_store_key_from_s3(bucket_name: str, submission_prefix: str) -> List[str]:
+    try:
+        metadata_list = s3.get_s3_object_metadata(
+            bucket_name=bucket_name, directory_prefix=submission_prefix
+        )
+    except ValueError:
+        # No object under the prefix
+        return []
+    return [metadata["Key"] for metadata in metadata_list]
+
+
+def list_store_key_from_dynamodb(table_name: str, submission_prefix: str) -> List[str]:
+    """
+    s3_key of the FILE records of the submission. The records are written by s3_event_recorder on every store
+    object event, so this avoids listing the bucket.
+    """
+    record_list = dynamodb.get_batch_item_from_pk_and_sk(
+        table_name=table_name,
+        partition_key=dynamodb.FileRecordPartitionKey.FILE_RECORD.value,
+        sort_key_prefix=submission_prefix,
+        projection_expr="sort_key",
+    )
+    return [record["sort_key"] for record in record_list]
@@ -2,8 +2,12 @@ import json
 import os
 import logging
 import re
+import time
+import uuid
 
 import util
+from util import dynamodb
+from util.cache import TTLCache
 
 # Logging
 logger = logging.getLogger()
@@ -20,26 +24,46 @@ class SubmitterInfo:
 
 # Some constants for the notification
 NOTIFICATION_LAMBDA_ARN = os.environ.get("NOTIFICATION_LAMBDA_ARN")
+# When set, notifications are written to the outbox table and sent (coalesced per submission) by the aggregator
+# instead of invoking the notification lambda for every message batch
+DYNAMODB_NOTIFICATION_OUTBOX_TABLE_NAME = os.environ.get(
+    "DYNAMODB_NOTIFICATION_OUTBOX_TABLE_NAME"
+)
+OUTBOX_PARTITION_KEY = "OUTBOX"
 EMAIL_SUBJECT = "[AGHA service] Submission received"
 MESSAGE_STORE = list()
 SUBMITTER_INFO = SubmitterInfo()
 
 CLIENT_IAM = util.get_client("iam")
 
+# Cached across warm invocation. Index of IAM UserId -> UserName, and principal_id -> (name, email)
+IAM_USER_INDEX_CACHE = TTLCache(maxsize=1, ttl=900)
+PRINCIPAL_CACHE = TTLCache(maxsize=256, ttl=900)
+
 
 def append_message(message):
     MESSAGE_STORE.append(message)
 
 
 def send_notifications():
-    client_lambda = util.get_client("lambda")
-
     notification_payload = {
         "messages": MESSAGE_STORE,
         "subject": EMAIL_SUBJECT,
         "submitter_info": SUBMITTER_INFO.__dict__,
     }
 
+    if DYNAMODB_NOTIFICATION_OUTBOX_TABLE_NAME:
+        try:
+            put_outbox_notification(notification_payload)
+            return
+        except Exception as e:
+            logger.error(
+                f"Something went wrong when writing to the notification outbox, invoking notification Lambda "
+                f"instead.\n Error: {e}"
+            )
+
+    client_lambda = util.get_client("lambda")
+
     # Handle notification to another lambda
     try:
         lambda_res = client_lambda.invoke(
@@ -82,9 +106,8 @@ def log_and_store_message(message, level="info"):
     elif level == "warning":
         message = f"WARNING: {message}"
 
-    email_message_format = message.replace(" ", "&nbsp;").replace("\n", "<br>")
-
-    MESSAGE_STORE.append(email_message_format)
+    # Stored as plain text, the notification lambda renders it for each channel
+    MESSAGE_STORE.append(message)
 
 
 def log_and_store_list_message(list_messages, level="info"):
@@ -105,6 +128,79 @@ def notify_and_exit():
         send_notifications()
 
 
+########################################################################################################################
+# Notification outbox
+
+
+def put_outbox_notification(notification_payload: dict):
+    """
+    The sort key starts with the creation time (epoch seconds) so the aggregator reads the outbox oldest first.
+    """
+    created_at = int(time.time())
+    record = {
+        "partition_key": OUTBOX_PARTITION_KEY,
+        "sort_key": f"{created_at:012d}:{uuid.uuid4().hex}",
+        "created_at": created_at,
+        "date_modified": util.get_datetimestamp(),
+        "submission_prefix": notification_payload["submitter_info"].get(
+            "submission_prefix", ""
+        ),
+        **notification_payload,
+    }
+    dynamodb.write_record_from_dict(DYNAMODB_NOTIFICATION_OUTBOX_TABLE_NAME, record)
+    logger.info(f"Notification written to outbox: {record['sort_key']}")
+
+
+def get_outbox_notification_list(table_name: str) -> list:
+    return dynamodb.get_batch_item_from_pk_only(
+        table_name=table_name, partition_key=OUTBOX_PARTITION_KEY
+    )
+
+
+def group_outbox_notification(
+    outbox_list: list, flush_before: int, force_flush_before: int
+) -> list:
+    """
+    Group outbox records by submission and recipient. A group is ready once nothing has been added to it since
+    flush_before (the submission has gone quiet), or its oldest record is from before force_flush_before (so a
+    submission that keeps producing messages is still notified). Both are epoch seconds.
+    :return: list of ready group, each a list of records oldest first
+    """
+    group_by_key = {}
+    for record in sorted(outbox_list, key=lambda r: r["sort_key"]):
+        submitter_info = record.get("submitter_info", {})
+        group_key = (
+            record.get("submission_prefix", ""),
+            submitter_info.get("email") or "",
+            record.get("subject", ""),
+        )
+        group_by_key.setdefault(group_key, []).append(record)
+
+    return [
+        group
+        for group in group_by_key.values()
+        if group[-1]["created_at"] < flush_before
+        or group[0]["created_at"] < force_flush_before
+    ]
+
+
+def merge_outbox_notification(group: list) -> dict:
+    """
+    One notification payload out of the records of a group, each record's messages separated by an empty line.
+    """
+    messages = []
+    for record in group:
+        if messages:
+            messages.append("")
+        messages.extend(record.get("messages", []))
+
+    return {
+        "messages": messages,
+        "subject": group[0].get("subject", EMAIL_SUBJECT),
+        "submitter_info": group[-1].get("submitter_info", {}),
+    }
+
+
 ########################################################################################################################
 # User account information
 # Email/name regular expressions
@@ -114,18 +210,53 @@ USER_RE = re.compile(f"AWS:({AWS_ID_RE})")
 SSO_RE = re.compile(f"AWS:({AWS_ID_RE}):({EMAIL_RE})")
 
 
+def get_iam_user_index(refresh=False) -> dict:
+    """
+    Build UserId -> UserName index for all IAM users in one paginated pass
+    """
+    if refresh:
+        IAM_USER_INDEX_CACHE.invalidate("user_index")
+
+    def build_index():
+        user_index = {}
+        paginator = CLIENT_IAM.get_paginator("list_users")
+        for page in paginator.paginate():
+            for user in page["Users"]:
+                user_index[user["UserId"]] = user["UserName"]
+        return user_index
+
+    return IAM_USER_INDEX_CACHE.get_or_set("user_index", build_index)
+
+
+def get_name_email_from_iam_user_id(user_id):
+    user_index = get_iam_user_index()
+    if user_id not in user_index:
+        # User may have been created after the index was built
+        user_index = get_iam_user_index(refresh=True)
+
+    username = user_index.get(user_id)
+    if username is None:
+        logger.warning(f"Could not find IAM user with UserId: {user_id}")
+        return None, None
+
+    email = None
+    user_details = CLIENT_IAM.get_user(UserName=username)
+    for tag in user_details["User"].get("Tags", []):
+        if tag["Key"] == "email":
+            email = tag["Value"]
+    return username, email
+
+
 def get_name_email_from_principalid(principal_id):
     if USER_RE.fullmatch(principal_id):
+        cached_name_email = PRINCIPAL_CACHE.get(principal_id)
+        if cached_name_email is not None:
+            return cached_name_email
+
         user_id = re.search(USER_RE, principal_id).group(1)
-        user_list = CLIENT_IAM.list_users()
-        for user in user_list["Users"]:
-            if user["UserId"] == user_id:
-                username = user["UserName"]
-        user_details = CLIENT_IAM.get_user(UserName=username)
-        tags = user_details["User"]["Tags"]
-        for tag in tags:
-            if tag["Key"] == "email":
-                email = tag["Value"]
+        username, email = get_name_email_from_iam_user_id(user_id)
+        if username is not None:
+            PRINCIPAL_CACHE.set(principal_id, (username, email))
         return username, email
     elif SSO_RE.fullmatch(principal_id):
         email = re.search(SSO_RE, principal_id).group(2)
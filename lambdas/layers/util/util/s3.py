@@ -13,6 +13,9 @@ logger.setLevel(logging.INFO)
 
 S3_CLIENT = util.get_client("s3")
 
+# Results bucket prefix for the data sharing sync manifests (not validation results)
+SHARING_KEY_PREFIX = "sharing/"
+
 
 class S3EventType(Enum):
     """
@@ -54,7 +57,7 @@ def parse_s3_event(s3_event: dict) -> List[S3EventRecord]:
 
     if "Records" not in s3_event.keys():
         logger.warning("No Records in message body!")
-        logger.warning(json.dumps(s3_event, cls=util.DecimalEncoder))
+        logger.warning(util.serialization.dumps(s3_event))
         return
 
     records = s3_event["Records"]
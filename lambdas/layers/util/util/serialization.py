@@ -0,0 +1,84 @@
+import datetime
+import decimal
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Set JSON_BACKEND=json to force the standard library even when orjson is installed
+JSON_BACKEND = os.environ.get("JSON_BACKEND", "orjson" if orjson else "json")
+
+
+def json_default(o):
+    """
+    `default` hook for DynamoDB items and datetime. A plain function (instead of a JSONEncoder subclass) keeps json on
+    its C encoder.
+    """
+    if isinstance(o, decimal.Decimal):
+        return str(o)
+
+    if isinstance(o, (datetime.datetime, datetime.date)):
+        return o.isoformat()
+
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+
+    # pandas/numpy objects
+    if hasattr(o, "tolist"):
+        return o.tolist()
+
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def dumps(obj, indent: int = None, sort_keys: bool = False) -> str:
+    """
+    Serialise obj (e.g. DynamoDB items with Decimal, datetime) to a JSON string.
+    orjson is used for compact output when available. Indented output stays on the standard library as orjson only
+    supports 2-space indentation, and objects orjson rejects (e.g. integer over 64-bit) fall back to it as well.
+    """
+    if JSON_BACKEND == "orjson" and orjson is not None and indent is None:
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, default=json_default, option=option).decode()
+        except orjson.JSONEncodeError:
+            pass
+
+    return json.dumps(obj, default=json_default, indent=indent, sort_keys=sort_keys)
+
+
+def loads(s):
+    if JSON_BACKEND == "orjson" and orjson is not None:
+        return orjson.loads(s)
+    return json.loads(s)
+
+
+def normalise_decimal(obj):
+    """
+    Return a copy of obj where every Decimal (at any depth) is replaced with int, or float if it has a fraction.
+    """
+    obj_type = type(obj)
+
+    if obj_type is decimal.Decimal:
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+
+    if obj_type is dict:
+        return {k: normalise_decimal(v) for k, v in obj.items()}
+
+    if obj_type is list or obj_type is tuple:
+        return [normalise_decimal(v) for v in obj]
+
+    if obj_type is set or obj_type is frozenset:
+        return {normalise_decimal(v) for v in obj}
+
+    # Subclasses (e.g. OrderedDict) go through the slower isinstance check
+    if isinstance(obj, decimal.Decimal):
+        return normalise_decimal(decimal.Decimal(obj))
+    if isinstance(obj, dict):
+        return {k: normalise_decimal(v) for k, v in obj.items()}
+
+    return obj
@@ -0,0 +1,154 @@
+"""
+Slack incoming webhook client.
+
+The HTTPS connection is kept open (HTTP/1.1 keep-alive) at module level, so a warm lambda container re-uses it
+instead of doing a TCP/TLS handshake for every message.
+"""
+import http.client
+import json
+import logging
+import os
+import threading
+import time
+
+import util
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+SLACK_HOST = "hooks.slack.com"
+SLACK_WEBHOOK_ENDPOINT_SSM_NAME = "/slack/webhook/endpoint"
+SLACK_WEBHOOK_TIMEOUT_SECONDS = float(
+    os.environ.get("SLACK_WEBHOOK_TIMEOUT_SECONDS", 10)
+)
+SLACK_WEBHOOK_MAX_RETRY = int(os.environ.get("SLACK_WEBHOOK_MAX_RETRY", 2))
+SLACK_WEBHOOK_RETRY_BACKOFF_SECONDS = float(
+    os.environ.get("SLACK_WEBHOOK_RETRY_BACKOFF_SECONDS", 1)
+)
+
+# Status worth another attempt, anything else (e.g. 400 invalid payload, 404 revoked webhook) will fail again
+RETRY_STATUS_LIST = [429, 500, 502, 503, 504]
+
+SESSION_BY_HOST = dict()
+SESSION_BY_HOST_LOCK = threading.Lock()
+
+
+class SlackWebhookSession:
+    """
+    A single persistent connection to the webhook host. Requests are serialised with a lock as http.client
+    connections are not thread safe.
+    - use_https: False is only meant for a local stand-in server in tests
+    """
+
+    def __init__(
+        self,
+        host=SLACK_HOST,
+        port=None,
+        timeout=SLACK_WEBHOOK_TIMEOUT_SECONDS,
+        max_retry=SLACK_WEBHOOK_MAX_RETRY,
+        retry_backoff=SLACK_WEBHOOK_RETRY_BACKOFF_SECONDS,
+        use_https=True,
+    ):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.max_retry = max_retry
+        self.retry_backoff = retry_backoff
+        self.use_https = use_https
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _get_connection(self):
+        if self._connection is None:
+            connection_class = (
+                http.client.HTTPSConnection
+                if self.use_https
+                else http.client.HTTPConnection
+            )
+            self._connection = connection_class(
+                self.host, port=self.port, timeout=self.timeout
+            )
+        return self._connection
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _post_once(self, endpoint: str, body: bytes):
+        connection = self._get_connection()
+        connection.request(
+            "POST",
+            endpoint,
+            body,
+            {"Content-Type": "application/json", "Connection": "keep-alive"},
+        )
+        response = connection.getresponse()
+
+        # The body must be read before the connection can carry the next request
+        response.read()
+        if response.will_close:
+            self._close()
+        return response.status
+
+    def post(self, endpoint: str, post_data: dict) -> int:
+        """
+        POST the JSON payload to the webhook endpoint, retrying on connection error and throttling/server error.
+        :return: HTTP status of the last attempt
+        """
+        body = json.dumps(post_data).encode("utf-8")
+
+        with self._lock:
+            attempt = 0
+            while True:
+                try:
+                    status = self._post_once(endpoint, body)
+                    if status not in RETRY_STATUS_LIST or attempt >= self.max_retry:
+                        return status
+                    logger.warning(f"Slack webhook responded {status}, retrying")
+                except (http.client.HTTPException, OSError) as e:
+                    # A kept-alive connection may have been dropped by the server while the container was idle
+                    self._close()
+                    if attempt >= self.max_retry:
+                        raise
+                    logger.warning(f"Slack webhook request failed ({e}), retrying")
+
+                time.sleep(self.retry_backoff * (2**attempt))
+                attempt += 1
+
+
+def get_slack_webhook_session(host=SLACK_HOST) -> SlackWebhookSession:
+    with SESSION_BY_HOST_LOCK:
+        if host not in SESSION_BY_HOST:
+            SESSION_BY_HOST[host] = SlackWebhookSession(host)
+        return SESSION_BY_HOST[host]
+
+
+def get_slack_webhook_endpoint(ssm_client) -> str:
+    return util.get_ssm_parameter_cached(
+        SLACK_WEBHOOK_ENDPOINT_SSM_NAME, ssm_client, with_decryption=True
+    )
+
+
+def create_slack_post_data(
+    channel: str, username: str, heading: str, title: str, message: str
+) -> dict:
+    return {
+        "channel": channel,
+        "username": username,
+        "text": "*" + heading + "*",  # After username line
+        "icon_emoji": ":aws_logo:",
+        "attachments": [{"title": title, "text": message}],  # First message line
+    }
+
+
+def send_slack_message(
+    endpoint: str, post_data: dict, session: SlackWebhookSession = None
+) -> int:
+    if session is None:
+        session = get_slack_webhook_session()
+    return session.post(endpoint, post_data)
@@ -2,7 +2,6 @@
 import logging
 import os
 import re
-import io
 import json
 import sys
 
@@ -13,6 +12,8 @@ import util
 from util import notification, s3, agha
 
 MANIFEST_REQUIRED_COLUMNS = {"filename", "checksum", "agha_study_id"}
+MANIFEST_COLUMNS = ["checksum", "filename", "agha_study_id"]
+MANIFEST_READ_CHUNK_SIZE = 10000
 
 # Manifest field validation related
 AGHA_ID_RE = re.compile("^A[0-9]{7,8}(?:_[a-zA-Z0-9]+)?$")
@@ -26,6 +27,10 @@ logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
+class ManifestHeaderError(Exception):
+    pass
+
+
 ########################################################################################################################
 # Data placeholder for submitted data
 
@@ -70,14 +75,52 @@ def retrieve_manifest_data(bucket_name: str, manifest_key: str):
         logger.error(message)
         raise ValueError(message)
 
+    return read_manifest_data(manifest_obj["Body"])
+
+
+def read_manifest_data(manifest_stream, chunk_size: int = MANIFEST_READ_CHUNK_SIZE):
+    """
+    Parse a manifest from a file-like stream (e.g. the get_object body) chunk by chunk.
+    Headers are validated from the first chunk, and only the required columns are kept from each chunk.
+    :param manifest_stream: file-like object of the manifest content
+    :param chunk_size: number of rows parsed at a time
+    :return: manifest DataFrame
+    """
+    manifest_chunk_list = []
+
     try:
-        manifest_str = io.BytesIO(manifest_obj["Body"].read())
-        manifest_data = pd.read_csv(manifest_str, sep="\t", encoding="utf8")
-        manifest_data.fillna(value="not provided", inplace=True)
+        manifest_reader = pd.read_csv(
+            manifest_stream,
+            sep="\t",
+            encoding="utf8",
+            dtype="string",
+            chunksize=chunk_size,
+        )
+
+        for manifest_chunk in manifest_reader:
+            if not manifest_chunk_list:
+                validate_manifest_header(manifest_chunk.columns.tolist())
+
+            manifest_chunk = manifest_chunk[MANIFEST_COLUMNS].fillna(
+                value="not provided"
+            )
+
+            # Removing leading/trailing spaces in the column
+            manifest_chunk["filename"] = manifest_chunk["filename"].str.strip()
+
+            manifest_chunk_list.append(manifest_chunk)
 
-        # Removing leading/trailing spaces in the column
-        manifest_data["filename"] = manifest_data["filename"].str.strip()
+        manifest_data = pd.concat(manifest_chunk_list, ignore_index=True)
 
+        # Study IDs are heavily repeated across files
+        manifest_data["agha_study_id"] = manifest_data["agha_study_id"].astype(
+            "category"
+        )
+
+    except ManifestHeaderError as e:
+        message = f"manifest header is invalid:\r{e}"
+        logger.error(message)
+        raise ValueError(message)
     except Exception as e:
         message = f"could not convert manifest into DataFrame:\r{e}"
         logger.error(message)
@@ -86,15 +129,23 @@ def retrieve_manifest_data(bucket_name: str, manifest_key: str):
     return manifest_data
 
 
+def validate_manifest_header(columns: list):
+    columns_missing = MANIFEST_REQUIRED_COLUMNS.difference(columns)
+    if columns_missing:
+        plurality = "column" if len(columns_missing) == 1 else "columns"
+        cmissing_str = "\r\t".join(sorted(columns_missing))
+        cfound_str = "\r\t".join(columns)
+        raise ManifestHeaderError(
+            f"required {plurality} missing from manifest:\r\t{cmissing_str}\rGot:\r\t{cfound_str}"
+        )
+
+
 def validate_manifest(
     data: SubmissionData,
     postfix_exception_list: list,
     skip_checksum_check: bool = False,
 ):
-    # Check manifest columns
-    columns_present = set(data.manifest_data.columns.tolist())
-    columns_missing = MANIFEST_REQUIRED_COLUMNS.difference(columns_present)
-
+    # Manifest columns are checked when read (See read_manifest_data)
     is_checksum_unique = data.manifest_data["checksum"].dropna().is_unique
 
     if not is_checksum_unique:
@@ -109,15 +160,6 @@ def validate_manifest(
             )
         )
 
-    if columns_missing:
-        plurality = "column" if len(columns_missing) == 1 else "columns"
-        cmissing_str = "\r\t".join(columns_missing)
-        cfound_str = "\r\t".join(columns_present)
-        message_base = f"required {plurality} missing from manifest:"
-        message_str = f"{message_base}\r\t{cmissing_str}\rGot:\r\t{cfound_str}"
-        notification.log_and_store_message(message_str, level="critical")
-        raise ValueError(json.dumps(message_str, indent=4, cls=util.JsonSerialEncoder))
-
     # File discovery
     # Entry count
     notification.log_and_store_message(
@@ -207,26 +249,13 @@ def validate_manifest(
         notification.MESSAGE_STORE.append("")  # New line to separate warning in email
 
     # Field validation in the manifest file
-    for row in data.manifest_data.itertuples():
-
-        # Skipping check on manifest for skipped name
-        if is_file_skipped(row.filename, postfix_exception_list):
-            continue
-
-        # Study ID
-        agha_study_id_list = row.agha_study_id.split(
-            ","
-        )  # Separate by commas for multi study-id
-        for agha_study_id in agha_study_id_list:
-            if not AGHA_ID_RE.match(agha_study_id) and not MM_ID_RE.match(
-                agha_study_id
-            ):
-                message = f"Malformed AGHA study ID ({row.filename}): {agha_study_id} "
-                messages_error.append(message)
-        # Checksum
-        if not MD5_RE.match(row.checksum) and not skip_checksum_check:
-            message = f"Malformed MD5 checksum ({row.filename}): {row.checksum} "
-            messages_error.append(message)
+    messages_error.extend(
+        validate_manifest_fields(
+            data.manifest_data,
+            postfix_exception_list,
+            skip_checksum_check=skip_checksum_check,
+        )
+    )
 
     # Check for error messages, exit in strict mode otherwise just emit warnings
     if messages_error:
@@ -250,6 +279,65 @@ def validate_manifest(
     return files_matched_accepted, list(files_missing_from_manifest)
 
 
+def validate_manifest_fields(
+    manifest_df: pd.DataFrame,
+    postfix_exception_list: list = None,
+    skip_checksum_check: bool = False,
+) -> list:
+    """
+    Validate study IDs and checksums over whole manifest columns.
+    Error messages are returned in manifest row order, study ID errors before the checksum error of the same row.
+    :param manifest_df: manifest content
+    :param postfix_exception_list: filename postfixes to skip from the check
+    :param skip_checksum_check: do not validate the checksum column
+    :return: list of error messages
+    """
+    manifest_df = manifest_df.reset_index(drop=True)
+    is_skipped = is_file_skipped_series(manifest_df["filename"], postfix_exception_list)
+    checked_df = manifest_df.loc[~is_skipped]
+    filename = checked_df["filename"].astype(str)
+
+    # Study ID (Separate by commas for multi study-id)
+    study_id = checked_df["agha_study_id"].astype(str).str.split(",").explode()
+    is_study_id_valid = study_id.str.match(AGHA_ID_RE) | study_id.str.match(MM_ID_RE)
+    malformed_study_id = study_id.loc[~is_study_id_valid.astype(bool)]
+    error_df_list = [
+        pd.DataFrame(
+            {
+                "row": malformed_study_id.index,
+                "order": 0,
+                "message": "Malformed AGHA study ID ("
+                + filename.loc[malformed_study_id.index].to_numpy()
+                + "): "
+                + malformed_study_id.to_numpy()
+                + " ",
+            }
+        )
+    ]
+
+    # Checksum
+    if not skip_checksum_check:
+        checksum = checked_df["checksum"].astype(str)
+        malformed_checksum = checksum.loc[~checksum.str.match(MD5_RE).astype(bool)]
+        error_df_list.append(
+            pd.DataFrame(
+                {
+                    "row": malformed_checksum.index,
+                    "order": 1,
+                    "message": "Malformed MD5 checksum ("
+                    + filename.loc[malformed_checksum.index].to_numpy()
+                    + "): "
+                    + malformed_checksum.to_numpy()
+                    + " ",
+                }
+            )
+        )
+
+    error_df = pd.concat(error_df_list, ignore_index=True)
+    error_df = error_df.sort_values(by=["row", "order"], kind="mergesort")
+    return error_df["message"].tolist()
+
+
 def find_study_id_from_manifest_df_and_filename(manifest_df, filename):
     file_info = manifest_df.loc[manifest_df["filename"] == filename].iloc[0]
     return file_info["agha_study_id"]
@@ -285,3 +373,26 @@ def is_file_skipped(filename: str, postfix_exception_list: list = None) -> bool:
     ):
         return True
     return False
+
+
+def is_file_skipped_series(
+    filename_series: pd.Series, postfix_exception_list: list = None
+) -> pd.Series:
+    """
+    Vectorized is_file_skipped over a column of filenames.
+    :param filename_series:
+    :param postfix_exception_list:
+    :return: boolean Series, True where the file is skipped from validation
+    """
+    if postfix_exception_list is None:
+        postfix_exception_list = []
+
+    skipped_postfix = (
+        *agha.FileType.MANIFEST.get_extensions(),
+        *agha.FileType.BAM_INDEX.get_extensions(),
+        *agha.FileType.CRAM_INDEX.get_extensions(),
+        *agha.FileType.VCF_INDEX.get_extensions(),
+        ".md5",
+        *postfix_exception_list,
+    )
+    return filename_series.astype(str).str.endswith(skipped_postfix)
@@ -0,0 +1,63 @@
+"""
+To run the testcase
+
+Change directory the s3_event_router
+cmd from root directory: cd lambdas/layers/util
+
+Run python test command:
+cmd: python -m unittest util.tests.test_agha.TestAghaLayer
+
+"""
+
+import unittest
+
+import pandas as pd
+
+from util import agha
+
+
+class TestAghaLayer(unittest.TestCase):
+    def test_flagship_from_name(self):
+        self.assertEqual(
+            agha.FlagShip.from_name("acute_care_genomics"),
+            agha.FlagShip.ACUTE_CARE_GENOMICS,
+        )
+        self.assertEqual(agha.FlagShip.from_name("AC").preferred_code(), "AC")
+        self.assertEqual(
+            agha.FlagShip.from_name("Renal Genetics"), agha.FlagShip.RENAL_GENETICS
+        )
+        self.assertEqual(agha.FlagShip.from_name("ac"), agha.FlagShip.UNKNOWN)
+
+    def test_flagship_from_name_case_insensitive(self):
+        self.assertEqual(
+            agha.FlagShip.from_name("ac", case_insensitive=True),
+            agha.FlagShip.ACUTE_CARE_GENOMICS,
+        )
+        self.assertEqual(
+            agha.FlagShip.from_name("KIDGEN", case_insensitive=True),
+            agha.FlagShip.RENAL_GENETICS,
+        )
+        self.assertEqual(
+            agha.FlagShip.from_name("NOT_A_FLAGSHIP", case_insensitive=True),
+            agha.FlagShip.UNKNOWN,
+        )
+
+    def test_flagship_from_names(self):
+        prefix_series = pd.Series(["AC", "mito", "AC", "foo", "KidGen"])
+
+        flagship_series = agha.FlagShip.from_names(prefix_series)
+
+        self.assertEqual(
+            flagship_series.tolist(),
+            [
+                agha.FlagShip.ACUTE_CARE_GENOMICS,
+                agha.FlagShip.MITOCHONDRIAL_DISORDERS,
+                agha.FlagShip.ACUTE_CARE_GENOMICS,
+                agha.FlagShip.UNKNOWN,
+                agha.FlagShip.RENAL_GENETICS,
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+To run the testcase
+
+Change directory the s3_event_router
+cmd from root directory: cd lambdas/layers/util
+
+Run python test command:
+cmd: python -m unittest util.tests.test_cache.TestCacheLayer
+
+"""
+
+import unittest
+from unittest import mock
+
+from util import notification
+from util.cache import TTLCache
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCacheLayer(unittest.TestCase):
+    def setUp(self) -> None:
+        notification.IAM_USER_INDEX_CACHE.clear()
+        notification.PRINCIPAL_CACHE.clear()
+
+    def test_ttl_expiry(self):
+        timer = FakeTimer()
+        cache = TTLCache(maxsize=2, ttl=10, timer=timer)
+
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+
+        timer.now = 10
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats(), {"hit": 1, "miss": 1, "size": 0})
+
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2, ttl=10)
+
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # "b" is now the least recently used
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+
+    def test_get_or_set(self):
+        cache = TTLCache()
+        loader = mock.MagicMock(return_value="value")
+
+        cache.get_or_set("key", loader)
+        self.assertEqual(cache.get_or_set("key", loader), "value")
+        loader.assert_called_once()
+
+    def test_get_name_email_from_principalid(self):
+        user_id = "A" * 21
+        mock_iam = mock.MagicMock()
+        mock_iam.get_paginator.return_value.paginate.return_value = [
+            {"Users": [{"UserId": "B" * 21, "UserName": "other"}]},
+            {"Users": [{"UserId": user_id, "UserName": "john"}]},
+        ]
+        mock_iam.get_user.return_value = {
+            "User": {"Tags": [{"Key": "email", "Value": "john@example.com"}]}
+        }
+
+        with mock.patch.object(notification, "CLIENT_IAM", mock_iam):
+            for _ in range(3):
+                name_email = notification.get_name_email_from_principalid(
+                    f"AWS:{user_id}"
+                )
+
+        self.assertEqual(name_email, ("john", "john@example.com"))
+        mock_iam.get_paginator.assert_called_once_with("list_users")
+        mock_iam.get_user.assert_called_once_with(UserName="john")
+
+    def test_get_name_email_from_unknown_principalid(self):
+        mock_iam = mock.MagicMock()
+        mock_iam.get_paginator.return_value.paginate.return_value = [{"Users": []}]
+
+        with mock.patch.object(notification, "CLIENT_IAM", mock_iam):
+            name_email = notification.get_name_email_from_principalid(f"AWS:{'C' * 21}")
+
+        self.assertEqual(name_email, (None, None))
+        mock_iam.get_user.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
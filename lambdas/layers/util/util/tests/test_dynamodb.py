@@ -0,0 +1,425 @@
+"""
+To run the testcase
+
+Change directory the s3_event_router
+cmd from root directory: cd lambdas/layers/util
+
+Run python test command:
+cmd: python -m unittest util.tests.test_dynamodb.TestDynamodbLayer
+cmd: python -m unittest util.tests.test_dynamodb.TestSubmissionStatus
+cmd: python -m unittest util.tests.test_dynamodb.TestStudyIdIndex
+
+"""
+
+import os
+import unittest
+from unittest import mock
+
+import boto3
+from boto3.dynamodb.conditions import Attr
+from moto import mock_aws
+
+from util import dynamodb
+
+
+class TestDynamodbLayer(unittest.TestCase):
+    def setUp(self) -> None:
+        dynamodb.clear_query_cache()
+
+        self.mock_table = mock.MagicMock()
+        self.mock_table.query.return_value = {
+            "Items": [{"partition_key": "TYPE:MANIFEST", "sort_key": "AC/1/a.bam"}]
+        }
+        mock_resource = mock.MagicMock()
+        mock_resource.Table.return_value = self.mock_table
+
+        patcher = mock.patch.object(
+            dynamodb, "get_resource", return_value=mock_resource
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cached_query_hit_and_miss(self):
+        first = dynamodb.get_cached_batch_item_from_pk_and_sk(
+            "staging", "TYPE:MANIFEST", "AC/1"
+        )
+        second = dynamodb.get_cached_batch_item_from_pk_and_sk(
+            "staging", "TYPE:MANIFEST", "AC/1"
+        )
+        dynamodb.get_cached_batch_item_from_pk_and_sk("staging", "TYPE:FILE", "AC/1")
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.mock_table.query.call_count, 2)
+        self.assertEqual(
+            dynamodb.get_query_cache_stats(),
+            {"hit": 1, "miss": 2, "cached_query": 2},
+        )
+
+    def test_cached_query_return_copy(self):
+        first = dynamodb.get_cached_batch_item_from_pk_and_sk(
+            "staging", "TYPE:MANIFEST", "AC/1"
+        )
+        first[0]["sort_key"] = "modified"
+
+        second = dynamodb.get_cached_batch_item_from_pk_and_sk(
+            "staging", "TYPE:MANIFEST", "AC/1"
+        )
+        self.assertEqual(second[0]["sort_key"], "AC/1/a.bam")
+
+    def test_cached_query_keyed_by_filter(self):
+        dynamodb.get_cached_batch_item_from_pk_and_sk(
+            "result", "STATUS:CHECKSUM", "AC/1", filter_expr=Attr("value").ne("PASS")
+        )
+        dynamodb.get_cached_batch_item_from_pk_and_sk(
+            "result", "STATUS:CHECKSUM", "AC/1", filter_expr=Attr("value").ne("PASS")
+        )
+        dynamodb.get_cached_batch_item_from_pk_and_sk(
+            "result", "STATUS:CHECKSUM", "AC/1", filter_expr=Attr("value").ne("FAIL")
+        )
+
+        self.assertEqual(self.mock_table.query.call_count, 2)
+
+    def test_write_invalidate_cached_query(self):
+        dynamodb.get_cached_batch_item_from_pk_and_sk("store", "TYPE:MANIFEST", "AC/1")
+        dynamodb.get_cached_batch_item_from_pk_and_sk(
+            "staging", "TYPE:MANIFEST", "AC/1"
+        )
+
+        dynamodb.batch_write_objects("store", [])
+
+        dynamodb.get_cached_batch_item_from_pk_and_sk("store", "TYPE:MANIFEST", "AC/1")
+        dynamodb.get_cached_batch_item_from_pk_and_sk(
+            "staging", "TYPE:MANIFEST", "AC/1"
+        )
+        self.assertEqual(self.mock_table.query.call_count, 3)
+
+
+class TestSubmissionStatus(unittest.TestCase):
+    table_name = "agha-gdr-submission-status"
+
+    def setUp(self) -> None:
+        env_patcher = mock.patch.dict(os.environ)
+        env_patcher.start()
+        self.addCleanup(env_patcher.stop)
+        os.environ.pop("AWS_ENDPOINT", None)
+        os.environ.setdefault("AWS_DEFAULT_REGION", "ap-southeast-2")
+
+        mock_aws_context = mock_aws()
+        mock_aws_context.start()
+        self.addCleanup(mock_aws_context.stop)
+
+        dynamodb.DYNAMODB_RESOURCE = ""
+        self.addCleanup(setattr, dynamodb, "DYNAMODB_RESOURCE", "")
+        boto3.client("dynamodb").create_table(
+            TableName=self.table_name,
+            KeySchema=[
+                {"AttributeName": "partition_key", "KeyType": "HASH"},
+                {"AttributeName": "sort_key", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "partition_key", "AttributeType": "S"},
+                {"AttributeName": "sort_key", "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+    def test_count_from_delta(self):
+        status_delta = {}
+        for s3_key in [
+            "AC/2022-02-02/a.bam",
+            "AC/2022-02-02/a.bam.bai",
+            "AC/2022-02-02/manifest.txt",
+            "AC/2022-02-03/b.bam",
+        ]:
+            dynamodb.add_submission_status_count(
+                status_delta, s3_key, dynamodb.SubmissionStatus.UPLOADED
+            )
+        dynamodb.add_submission_status_count(
+            status_delta,
+            "AC/2022-02-03/b.bam",
+            dynamodb.SubmissionStatus.UPLOADED,
+            -1,
+        )
+        self.assertEqual(
+            status_delta,
+            {"AC/2022-02-02/": {"uploaded": 2}, "AC/2022-02-03/": {"uploaded": 0}},
+        )
+
+        dynamodb.update_submission_status_count_from_delta(
+            self.table_name, status_delta
+        )
+        dynamodb.update_submission_status_count_from_delta(
+            self.table_name, status_delta
+        )
+
+        record = dynamodb.get_submission_status(self.table_name, "AC/2022-02-02/")
+        self.assertEqual(record["uploaded"], 4)
+        self.assertEqual(record["flagship"], "AC")
+        # Nothing to write for a zero delta
+        self.assertIsNone(
+            dynamodb.get_submission_status(self.table_name, "AC/2022-02-03/")
+        )
+
+    def test_validation_complete(self):
+        submission_prefix = "AC/2022-02-02/"
+        dynamodb.increment_submission_status(
+            self.table_name, submission_prefix, {"passed": 5, "failed": 1}
+        )
+        dynamodb.set_submission_status(
+            self.table_name,
+            submission_prefix,
+            {"validating": 2, "passed": 0, "failed": 0},
+        )
+        dynamodb.increment_submission_status(
+            self.table_name, submission_prefix, {"passed": 1}
+        )
+
+        record = dynamodb.get_submission_status(self.table_name, submission_prefix)
+        self.assertFalse(dynamodb.SubmissionStatusRecord.is_validation_complete(record))
+
+        record = dynamodb.increment_submission_status(
+            self.table_name, submission_prefix, {"passed": 1}
+        )
+        self.assertTrue(dynamodb.SubmissionStatusRecord.is_validation_passed(record))
+
+        self.assertFalse(dynamodb.SubmissionStatusRecord.is_transfer_complete(record))
+        record = dynamodb.set_submission_status(
+            self.table_name,
+            submission_prefix,
+            {"transfer_expected": 1, "transfer_received": 0},
+        )
+        self.assertFalse(dynamodb.SubmissionStatusRecord.is_transfer_complete(record))
+        record = dynamodb.increment_submission_status(
+            self.table_name, submission_prefix, {"transfer_received": 1}
+        )
+        self.assertTrue(dynamodb.SubmissionStatusRecord.is_transfer_complete(record))
+
+        status_list = dynamodb.get_submission_status_list(self.table_name, "AC")
+        self.assertEqual([r["sort_key"] for r in status_list], [submission_prefix])
+
+    def test_submission_status_with_pending_transfer(self):
+        dynamodb.set_submission_status(
+            self.table_name,
+            "AC/2022-02-02/",
+            {"transfer_expected": 2, "transfer_received": 1},
+        )
+        dynamodb.set_submission_status(
+            self.table_name,
+            "AC/2022-03-03/",
+            {"transfer_expected": 2, "transfer_received": 2},
+        )
+        dynamodb.increment_submission_status(
+            self.table_name, "GI/2022-02-02/", {"uploaded": 1}
+        )
+
+        status_list = dynamodb.get_submission_status_with_pending_transfer(
+            self.table_name
+        )
+
+        self.assertEqual([r["sort_key"] for r in status_list], ["AC/2022-02-02/"])
+
+    def test_validation_in_progress(self):
+        record_class = dynamodb.SubmissionStatusRecord
+
+        self.assertTrue(
+            record_class.is_validation_in_progress(
+                {"validating": 2, "passed": 1, "failed": 0}
+            )
+        )
+        # Missing counters or a count over the number validating are left to the full check
+        self.assertFalse(record_class.is_validation_in_progress({}))
+        self.assertFalse(
+            record_class.is_validation_in_progress({"passed": 1, "failed": 0})
+        )
+        self.assertFalse(
+            record_class.is_validation_in_progress(
+                {"validating": 1, "passed": 1, "failed": 1}
+            )
+        )
+        self.assertFalse(
+            record_class.is_validation_in_progress(
+                {"validating": 2, "passed": 1, "failed": 0}, min_outstanding=2
+            )
+        )
+
+    def test_missing_table_is_not_fatal(self):
+        self.assertIsNone(
+            dynamodb.increment_submission_status(
+                "non-existent-table", "AC/2022-02-02/", {"uploaded": 1}
+            )
+        )
+        self.assertIsNone(dynamodb.get_submission_status(None, "AC/2022-02-02/"))
+
+
+class TestStudyIdIndex(unittest.TestCase):
+    table_name = "agha-gdr-store-bucket"
+
+    def setUp(self) -> None:
+        env_patcher = mock.patch.dict(os.environ)
+        env_patcher.start()
+        self.addCleanup(env_patcher.stop)
+        os.environ.pop("AWS_ENDPOINT", None)
+        os.environ.setdefault("AWS_DEFAULT_REGION", "ap-southeast-2")
+
+        mock_aws_context = mock_aws()
+        mock_aws_context.start()
+        self.addCleanup(mock_aws_context.stop)
+
+        dynamodb.DYNAMODB_RESOURCE = ""
+        self.addCleanup(setattr, dynamodb, "DYNAMODB_RESOURCE", "")
+        boto3.client("dynamodb").create_table(
+            TableName=self.table_name,
+            KeySchema=[
+                {"AttributeName": "partition_key", "KeyType": "HASH"},
+                {"AttributeName": "sort_key", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "partition_key", "AttributeType": "S"},
+                {"AttributeName": "sort_key", "AttributeType": "S"},
+                {"AttributeName": "index_agha_study_id", "AttributeType": "S"},
+                {"AttributeName": "s3_key", "AttributeType": "S"},
+            ],
+            GlobalSecondaryIndexes=[
+                {
+                    "IndexName": dynamodb.AGHA_STUDY_ID_INDEX_NAME,
+                    "KeySchema": [
+                        {"AttributeName": "index_agha_study_id", "KeyType": "HASH"},
+                        {"AttributeName": "s3_key", "KeyType": "RANGE"},
+                    ],
+                    "Projection": {"ProjectionType": "ALL"},
+                }
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+    @staticmethod
+    def create_manifest_record(s3_key, agha_study_id):
+        return dynamodb.ManifestFileRecord(
+            partition_key=dynamodb.FileRecordPartitionKey.MANIFEST_FILE_RECORD.value,
+            sort_key=s3_key,
+            flagship="AC",
+            filename=s3_key.split("/")[-1],
+            filetype="BAM",
+            provided_checksum="abc",
+            agha_study_id=agha_study_id,
+        )
+
+    def get_index_s3_key_list(self, agha_study_id, s3_key_prefix=""):
+        return [
+            item["sort_key"]
+            for item in dynamodb.get_batch_item_from_agha_study_id(
+                self.table_name, agha_study_id, s3_key_prefix
+            )
+        ]
+
+    def test_split_agha_study_id(self):
+        self.assertEqual(
+            dynamodb.split_agha_study_id("A1234567, A1234568,"),
+            ["A1234567", "A1234568"],
+        )
+        self.assertEqual(dynamodb.split_agha_study_id(None), [])
+
+    def test_multi_study_id_fan_out(self):
+        dynamodb.update_study_id_index_from_manifest_record_list(
+            self.table_name,
+            [
+                self.create_manifest_record("AC/1/a.bam", "A1234567,A1234568"),
+                self.create_manifest_record("AC/1/b.bam", "A1234568"),
+                self.create_manifest_record("GI/1/c.bam", "A1234567"),
+            ],
+            sort_key_prefix="",
+        )
+
+        self.assertEqual(
+            self.get_index_s3_key_list("A1234567"), ["AC/1/a.bam", "GI/1/c.bam"]
+        )
+        self.assertEqual(
+            self.get_index_s3_key_list("A1234568"), ["AC/1/a.bam", "AC/1/b.bam"]
+        )
+        self.assertEqual(self.get_index_s3_key_list("A1234567", "AC/"), ["AC/1/a.bam"])
+
+        item = dynamodb.get_batch_item_from_agha_study_id(self.table_name, "A1234568")[
+            0
+        ]
+        self.assertEqual(item["provided_checksum"], "abc")
+        self.assertEqual(item["agha_study_id"], "A1234567,A1234568")
+
+    def test_get_item_from_sort_key_list(self):
+        dynamodb.batch_write_objects(
+            self.table_name,
+            [
+                {
+                    "partition_key": dynamodb.FileRecordPartitionKey.FILE_RECORD.value,
+                    "sort_key": f"AC/1/{i}.bam",
+                    "size_in_bytes": i,
+                }
+                for i in range(150)
+            ],
+        )
+
+        item_list = dynamodb.get_batch_item_from_pk_and_sk_list(
+            self.table_name,
+            dynamodb.FileRecordPartitionKey.FILE_RECORD.value,
+            [f"AC/1/{i}.bam" for i in range(0, 150, 2)] + ["AC/1/0.bam", "AC/1/x.bam"],
+            projection_expr="sort_key, size_in_bytes",
+        )
+
+        self.assertEqual(
+            {item["sort_key"]: item["size_in_bytes"] for item in item_list},
+            {f"AC/1/{i}.bam": i for i in range(0, 150, 2)},
+        )
+
+    def test_update_remove_stale_index(self):
+        dynamodb.update_study_id_index_from_manifest_record_list(
+            self.table_name,
+            [self.create_manifest_record("AC/1/a.bam", "A1234567,A1234568")],
+        )
+        written, deleted = dynamodb.update_study_id_index_from_manifest_record_list(
+            self.table_name,
+            [self.create_manifest_record("AC/1/a.bam", "A1234568")],
+        )
+
+        self.assertEqual((written, deleted), (1, 1))
+        self.assertEqual(self.get_index_s3_key_list("A1234567"), [])
+        self.assertEqual(self.get_index_s3_key_list("A1234568"), ["AC/1/a.bam"])
+
+    def test_delete_from_s3_key(self):
+        dynamodb.update_study_id_index_from_manifest_record_list(
+            self.table_name,
+            [
+                self.create_manifest_record("AC/1/a.bam", "A1234567,A1234568"),
+                self.create_manifest_record("AC/1/a.bam.bai", "A1234567"),
+            ],
+        )
+        deleted = dynamodb.delete_study_id_index_from_s3_key(
+            self.table_name, "AC/1/a.bam"
+        )
+
+        self.assertEqual(len(deleted), 2)
+        self.assertEqual(self.get_index_s3_key_list("A1234567"), ["AC/1/a.bam.bai"])
+
+    def test_manifest_record_fallback(self):
+        dynamodb.batch_write_records(
+            self.table_name,
+            [
+                self.create_manifest_record("AC/1/a.bam", "A1234567, A1234568"),
+                self.create_manifest_record("AC/1/b.bam", "A1234568"),
+                self.create_manifest_record("GI/1/c.bam", "A1234567"),
+            ],
+        )
+
+        record_by_study_id = dynamodb.get_manifest_record_by_agha_study_id(
+            self.table_name, ["A1234567", "A0000000"], "AC/"
+        )
+
+        self.assertEqual(
+            {
+                study_id: [r["sort_key"] for r in record_list]
+                for study_id, record_list in record_by_study_id.items()
+            },
+            {"A1234567": ["AC/1/a.bam"]},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+To run the testcase
+
+Change directory the s3_event_router
+cmd from root directory: cd lambdas/layers/util
+
+Run python test command:
+cmd: python -m unittest util.tests.test_instrumentation.TestInstrumentationLayer
+
+"""
+
+import json
+import unittest
+from unittest import mock
+
+import boto3
+import botocore.config
+import botocore.exceptions
+from botocore.stub import Stubber
+
+from util import instrumentation
+
+
+class TestInstrumentationLayer(unittest.TestCase):
+    def setUp(self) -> None:
+        instrumentation.AWS_CALL_STATS.reset()
+
+    def test_record_call_from_event_handler(self):
+        model = mock.MagicMock()
+        model.service_model.service_name = "s3"
+        model.name = "GetObject"
+        http_response = mock.MagicMock(status_code=200, headers={"content-length": "5"})
+        parsed = {"ResponseMetadata": {"RetryAttempts": 2}}
+
+        context = {}
+        instrumentation.before_call_handler(
+            params={"body": b"abc"}, model=model, context=context
+        )
+        instrumentation.after_call_handler(
+            http_response=http_response, parsed=parsed, model=model, context=context
+        )
+
+        context = {}
+        instrumentation.before_call_handler(params={}, model=model, context=context)
+        instrumentation.after_call_error_handler(
+            exception=ConnectionError(), context=context
+        )
+
+        stats = instrumentation.AWS_CALL_STATS.summary()["operation"]["s3.GetObject"]
+        self.assertEqual(stats["call"], 2)
+        self.assertEqual(stats["error"], 1)
+        self.assertEqual(stats["retry"], 2)
+        self.assertEqual(stats["bytes_sent"], 3)
+        self.assertEqual(stats["bytes_received"], 5)
+
+    def test_connection_error_is_raised_and_recorded(self):
+        # Nothing listens on port 9, the client fails to connect
+        client = boto3.session.Session().client(
+            "s3",
+            region_name="ap-southeast-2",
+            endpoint_url="http://127.0.0.1:9",
+            aws_access_key_id="x",
+            aws_secret_access_key="x",
+            config=botocore.config.Config(
+                retries={"max_attempts": 0}, connect_timeout=1
+            ),
+        )
+
+        with self.assertRaises(botocore.exceptions.EndpointConnectionError):
+            client.list_buckets()
+
+        stats = instrumentation.AWS_CALL_STATS.summary()["operation"]["s3.ListBuckets"]
+        self.assertEqual(stats["call"], 1)
+        self.assertEqual(stats["error"], 1)
+
+    def test_after_call_without_before_call(self):
+        instrumentation.after_call_handler(
+            http_response=None, parsed={}, model=mock.MagicMock(), context={}
+        )
+        self.assertEqual(instrumentation.AWS_CALL_STATS.summary()["operation"], {})
+
+    def test_instrument_handler_log_summary(self):
+        # A new session picks up the builtin handlers registered at import
+        client = boto3.session.Session().client("s3", region_name="ap-southeast-2")
+        stubber = Stubber(client)
+        stubber.add_response("list_buckets", {"Buckets": []})
+
+        @instrumentation.instrument_handler
+        def handler(event, context):
+            with stubber:
+                client.list_buckets()
+            return "done"
+
+        with self.assertLogs(level="INFO") as log:
+            result = handler({}, mock.MagicMock(function_name="test-function"))
+
+        self.assertEqual(result, "done")
+        metric_log = json.loads(log.records[-1].getMessage())
+        self.assertEqual(metric_log["metric"], "aws_call_summary")
+        self.assertEqual(metric_log["function_name"], "test-function")
+
+    def test_create_metric_log_emf(self):
+        instrumentation.AWS_CALL_STATS.record(
+            operation_name="dynamodb.Query",
+            latency_ms=12.5,
+            bytes_sent=10,
+            bytes_received=20,
+            retry=0,
+            error=False,
+        )
+
+        with mock.patch.object(instrumentation, "AWS_CALL_METRIC_FORMAT", "emf"):
+            emf = json.loads(instrumentation.create_metric_log("test-function", 100))
+
+        self.assertEqual(
+            emf["_aws"]["CloudWatchMetrics"][0]["Dimensions"], [["FunctionName"]]
+        )
+        self.assertEqual(emf["AwsApiCall"], 1)
+        self.assertEqual(emf["AwsApiLatency"], 12.5)
+        self.assertEqual(emf["aws_call"]["dynamodb.Query"]["bytes_received"], 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+"""
+To run the testcase
+
+Change directory the s3_event_router
+cmd from root directory: cd lambdas/layers/util
+
+Run python test command:
+cmd: python -m unittest util.tests.test_log.TestLogLayer
+
+"""
+
+import datetime
+import decimal
+import json
+import logging
+import unittest
+from unittest import mock
+
+from util.log import LazyJson, truncate
+
+
+class TestLogLayer(unittest.TestCase):
+    def test_truncate_large_collection(self):
+        obj = {"Items": [{"sort_key": i} for i in range(100)], "Count": 100}
+
+        truncated = truncate(obj, max_items=10, sample_size=2)
+
+        self.assertEqual(
+            truncated,
+            {
+                "Items": {"count": 100, "sample": [{"sort_key": 0}, {"sort_key": 1}]},
+                "Count": 100,
+            },
+        )
+
+    def test_encode_decimal_and_datetime(self):
+        obj = {
+            "size_in_bytes": decimal.Decimal("10"),
+            "date_modified": datetime.datetime(2022, 1, 2, 3, 4, 5),
+        }
+
+        self.assertEqual(
+            json.loads(str(LazyJson(obj))),
+            {"size_in_bytes": "10", "date_modified": "2022-01-02T03:04:05"},
+        )
+
+    def test_no_serialisation_when_level_disabled(self):
+        logger = logging.getLogger("test_log")
+        logger.setLevel(logging.INFO)
+
+        with mock.patch("util.log.dumps") as mock_dumps:
+            logger.debug("%s", LazyJson({"a": 1}))
+        mock_dumps.assert_not_called()
+
+        with self.assertLogs(logger, level="INFO") as log:
+            logger.info("%s", LazyJson(list(range(30)), max_items=None))
+        self.assertEqual(json.loads(log.records[0].getMessage()), list(range(30)))
+
+
+if __name__ == "__main__":
+    unittest.main()
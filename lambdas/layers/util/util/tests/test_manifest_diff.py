@@ -0,0 +1,159 @@
+"""
+To run the testcase
+
+Change directory to the util layer
+cmd from root directory: cd lambdas/layers/util
+
+Run python test command:
+cmd: python -m unittest util.tests.test_manifest_diff.TestManifestDiff
+
+"""
+
+import random
+import unittest
+
+from util import agha, manifest_diff
+
+NUMBER_OF_EXAMPLE = 200
+
+EXTENSION_LIST = [
+    ".bam",
+    ".bam.bai",
+    ".cram",
+    ".cram.crai",
+    ".vcf",
+    ".vcf.gz",
+    ".vcf.gz.tbi",
+    ".fastq",
+    ".fastq.gz",
+    ".md5",
+    ".txt",
+]
+
+
+def find_missing_manifest_file_reference(manifest_filename_list, store_key_list):
+    """
+    The set difference previously done in batch.run_manifest_orig_store_check
+    """
+    store_filename_list = [key.split("/")[-1] for key in store_key_list]
+    manifest_orig_diff_store = list(
+        set(manifest_filename_list) - set(store_filename_list)
+    )
+
+    uncompress_file = []
+    for filename in manifest_orig_diff_store:
+        if (
+            agha.FileType.is_compressable_file(filename)
+            and not agha.FileType.is_compress_file(filename)
+            and f"{filename}.gz" in store_filename_list
+        ):
+            uncompress_file.append(filename)
+
+    return sorted(set(manifest_orig_diff_store) - set(uncompress_file))
+
+
+def create_example(rng: random.Random, extension_list=EXTENSION_LIST):
+    """
+    A manifest and a store listing drawn from the same small pool of names, so that the two overlap often.
+    """
+    name_pool = [
+        f"SAMPLE{i}{rng.choice(extension_list)}" for i in range(rng.randint(0, 30))
+    ]
+    manifest_filename_list = [
+        rng.choice(name_pool) for _ in range(rng.randint(0, 30)) if name_pool
+    ]
+    store_key_list = [
+        f"AC/2022-02-02/{rng.choice(name_pool)}"
+        for _ in range(rng.randint(0, 30))
+        if name_pool
+    ]
+    return manifest_filename_list, store_key_list
+
+
+class TestManifestDiff(unittest.TestCase):
+    def setUp(self) -> None:
+        self.rng = random.Random(42)
+
+    def test_same_as_reference_without_index(self):
+        extension_list = [
+            e for e in EXTENSION_LIST if not agha.FileType.is_index_file(f"a{e}")
+        ]
+        for _ in range(NUMBER_OF_EXAMPLE):
+            manifest, store = create_example(self.rng, extension_list)
+            self.assertEqual(
+                manifest_diff.find_missing_manifest_file(manifest, store),
+                find_missing_manifest_file_reference(manifest, store),
+                (manifest, store),
+            )
+
+    def test_never_more_missing_than_reference(self):
+        for _ in range(NUMBER_OF_EXAMPLE):
+            manifest, store = create_example(self.rng)
+            missing = manifest_diff.find_missing_manifest_file(manifest, store)
+            self.assertTrue(
+                set(missing)
+                <= set(find_missing_manifest_file_reference(manifest, store))
+            )
+            self.assertTrue(set(missing) <= set(manifest))
+
+    def test_order_independent(self):
+        for _ in range(NUMBER_OF_EXAMPLE):
+            manifest, store = create_example(self.rng)
+            expected = manifest_diff.find_missing_manifest_file(manifest, store)
+
+            self.rng.shuffle(manifest)
+            self.rng.shuffle(store)
+            self.assertEqual(
+                manifest_diff.find_missing_manifest_file(iter(manifest), iter(store)),
+                expected,
+            )
+
+    def test_adding_store_key_never_add_missing_file(self):
+        for _ in range(NUMBER_OF_EXAMPLE):
+            manifest, store = create_example(self.rng)
+            extra, _ = create_example(self.rng)
+            missing = manifest_diff.find_missing_manifest_file(manifest, store)
+
+            self.assertTrue(
+                set(manifest_diff.find_missing_manifest_file(manifest, store + extra))
+                <= set(missing)
+            )
+
+    def test_manifest_in_store(self):
+        for _ in range(NUMBER_OF_EXAMPLE):
+            manifest, _ = create_example(self.rng)
+            self.assertEqual(
+                manifest_diff.find_missing_manifest_file(manifest, manifest), []
+            )
+
+    def test_compressed_and_index_file(self):
+        store = [
+            "AC/2022-02-02/A.fastq.gz",
+            "AC/2022-02-02/B.bam",
+            "AC/2022-02-02/C.vcf",
+        ]
+        manifest = [
+            "A.fastq",
+            "A.fastq.gz",
+            "B.bam.bai",
+            "C.vcf.gz",
+            "C.vcf.gz.tbi",
+            "D.bam.bai",
+        ]
+
+        self.assertEqual(
+            manifest_diff.find_missing_manifest_file(manifest, store),
+            ["C.vcf.gz", "C.vcf.gz.tbi", "D.bam.bai"],
+        )
+
+    def test_postfix_exception(self):
+        self.assertEqual(
+            manifest_diff.find_missing_manifest_file(
+                ["A.bam", "A.bam.md5"], ["AC/1/A.bam"], postfix_exception_list=[".md5"]
+            ),
+            [],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+"""
+To run the testcase
+
+Change directory to the util layer
+cmd from root directory: cd lambdas/layers/util
+
+Run python test command:
+cmd: python -m unittest util.tests.test_notification.TestNotificationOutbox
+
+"""
+
+import os
+import unittest
+from unittest import mock
+
+import boto3
+from moto import mock_aws
+
+from util import dynamodb, notification
+
+
+def create_outbox_record(created_at, submission_prefix, messages, email=""):
+    return {
+        "partition_key": notification.OUTBOX_PARTITION_KEY,
+        "sort_key": f"{created_at:012d}:{len(messages)}{submission_prefix}",
+        "created_at": created_at,
+        "submission_prefix": submission_prefix,
+        "subject": notification.EMAIL_SUBJECT,
+        "messages": messages,
+        "submitter_info": {
+            "name": "John Doe",
+            "email": email,
+            "submission_prefix": submission_prefix,
+        },
+    }
+
+
+class TestNotificationOutbox(unittest.TestCase):
+    table_name = "agha-gdr-notification-outbox"
+
+    def setUp(self) -> None:
+        env_patcher = mock.patch.dict(os.environ)
+        env_patcher.start()
+        self.addCleanup(env_patcher.stop)
+        os.environ.pop("AWS_ENDPOINT", None)
+        os.environ.setdefault("AWS_DEFAULT_REGION", "ap-southeast-2")
+
+        mock_aws_context = mock_aws()
+        mock_aws_context.start()
+        self.addCleanup(mock_aws_context.stop)
+
+        dynamodb.DYNAMODB_RESOURCE = ""
+        self.addCleanup(setattr, dynamodb, "DYNAMODB_RESOURCE", "")
+        boto3.client("dynamodb").create_table(
+            TableName=self.table_name,
+            KeySchema=[
+                {"AttributeName": "partition_key", "KeyType": "HASH"},
+                {"AttributeName": "sort_key", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "partition_key", "AttributeType": "S"},
+                {"AttributeName": "sort_key", "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+        table_patcher = mock.patch.object(
+            notification, "DYNAMODB_NOTIFICATION_OUTBOX_TABLE_NAME", self.table_name
+        )
+        table_patcher.start()
+        self.addCleanup(table_patcher.stop)
+
+        message_patcher = mock.patch.object(notification, "MESSAGE_STORE", [])
+        message_patcher.start()
+        self.addCleanup(message_patcher.stop)
+
+    def test_send_notifications_write_outbox(self):
+        notification.initialized_submitter_information(
+            name="John Doe", email="john@example.com", submission_prefix="AC/1/"
+        )
+        notification.log_and_store_message("Manifest is valid\n  2 files")
+
+        with mock.patch("util.get_client") as mock_get_client:
+            notification.send_notifications()
+        mock_get_client.assert_not_called()
+
+        outbox_list = notification.get_outbox_notification_list(self.table_name)
+        self.assertEqual(len(outbox_list), 1)
+        self.assertEqual(outbox_list[0]["submission_prefix"], "AC/1/")
+        self.assertEqual(outbox_list[0]["messages"], ["Manifest is valid\n  2 files"])
+
+    def test_group_quiet_submission(self):
+        outbox_list = [
+            create_outbox_record(100, "AC/1/", ["a"]),
+            create_outbox_record(110, "AC/1/", ["b"]),
+            create_outbox_record(150, "AC/2/", ["c"]),
+            create_outbox_record(105, "AC/1/", ["d"], email="john@example.com"),
+        ]
+
+        group_list = notification.group_outbox_notification(
+            outbox_list, flush_before=120, force_flush_before=0
+        )
+        self.assertEqual(
+            [[r["messages"][0] for r in group] for group in group_list],
+            [["a", "b"], ["d"]],
+        )
+
+    def test_group_force_flush_busy_submission(self):
+        outbox_list = [
+            create_outbox_record(100, "AC/1/", ["a"]),
+            create_outbox_record(200, "AC/1/", ["b"]),
+        ]
+
+        self.assertEqual(
+            notification.group_outbox_notification(
+                outbox_list, flush_before=150, force_flush_before=50
+            ),
+            [],
+        )
+        self.assertEqual(
+            len(
+                notification.group_outbox_notification(
+                    outbox_list, flush_before=150, force_flush_before=101
+                )
+            ),
+            1,
+        )
+
+    def test_merge(self):
+        group = [
+            create_outbox_record(100, "AC/1/", ["a", "b"]),
+            create_outbox_record(110, "AC/1/", ["c"], email="john@example.com"),
+        ]
+
+        payload = notification.merge_outbox_notification(group)
+        self.assertEqual(payload["messages"], ["a", "b", "", "c"])
+        self.assertEqual(payload["submitter_info"]["email"], "john@example.com")
+        self.assertEqual(payload["subject"], notification.EMAIL_SUBJECT)
+
+
+if __name__ == "__main__":
+    unittest.main()
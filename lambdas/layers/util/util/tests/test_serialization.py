@@ -0,0 +1,63 @@
+"""
+To run the testcase
+
+Change directory the s3_event_router
+cmd from root directory: cd lambdas/layers/util
+
+Run python test command:
+cmd: python -m unittest util.tests.test_serialization.TestSerializationLayer
+
+"""
+
+import datetime
+import decimal
+import json
+import unittest
+from unittest import mock
+
+import util
+from util import serialization
+
+
+class TestSerializationLayer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.record = {
+            "sort_key": "AC/2022/a.bam",
+            "size_in_bytes": decimal.Decimal("1024"),
+            "date_modified": datetime.datetime(2022, 1, 2, 3, 4, 5),
+            "value": [{"coverage": decimal.Decimal("30.5")}],
+        }
+        self.expected = {
+            "sort_key": "AC/2022/a.bam",
+            "size_in_bytes": "1024",
+            "date_modified": "2022-01-02T03:04:05",
+            "value": [{"coverage": "30.5"}],
+        }
+
+    def test_dumps_same_as_encoder(self):
+        for backend in ["json", "orjson"]:
+            with mock.patch.object(serialization, "JSON_BACKEND", backend):
+                self.assertEqual(
+                    json.loads(serialization.dumps(self.record)), self.expected
+                )
+
+        self.assertEqual(
+            serialization.dumps(self.record, indent=4),
+            json.dumps(self.record, indent=4, cls=util.JsonSerialEncoder),
+        )
+
+    def test_dumps_fallback_on_large_integer(self):
+        self.assertEqual(
+            serialization.dumps({"a": 2**70}), '{"a": 1180591620717411303424}'
+        )
+
+    def test_normalise_decimal_recursive(self):
+        record = util.replace_record_decimal_object(dict(self.record))
+
+        self.assertEqual(record["size_in_bytes"], 1024)
+        self.assertIsInstance(record["size_in_bytes"], int)
+        self.assertEqual(record["value"], [{"coverage": 30.5}])
+
+
+if __name__ == "__main__":
+    unittest.main()
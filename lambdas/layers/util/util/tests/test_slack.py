@@ -0,0 +1,138 @@
+"""
+To run the testcase
+
+Change directory to the util layer
+cmd from root directory: cd lambdas/layers/util
+
+Run python test command:
+cmd: python -m unittest util.tests.test_slack.TestSlackWebhookSession
+
+"""
+
+import http.server
+import json
+import threading
+import unittest
+
+from util import slack
+
+
+class SlackStandInServer(http.server.ThreadingHTTPServer):
+    """
+    Local HTTP/1.1 server standing in for the Slack webhook. Records every request and the client port it came from,
+    and answers with the queued status (200 once the queue is empty).
+    """
+
+    def __init__(self):
+        self.request_list = []
+        self.status_queue = []
+        self.close_after_response = False
+        super().__init__(("127.0.0.1", 0), SlackStandInHandler)
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class SlackStandInHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.request_list.append(
+            {
+                "path": self.path,
+                "client_port": self.client_address[1],
+                "body": json.loads(body),
+            }
+        )
+
+        status = self.server.status_queue.pop(0) if self.server.status_queue else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        if self.server.close_after_response:
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestSlackWebhookSession(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = SlackStandInServer()
+        self.addCleanup(self.server.stop)
+
+        self.session = slack.SlackWebhookSession(
+            "127.0.0.1",
+            port=self.server.port,
+            timeout=5,
+            max_retry=2,
+            retry_backoff=0,
+            use_https=False,
+        )
+        self.addCleanup(self.session.close)
+
+    def test_connection_reused(self):
+        post_data = slack.create_slack_post_data(
+            "#agha-gdr", "AWS-AGHA", "Heading", "Title", "Message"
+        )
+        for _ in range(3):
+            status = slack.send_slack_message(
+                "/services/ABC", post_data, session=self.session
+            )
+            self.assertEqual(status, 200)
+
+        self.assertEqual(len(self.server.request_list), 3)
+        self.assertEqual(len({r["client_port"] for r in self.server.request_list}), 1)
+        self.assertEqual(self.server.request_list[0]["path"], "/services/ABC")
+        self.assertEqual(self.server.request_list[0]["body"]["text"], "*Heading*")
+
+    def test_reconnect_when_server_close(self):
+        self.server.close_after_response = True
+        for _ in range(2):
+            self.assertEqual(self.session.post("/services/ABC", {}), 200)
+
+        self.assertEqual(len(self.server.request_list), 2)
+
+    def test_retry_on_server_error(self):
+        self.server.status_queue = [503, 429]
+        self.assertEqual(self.session.post("/services/ABC", {}), 200)
+        self.assertEqual(len(self.server.request_list), 3)
+
+    def test_retry_exhausted(self):
+        self.server.status_queue = [500, 500, 500, 500]
+        self.assertEqual(self.session.post("/services/ABC", {}), 500)
+        self.assertEqual(len(self.server.request_list), 3)
+
+    def test_no_retry_on_client_error(self):
+        self.server.status_queue = [404]
+        self.assertEqual(self.session.post("/services/ABC", {}), 404)
+        self.assertEqual(len(self.server.request_list), 1)
+
+    def test_connection_error_raised_after_retry(self):
+        self.server.stop()
+        with self.assertRaises(OSError):
+            self.session.post("/services/ABC", {})
+
+    def test_session_shared_per_host(self):
+        self.assertIs(
+            slack.get_slack_webhook_session("example.com"),
+            slack.get_slack_webhook_session("example.com"),
+        )
+        self.assertIsNot(
+            slack.get_slack_webhook_session("example.com"),
+            slack.get_slack_webhook_session(),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,189 @@
+"""
+To run the testcase
+
+Change directory the s3_event_router
+cmd from root directory: cd lambdas/layers/util
+
+Run python test command:
+cmd: python -m unittest util.tests.test_submission_data.TestSubmissionDataLayer
+
+"""
+
+import io
+import unittest
+
+import pandas as pd
+
+from util import submission_data
+
+BENCHMARK_MANIFEST_ROWS = 50000
+
+
+def create_benchmark_manifest_df(number_of_rows=BENCHMARK_MANIFEST_ROWS):
+    """
+    Benchmark fixture: a manifest with a mix of valid, malformed and skipped entries
+    """
+    filename_list = []
+    checksum_list = []
+    agha_study_id_list = []
+    for i in range(number_of_rows):
+        remainder = i % 10
+        if remainder == 0:
+            filename_list.append(f"sample_{i}.bam.bai")  # Skipped index file
+        else:
+            filename_list.append(f"sample_{i}.fastq.gz")
+
+        if remainder == 3:
+            checksum_list.append("not provided")
+        else:
+            checksum_list.append(f"{i:032x}")
+
+        if remainder == 5:
+            agha_study_id_list.append(f"A{i:07d},bad_{i}")
+        elif remainder == 7:
+            agha_study_id_list.append(f"{i % 1000000:06d}_mm,A{i:07d}")
+        elif remainder == 9:
+            agha_study_id_list.append("unknown")
+        else:
+            agha_study_id_list.append(f"A{i:07d}")
+
+    return pd.DataFrame(
+        {
+            "checksum": checksum_list,
+            "filename": filename_list,
+            "agha_study_id": agha_study_id_list,
+        }
+    )
+
+
+def validate_manifest_fields_by_row(
+    manifest_df, postfix_exception_list, skip_checksum_check=False
+):
+    """Row-by-row reference implementation of the manifest field validation"""
+    messages_error = []
+    for row in manifest_df.itertuples():
+        if submission_data.is_file_skipped(row.filename, postfix_exception_list):
+            continue
+
+        for agha_study_id in row.agha_study_id.split(","):
+            if not submission_data.AGHA_ID_RE.match(
+                agha_study_id
+            ) and not submission_data.MM_ID_RE.match(agha_study_id):
+                messages_error.append(
+                    f"Malformed AGHA study ID ({row.filename}): {agha_study_id} "
+                )
+        if not submission_data.MD5_RE.match(row.checksum) and not skip_checksum_check:
+            messages_error.append(
+                f"Malformed MD5 checksum ({row.filename}): {row.checksum} "
+            )
+    return messages_error
+
+
+class TestSubmissionDataLayer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.manifest_df = create_benchmark_manifest_df()
+
+    def test_validate_manifest_fields_match_row_validation(self):
+        expected_messages = validate_manifest_fields_by_row(
+            self.manifest_df, ["_9.fastq.gz"]
+        )
+
+        messages = submission_data.validate_manifest_fields(
+            self.manifest_df, ["_9.fastq.gz"]
+        )
+
+        self.assertTrue(len(expected_messages) > 0)
+        self.assertEqual(expected_messages, messages)
+
+    def test_validate_manifest_fields_skip_checksum(self):
+        messages = submission_data.validate_manifest_fields(
+            self.manifest_df, [], skip_checksum_check=True
+        )
+
+        self.assertEqual(
+            validate_manifest_fields_by_row(
+                self.manifest_df, [], skip_checksum_check=True
+            ),
+            messages,
+        )
+        self.assertFalse(any("checksum" in message for message in messages))
+
+    def test_validate_manifest_fields_empty_manifest(self):
+        empty_manifest_df = pd.DataFrame(
+            columns=["checksum", "filename", "agha_study_id"]
+        )
+
+        messages = submission_data.validate_manifest_fields(empty_manifest_df, [])
+
+        self.assertEqual(messages, [])
+
+    def test_is_file_skipped_series(self):
+        filename_series = pd.Series(
+            ["a.bam", "a.bam.bai", "manifest.txt", "a.md5", "metadata.txt", "a.vcf.gz"]
+        )
+
+        result = submission_data.is_file_skipped_series(
+            filename_series, ["metadata.txt"]
+        )
+
+        self.assertEqual(
+            result.tolist(),
+            [
+                submission_data.is_file_skipped(filename, ["metadata.txt"])
+                for filename in filename_series
+            ],
+        )
+
+    def test_read_manifest_data_in_chunks(self):
+        manifest_stream = io.BytesIO(
+            self.manifest_df.assign(extra_column="extra")
+            .to_csv(sep="\t", index=False)
+            .encode("utf8")
+        )
+
+        manifest_data = submission_data.read_manifest_data(
+            manifest_stream, chunk_size=1000
+        )
+
+        self.assertEqual(
+            manifest_data.columns.tolist(), submission_data.MANIFEST_COLUMNS
+        )
+        self.assertEqual(
+            manifest_data["filename"].tolist(), self.manifest_df["filename"].tolist()
+        )
+        self.assertEqual(
+            manifest_data["agha_study_id"].tolist(),
+            self.manifest_df["agha_study_id"].tolist(),
+        )
+
+    def test_read_manifest_data_strip_and_fill(self):
+        manifest_stream = io.BytesIO(
+            b"checksum\tfilename\tagha_study_id\n\t file.fastq.gz \t123456\n"
+        )
+
+        manifest_data = submission_data.read_manifest_data(manifest_stream)
+
+        self.assertEqual(manifest_data["filename"].tolist(), ["file.fastq.gz"])
+        self.assertEqual(manifest_data["checksum"].tolist(), ["not provided"])
+        self.assertEqual(manifest_data["agha_study_id"].tolist(), ["123456"])
+
+    def test_read_manifest_data_missing_header(self):
+        manifest_stream = io.BytesIO(
+            b"checksum\tfilename\n" + b"c\tfile.fastq.gz\n" * 10
+        )
+
+        with self.assertRaises(ValueError) as context:
+            submission_data.read_manifest_data(manifest_stream, chunk_size=2)
+        self.assertIn("agha_study_id", str(context.exception))
+
+    def test_validate_manifest_fields_no_postfix_exception(self):
+        expected_messages = validate_manifest_fields_by_row(self.manifest_df, [])
+
+        messages = submission_data.validate_manifest_fields(self.manifest_df, [])
+
+        self.assertEqual(expected_messages, messages)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+To run the testcase
+
+Change directory the s3_event_router
+cmd from root directory: cd lambdas/layers/util
+
+Run python test command:
+cmd: python -m unittest util.tests.test_timing.TestTimingLayer
+
+"""
+
+import json
+import unittest
+from unittest import mock
+
+from util import timing
+
+
+class TestTimingLayer(unittest.TestCase):
+    def test_nested_span(self):
+        @timing.trace_handler
+        def handler(event, context):
+            with timing.span("parent", file=2) as parent:
+                with timing.span("child"):
+                    parent.add_count("duplicate")
+                parent.add_count("duplicate")
+            with timing.span("sibling"):
+                pass
+
+        with self.assertLogs(level="INFO") as log:
+            handler(
+                {},
+                mock.MagicMock(function_name="test-function", aws_request_id="1234"),
+            )
+
+        span_log = json.loads(log.records[-1].getMessage())
+        self.assertEqual(span_log["metric"], "span_summary")
+        self.assertEqual(span_log["function_name"], "test-function")
+        self.assertEqual(span_log["request_id"], "1234")
+        self.assertEqual(
+            [child["name"] for child in span_log["span"]], ["parent", "sibling"]
+        )
+        self.assertEqual(span_log["span"][0]["count"], {"file": 2, "duplicate": 2})
+        self.assertEqual(span_log["span"][0]["span"][0]["name"], "child")
+        self.assertNotIn("count", span_log["span"][1])
+
+    def test_span_log_on_exception(self):
+        @timing.trace_handler
+        def handler(event, context):
+            with timing.span("failing"):
+                raise ValueError("failed")
+
+        with self.assertLogs(level="INFO") as log:
+            with self.assertRaises(ValueError):
+                handler({}, {})
+
+        span_log = json.loads(log.records[-1].getMessage())
+        self.assertEqual(span_log["span"][0]["name"], "failing")
+
+    def test_timed_decorator(self):
+        @timing.timed()
+        def read_manifest():
+            timing.current_span().set_count("row", 10)
+
+        @timing.trace_handler
+        def handler(event, context):
+            read_manifest()
+            read_manifest()
+
+        with self.assertLogs(level="INFO") as log:
+            handler({}, {})
+
+        span_log = json.loads(log.records[-1].getMessage())
+        self.assertEqual(len(span_log["span"]), 2)
+        self.assertEqual(span_log["span"][1]["name"], "read_manifest")
+        self.assertEqual(span_log["span"][1]["count"], {"row": 10})
+
+    def test_profile_slow_invocation(self):
+        @timing.trace_handler
+        def handler(event, context):
+            with timing.span("slow"):
+                sum(range(1000))
+
+        with mock.patch.object(
+            timing, "TIMING_PROFILE_SAMPLE_RATE", 1
+        ), mock.patch.object(
+            timing, "TIMING_PROFILE_THRESHOLD_MS", 0
+        ), mock.patch.object(
+            timing, "upload_profile", return_value="profile/test/key.txt"
+        ) as mock_upload:
+            with self.assertLogs(level="INFO") as log:
+                handler({}, {})
+
+        mock_upload.assert_called_once()
+        span_log = json.loads(log.records[-1].getMessage())
+        self.assertEqual(span_log["profile_key"], "profile/test/key.txt")
+
+
+if __name__ == "__main__":
+    unittest.main()
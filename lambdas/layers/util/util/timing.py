@@ -0,0 +1,202 @@
+import contextlib
+import cProfile
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+
+import boto3
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# cProfile is only enabled for the sampled fraction of invocations (0 disables profiling) and the profile is
+# uploaded only when the invocation is slower than the threshold
+TIMING_PROFILE_SAMPLE_RATE = float(os.environ.get("TIMING_PROFILE_SAMPLE_RATE", 0))
+TIMING_PROFILE_THRESHOLD_MS = float(
+    os.environ.get("TIMING_PROFILE_THRESHOLD_MS", 60000)
+)
+TIMING_PROFILE_BUCKET = os.environ.get(
+    "TIMING_PROFILE_BUCKET", os.environ.get("RESULTS_BUCKET")
+)
+PROFILE_KEY_PREFIX = "profile/"
+PROFILE_LINE_LIMIT = 100
+
+
+class Span:
+    """
+    A timed phase of the handler. Spans started while another span is open become its children.
+    """
+
+    def __init__(self, name: str, **count):
+        self.name = name
+        self.count = dict(count)
+        self.children = []
+        self.start = time.perf_counter()
+        self.duration_ms = None
+
+    def add_count(self, key: str = "item", value: int = 1):
+        self.count[key] = self.count.get(key, 0) + value
+
+    def set_count(self, key: str, value: int):
+        self.count[key] = value
+
+    def finish(self):
+        self.duration_ms = (time.perf_counter() - self.start) * 1000
+
+    def to_dict(self) -> dict:
+        duration_ms = self.duration_ms
+        if duration_ms is None:
+            # Span still open (e.g. left by an exception), report time elapsed so far
+            duration_ms = (time.perf_counter() - self.start) * 1000
+
+        span_dict = {"name": self.name, "duration_ms": round(duration_ms, 2)}
+        if self.count:
+            span_dict["count"] = self.count
+        if self.children:
+            span_dict["span"] = [child.to_dict() for child in self.children]
+        return span_dict
+
+
+class SpanRecorder:
+    """
+    Hold the span tree of the current invocation. Each thread keeps its own stack of open spans, spans opened
+    from a worker thread are attached to the root span.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.root = Span("handler")
+
+    def reset(self, name: str = "handler"):
+        self.root = Span(name)
+
+    def _get_stack(self) -> list:
+        stack = getattr(self._local, "stack", None)
+        if not stack or stack[0] is not self.root:
+            stack = [self.root]
+            self._local.stack = stack
+        return stack
+
+    def current_span(self) -> Span:
+        return self._get_stack()[-1]
+
+    @contextlib.contextmanager
+    def span(self, name: str, **count):
+        stack = self._get_stack()
+        child = Span(name, **count)
+        with self._lock:
+            stack[-1].children.append(child)
+
+        stack.append(child)
+        try:
+            yield child
+        finally:
+            child.finish()
+            stack.pop()
+
+
+SPAN_RECORDER = SpanRecorder()
+
+
+def span(name: str, **count):
+    """
+    Context manager to time a phase of the handler.
+    Example:
+        with timing.span("validate_manifest", file=len(file_list)) as s:
+            ...
+            s.add_count("duplicate")
+    """
+    return SPAN_RECORDER.span(name, **count)
+
+
+def current_span() -> Span:
+    return SPAN_RECORDER.current_span()
+
+
+def timed(name: str = None):
+    """
+    Decorator to time every call of the function as a span. The function name is used if name is not given.
+    """
+
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def upload_profile(profiler: cProfile.Profile, function_name: str, request_id: str):
+    """
+    Upload the text report of the profile (sorted by cumulative time) to the profile bucket and return its key.
+    """
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_LINE_LIMIT)
+
+    key = f"{PROFILE_KEY_PREFIX}{function_name}/{time.strftime('%Y%m%d_%H%M%S')}_{request_id}.txt"
+    boto3.client("s3").put_object(
+        Bucket=TIMING_PROFILE_BUCKET, Key=key, Body=stream.getvalue().encode()
+    )
+    return key
+
+
+def trace_handler(handler):
+    """
+    Decorator for lambda handler. Record spans opened during the invocation and log them as one JSON record at the
+    end. A sampled invocation is profiled and its profile uploaded when it is slower than TIMING_PROFILE_THRESHOLD_MS.
+    """
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        function_name = getattr(context, "function_name", None) or handler.__module__
+        request_id = getattr(context, "aws_request_id", None) or "local"
+
+        SPAN_RECORDER.reset()
+        profiler = None
+        if (
+            TIMING_PROFILE_SAMPLE_RATE > 0
+            and random.random() < TIMING_PROFILE_SAMPLE_RATE
+        ):
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        try:
+            return handler(event, context)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+
+            root = SPAN_RECORDER.root
+            root.finish()
+
+            span_log = {
+                "metric": "span_summary",
+                "function_name": function_name,
+                "request_id": request_id,
+                **root.to_dict(),
+            }
+
+            if profiler is not None and root.duration_ms >= TIMING_PROFILE_THRESHOLD_MS:
+                try:
+                    span_log["profile_key"] = upload_profile(
+                        profiler, function_name, request_id
+                    )
+                except Exception as e:
+                    logger.warning(f"Unable to upload profile: {e}")
+
+            logger.info(json.dumps(span_log))
+
+    return wrapper
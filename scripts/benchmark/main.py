@@ -0,0 +1,696 @@
+import argparse
+import collections
+import contextlib
+import datetime
+import hashlib
+import importlib
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+from unittest import mock
+
+# Credentials and resource names must be set before any lambda module (and its boto3 clients) is imported
+REGION = "ap-southeast-2"
+ACCOUNT_ID = "123456789012"
+FLAGSHIP = "AC"
+
+STAGING_BUCKET = "agha-gdr-staging-benchmark"
+RESULTS_BUCKET = "agha-gdr-results-benchmark"
+STORE_BUCKET = "agha-gdr-store-benchmark"
+
+DYNAMODB_STAGING_TABLE_NAME = "agha-gdr-staging-bucket"
+DYNAMODB_ARCHIVE_STAGING_TABLE_NAME = "agha-gdr-staging-bucket-archive"
+DYNAMODB_STORE_TABLE_NAME = "agha-gdr-store-bucket"
+DYNAMODB_ARCHIVE_STORE_TABLE_NAME = "agha-gdr-store-bucket-archive"
+DYNAMODB_RESULT_TABLE_NAME = "agha-gdr-result-bucket"
+DYNAMODB_ARCHIVE_RESULT_TABLE_NAME = "agha-gdr-result-bucket-archive"
+DYNAMODB_ETAG_TABLE_NAME = "agha-gdr-e-tag"
+DYNAMODB_FOLDER_LOCK_TABLE_NAME = "agha-gdr-folder-lock"
+DYNAMODB_SUBMISSION_STATUS_TABLE_NAME = "agha-gdr-submission-status"
+DYNAMODB_NOTIFICATION_OUTBOX_TABLE_NAME = "agha-gdr-notification-outbox"
+DYNAMODB_TABLE_NAME_LIST = [
+    DYNAMODB_STAGING_TABLE_NAME,
+    DYNAMODB_ARCHIVE_STAGING_TABLE_NAME,
+    DYNAMODB_STORE_TABLE_NAME,
+    DYNAMODB_ARCHIVE_STORE_TABLE_NAME,
+    DYNAMODB_RESULT_TABLE_NAME,
+    DYNAMODB_ARCHIVE_RESULT_TABLE_NAME,
+    DYNAMODB_ETAG_TABLE_NAME,
+    DYNAMODB_FOLDER_LOCK_TABLE_NAME,
+    DYNAMODB_SUBMISSION_STATUS_TABLE_NAME,
+    DYNAMODB_NOTIFICATION_OUTBOX_TABLE_NAME,
+]
+
+SLACK_WEBHOOK_SSM_NAME = "/slack/webhook/endpoint"
+
+# Lambda functions driven in-process by this benchmark (module name == function name)
+DRIVEN_LAMBDA_LIST = [
+    "s3_event_router",
+    "s3_event_recorder",
+    "manifest_processor",
+    "validation_manager",
+    "batch_notification",
+    "data_transfer_manager",
+]
+# Lambda functions invoked by the flow, but not part of the benchmark (invocation is only counted)
+NOT_DRIVEN_LAMBDA_LIST = ["folder_lock", "notification", "cleanup_manager", "report"]
+
+
+def lambda_arn(function_name):
+    return f"arn:aws:lambda:{REGION}:{ACCOUNT_ID}:function:{function_name}"
+
+
+def set_environment_variable():
+    os.environ.update(
+        {
+            "AWS_DEFAULT_REGION": REGION,
+            "AWS_ACCESS_KEY_ID": "benchmark",
+            "AWS_SECRET_ACCESS_KEY": "benchmark",
+            "STAGING_BUCKET": STAGING_BUCKET,
+            "RESULTS_BUCKET": RESULTS_BUCKET,
+            "RESULT_BUCKET": RESULTS_BUCKET,
+            "STORE_BUCKET": STORE_BUCKET,
+            "DYNAMODB_STAGING_TABLE_NAME": DYNAMODB_STAGING_TABLE_NAME,
+            "DYNAMODB_ARCHIVE_STAGING_TABLE_NAME": DYNAMODB_ARCHIVE_STAGING_TABLE_NAME,
+            "DYNAMODB_STORE_TABLE_NAME": DYNAMODB_STORE_TABLE_NAME,
+            "DYNAMODB_ARCHIVE_STORE_TABLE_NAME": DYNAMODB_ARCHIVE_STORE_TABLE_NAME,
+            "DYNAMODB_RESULT_TABLE_NAME": DYNAMODB_RESULT_TABLE_NAME,
+            "DYNAMODB_ARCHIVE_RESULT_TABLE_NAME": DYNAMODB_ARCHIVE_RESULT_TABLE_NAME,
+            "DYNAMODB_ETAG_TABLE_NAME": DYNAMODB_ETAG_TABLE_NAME,
+            "DYNAMODB_FOLDER_LOCK_TABLE_NAME": DYNAMODB_FOLDER_LOCK_TABLE_NAME,
+            "DYNAMODB_SUBMISSION_STATUS_TABLE_NAME": DYNAMODB_SUBMISSION_STATUS_TABLE_NAME,
+            "DYNAMODB_NOTIFICATION_OUTBOX_TABLE_NAME": DYNAMODB_NOTIFICATION_OUTBOX_TABLE_NAME,
+            "BATCH_QUEUE_NAME": json.dumps(
+                {
+                    "small": "benchmark-small",
+                    "medium": "benchmark-medium",
+                    "large": "benchmark-large",
+                    "xlarge": "benchmark-xlarge",
+                }
+            ),
+            "JOB_DEFINITION_ARN": "benchmark-validation-job",
+            "S3_JOB_DEFINITION_ARN": "benchmark-s3-job",
+            "AUTORUN_VALIDATION_JOBS": "yes",
+            "S3_RECORDER_LAMBDA_ARN": lambda_arn("s3_event_recorder"),
+            "MANIFEST_PROCESSOR_LAMBDA_ARN": lambda_arn("manifest_processor"),
+            "VALIDATION_MANAGER_LAMBDA_ARN": lambda_arn("validation_manager"),
+            "BATCH_NOTIFICATION_LAMBDA": lambda_arn("batch_notification"),
+            "DATA_TRANSFER_MANAGER_LAMBDA_ARN": lambda_arn("data_transfer_manager"),
+            "FOLDER_LOCK_LAMBDA_ARN": lambda_arn("folder_lock"),
+            "NOTIFICATION_LAMBDA_ARN": lambda_arn("notification"),
+            "CLEANUP_MANAGER_LAMBDA_ARN": lambda_arn("cleanup_manager"),
+            "REPORT_LAMBDA_ARN": lambda_arn("report"),
+        }
+    )
+    # Make sure nothing is redirected to a real endpoint
+    os.environ.pop("AWS_ENDPOINT", None)
+    os.environ.pop("AWS_PROFILE", None)
+
+
+set_environment_variable()
+
+DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+SOURCE_PATH = os.path.join(DIR_PATH, "..", "..", "lambdas", "layers", "util")
+FUNCTIONS_PATH = os.path.join(DIR_PATH, "..", "..", "lambdas", "functions")
+sys.path.append(SOURCE_PATH)
+for function_name in DRIVEN_LAMBDA_LIST:
+    sys.path.append(os.path.join(FUNCTIONS_PATH, function_name))
+
+import boto3
+import botocore.awsrequest
+import botocore.handlers
+import moto
+
+"""
+To run the script:
+cd scripts/benchmark
+python3 main.py --number-of-files 100 1000 --output benchmark.json
+"""
+
+logger = logging.getLogger(__name__)
+
+
+########################################################################################################################
+# Stage metrics and instrumentation
+
+
+class StageMetrics:
+    def __init__(self, name):
+        self.name = name
+        self.invocation = 0
+        self.invocation_error = 0
+        self.wall_time_seconds = 0.0
+        self.api_call = collections.Counter()
+        self.peak_rss_bytes = 0
+        self.sleep_skipped_seconds = 0.0
+
+    def to_dict(self):
+        return {
+            "stage": self.name,
+            "invocation": self.invocation,
+            "invocation_error": self.invocation_error,
+            "wall_time_seconds": round(self.wall_time_seconds, 4),
+            "api_call_total": sum(self.api_call.values()),
+            "api_call": dict(sorted(self.api_call.items())),
+            "peak_rss_mb": round(self.peak_rss_bytes / 1024 / 1024, 2),
+            "sleep_skipped_seconds": self.sleep_skipped_seconds,
+        }
+
+
+class Instrumentation:
+    """
+    Counts every boto3 call against the stage currently running, samples the RSS of the process while the stage is
+    running, and captures Lambda Invoke and Batch SubmitJob so they can be driven in-process instead.
+    """
+
+    RSS_SAMPLE_INTERVAL_SECONDS = 0.005
+
+    def __init__(self):
+        self.current_stage = None
+        self.pending_invocation = collections.deque()
+        self.submitted_job = []
+        self._stop_event = threading.Event()
+        self._sampler = threading.Thread(target=self._sample_rss, daemon=True)
+
+    def register(self):
+        """
+        Handlers are added to the botocore builtin handlers so every session gets them, including the sessions moto
+        creates while mocking and the ones clients create at import time of the lambda module.
+        """
+        botocore.handlers.BUILTIN_HANDLERS.extend(
+            [
+                ("before-parameter-build.*.*", self._count_api_call),
+                ("before-call.lambda.Invoke", self._capture_invoke),
+                ("before-call.batch.SubmitJob", self._capture_job),
+            ]
+        )
+        self._sampler.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _count_api_call(self, params, model, context, **kwargs):
+        context["benchmark_params"] = dict(params)
+        if self.current_stage is not None:
+            service_name = model.service_model.service_name
+            self.current_stage.api_call[f"{service_name}.{model.name}"] += 1
+
+    @staticmethod
+    def _accepted_response(status_code, parsed):
+        http_response = botocore.awsrequest.AWSResponse(
+            url="", status_code=status_code, headers={}, raw=None
+        )
+        parsed["ResponseMetadata"] = {"HTTPStatusCode": status_code}
+        return http_response, parsed
+
+    def _capture_invoke(self, context, **kwargs):
+        params = context["benchmark_params"]
+        function_name = params["FunctionName"].split(":")[-1]
+        payload = json.loads(params.get("Payload") or "{}")
+        self.pending_invocation.append((function_name, payload))
+        return self._accepted_response(202, {"StatusCode": 202})
+
+    def _capture_job(self, context, **kwargs):
+        params = context["benchmark_params"]
+        self.submitted_job.append(params)
+        job_id = f"benchmark-job-{len(self.submitted_job)}"
+        return self._accepted_response(
+            200, {"jobId": job_id, "jobName": params["jobName"]}
+        )
+
+    def _sample_rss(self):
+        page_size = os.sysconf("SC_PAGE_SIZE")
+        while not self._stop_event.is_set():
+            stage = self.current_stage
+            if stage is not None:
+                stage.peak_rss_bytes = max(stage.peak_rss_bytes, current_rss(page_size))
+            # time.sleep is patched while a stage is running
+            self._stop_event.wait(self.RSS_SAMPLE_INTERVAL_SECONDS)
+
+
+def current_rss(page_size):
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * page_size
+    except OSError:
+        # Non-linux fallback, this is the peak of the whole process rather than the current RSS
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class FakeSlackConnection:
+    """Stand-in for the Slack webhook connection used by batch_notification"""
+
+    request_count = 0
+
+    def __init__(self, host, *args, **kwargs):
+        self.host = host
+
+    def request(self, method, url, body=None, headers=None):
+        FakeSlackConnection.request_count += 1
+
+    def getresponse(self):
+        return mock.MagicMock(status=200)
+
+    def close(self):
+        pass
+
+
+########################################################################################################################
+# Pipeline driver
+
+
+class BenchmarkPipeline:
+    def __init__(self, instrumentation, handler_map):
+        self.instrumentation = instrumentation
+        self.handler_map = handler_map
+        self.stage_metrics = {}
+        self.not_driven_invocation = collections.Counter()
+        self.sampled_out_invocation = collections.Counter()
+
+    def get_stage(self, stage_name):
+        if stage_name not in self.stage_metrics:
+            self.stage_metrics[stage_name] = StageMetrics(stage_name)
+        return self.stage_metrics[stage_name]
+
+    def invoke(self, function_name, payload, phase):
+        stage = self.get_stage(f"{function_name} ({phase})")
+
+        def skip_sleep(seconds):
+            stage.sleep_skipped_seconds += seconds
+
+        # Lambda receive a fresh deserialized payload on each invocation
+        event = json.loads(json.dumps(payload))
+
+        self.instrumentation.current_stage = stage
+        start = time.perf_counter()
+        try:
+            with mock.patch("time.sleep", side_effect=skip_sleep):
+                self.handler_map[function_name](event, None)
+        except Exception as e:
+            stage.invocation_error += 1
+            logger.warning(f"{function_name} raised an exception: {e!r}")
+        finally:
+            stage.wall_time_seconds += time.perf_counter() - start
+            stage.invocation += 1
+            self.instrumentation.current_stage = None
+
+    def drain(self, phase, sampler=None):
+        """
+        Run pending invocation (captured from Lambda Invoke) until none left.
+        :param phase: Label appended to the stage name
+        :param sampler: Optional dict of function_name -> callable(payload) returning False to skip the invocation
+        """
+        pending_invocation = self.instrumentation.pending_invocation
+        while pending_invocation:
+            function_name, payload = pending_invocation.popleft()
+
+            if function_name not in self.handler_map:
+                self.not_driven_invocation[function_name] += 1
+                continue
+            if sampler and function_name in sampler and not sampler[function_name]():
+                self.sampled_out_invocation[function_name] += 1
+                continue
+
+            self.invoke(function_name, payload, phase)
+
+
+class EvenSampler:
+    """
+    Accept at most `max_count` out of `total` calls, evenly spaced and always including the last call.
+    """
+
+    def __init__(self, total, max_count=None):
+        if max_count is None or max_count >= total:
+            self.accepted_index = set(range(total))
+        else:
+            step = total / max_count
+            self.accepted_index = {total - 1 - int(i * step) for i in range(max_count)}
+        self.index = 0
+
+    def __call__(self):
+        is_accepted = self.index in self.accepted_index
+        self.index += 1
+        return is_accepted
+
+
+########################################################################################################################
+# Synthetic submission and AWS stand-in
+
+
+def create_aws_resources():
+    s3_client = boto3.client("s3")
+    for bucket_name in [STAGING_BUCKET, RESULTS_BUCKET, STORE_BUCKET]:
+        s3_client.create_bucket(
+            Bucket=bucket_name,
+            CreateBucketConfiguration={"LocationConstraint": REGION},
+        )
+
+    dynamodb_client = boto3.client("dynamodb")
+    for table_name in DYNAMODB_TABLE_NAME_LIST:
+        dynamodb_client.create_table(
+            TableName=table_name,
+            KeySchema=[
+                {"AttributeName": "partition_key", "KeyType": "HASH"},
+                {"AttributeName": "sort_key", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "partition_key", "AttributeType": "S"},
+                {"AttributeName": "sort_key", "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+    boto3.client("ssm").put_parameter(
+        Name=SLACK_WEBHOOK_SSM_NAME,
+        Value="/services/benchmark/webhook",
+        Type="SecureString",
+    )
+
+
+def create_s3_event_record(bucket_name, s3_key, etag, size):
+    return {
+        "eventVersion": "2.1",
+        "eventSource": "aws:s3",
+        "awsRegion": REGION,
+        "eventTime": datetime.datetime.utcnow().isoformat() + "Z",
+        "eventName": "ObjectCreated:Put",
+        "userIdentity": {"principalId": f"AWS:{'A' * 21}:submitter@example.com"},
+        "s3": {
+            "bucket": {"name": bucket_name},
+            "object": {"key": s3_key, "size": size, "eTag": etag},
+        },
+    }
+
+
+def put_object(bucket_name, s3_key, body: bytes):
+    response = boto3.client("s3").put_object(Bucket=bucket_name, Key=s3_key, Body=body)
+    return create_s3_event_record(
+        bucket_name, s3_key, response["ETag"].strip('"'), len(body)
+    )
+
+
+def generate_submission(submission_prefix, number_of_files):
+    """
+    Upload a synthetic submission (mixed FASTQ/BAM/VCF) and its manifest to the staging bucket.
+    :return: List of S3 events, the manifest event is the last one
+    """
+    file_extension_list = [".fastq.gz", ".bam", ".vcf.gz"]
+    manifest_line_list = ["checksum\tfilename\tagha_study_id"]
+    s3_event_list = []
+
+    for i in range(number_of_files):
+        filename = f"SAMPLE{i:07d}{file_extension_list[i % len(file_extension_list)]}"
+        body = f"benchmark content of {filename}\n".encode()
+        checksum = hashlib.md5(body).hexdigest()
+
+        s3_event_list.append(
+            put_object(STAGING_BUCKET, f"{submission_prefix}/{filename}", body)
+        )
+        manifest_line_list.append(f"{checksum}\t{filename}\tA{i:07d}")
+
+    manifest_body = ("\n".join(manifest_line_list) + "\n").encode()
+    s3_event_list.append(
+        put_object(STAGING_BUCKET, f"{submission_prefix}/manifest.txt", manifest_body)
+    )
+
+    return s3_event_list
+
+
+def get_command_argument(command, argument_name):
+    index = command.index(argument_name)
+    argument_list = []
+    for argument in command[index + 1 :]:
+        if argument.startswith("--"):
+            break
+        argument_list.append(argument)
+    return argument_list
+
+
+def simulate_validation_batch_job(job_list):
+    """
+    Stand-in for the validation batch job: write index files and the '__results.json' to the results bucket.
+    :return: List of S3 events from the results bucket
+    """
+    s3_event_list = []
+    for job in job_list:
+        command = job["containerOverrides"]["command"]
+        s3_key = get_command_argument(command, "--s3_key")[0]
+        tasks_list = get_command_argument(command, "--tasks")
+        checksum = hashlib.md5(
+            f"benchmark content of {os.path.basename(s3_key)}\n".encode()
+        ).hexdigest()
+
+        result_list = []
+        for task in tasks_list:
+            result = {
+                "staging_s3_key": s3_key,
+                "task_type": task,
+                "status": "SUCCEED",
+                "value": "FILE",
+                "source_file": None,
+            }
+            if task == "CHECKSUM_VALIDATION":
+                result["value"] = checksum
+            elif task == "FILE_VALIDATION":
+                result["value"] = "PASS"
+            elif task == "CREATE_INDEX":
+                index_extension = ".bai" if s3_key.endswith(".bam") else ".tbi"
+                index_s3_key = s3_key + index_extension
+                index_body = f"benchmark index of {s3_key}\n".encode()
+                s3_event_list.append(
+                    put_object(RESULTS_BUCKET, index_s3_key, index_body)
+                )
+                result["source_file"] = [
+                    {
+                        "s3_key": index_s3_key,
+                        "checksum": hashlib.md5(index_body).hexdigest(),
+                        "bucket_name": RESULTS_BUCKET,
+                    }
+                ]
+            elif task == "CREATE_COMPRESS":
+                # Synthetic files are already compressed, the original file is the output
+                result["source_file"] = [
+                    {
+                        "s3_key": s3_key,
+                        "checksum": checksum,
+                        "bucket_name": STAGING_BUCKET,
+                    }
+                ]
+            result_list.append(result)
+
+        s3_event_list.append(
+            put_object(
+                RESULTS_BUCKET,
+                f"{s3_key}__results.json",
+                json.dumps(result_list).encode(),
+            )
+        )
+    return s3_event_list
+
+
+def simulate_data_transfer_batch_job(job_list):
+    """
+    Stand-in for the 's3 mv' batch job submitted by data_transfer_manager.
+    :return: List of S3 events from the store bucket
+    """
+    s3_client = boto3.client("s3")
+    s3_event_list = []
+    for job in job_list:
+        _, _, source_uri, target_uri = job["containerOverrides"]["command"]
+        source_bucket, source_key = source_uri[len("s3://") :].split("/", 1)
+        target_bucket, target_key = target_uri[len("s3://") :].split("/", 1)
+
+        body = s3_client.get_object(Bucket=source_bucket, Key=source_key)["Body"].read()
+        s3_client.delete_object(Bucket=source_bucket, Key=source_key)
+        s3_event_list.append(put_object(target_bucket, target_key, body))
+    return s3_event_list
+
+
+########################################################################################################################
+# Benchmark
+
+
+def run_benchmark(
+    handler_map, instrumentation, number_of_files, max_notification_event
+):
+    pipeline = BenchmarkPipeline(instrumentation, handler_map)
+    submission_prefix = f"{FLAGSHIP}/benchmark_{number_of_files}"
+    FakeSlackConnection.request_count = 0
+
+    with moto.mock_aws():
+        create_aws_resources()
+        setup_start = time.perf_counter()
+        staging_event_list = generate_submission(submission_prefix, number_of_files)
+        logger.info(
+            f"Submission of {number_of_files} files uploaded in {time.perf_counter() - setup_start:.2f}s"
+        )
+
+        # Submission: router -> recorder -> manifest_processor -> validation_manager
+        for s3_event in staging_event_list:
+            pipeline.invoke("s3_event_router", {"Records": [s3_event]}, "submission")
+            pipeline.drain("submission")
+
+        validation_job = list(instrumentation.submitted_job)
+        instrumentation.submitted_job.clear()
+        results_event_list = simulate_validation_batch_job(validation_job)
+
+        # Validation result: recorder -> batch_notification -> data_transfer_manager
+        sampler = {
+            "batch_notification": EvenSampler(
+                len(validation_job), max_notification_event
+            )
+        }
+        for s3_event in results_event_list:
+            pipeline.invoke("s3_event_recorder", {"Records": [s3_event]}, "results")
+            pipeline.drain("results", sampler)
+
+        data_transfer_job = list(instrumentation.submitted_job)
+        instrumentation.submitted_job.clear()
+
+        # Data transfer: the manifest.txt generated by data_transfer_manager lands before the moved files
+        store_event_list = []
+        store_manifest_key = f"{submission_prefix}/manifest.txt"
+        if "Contents" in boto3.client("s3").list_objects_v2(
+            Bucket=STORE_BUCKET, Prefix=store_manifest_key
+        ):
+            store_event_list.append(
+                create_s3_event_record(STORE_BUCKET, store_manifest_key, "manifest", 0)
+            )
+        store_event_list.extend(simulate_data_transfer_batch_job(data_transfer_job))
+
+        # Store: recorder -> batch_notification
+        sampler = {
+            "batch_notification": EvenSampler(
+                len(store_event_list), max_notification_event
+            )
+        }
+        for s3_event in store_event_list:
+            pipeline.invoke("s3_event_recorder", {"Records": [s3_event]}, "store")
+            pipeline.drain("store", sampler)
+
+    stage_list = [stage.to_dict() for stage in pipeline.stage_metrics.values()]
+    return {
+        "number_of_files": number_of_files,
+        "submission_prefix": submission_prefix,
+        "total_wall_time_seconds": round(
+            sum(stage["wall_time_seconds"] for stage in stage_list), 4
+        ),
+        "total_api_call": sum(stage["api_call_total"] for stage in stage_list),
+        "stages": stage_list,
+        "simulated_batch_job": {
+            "validation": len(validation_job),
+            "data_transfer": len(data_transfer_job),
+        },
+        "not_driven_invocation": dict(pipeline.not_driven_invocation),
+        "sampled_out_invocation": dict(pipeline.sampled_out_invocation),
+        "slack_notification": FakeSlackConnection.request_count,
+    }
+
+
+def import_lambda_handler():
+    handler_map = {}
+    for function_name in DRIVEN_LAMBDA_LIST:
+        handler_map[function_name] = importlib.import_module(function_name).handler
+    return handler_map
+
+
+def print_summary(result):
+    print(
+        f"\n{result['number_of_files']} files: {result['total_wall_time_seconds']}s, "
+        f"{result['total_api_call']} API calls"
+    )
+    print(
+        f"{'stage':<40}{'invocation':>12}{'wall_time_s':>14}{'api_call':>10}{'peak_rss_mb':>13}"
+    )
+    for stage in result["stages"]:
+        print(
+            f"{stage['stage']:<40}{stage['invocation']:>12}{stage['wall_time_seconds']:>14}"
+            f"{stage['api_call_total']:>10}{stage['peak_rss_mb']:>13}"
+        )
+
+
+def get_argument():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the submission flow end-to-end against in-process AWS stand-in"
+    )
+    parser.add_argument(
+        "-n",
+        "--number-of-files",
+        type=int,
+        nargs="+",
+        default=[100],
+        help="Number of files in the synthetic submission. Space seperated for multiple runs.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default="benchmark.json",
+        help="JSON file the result is written to.",
+    )
+    parser.add_argument(
+        "--max-notification-event",
+        type=int,
+        default=20,
+        help="Maximum number of batch_notification invocation driven per phase. "
+        "The last event (the one completing the submission) is always driven. Use 0 for all.",
+    )
+    parser.add_argument(
+        "--lambda-log",
+        default=os.devnull,
+        help="File where the lambda logs/prints are written to (default: discarded).",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_argument()
+    max_notification_event = args.max_notification_event or None
+
+    benchmark_logger = logging.getLogger(__name__)
+    benchmark_logger.propagate = False
+    benchmark_logger.addHandler(logging.StreamHandler(sys.stderr))
+
+    # Lambda logs are still formatted and written (as in the Lambda runtime), but not to the console
+    lambda_log_file = open(args.lambda_log, "w")
+    root_logger = logging.getLogger()
+    root_logger.handlers = [logging.StreamHandler(lambda_log_file)]
+
+    benchmark_instrumentation = Instrumentation()
+    benchmark_instrumentation.register()
+
+    run_list = []
+    with mock.patch("http.client.HTTPSConnection", FakeSlackConnection):
+        with contextlib.redirect_stdout(lambda_log_file):
+            lambda_handler_map = import_lambda_handler()
+
+        for number_of_files in args.number_of_files:
+            benchmark_logger.info(f"Running benchmark with {number_of_files} files ...")
+            with contextlib.redirect_stdout(lambda_log_file):
+                benchmark_result = run_benchmark(
+                    lambda_handler_map,
+                    benchmark_instrumentation,
+                    number_of_files,
+                    max_notification_event,
+                )
+            print_summary(benchmark_result)
+            run_list.append(benchmark_result)
+
+    benchmark_instrumentation.stop()
+    lambda_log_file.close()
+
+    output = {
+        "created": datetime.datetime.now().isoformat(),
+        "python_version": platform.python_version(),
+        "moto_version": moto.__version__,
+        "max_notification_event": max_notification_event,
+        "runs": run_list,
+    }
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=4)
+    print(f"\nBenchmark result written to {args.output}")
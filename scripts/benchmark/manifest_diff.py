@@ -0,0 +1,107 @@
+import argparse
+import os
+import sys
+import timeit
+
+DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+SOURCE_PATH = os.path.join(DIR_PATH, "..", "..", "lambdas", "layers", "util")
+sys.path.append(SOURCE_PATH)
+
+from util import agha, manifest_diff
+
+EXTENSION_LIST = [".bam", ".bam.bai", ".vcf.gz", ".vcf.gz.tbi", ".fastq.gz"]
+
+
+def create_submission(number_of_files: int):
+    """
+    A manifest listing FASTQ uncompressed (as submitted), and the store holding every file with FASTQ compressed.
+    """
+    manifest_filename_list = []
+    store_key_list = []
+    for i in range(number_of_files):
+        extension = EXTENSION_LIST[i % len(EXTENSION_LIST)]
+        filename = f"SAMPLE{i:07}{extension}"
+        store_key_list.append(f"AC/2022-02-02/{filename}")
+
+        if extension == ".fastq.gz":
+            filename = filename[: -len(".gz")]
+        manifest_filename_list.append(filename)
+
+    return manifest_filename_list, store_key_list
+
+
+def find_missing_manifest_file_set_diff(manifest_filename_list, store_key_list):
+    """
+    The set difference previously done in batch.run_manifest_orig_store_check and report store_bucket_check
+    """
+    store_filename_list = [key.split("/")[-1] for key in store_key_list]
+    manifest_orig_diff_store = list(
+        set(manifest_filename_list) - set(store_filename_list)
+    )
+
+    uncompress_file = []
+    for filename in manifest_orig_diff_store:
+        if (
+            agha.FileType.is_compressable_file(filename)
+            and not agha.FileType.is_compress_file(filename)
+            and f"{filename}.gz" in store_filename_list
+        ):
+            uncompress_file.append(filename)
+
+    return list(set(manifest_orig_diff_store) - set(uncompress_file))
+
+
+def time_call(func, number: int) -> float:
+    return round(timeit.timeit(func, number=number) / number * 1000, 3)
+
+
+def run_benchmark(number_of_files_list: list, number: int) -> list:
+    result = []
+    for number_of_files in number_of_files_list:
+        manifest, store = create_submission(number_of_files)
+
+        result.append(
+            {
+                "number_of_files": number_of_files,
+                "set_diff_ms": time_call(
+                    lambda: find_missing_manifest_file_set_diff(manifest, store),
+                    number,
+                ),
+                "manifest_diff_ms": time_call(
+                    lambda: manifest_diff.find_missing_manifest_file(manifest, store),
+                    number,
+                ),
+            }
+        )
+
+    return result
+
+
+def get_argument():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the manifest.orig against store listing diff"
+    )
+    parser.add_argument(
+        "--number-of-files",
+        type=int,
+        nargs="+",
+        default=[100, 1000, 10000],
+        help="Number of files in the submission. Space seperated for multiple runs.",
+    )
+    parser.add_argument(
+        "--number",
+        type=int,
+        default=5,
+        help="Number of repetition per measurement.",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_argument()
+
+    result = run_benchmark(args.number_of_files, args.number)
+    column_list = list(result[0].keys())
+    print("".join(f"{column:>20}" for column in column_list))
+    for row in result:
+        print("".join(f"{str(row.get(column, '-')):>20}" for column in column_list))
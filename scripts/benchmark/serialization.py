@@ -0,0 +1,128 @@
+import argparse
+import datetime
+import decimal
+import json
+import os
+import sys
+import timeit
+from unittest import mock
+
+DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+SOURCE_PATH = os.path.join(DIR_PATH, "..", "..", "lambdas", "layers", "util")
+sys.path.append(SOURCE_PATH)
+
+import util
+from util import serialization
+
+# A DynamoDB Query page is at most 1MB
+DYNAMODB_PAGE_SIZE_BYTES = 1024 * 1024
+
+
+def create_dynamodb_page(record_type: str) -> list:
+    """
+    Items as returned by boto3 resource (numbers are Decimal) until the page reaches the DynamoDB page size.
+    """
+    page = []
+    page_size = 0
+    i = 0
+    while page_size < DYNAMODB_PAGE_SIZE_BYTES:
+        sort_key = f"cardiac/20220101_000000/SAMPLE{i:06}.bam"
+        if record_type == "FILE":
+            item = {
+                "partition_key": "TYPE:FILE",
+                "sort_key": sort_key,
+                "bucket_name": "agha-gdr-staging-2.0",
+                "s3_key": sort_key,
+                "etag": f"{i:032x}",
+                "filename": os.path.basename(sort_key),
+                "filetype": "BAM",
+                "date_modified": "20220101_000000",
+                "size_in_bytes": decimal.Decimal(123456789 + i),
+            }
+        elif record_type == "MANIFEST":
+            item = {
+                "partition_key": "TYPE:MANIFEST",
+                "sort_key": sort_key,
+                "flagship": "CARD",
+                "filename": os.path.basename(sort_key),
+                "filetype": "BAM",
+                "submission": "cardiac/20220101_000000",
+                "provided_checksum": f"{i:032x}",
+                "agha_study_id": f"A{i:07}",
+                "is_in_manifest": "True",
+                "validation_status": "PASS",
+                "date_modified": datetime.datetime(2022, 1, 1),
+            }
+        else:
+            item = {
+                "partition_key": "DATA:COVERAGE",
+                "sort_key": sort_key,
+                "date_modified": "20220101_000000",
+                "value": {
+                    "mean": decimal.Decimal("30.25"),
+                    "per_chromosome": [decimal.Decimal(c) for c in range(1, 23)],
+                },
+            }
+        page.append(item)
+        page_size += len(json.dumps(item, cls=util.JsonSerialEncoder))
+        i += 1
+    return page
+
+
+def time_call(func, number: int) -> float:
+    return round(timeit.timeit(func, number=number) / number * 1000, 3)
+
+
+def run_benchmark(number: int) -> list:
+    result = []
+    for record_type in ["FILE", "MANIFEST", "RESULT"]:
+        page = create_dynamodb_page(record_type)
+
+        row = {
+            "record_type": record_type,
+            "item": len(page),
+            "JsonSerialEncoder_ms": time_call(
+                lambda: json.dumps(page, cls=util.JsonSerialEncoder), number
+            ),
+            "JsonSerialEncoder_indent_ms": time_call(
+                lambda: json.dumps(page, indent=4, cls=util.JsonSerialEncoder), number
+            ),
+        }
+
+        with mock.patch.object(serialization, "JSON_BACKEND", "json"):
+            row["dumps_json_ms"] = time_call(lambda: serialization.dumps(page), number)
+        if serialization.orjson is not None:
+            with mock.patch.object(serialization, "JSON_BACKEND", "orjson"):
+                row["dumps_orjson_ms"] = time_call(
+                    lambda: serialization.dumps(page), number
+                )
+
+        row["normalise_decimal_ms"] = time_call(
+            lambda: serialization.normalise_decimal(page), number
+        )
+        result.append(row)
+
+    return result
+
+
+def get_argument():
+    parser = argparse.ArgumentParser(
+        description="Benchmark JSON serialisation of DynamoDB pages"
+    )
+    parser.add_argument(
+        "--number",
+        type=int,
+        default=20,
+        help="Number of repetition per measurement.",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_argument()
+
+    result = run_benchmark(args.number)
+    column_list = list(result[0].keys())
+    print("".join(f"{column:>28}" for column in column_list))
+    for row in result:
+        print("".join(f"{str(row.get(column, '-')):>28}" for column in column_list))
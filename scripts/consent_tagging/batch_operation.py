@@ -0,0 +1,335 @@
+import argparse
+import csv
+import io
+import json
+import os
+import urllib.parse
+import uuid
+from typing import List
+
+# main adds the util layer to the python path
+import main
+from main import Action
+
+import util
+
+##################################################################################################################
+"""
+S3 Batch Operations for large consent tagging request, instead of tagging object by object from the main.py script.
+
+To run the script:
+cd scripts/consent_tagging
+python3 batch_operation.py create ...
+python3 batch_operation.py reconcile ...
+
+See README.md for the full workflow.
+"""
+
+# Column of the completion report CSV, as documented in the S3 Batch Operations completion report
+COMPLETION_REPORT_COLUMN = [
+    "Bucket",
+    "Key",
+    "VersionId",
+    "TaskStatus",
+    "ErrorCode",
+    "HTTPStatusCode",
+    "ResultMessage",
+]
+TASK_STATUS_SUCCEEDED = "succeeded"
+
+
+def create_manifest_csv(bucket: str, s3_key_list: List[str]) -> str:
+    """
+    S3 Batch Operations CSV manifest: one 'bucket,key' row per object, key URL-encoded.
+    """
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator="\n")
+    for s3_key in s3_key_list:
+        writer.writerow([bucket, urllib.parse.quote(s3_key, safe="/")])
+    return output.getvalue()
+
+
+def create_put_object_tagging_job_spec(
+    account_id: str,
+    role_arn: str,
+    manifest_bucket: str,
+    manifest_key: str,
+    manifest_etag: str,
+    report_bucket: str,
+    report_prefix: str,
+    tag_set: List[dict],
+    description: str,
+    client_request_token: str = None,
+) -> dict:
+    """
+    Parameter of s3control.create_job (or `aws s3control create-job --cli-input-json`).
+    NOTE: PutObjectTagging replaces the whole tag set of the object, the same as main.tag_s3_object.
+    """
+    return {
+        "AccountId": account_id,
+        "ConfirmationRequired": True,
+        "Operation": {"S3PutObjectTagging": {"TagSet": tag_set}},
+        "Report": {
+            "Bucket": f"arn:aws:s3:::{report_bucket}",
+            "Format": "Report_CSV_20180820",
+            "Enabled": True,
+            "Prefix": report_prefix,
+            "ReportScope": "AllTasks",
+        },
+        "ClientRequestToken": client_request_token or str(uuid.uuid4()),
+        "Manifest": {
+            "Spec": {
+                "Format": "S3BatchOperations_CSV_20180820",
+                "Fields": ["Bucket", "Key"],
+            },
+            "Location": {
+                "ObjectArn": f"arn:aws:s3:::{manifest_bucket}/{manifest_key}",
+                "ETag": manifest_etag,
+            },
+        },
+        "Description": description,
+        "Priority": 10,
+        "RoleArn": role_arn,
+    }
+
+
+def parse_completion_report(report_csv: str):
+    """
+    :param report_csv: content of one completion report CSV (the report has no header row)
+    :return: (succeeded s3_key list, failed list of dict with s3_key and error)
+    """
+    succeeded_list = []
+    failed_list = []
+
+    for row in csv.reader(io.StringIO(report_csv)):
+        if not row:
+            continue
+        task = dict(zip(COMPLETION_REPORT_COLUMN, row))
+        s3_key = urllib.parse.unquote_plus(task["Key"])
+
+        if task.get("TaskStatus", "").lower() == TASK_STATUS_SUCCEEDED:
+            succeeded_list.append(s3_key)
+        else:
+            failed_list.append(
+                {
+                    "s3_key": s3_key,
+                    "error_code": task.get("ErrorCode", ""),
+                    "result_message": task.get("ResultMessage", ""),
+                }
+            )
+
+    return succeeded_list, failed_list
+
+
+def parse_completion_report_file_list(report_path_list: List[str]):
+    """
+    A completion report is split over several CSV in its 'results/' directory. A directory path reads every CSV
+    in it.
+    """
+    csv_path_list = []
+    for path in report_path_list:
+        if os.path.isdir(path):
+            for root, _, filename_list in os.walk(path):
+                csv_path_list.extend(
+                    os.path.join(root, f) for f in filename_list if f.endswith(".csv")
+                )
+        else:
+            csv_path_list.append(path)
+
+    succeeded_list = []
+    failed_list = []
+    for csv_path in sorted(csv_path_list):
+        with open(csv_path) as f:
+            succeeded, failed = parse_completion_report(f.read())
+        succeeded_list.extend(succeeded)
+        failed_list.extend(failed)
+
+    return succeeded_list, failed_list
+
+
+def select_key_to_record(
+    succeeded_list: List[str], step_by_s3_key: dict, manifest_s3_key_list=None
+) -> List[str]:
+    """
+    Object tagged by the job whose DynamoDB record has not been updated yet (according to the progress log).
+    :param manifest_s3_key_list: when given, only these keys (i.e. the keys of the job manifest) are selected
+    """
+    allowed = set(manifest_s3_key_list) if manifest_s3_key_list is not None else None
+
+    s3_key_list = []
+    for s3_key in dict.fromkeys(succeeded_list):
+        if allowed is not None and s3_key not in allowed:
+            continue
+        if step_by_s3_key.get(s3_key) == main.ProgressLog.RECORDED:
+            continue
+        s3_key_list.append(s3_key)
+    return s3_key_list
+
+
+########################################################################################################################
+# Commands
+
+
+def run_create(args):
+    s3_key_list = main.get_s3_key_list_from_study_id(args.study_ids, args.flagship)
+    print(f"Number of objects in the manifest: {len(s3_key_list)}")
+
+    manifest_csv = create_manifest_csv(main.STORE_BUCKET, s3_key_list)
+    with open(args.manifest_output, "w") as f:
+        f.write(manifest_csv)
+    print(f"Manifest written to: {args.manifest_output}")
+
+    if args.dryrun:
+        return
+
+    manifest_key = (
+        f"{args.manifest_prefix}consent-tagging-{args.flagship}-"
+        f"{util.get_datetimestamp()}.csv"
+    )
+    put_response = util.get_client("s3").put_object(
+        Bucket=args.manifest_bucket, Key=manifest_key, Body=manifest_csv
+    )
+
+    job_spec = create_put_object_tagging_job_spec(
+        account_id=args.account_id,
+        role_arn=args.role_arn,
+        manifest_bucket=args.manifest_bucket,
+        manifest_key=manifest_key,
+        manifest_etag=put_response["ETag"].strip('"'),
+        report_bucket=args.report_bucket,
+        report_prefix=args.report_prefix,
+        tag_set=[{"Key": "Consent", "Value": "True"}],
+        description=f"Consent tagging {args.flagship} ({len(s3_key_list)} objects)",
+    )
+    with open(args.job_spec_output, "w") as f:
+        f.write(json.dumps(job_spec, indent=4))
+    print(f"Job spec written to: {args.job_spec_output}")
+    print(
+        f"Create the job with: aws s3control create-job --cli-input-json file://{args.job_spec_output}"
+    )
+
+
+def run_reconcile(args):
+    succeeded_list, failed_list = parse_completion_report_file_list(args.report)
+    print(
+        f"Completion report: {len(succeeded_list)} succeeded, {len(failed_list)} failed"
+    )
+
+    if failed_list:
+        error_filename = f"tagging-error-{util.get_datetimestamp()}.json"
+        with open(error_filename, "w") as f:
+            f.write(json.dumps(failed_list, indent=4))
+        print(f"Failed objects written to: {error_filename}")
+
+    manifest_s3_key_list = None
+    if args.manifest:
+        with open(args.manifest) as f:
+            manifest_s3_key_list = [
+                urllib.parse.unquote_plus(row[1]) for row in csv.reader(f) if row
+            ]
+
+    progress_log_path = args.progress_log
+    if progress_log_path is None:
+        progress_log_path = main.ProgressLog.create_default_path(
+            "batch-operation", succeeded_list
+        )
+    progress_log = main.ProgressLog(progress_log_path, Action.ADD_CONSENT)
+    s3_key_list = select_key_to_record(
+        succeeded_list, progress_log.load(), manifest_s3_key_list
+    )
+    print(f"Progress log: {progress_log_path}")
+    print(f"Number of DynamoDB record to update: {len(s3_key_list)}")
+    if args.dryrun:
+        return
+
+    if s3_key_list:
+        progress_log.record(s3_key_list, main.ProgressLog.TAGGED)
+        main.update_dynamodb(
+            s3_key_list,
+            Action.ADD_CONSENT,
+            progress_log=progress_log,
+            max_workers=args.max_workers,
+        )
+
+    done_path = progress_log.complete()
+    if done_path is not None:
+        print(f"Progress log moved to: {done_path}")
+
+
+def get_argument():
+    parser = argparse.ArgumentParser(
+        description="Add consent tags with S3 Batch Operations"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    create_parser = subparsers.add_parser(
+        "create", help="Create the CSV manifest and the PutObjectTagging job spec."
+    )
+    create_parser.add_argument(
+        "--dryrun",
+        default=False,
+        action="store_true",
+        help="Only write the manifest locally.",
+    )
+    create_parser.add_argument("-s", "--study-ids", required=True, nargs="+")
+    create_parser.add_argument("-f", "--flagship", required=True)
+    create_parser.add_argument("--manifest-output", default="batch-manifest.csv")
+    create_parser.add_argument("--job-spec-output", default="batch-job-spec.json")
+    create_parser.add_argument("--account-id")
+    create_parser.add_argument(
+        "--role-arn",
+        help="Role assumed by S3 Batch Operations, it must be able to read the manifest, tag the store objects "
+        "and write the report.",
+    )
+    create_parser.add_argument("--manifest-bucket")
+    create_parser.add_argument("--manifest-prefix", default="batch-operation/")
+    create_parser.add_argument("--report-bucket")
+    create_parser.add_argument("--report-prefix", default="batch-operation/report")
+
+    reconcile_parser = subparsers.add_parser(
+        "reconcile",
+        help="Update the store DynamoDB table from the job completion report.",
+    )
+    reconcile_parser.add_argument(
+        "--dryrun",
+        default=False,
+        action="store_true",
+        help="Only print the number of records to update.",
+    )
+    reconcile_parser.add_argument(
+        "-r",
+        "--report",
+        required=True,
+        nargs="+",
+        help="Completion report CSV file(s) or directory (e.g. the downloaded 'results/' directory).",
+    )
+    reconcile_parser.add_argument(
+        "--manifest",
+        help="(Optional) The job CSV manifest, only its objects are updated.",
+    )
+    reconcile_parser.add_argument(
+        "--progress-log",
+        default=None,
+        help="Path of the progress log. Default: consent-tagging-progress-batch-operation-<report hash>.jsonl",
+    )
+    reconcile_parser.add_argument("--max-workers", type=int, default=main.MAX_WORKERS)
+
+    args = parser.parse_args()
+    if args.command == "create" and not args.dryrun:
+        missing = [
+            name
+            for name in ["account_id", "role_arn", "manifest_bucket", "report_bucket"]
+            if not getattr(args, name)
+        ]
+        if missing:
+            parser.error(f"create requires: {', '.join(missing)} (or --dryrun)")
+
+    return args
+
+
+if __name__ == "__main__":
+    args = get_argument()
+    if args.command == "create":
+        run_create(args)
+    else:
+        run_reconcile(args)
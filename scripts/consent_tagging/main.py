@@ -1,11 +1,15 @@
+import hashlib
 import json
 import os
 import sys
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import botocore.exceptions
 import pandas as pd
 from enum import Enum
 from typing import List
-from boto3.dynamodb.conditions import Attr
 
 DIR_PATH = os.path.dirname(os.path.realpath(__file__))
 SOURCE_PATH = os.path.join(DIR_PATH, "..", "..", "lambdas", "layers", "util")
@@ -25,6 +29,12 @@ STAGING_BUCKET = "agha-gdr-staging-2.0"
 RESULT_BUCKET = "agha-gdr-results-2.0"
 STORE_BUCKET = "agha-gdr-store-2.0"
 
+MAX_WORKERS = 16
+# Number of DynamoDB record updated (in parallel) between two progress log/archive writes
+UPDATE_BATCH_SIZE = 100
+
+CLIENT_S3 = util.get_client("s3")
+
 ##################################################################################################################
 # NOTE: Only works in store bucket
 """
@@ -87,6 +97,18 @@ def get_argument():
         choices=flagship_list,
         help="Code of the flagship the sample belongs to.",
     )
+    parser.add_argument(
+        "--progress-log",
+        default=None,
+        help="Path of the progress log. Re-run with the same log to continue an interrupted run. "
+        "Default: consent-tagging-progress-<flagship>-<action>-<study IDs hash>.jsonl",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=MAX_WORKERS,
+        help="Number of S3/DynamoDB request made in parallel.",
+    )
     args = parser.parse_args()
 
     print("######################" * 6)
@@ -146,33 +168,170 @@ def parse_from_excel_by_pandas():
         f.close()
 
 
-def run_modify_tagging(
-    agha_study_id_list: List, flagship: str, action_type: Action, dry_run: bool
+def get_s3_key_list_from_study_id(
+    agha_study_id_list: List, flagship: str, max_workers: int = MAX_WORKERS
 ):
+    """
+    Query the study ID index (See util.dynamodb StudyIdIndexRecord) of each study ID in parallel, limited to the
+    flagship prefix. Only the records of the requested studies are read.
+    Study IDs without any index record (e.g. submission stored before the index and not backfilled yet, see
+    scripts/util/backfill_study_id_index.py) fall back to a single read of the flagship MANIFEST records.
+    """
     sort_key_flagship_prefix = agha.FlagShip.from_name(flagship).preferred_code()
-    s3_key_list_to_tag = []
-
-    # Grab sort_key from agha_study_id and flagship
-    for study_id in agha_study_id_list:
-        filter_expr = Attr("agha_study_id").eq(study_id)
-
-        file_list = dynamodb.get_batch_item_from_pk_and_sk(
-            table_name=DYNAMODB_STORE_TABLE_NAME,
-            partition_key=dynamodb.FileRecordPartitionKey.MANIFEST_FILE_RECORD.value,
-            sort_key_prefix=sort_key_flagship_prefix,
-            filter_expr=filter_expr,
+    agha_study_id_list = list(dict.fromkeys(str(i).strip() for i in agha_study_id_list))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        index_record_list_by_study_id = list(
+            executor.map(
+                lambda agha_study_id: dynamodb.get_batch_item_from_agha_study_id(
+                    table_name=DYNAMODB_STORE_TABLE_NAME,
+                    agha_study_id=agha_study_id,
+                    s3_key_prefix=f"{sort_key_flagship_prefix}/",
+                ),
+                agha_study_id_list,
+            )
         )
-        s3_key_list_to_tag.extend([metadata["sort_key"] for metadata in file_list])
-
-        # Start tagging object
+    s3_key_set = {
+        record["sort_key"]
+        for index_record_list in index_record_list_by_study_id
+        for record in index_record_list
+    }
+
+    unindexed_study_id_list = [
+        agha_study_id
+        for agha_study_id, index_record_list in zip(
+            agha_study_id_list, index_record_list_by_study_id
+        )
+        if not index_record_list
+    ]
+    if unindexed_study_id_list:
         print(
-            f"List of sort_key associated with given `{study_id}` ({len(s3_key_list_to_tag)}):",
-            json.dumps(s3_key_list_to_tag, indent=4),
+            f"WARNING: No study ID index record for {unindexed_study_id_list}, reading the {sort_key_flagship_prefix} "
+            f"MANIFEST records instead. Run scripts/util/backfill_study_id_index.py if the index is missing."
+        )
+        record_by_study_id = dynamodb.get_manifest_record_by_agha_study_id(
+            table_name=DYNAMODB_STORE_TABLE_NAME,
+            agha_study_id_list=unindexed_study_id_list,
+            sort_key_prefix=f"{sort_key_flagship_prefix}/",
+        )
+        s3_key_set.update(
+            record["sort_key"]
+            for record_list in record_by_study_id.values()
+            for record in record_list
         )
+
+    return sorted(s3_key_set)
+
+
+class ProgressLog:
+    """
+    Append-only JSON lines log of every object done, so an interrupted run can be executed again with the same
+    parameter and continue where it stopped. Each line: {"action": str, "s3_key": str, "step": TAGGED|RECORDED}
+    """
+
+    TAGGED = "TAGGED"
+    RECORDED = "RECORDED"
+
+    def __init__(self, path: str, action_type: Action):
+        self.path = path
+        self.action = str(action_type)
+        self._lock = threading.Lock()
+
+    def load(self) -> dict:
+        """
+        :return: s3_key -> last step done
+        """
+        step_by_s3_key = {}
+        if not os.path.exists(self.path):
+            return step_by_s3_key
+
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Last line may be incomplete if the run was killed while writing
+                    continue
+                if entry.get("action") != self.action:
+                    continue
+                if step_by_s3_key.get(entry["s3_key"]) == self.RECORDED:
+                    continue
+                step_by_s3_key[entry["s3_key"]] = entry["step"]
+        return step_by_s3_key
+
+    @staticmethod
+    def create_default_path(name: str, value_list: List[str]) -> str:
+        """
+        Path unique to the values of the run (e.g. the study IDs), so a run over other values does not pick up the log
+        """
+        digest = hashlib.sha256(",".join(sorted(set(value_list))).encode()).hexdigest()
+        return f"consent-tagging-progress-{name}-{digest[:12]}.jsonl"
+
+    def complete(self):
+        """
+        Move the log aside once every object is done, so a later run with the same parameter starts over
+        :return: new path of the log
+        """
+        if not os.path.exists(self.path):
+            return None
+        done_path = f"{self.path}.done-{util.get_datetimestamp()}"
+        os.replace(self.path, done_path)
+        return done_path
+
+    def record(self, s3_key_list: List[str], step: str):
+        with self._lock:
+            with open(self.path, "a") as f:
+                for s3_key in s3_key_list:
+                    f.write(
+                        json.dumps(
+                            {"action": self.action, "s3_key": s3_key, "step": step}
+                        )
+                        + "\n"
+                    )
+
+
+def run_modify_tagging(
+    agha_study_id_list: List,
+    flagship: str,
+    action_type: Action,
+    dry_run: bool,
+    progress_log_path: str = None,
+    max_workers: int = MAX_WORKERS,
+):
+    action_type = Action.from_name(str(action_type))
+
+    # Grab sort_key from agha_study_id and flagship
+    s3_key_list_to_tag = get_s3_key_list_from_study_id(agha_study_id_list, flagship)
+    print(
+        f"List of sort_key associated with given study ID(s) ({len(s3_key_list_to_tag)}):",
+        json.dumps(s3_key_list_to_tag, indent=4),
+    )
     if dry_run:
         return s3_key_list_to_tag
+
+    if progress_log_path is None:
+        progress_log_path = ProgressLog.create_default_path(
+            f"{flagship}-{action_type}", agha_study_id_list
+        )
+    progress_log = ProgressLog(progress_log_path, action_type)
+    step_by_s3_key = progress_log.load()
+
+    tag_s3_key_list = [k for k in s3_key_list_to_tag if k not in step_by_s3_key]
+    tagged_s3_key_list = [
+        k for k in s3_key_list_to_tag if step_by_s3_key.get(k) == ProgressLog.TAGGED
+    ]
+    print(
+        f"Progress log '{progress_log_path}': "
+        f"{len(s3_key_list_to_tag) - len(tag_s3_key_list) - len(tagged_s3_key_list)} done, "
+        f"{len(tagged_s3_key_list)} tagged but not recorded, {len(tag_s3_key_list)} to tag"
+    )
+
+    # Start tagging object
     success_array, error_array = modify_consent_tag_object_from_s3_key_list(
-        s3_key_list_to_tag, tag_action=action_type
+        tag_s3_key_list,
+        tag_action=action_type,
+        progress_log=progress_log,
+        max_workers=max_workers,
     )
 
     # Result writing and logging
@@ -182,43 +341,93 @@ def run_modify_tagging(
         err_file.write(json.dumps(error_array))
         err_file.close()
 
-    if success_array:
-        update_dynamodb(success_array, action_type)
+    if success_array or tagged_s3_key_list:
+        update_dynamodb(
+            tagged_s3_key_list + success_array,
+            action_type,
+            progress_log=progress_log,
+            max_workers=max_workers,
+        )
+
+    # The log is kept when an object failed, so re-running the command only retries the failed objects
+    if not error_array:
+        done_path = progress_log.complete()
+        if done_path is not None:
+            print(f"Progress log moved to: {done_path}")
 
     return s3_key_list_to_tag
 
 
-def update_dynamodb(s3_key_list: List[str], action_type: Action):
-    update_array = []
+def update_consent_record(s3_key: str, action_type: Action):
+    """
+    SET/REMOVE the Consent attribute of the FILE record in place.
+    :return: the updated record, None if the record does not exist
+    """
+    tbl = dynamodb.get_resource().Table(DYNAMODB_STORE_TABLE_NAME)
 
-    # Fetch existing data
-    for new_s3_key in s3_key_list:
-        print("Processing: ", new_s3_key)
-        pk = dynamodb.FileRecordPartitionKey.FILE_RECORD.value
-        dy_res = dynamodb.get_item_from_exact_pk_and_sk(
-            table_name=DYNAMODB_STORE_TABLE_NAME, partition_key=pk, sort_key=new_s3_key
-        )
+    if action_type == Action.ADD_CONSENT:
+        update_parameter = {
+            "UpdateExpression": "SET Consent = :consent",
+            "ExpressionAttributeValues": {":consent": True},
+        }
+    elif action_type == Action.REMOVE_CONSENT:
+        update_parameter = {"UpdateExpression": "REMOVE Consent"}
+    else:
+        raise ValueError
 
-        dy_item = dy_res["Items"][0]
+    try:
+        response = tbl.update_item(
+            Key={
+                "partition_key": dynamodb.FileRecordPartitionKey.FILE_RECORD.value,
+                "sort_key": s3_key,
+            },
+            ConditionExpression="attribute_exists(sort_key)",
+            ReturnValues="ALL_NEW",
+            **update_parameter,
+        )
+    except tbl.meta.client.exceptions.ConditionalCheckFailedException:
+        print(f"No FILE record for: {s3_key}")
+        return None
 
-        if action_type == Action.ADD_CONSENT:
-            dy_item["Consent"] = True
-        elif action_type == Action.REMOVE_CONSENT:
-            del dy_item["Consent"]
-        else:
-            raise ValueError
+    return response["Attributes"]
 
-        update_array.append(dy_item)
 
-    print(json.dumps(update_array, indent=4, cls=util.JsonSerialEncoder))
+def update_dynamodb(
+    s3_key_list: List[str],
+    action_type: Action,
+    progress_log: ProgressLog = None,
+    max_workers: int = MAX_WORKERS,
+):
+    update_array = []
 
-    # Batch update array
     print("Updating dydb...")
-    dynamodb.batch_write_objects(DYNAMODB_STORE_TABLE_NAME, update_array)
-    dynamodb.batch_write_objects_archive(
-        DYNAMODB_ARCHIVE_STORE_TABLE_NAME, update_array, "ObjectUpdate"
-    )
+    for i in range(0, len(s3_key_list), UPDATE_BATCH_SIZE):
+        s3_key_batch = s3_key_list[i : i + UPDATE_BATCH_SIZE]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            updated_batch = list(
+                executor.map(
+                    lambda s3_key: update_consent_record(s3_key, action_type),
+                    s3_key_batch,
+                )
+            )
+        updated_batch = [item for item in updated_batch if item is not None]
+
+        # The archive record keeps the state after the update, as before
+        dynamodb.batch_write_objects_archive(
+            DYNAMODB_ARCHIVE_STORE_TABLE_NAME,
+            [dict(item) for item in updated_batch],
+            "ObjectUpdate",
+        )
+        if progress_log is not None:
+            progress_log.record(s3_key_batch, ProgressLog.RECORDED)
+
+        update_array.extend(updated_batch)
+        print(
+            f"Updated {min(i + UPDATE_BATCH_SIZE, len(s3_key_list))}/{len(s3_key_list)}"
+        )
 
+    dynamodb.invalidate_query_cache(DYNAMODB_STORE_TABLE_NAME)
     return update_array
 
 
@@ -243,9 +452,7 @@ def tag_s3_object(bucket: str, key: str, tag_set: List[dict]):
     :return: the response of the tagging request
     """
 
-    client_s3 = util.get_client("s3")
-
-    response = client_s3.put_object_tagging(
+    response = CLIENT_S3.put_object_tagging(
         Bucket=bucket, Key=key, Tagging={"TagSet": tag_set}
     )
     return response
@@ -255,7 +462,7 @@ def remove_specific_tag_from_s3_object(
     bucket: str, key: str, removal_tag_set: List[dict]
 ):
     """
-    Add tags to an S3 object.
+    Remove tags from an S3 object.
     TagSet in the form:
     [
         {
@@ -271,61 +478,66 @@ def remove_specific_tag_from_s3_object(
     :param bucket: the S3 bucket name the object is in
     :param key: the full S3 key of the object
     :param removal_tag_set: the List[dict] of tag key/value pairs
-    :return: the response of the tagging request
+    :return: the response of the tagging request, None if there was nothing to remove
     """
 
-    client_s3 = util.get_client("s3")
-
     ######################################################################
     # Current Boto3 SDK does not support specific tag removal
-    # This is a wrapper to retrieve current tag, remove, and re-tag the object
+    # This is a wrapper to retrieve current tag and re-tag the object with the remaining tag
 
-    current_tag = client_s3.get_object_tagging(Bucket=bucket, Key=key)
-    current_tag_set = current_tag["TagSet"]
+    current_tag_set = CLIENT_S3.get_object_tagging(Bucket=bucket, Key=key)["TagSet"]
     # Find what tag should be there and not remove
-    new_tag_set = []
-    for current_tag in current_tag_set:
-        if current_tag in removal_tag_set:
-            continue
-        else:
-            new_tag_set.append(current_tag)
+    new_tag_set = [tag for tag in current_tag_set if tag not in removal_tag_set]
 
-    # Removing all tag in the object
-    response = client_s3.delete_object_tagging(Bucket=bucket, Key=key)
+    if len(new_tag_set) == len(current_tag_set):
+        return None
 
-    # re-apply any tag if there should exist
+    # PutObjectTagging replaces the whole tag set
     if new_tag_set:
-        tag_s3_object(bucket=bucket, key=key, tag_set=new_tag_set)
+        return tag_s3_object(bucket=bucket, key=key, tag_set=new_tag_set)
+    return CLIENT_S3.delete_object_tagging(Bucket=bucket, Key=key)
 
-    return response
+
+def modify_consent_tag_object(s3_key: str, tag_action: Action):
+    tag_set = [{"Key": "Consent", "Value": "True"}]
+
+    if tag_action == Action.ADD_CONSENT:
+        return tag_s3_object(bucket=STORE_BUCKET, key=s3_key, tag_set=tag_set)
+    elif tag_action == Action.REMOVE_CONSENT:
+        return remove_specific_tag_from_s3_object(
+            bucket=STORE_BUCKET, key=s3_key, removal_tag_set=tag_set
+        )
+    else:
+        raise ValueError
 
 
 def modify_consent_tag_object_from_s3_key_list(
-    s3_key_list: List[str], tag_action: Action
+    s3_key_list: List[str],
+    tag_action: Action,
+    progress_log: ProgressLog = None,
+    max_workers: int = MAX_WORKERS,
 ):
-    tag_set = [{"Key": "Consent", "Value": "True"}]
-
     success_array = []
     error_array = []
-    for s3_key in s3_key_list:
-
-        print("Modifying object tag: ", s3_key)
-        try:
-
-            if tag_action == Action.ADD_CONSENT:
-                tag_resp = tag_s3_object(
-                    bucket=STORE_BUCKET, key=s3_key, tag_set=tag_set
-                )
-            elif tag_action == Action.REMOVE_CONSENT:
-                tag_resp = remove_specific_tag_from_s3_object(
-                    bucket=STORE_BUCKET, key=s3_key, removal_tag_set=tag_set
-                )
-            else:
-                raise ValueError
 
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_key = {
+            executor.submit(modify_consent_tag_object, s3_key, tag_action): s3_key
+            for s3_key in s3_key_list
+        }
+        for future in as_completed(future_key):
+            s3_key = future_key[future]
+            try:
+                future.result()
+            except (ValueError, botocore.exceptions.ClientError) as e:
+                print(f"Error modifying object tag '{s3_key}': {e}")
+                error_array.append(s3_key)
+                continue
+
+            print("Modified object tag: ", s3_key)
             success_array.append(s3_key)
-        except ValueError:
-            error_array.append(s3_key)
+            if progress_log is not None:
+                progress_log.record([s3_key], ProgressLog.TAGGED)
 
     return success_array, error_array
 
@@ -339,4 +551,6 @@ if __name__ == "__main__":
         flagship=args.flagship,
         action_type=args.action,
         dry_run=args.dryrun,
+        progress_log_path=args.progress_log,
+        max_workers=args.max_workers,
     )
@@ -0,0 +1,10 @@
+# Add the script and util directory to python path
+import os
+import sys
+
+DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(DIR_PATH, ".."))
+sys.path.append(os.path.join(DIR_PATH, "..", "..", "..", "lambdas", "layers", "util"))
+
+# Setting up environment variable
+os.environ.setdefault("AWS_DEFAULT_REGION", "ap-southeast-2")
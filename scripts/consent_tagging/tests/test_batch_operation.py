@@ -0,0 +1,153 @@
+"""
+To run the testcase
+
+Change directory to the consent_tagging script
+cmd from root directory: cd scripts/consent_tagging
+
+Run python test command:
+cmd: python -m unittest tests.test_batch_operation.TestBatchOperation
+
+"""
+
+import os
+import tempfile
+import unittest
+
+import batch_operation
+import main
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "fixtures")
+MANIFEST_FIXTURE = os.path.join(FIXTURE_PATH, "manifest.csv")
+REPORT_FIXTURE_PATH = os.path.join(FIXTURE_PATH, "report")
+COMPLETION_REPORT_FIXTURE = os.path.join(REPORT_FIXTURE_PATH, "completion_report.csv")
+
+S3_KEY_LIST = [
+    "AC/2022-02-02/A0001.bam",
+    "AC/2022-02-02/A0001.bam.bai",
+    "AC/2022-02-02/A0002 R1.fastq.gz",
+    "AC/2022-02-02/A0003+1.vcf.gz",
+]
+
+
+class TestBatchOperation(unittest.TestCase):
+    def test_create_manifest_csv(self):
+        with open(MANIFEST_FIXTURE) as f:
+            expected = f.read()
+
+        self.assertEqual(
+            batch_operation.create_manifest_csv("agha-gdr-store-2.0", S3_KEY_LIST),
+            expected,
+        )
+
+    def test_create_job_spec(self):
+        job_spec = batch_operation.create_put_object_tagging_job_spec(
+            account_id="123456789",
+            role_arn="arn:aws:iam::123456789:role/batch-operation",
+            manifest_bucket="agha-gdr-results-2.0",
+            manifest_key="batch-operation/manifest.csv",
+            manifest_etag="abcd",
+            report_bucket="agha-gdr-results-2.0",
+            report_prefix="batch-operation/report",
+            tag_set=[{"Key": "Consent", "Value": "True"}],
+            description="Consent tagging AC",
+            client_request_token="token",
+        )
+
+        self.assertEqual(
+            job_spec["Operation"],
+            {"S3PutObjectTagging": {"TagSet": [{"Key": "Consent", "Value": "True"}]}},
+        )
+        self.assertEqual(
+            job_spec["Manifest"]["Location"],
+            {
+                "ObjectArn": "arn:aws:s3:::agha-gdr-results-2.0/batch-operation/manifest.csv",
+                "ETag": "abcd",
+            },
+        )
+        self.assertEqual(job_spec["Report"]["ReportScope"], "AllTasks")
+
+    def test_parse_completion_report(self):
+        succeeded_list, failed_list = batch_operation.parse_completion_report_file_list(
+            [REPORT_FIXTURE_PATH]
+        )
+
+        self.assertEqual(
+            succeeded_list,
+            [
+                "AC/2022-02-02/A0001.bam",
+                "AC/2022-02-02/A0001.bam.bai",
+                "AC/2022-02-02/A0003+1.vcf.gz",
+                "AC/2022-02-02/UNLISTED.bam",
+            ],
+        )
+        self.assertEqual(len(failed_list), 1)
+        self.assertEqual(failed_list[0]["s3_key"], "AC/2022-02-02/A0002 R1.fastq.gz")
+        self.assertEqual(failed_list[0]["error_code"], "NoSuchKey")
+
+    def test_select_key_to_record(self):
+        succeeded_list, _ = batch_operation.parse_completion_report_file_list(
+            [COMPLETION_REPORT_FIXTURE]
+        )
+
+        self.assertEqual(
+            batch_operation.select_key_to_record(
+                succeeded_list,
+                {"AC/2022-02-02/A0001.bam": main.ProgressLog.RECORDED},
+                S3_KEY_LIST,
+            ),
+            ["AC/2022-02-02/A0001.bam.bai", "AC/2022-02-02/A0003+1.vcf.gz"],
+        )
+
+    def test_progress_log_resume(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        progress_log_path = os.path.join(tmp_dir.name, "progress.jsonl")
+        progress_log = main.ProgressLog(progress_log_path, main.Action.ADD_CONSENT)
+
+        progress_log.record(S3_KEY_LIST[:2], main.ProgressLog.TAGGED)
+        progress_log.record(S3_KEY_LIST[:1], main.ProgressLog.RECORDED)
+        main.ProgressLog(progress_log_path, main.Action.REMOVE_CONSENT).record(
+            S3_KEY_LIST[2:], main.ProgressLog.RECORDED
+        )
+
+        self.assertEqual(
+            progress_log.load(),
+            {
+                S3_KEY_LIST[0]: main.ProgressLog.RECORDED,
+                S3_KEY_LIST[1]: main.ProgressLog.TAGGED,
+            },
+        )
+
+    def test_progress_log_default_path(self):
+        path = main.ProgressLog.create_default_path(
+            "GI-ADD_CONSENT", ["A0001", "A0002"]
+        )
+
+        self.assertTrue(path.startswith("consent-tagging-progress-GI-ADD_CONSENT-"))
+        self.assertEqual(
+            path,
+            main.ProgressLog.create_default_path(
+                "GI-ADD_CONSENT", ["A0002", "A0001", "A0001"]
+            ),
+        )
+        self.assertNotEqual(
+            path, main.ProgressLog.create_default_path("GI-ADD_CONSENT", ["A0001"])
+        )
+
+    def test_progress_log_complete(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        progress_log_path = os.path.join(tmp_dir.name, "progress.jsonl")
+        progress_log = main.ProgressLog(progress_log_path, main.Action.ADD_CONSENT)
+        progress_log.record(S3_KEY_LIST, main.ProgressLog.RECORDED)
+
+        done_path = progress_log.complete()
+
+        self.assertTrue(os.path.exists(done_path))
+        self.assertFalse(os.path.exists(progress_log_path))
+        self.assertEqual(progress_log.load(), {})
+        self.assertIsNone(progress_log.complete())
+
+
+if __name__ == "__main__":
+    unittest.main()
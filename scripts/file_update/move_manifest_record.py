@@ -121,6 +121,15 @@ def move_and_update_manifest_record(event_payload):
     # Upload new dydb record
     dynamodb.batch_write_objects(table_name=table_name, object_list=[dynamodb_item])
 
+    # The study ID lookup (e.g. consent_tagging, generate_presign_url) reads the index records of the store MANIFEST
+    # records. Before the archive write below, which appends a timestamp to the record sort_key.
+    if (
+        table_name == DYNAMODB_STORE_TABLE_NAME
+        and event_payload.partition_key
+        == dynamodb.FileRecordPartitionKey.MANIFEST_FILE_RECORD.value
+    ):
+        update_study_id_index(table_name, event_payload.old_sort_key, dynamodb_item)
+
     dynamodb.batch_write_objects_archive(
         table_name=archive_table_name,
         object_list=[dynamodb_item],
@@ -140,6 +149,21 @@ def move_and_update_manifest_record(event_payload):
         sys.exit(1)
 
 
+def update_study_id_index(table_name: str, old_sort_key: str, manifest_item: dict):
+    if old_sort_key != manifest_item["sort_key"]:
+        deleted_index_list = dynamodb.delete_study_id_index_from_s3_key(
+            table_name, old_sort_key
+        )
+        logger.info(
+            f"Deleted {len(deleted_index_list)} study ID index record(s) of {old_sort_key}"
+        )
+
+    written, deleted = dynamodb.update_study_id_index_from_manifest_record_list(
+        table_name, [manifest_item]
+    )
+    logger.info(f"Study ID index updated: {written} written, {deleted} deleted")
+
+
 if __name__ == "__main__":
     event_payload = get_arguments()
     move_and_update_manifest_record(event_payload)
@@ -3,6 +3,7 @@ import os
 import sys
 import argparse
 import boto3
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from typing import List
 from boto3.dynamodb.conditions import Attr
 from botocore.client import Config
@@ -26,6 +27,10 @@ STAGING_BUCKET = "agha-gdr-staging-2.0"
 RESULT_BUCKET = "agha-gdr-results-2.0"
 STORE_BUCKET = "agha-gdr-store-2.0"
 
+SIGN_WORKERS = os.cpu_count() or 1
+QUERY_WORKERS = 16
+SIGN_BATCH_SIZE = 500
+
 ##############################################################################################################
 # Configure generate_presigned_url to accept custom parameter.
 # Taken from: https://stackoverflow.com/a/59057975/13137208
@@ -98,11 +103,17 @@ def get_argument():
         choices=flagship_list,
         help="Code of the flagship the sample belongs to.",
     )
+    parser.add_argument(
+        "--sign-workers",
+        type=int,
+        default=SIGN_WORKERS,
+        help="Number of processes signing the URLs. Default: number of CPU",
+    )
     args = parser.parse_args()
 
     print("######################" * 6)
     print("Running the following")
-    print(f"Release Id: {args.study_ids}")
+    print(f"Release Id: {args.release_id}")
     print(f"Flagship  : {args.flagship}")
     print(f"Study Ids : {args.study_ids}")
     print(f"Filetype  : {args.filetype}")
@@ -113,42 +124,70 @@ def get_argument():
     return args
 
 
-def generate_presign_s3_url(
-    agha_study_id_list: List[str],
-    flagship: str,
-    filetype_list: List[str],
-    dry_run: bool,
-    out_file: str,
-    release_id: str,
+def get_file_metadata_list(
+    agha_study_id_list: List[str], flagship: str, filetype_list: List[str]
 ):
-    sort_key_flagship_prefix = agha.FlagShip.from_name(flagship).preferred_code()
-    filetype_list = run_filetype_sanitize(filetype_list)
-    file_metadata_list = []
+    """
+    Query the study ID index (See util.dynamodb StudyIdIndexRecord) of each study ID in parallel, limited to the
+    flagship, then read the size of the matching FILE records with batched gets. Only the records of the requested
+    studies are read.
+    Study IDs without any index record (e.g. submission stored before the index and not backfilled yet, see
+    scripts/util/backfill_study_id_index.py) fall back to a single read of the flagship MANIFEST records.
+    :return: manifest record with 'size_in_bytes', ordered by the study ID list then sort_key
+    """
+    sort_key_flagship_prefix = f"{agha.FlagShip.from_name(flagship).preferred_code()}/"
+    agha_study_id_list = list(dict.fromkeys(str(i).strip() for i in agha_study_id_list))
+
+    filter_expr = None
+    if filetype_list:
+        filter_expr = Attr("filetype").is_in(filetype_list)
+
+    with ThreadPoolExecutor(max_workers=QUERY_WORKERS) as executor:
+        index_record_list_by_study_id = list(
+            executor.map(
+                lambda agha_study_id: dynamodb.get_batch_item_from_agha_study_id(
+                    table_name=DYNAMODB_STORE_TABLE_NAME,
+                    agha_study_id=agha_study_id,
+                    s3_key_prefix=sort_key_flagship_prefix,
+                    filter_expr=filter_expr,
+                ),
+                agha_study_id_list,
+            )
+        )
 
-    # Find files with relevant study_id, flagship, and filetype
-    for study_id in agha_study_id_list:
-
-        # study_id filter
-        filter_expr = Attr("agha_study_id").eq(study_id)
-
-        # filetype filter
-        if filetype_list:
-            filetype_attr_expr = Attr("filetype").eq(
-                filetype_list[0]
-            )  # Init expression
-            for filetype in filetype_list[1:]:
-                filetype_attr_expr = filetype_attr_expr | Attr("filetype").eq(
-                    filetype
-                )  # Appending expression
-            filter_expr = filter_expr & filetype_attr_expr
-
-        # query to dydb
-        file_list = dynamodb.get_batch_item_from_pk_and_sk(
+    unindexed_study_id_list = [
+        study_id
+        for study_id, index_record_list in zip(
+            agha_study_id_list, index_record_list_by_study_id
+        )
+        if not index_record_list
+    ]
+    record_by_unindexed_study_id = {}
+    if unindexed_study_id_list:
+        print(
+            f"WARNING: No study ID index record for {unindexed_study_id_list}, reading the {sort_key_flagship_prefix} "
+            f"MANIFEST records instead. Run scripts/util/backfill_study_id_index.py if the index is missing."
+        )
+        record_by_unindexed_study_id = dynamodb.get_manifest_record_by_agha_study_id(
             table_name=DYNAMODB_STORE_TABLE_NAME,
-            partition_key=dynamodb.FileRecordPartitionKey.MANIFEST_FILE_RECORD.value,
+            agha_study_id_list=unindexed_study_id_list,
             sort_key_prefix=sort_key_flagship_prefix,
             filter_expr=filter_expr,
         )
+
+    file_metadata_list = []
+    seen_sort_key = set()
+    for study_id, index_record_list in zip(
+        agha_study_id_list, index_record_list_by_study_id
+    ):
+        if not index_record_list:
+            index_record_list = record_by_unindexed_study_id.get(study_id, [])
+        file_list = [
+            record
+            for record in sorted(index_record_list, key=lambda r: r["sort_key"])
+            if record["sort_key"] not in seen_sort_key
+        ]
+        seen_sort_key.update(record["sort_key"] for record in file_list)
         file_metadata_list.extend(file_list)
 
         # Logging
@@ -157,15 +196,36 @@ def generate_presign_s3_url(
             f"File with matching study_id ({study_id}) and flagship ({sort_key_flagship_prefix}) are: {json.dumps(sort_key_list, indent=4)}"
         )
 
-    if dry_run:
-        return
+    size_by_sort_key = {
+        record["sort_key"]: record.get("size_in_bytes")
+        for record in dynamodb.get_batch_item_from_pk_and_sk_list(
+            table_name=DYNAMODB_STORE_TABLE_NAME,
+            partition_key=dynamodb.FileRecordPartitionKey.FILE_RECORD.value,
+            sort_key_list=[metadata["sort_key"] for metadata in file_metadata_list],
+            projection_expr="sort_key, size_in_bytes",
+        )
+    }
 
-    # Fetch additional field needed
+    missing_size_list = []
     for file_metadata in file_metadata_list:
-        s3_key = file_metadata["sort_key"]
+        size_in_bytes = size_by_sort_key.get(file_metadata["sort_key"])
+        if size_in_bytes is None:
+            missing_size_list.append(file_metadata["sort_key"])
+        file_metadata["size_in_bytes"] = size_in_bytes
+    if missing_size_list:
+        raise ValueError(
+            f"Cannot retrieve size: {json.dumps(missing_size_list, indent=4)}"
+        )
+
+    return file_metadata_list
 
-        # Generate presigned-url
-        presigned_url = CUSTOM_S3_CLIENT.generate_presigned_url(
+
+def sign_s3_key_batch(s3_key_list: List[str], release_id: str) -> List[str]:
+    """
+    Signing is local (no request to AWS) and CPU bound, hence done by batch in worker processes.
+    """
+    return [
+        CUSTOM_S3_CLIENT.generate_presigned_url(
             ClientMethod="get_object",
             Params={
                 "Bucket": STORE_BUCKET,
@@ -174,34 +234,59 @@ def generate_presign_s3_url(
             },
             ExpiresIn=604800,  # 7 full days
         )
-        file_metadata["presigned_url"] = presigned_url
+        for s3_key in s3_key_list
+    ]
 
-        # Get fileSize
-        object_s3_metadata = dynamodb.get_item_from_exact_pk_and_sk(
-            table_name=DYNAMODB_STORE_TABLE_NAME,
-            partition_key=dynamodb.FileRecordPartitionKey.FILE_RECORD.value,
-            sort_key=s3_key,
-        )
-        if object_s3_metadata["Count"] != 1:
-            raise ValueError("Cannot retrieve size")
-        size_in_bytes = object_s3_metadata["Items"][0]["size_in_bytes"]
-        file_metadata["size_in_bytes"] = size_in_bytes
 
-    # Write output file
-    f = open(out_file, "w")
-    f.write("agha_study_id\tfilename\tsize_in_bytes\tchecksum\tpresigned_url\n")
-    for metadata in file_metadata_list:
-        # parse data
-        study_id = metadata["agha_study_id"]
-        filename = metadata["filename"]
-        checksum = metadata["provided_checksum"]
-        presigned_url = metadata["presigned_url"]
-        size_in_bytes = metadata["size_in_bytes"]
-
-        f.write(
-            f"{study_id}\t{filename}\t{size_in_bytes}\t{checksum}\t{presigned_url}\n"
+def generate_presign_s3_url(
+    agha_study_id_list: List[str],
+    flagship: str,
+    filetype_list: List[str],
+    dry_run: bool,
+    out_file: str,
+    release_id: str,
+    sign_workers: int = SIGN_WORKERS,
+    sign_batch_size: int = SIGN_BATCH_SIZE,
+):
+    filetype_list = run_filetype_sanitize(filetype_list)
+
+    # Find files with relevant study_id, flagship, and filetype
+    file_metadata_list = get_file_metadata_list(
+        agha_study_id_list, flagship, filetype_list
+    )
+
+    if dry_run:
+        return
+
+    batch_list = [
+        file_metadata_list[i : i + sign_batch_size]
+        for i in range(0, len(file_metadata_list), sign_batch_size)
+    ]
+    s3_key_batch_list = [[m["sort_key"] for m in batch] for batch in batch_list]
+
+    # Write output file, each batch as soon as it is signed
+    with open(out_file, "w") as f, ProcessPoolExecutor(
+        max_workers=max(1, sign_workers)
+    ) as executor:
+        f.write("agha_study_id\tfilename\tsize_in_bytes\tchecksum\tpresigned_url\n")
+
+        presigned_url_batch_iter = executor.map(
+            sign_s3_key_batch,
+            s3_key_batch_list,
+            [release_id] * len(s3_key_batch_list),
         )
-    f.close()
+        for batch, presigned_url_batch in zip(batch_list, presigned_url_batch_iter):
+            for metadata, presigned_url in zip(batch, presigned_url_batch):
+                # parse data
+                study_id = metadata["agha_study_id"]
+                filename = metadata["filename"]
+                checksum = metadata["provided_checksum"]
+                size_in_bytes = metadata["size_in_bytes"]
+
+                f.write(
+                    f"{study_id}\t{filename}\t{size_in_bytes}\t{checksum}\t{presigned_url}\n"
+                )
+            f.flush()
 
     print(f"PresignUrl generated. Checkout: {out_file}")
 
@@ -236,4 +321,5 @@ if __name__ == "__main__":
         dry_run=args.dryrun,
         out_file=args.out_file,
         release_id=args.release_id,
+        sign_workers=args.sign_workers,
     )
@@ -139,6 +139,9 @@ def summarize_files_from_bucket(consent: bool = True):
     report_txt.flush(python_open_mode="w")
 
     # Per Flagship level
+    pd_df["flagship"] = agha.FlagShip.from_names(
+        pd_df["sort_key"].str.split("/").str[0]
+    )
     for new_flagship in flagships:
         flagship_enum = agha.FlagShip.from_name(new_flagship)
         flagship_official_name = flagship_enum.official_name()
@@ -147,7 +150,7 @@ def summarize_files_from_bucket(consent: bool = True):
             f"Checking FlagShip: {flagship_official_name} ({flagship_preferred_code})"
         )
 
-        flagship_df = pd_df[pd_df["sort_key"].str.startswith(new_flagship)]
+        flagship_df = pd_df[pd_df["flagship"] == flagship_enum]
 
         size_in_byte_df = flagship_df.groupby(by="filetype", as_index=False)[
             "size_in_bytes"
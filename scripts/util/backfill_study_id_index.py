@@ -0,0 +1,89 @@
+import argparse
+import os
+import sys
+
+DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+SOURCE_PATH = os.path.join(DIR_PATH, "..", "..", "lambdas", "layers", "util")
+sys.path.append(SOURCE_PATH)
+
+from util import dynamodb
+
+DYNAMODB_STORE_TABLE = "agha-gdr-store-bucket"
+
+"""
+Create the study ID index records (See util.dynamodb StudyIdIndexRecord) of the MANIFEST records already in the store
+table. Records are updated one submission at a time, so the script can be re-run safely (only the difference is
+written).
+
+To run the script:
+python3 scripts/util/backfill_study_id_index.py --sort-key-prefix AC/
+"""
+
+
+def get_argument():
+    parser = argparse.ArgumentParser(
+        description="Backfill the study ID index of the store table."
+    )
+    parser.add_argument(
+        "--sort-key-prefix",
+        default="",
+        help="Only backfill the MANIFEST records with this prefix (e.g. 'AC/' or 'AC/2022-02-02/'). Default: all",
+    )
+    parser.add_argument(
+        "--dryrun", default=False, action="store_true", help="Perform a dry run."
+    )
+    return parser.parse_args()
+
+
+def group_manifest_record_by_submission(manifest_record_list: list) -> dict:
+    """
+    :return: submission prefix (e.g. 'AC/2022-02-02/') -> MANIFEST records
+    """
+    record_by_submission = {}
+    for record in manifest_record_list:
+        submission = os.path.dirname(record["sort_key"]) + "/"
+        record_by_submission.setdefault(submission, []).append(record)
+    return record_by_submission
+
+
+def backfill_study_id_index(sort_key_prefix: str, dry_run: bool):
+    if sort_key_prefix:
+        manifest_record_list = dynamodb.get_batch_item_from_pk_and_sk(
+            table_name=DYNAMODB_STORE_TABLE,
+            partition_key=dynamodb.FileRecordPartitionKey.MANIFEST_FILE_RECORD.value,
+            sort_key_prefix=sort_key_prefix,
+        )
+    else:
+        manifest_record_list = dynamodb.get_batch_item_from_pk_only(
+            table_name=DYNAMODB_STORE_TABLE,
+            partition_key=dynamodb.FileRecordPartitionKey.MANIFEST_FILE_RECORD.value,
+        )
+    record_by_submission = group_manifest_record_by_submission(manifest_record_list)
+    print(
+        f"{len(manifest_record_list)} MANIFEST records in {len(record_by_submission)} submissions"
+    )
+
+    total_written = 0
+    total_deleted = 0
+    for submission, record_list in sorted(record_by_submission.items()):
+        if dry_run:
+            number_of_index = sum(
+                len(dynamodb.split_agha_study_id(r.get("agha_study_id")))
+                for r in record_list
+            )
+            print(f"{submission}: {len(record_list)} records, {number_of_index} index")
+            continue
+
+        written, deleted = dynamodb.update_study_id_index_from_manifest_record_list(
+            DYNAMODB_STORE_TABLE, record_list, sort_key_prefix=submission
+        )
+        print(f"{submission}: {written} index written, {deleted} deleted")
+        total_written += written
+        total_deleted += deleted
+
+    print(f"Done. {total_written} index written, {total_deleted} deleted")
+
+
+if __name__ == "__main__":
+    args = get_argument()
+    backfill_study_id_index(args.sort_key_prefix, args.dryrun)
@@ -69,7 +69,7 @@ class LambdaStack(core.NestedStack):
                 iam.ManagedPolicy.from_aws_managed_policy_name("AmazonS3FullAccess"),
                 iam.ManagedPolicy.from_aws_managed_policy_name("IAMReadOnlyAccess"),
                 iam.ManagedPolicy.from_aws_managed_policy_name(
-                    "AmazonDynamoDBReadOnlyAccess"
+                    "AmazonDynamoDBFullAccess"
                 ),
                 iam.ManagedPolicy.from_aws_managed_policy_name(
                     "service-role/AWSLambdaBasicExecutionRole"
@@ -90,6 +90,10 @@ class LambdaStack(core.NestedStack):
                 # Buckets
                 "STORE_BUCKET": bucket_name["store_bucket"],
                 "STAGING_BUCKET": bucket_name["staging_bucket"],
+                # Dynamodb
+                "DYNAMODB_SUBMISSION_STATUS_TABLE_NAME": dynamodb_table[
+                    "submission-status"
+                ],
             },
             role=cleanup_manager_lambda_role,
             memory_size=1769,
@@ -106,7 +110,10 @@ class LambdaStack(core.NestedStack):
             managed_policies=[
                 iam.ManagedPolicy.from_aws_managed_policy_name(
                     "service-role/AWSLambdaBasicExecutionRole"
-                )
+                ),
+                iam.ManagedPolicy.from_aws_managed_policy_name(
+                    "AmazonDynamoDBFullAccess"
+                ),
             ],
         )
 
@@ -137,9 +144,11 @@ class LambdaStack(core.NestedStack):
                 "STAGING_BUCKET": bucket_name["staging_bucket"],
                 "AWS_ACCOUNT_NUMBER": os.environ.get("CDK_DEFAULT_ACCOUNT"),
                 "FOLDER_LOCK_EXCEPTION_ROLE_ID": folder_lock_exception_role_id,
+                "DYNAMODB_FOLDER_LOCK_TABLE_NAME": dynamodb_table["folder-lock"],
             },
             memory_size=1769,
             role=folder_lock_lambda_role,
+            layers=[util_layer, runtime_layer],
         )
 
         ################################################################################
@@ -156,6 +165,9 @@ class LambdaStack(core.NestedStack):
                 iam.ManagedPolicy.from_aws_managed_policy_name(
                     "AmazonSSMReadOnlyAccess"
                 ),
+                iam.ManagedPolicy.from_aws_managed_policy_name(
+                    "AmazonDynamoDBFullAccess"
+                ),
             ],
         )
 
@@ -196,6 +208,43 @@ class LambdaStack(core.NestedStack):
             ],
         )
 
+        # Send the notification written to the outbox, one per submission
+        notification_aggregator_lambda = lambda_.Function(
+            self,
+            "NotificationAggregatorLambda",
+            function_name=f"{namespace}-notification-aggregator",
+            handler="notification.aggregate_handler",
+            runtime=lambda_.Runtime.PYTHON_3_8,
+            timeout=core.Duration.seconds(50),
+            reserved_concurrent_executions=1,  # A group must not be sent by two overlapping runs
+            retry_attempts=0,
+            code=lambda_.Code.from_asset("lambdas/functions/notification/"),
+            environment={
+                "SLACK_NOTIFY": notification["slack_notify"],
+                "EMAIL_NOTIFY": notification["email_notify"],
+                "SLACK_HOST": notification["slack_host"],
+                "SLACK_CHANNEL": notification["slack_channel"],
+                "MANAGER_EMAIL": notification["manager_email"],
+                "SENDER_EMAIL": notification["sender_email"],
+                "DYNAMODB_NOTIFICATION_OUTBOX_TABLE_NAME": dynamodb_table[
+                    "notification-outbox"
+                ],
+            },
+            role=notification_lambda_role,
+            memory_size=1769,
+            layers=[
+                runtime_layer,
+                util_layer,
+            ],
+        )
+
+        events.Rule(
+            self,
+            "NotificationAggregatorSchedule",
+            schedule=events.Schedule.rate(core.Duration.minutes(1)),
+            targets=[targets.LambdaFunction(notification_aggregator_lambda)],
+        )
+
         ################################################################################
         # File Validation Lambda (Trigger Batch)
 
@@ -247,6 +296,9 @@ class LambdaStack(core.NestedStack):
                 "DYNAMODB_ARCHIVE_RESULT_TABLE_NAME": dynamodb_table[
                     "result-bucket-archive"
                 ],
+                "DYNAMODB_SUBMISSION_STATUS_TABLE_NAME": dynamodb_table[
+                    "submission-status"
+                ],
                 # Batch
                 "BATCH_QUEUE_NAME": json.dumps(batch_environment["batch_queue_name"]),
                 "JOB_DEFINITION_ARN": batch.batch_job_definition.job_definition_arn,
@@ -293,6 +345,13 @@ class LambdaStack(core.NestedStack):
                 ],
             )
         )
+        # Sampled cProfile output of slow invocations (see util.timing)
+        manifest_processor_lambda_role.add_to_policy(
+            iam.PolicyStatement(
+                actions=["s3:PutObject"],
+                resources=[f"arn:aws:s3:::{bucket_name['results_bucket']}/profile/*"],
+            )
+        )
 
         self.manifest_processor_lambda = lambda_.Function(
             self,
@@ -314,8 +373,12 @@ class LambdaStack(core.NestedStack):
                     "staging-bucket-archive"
                 ],
                 "DYNAMODB_ETAG_TABLE_NAME": dynamodb_table["e-tag"],
+                "DYNAMODB_NOTIFICATION_OUTBOX_TABLE_NAME": dynamodb_table[
+                    "notification-outbox"
+                ],
                 # Bucket
                 "STAGING_BUCKET": bucket_name["staging_bucket"],
+                "TIMING_PROFILE_BUCKET": bucket_name["results_bucket"],
                 # AUTORUN
                 "AUTORUN_VALIDATION_JOBS": autorun_validation_jobs,
             },
@@ -372,6 +435,9 @@ class LambdaStack(core.NestedStack):
                     "store-bucket-archive"
                 ],
                 "DYNAMODB_ETAG_TABLE_NAME": dynamodb_table["e-tag"],
+                "DYNAMODB_SUBMISSION_STATUS_TABLE_NAME": dynamodb_table[
+                    "submission-status"
+                ],
             },
             role=s3_event_recorder_lambda_role,
             memory_size=1769,
@@ -434,6 +500,7 @@ class LambdaStack(core.NestedStack):
             },
             memory_size=1769,
             role=s3_event_router_lambda_role,
+            layers=[util_layer, runtime_layer],
         )
 
         # Bucket event emmit
@@ -523,6 +590,9 @@ class LambdaStack(core.NestedStack):
                 "DYNAMODB_ARCHIVE_RESULT_TABLE_NAME": dynamodb_table[
                     "result-bucket-archive"
                 ],
+                "DYNAMODB_SUBMISSION_STATUS_TABLE_NAME": dynamodb_table[
+                    "submission-status"
+                ],
             },
             role=data_transfer_manager_lambda_role,
             memory_size=1769,
@@ -565,6 +635,10 @@ class LambdaStack(core.NestedStack):
                 "STORE_BUCKET": bucket_name["store_bucket"],
                 # DynamodDB
                 "DYNAMODB_RESULT_TABLE_NAME": dynamodb_table["result-bucket"],
+                "DYNAMODB_STORE_TABLE_NAME": dynamodb_table["store-bucket"],
+                "DYNAMODB_SUBMISSION_STATUS_TABLE_NAME": dynamodb_table[
+                    "submission-status"
+                ],
             },
             role=report_lambda_role,
             memory_size=1769,
@@ -621,6 +695,9 @@ class LambdaStack(core.NestedStack):
                 "DYNAMODB_RESULT_TABLE_NAME": dynamodb_table["result-bucket"],
                 "DYNAMODB_STAGING_TABLE_NAME": dynamodb_table["staging-bucket"],
                 "DYNAMODB_STORE_TABLE_NAME": dynamodb_table["store-bucket"],
+                "DYNAMODB_SUBMISSION_STATUS_TABLE_NAME": dynamodb_table[
+                    "submission-status"
+                ],
                 # Batches
                 "REPORT_LAMBDA_ARN": self.report_lambda.function_arn,
                 # Triggering lambda
@@ -630,6 +707,31 @@ class LambdaStack(core.NestedStack):
             layers=[util_layer, runtime_layer],
         )
 
+        # The scheduled check settles the store upload count of the submission it concludes
+        batch_notification_lambda_role.add_to_policy(
+            iam.PolicyStatement(
+                actions=["dynamodb:UpdateItem"],
+                resources=[
+                    f"arn:aws:dynamodb:{self.region}:{self.account}:table/{dynamodb_table['submission-status']}"
+                ],
+            )
+        )
+
+        # Full store check of a transfer whose upload count stopped short (e.g. a lost upload event)
+        events.Rule(
+            self,
+            "StoreTransferCheckSchedule",
+            schedule=events.Schedule.rate(core.Duration.minutes(30)),
+            targets=[
+                targets.LambdaFunction(
+                    self.batch_notification_lambda,
+                    event=events.RuleTargetInput.from_object(
+                        {"event_type": "STORE_TRANSFER_CHECK"}
+                    ),
+                )
+            ],
+        )
+
         # Allow event recorder to invoke this function
         # After recording event, notification might be sent
         s3_event_recorder_lambda_role.add_to_policy(
@@ -152,6 +152,20 @@ class S3DataSharing(core.NestedStack):
             )
         )
 
+        # Server-side copy to the destination bucket from the lambda
+        self.gdr_s3_sharing_policy.attach_to_role(gdr_s3_data_sharing_lambda_role)
+
+        # Sync manifest of each share is kept in the results bucket
+        gdr_s3_data_sharing_lambda_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=["s3:GetObject", "s3:PutObject"],
+                resources=[
+                    f"arn:aws:s3:::{bucket_name['results_bucket']}/sharing/*",
+                ],
+            )
+        )
+
         # We could change policy via lambda to upload stuff on s3 destination bucket
         gdr_s3_data_sharing_lambda_role.add_to_policy(
             iam.PolicyStatement(
@@ -169,7 +183,7 @@ class S3DataSharing(core.NestedStack):
             function_name=f"{namespace}-s3-data-sharing",
             handler="gdr_s3_data_sharing.handler",
             runtime=lambda_.Runtime.PYTHON_3_8,
-            timeout=core.Duration.seconds(300),
+            timeout=core.Duration.seconds(900),
             retry_attempts=0,
             code=lambda_.Code.from_asset("lambdas/functions/gdr_s3_data_sharing"),
             environment={
@@ -180,6 +194,7 @@ class S3DataSharing(core.NestedStack):
                 "S3_DATA_SHARING_JOB_DEFINITION_ARN": self.gdr_s3_sharing_job_definition.job_definition_arn,
                 # Buckets
                 "STORE_BUCKET": bucket_name["store_bucket"],
+                "RESULTS_BUCKET": bucket_name["results_bucket"],
             },
             role=gdr_s3_data_sharing_lambda_role,
             memory_size=1769,
@@ -114,6 +114,21 @@ class DynamoDBStack(core.Stack):
             billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
         )
 
+        # Study ID lookup, only the TYPE:STUDY_ID_INDEX records (one per study ID of a MANIFEST record) have the
+        # partition attribute (See util.dynamodb StudyIdIndexRecord)
+        self.dynamodb_store_bucket.add_global_secondary_index(
+            index_name="agha_study_id_index",
+            partition_key=dynamodb.Attribute(
+                name="index_agha_study_id",
+                type=dynamodb.AttributeType.STRING,
+            ),
+            sort_key=dynamodb.Attribute(
+                name="s3_key",
+                type=dynamodb.AttributeType.STRING,
+            ),
+            projection_type=dynamodb.ProjectionType.ALL,
+        )
+
         ################################################################################
         # Archived Table for store bucket dynamodb table
         # Partition Key: S3 key
@@ -156,3 +171,66 @@ class DynamoDBStack(core.Stack):
             removal_policy=core.RemovalPolicy.RETAIN,
             billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
         )
+
+        ################################################################################
+        # Folder lock table for staging bucket
+        # Partition Key: LOCK (locked submission) or POLICY (bucket policy write state)
+        # Sort Key: Submission directory for LOCK, bucket name for POLICY
+
+        self.dynamodb_folder_lock = dynamodb.Table(
+            self,
+            "DynamoDBTableFolderLock",
+            table_name=dynamodb_table["folder-lock"],
+            partition_key=dynamodb.Attribute(
+                name="partition_key",
+                type=dynamodb.AttributeType.STRING,
+            ),
+            sort_key=dynamodb.Attribute(
+                name="sort_key",
+                type=dynamodb.AttributeType.STRING,
+            ),
+            removal_policy=core.RemovalPolicy.RETAIN,
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+        )
+
+        ################################################################################
+        # Submission status table, count of files at each pipeline stage
+        # Partition Key: Flagship code
+        # Sort Key: Submission directory (e.g. 'AC/2022-02-02/')
+
+        self.dynamodb_submission_status = dynamodb.Table(
+            self,
+            "DynamoDBTableSubmissionStatus",
+            table_name=dynamodb_table["submission-status"],
+            partition_key=dynamodb.Attribute(
+                name="partition_key",
+                type=dynamodb.AttributeType.STRING,
+            ),
+            sort_key=dynamodb.Attribute(
+                name="sort_key",
+                type=dynamodb.AttributeType.STRING,
+            ),
+            removal_policy=core.RemovalPolicy.RETAIN,
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+        )
+
+        ################################################################################
+        # Notification outbox table, notification waiting to be coalesced and sent
+        # Partition Key: 'OUTBOX'
+        # Sort Key: Creation epoch and unique id (e.g. '001650000000:<uuid>')
+
+        self.dynamodb_notification_outbox = dynamodb.Table(
+            self,
+            "DynamoDBTableNotificationOutbox",
+            table_name=dynamodb_table["notification-outbox"],
+            partition_key=dynamodb.Attribute(
+                name="partition_key",
+                type=dynamodb.AttributeType.STRING,
+            ),
+            sort_key=dynamodb.Attribute(
+                name="sort_key",
+                type=dynamodb.AttributeType.STRING,
+            ),
+            removal_policy=core.RemovalPolicy.RETAIN,
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+        )